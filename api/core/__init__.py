@@ -5,12 +5,22 @@ api/core — Infraestructura compartida de la API.
 Exporta las utilidades más usadas para importación directa:
     from api.core import get_cache_key, get_from_cache, set_in_cache
     from api.core import create_utf8_response, clean_firebase_data
+    from api.core import FirestoreJSONResponse, to_jsonable
     from api.core import optional_rate_limit, verify_firebase_token
     from api.core import get_cors_origins
 """
 
-from .cache import get_cache_key, get_from_cache, set_in_cache, async_cache
+from .cache import (
+    get_cache_key,
+    get_from_cache,
+    set_in_cache,
+    async_cache,
+    invalidate_tags,
+    freeze,
+    thaw,
+)
 from .responses import create_utf8_response, clean_firebase_data, handle_utf8_text
+from .serialization import FirestoreJSONResponse, StreamingJSONResponse, to_jsonable
 from .config import get_cors_origins, get_cors_origin_regex, CORS_ORIGINS
 from .security import optional_rate_limit, limiter, SLOWAPI_AVAILABLE
 
@@ -20,10 +30,16 @@ __all__ = [
     "get_from_cache",
     "set_in_cache",
     "async_cache",
+    "invalidate_tags",
+    "freeze",
+    "thaw",
     # Responses
     "create_utf8_response",
     "clean_firebase_data",
     "handle_utf8_text",
+    "FirestoreJSONResponse",
+    "StreamingJSONResponse",
+    "to_jsonable",
     # Config / CORS
     "get_cors_origins",
     "get_cors_origin_regex",
@@ -1,29 +1,490 @@
 # -*- coding: utf-8 -*-
 """
-api/core/cache.py — Cache en memoria thread-safe con TTL y tamaño acotado.
+api/core/cache.py — Subsistema de caché unificado con backends intercambiables.
+
+Un único caché para toda la API (endpoints, dashboard, empréstito):
+
+- Backends (``CACHE_BACKEND``):
+    - ``memory`` (por defecto): acotado por proceso, política ``lru`` o ``lfu``
+      (``CACHE_MEMORY_POLICY``) y tamaño ``CACHE_MAX_SIZE``.
+    - ``sqlite``: archivo SQLite local (``CACHE_SQLITE_PATH``) compartido por
+      todos los workers de uvicorn del mismo host; un worker calienta la
+      entrada y los demás la reutilizan, y las invalidaciones son globales.
+- Claves ``"<namespace>:<hash>"`` (ver ``get_cache_key``). Cada namespace
+  puede tener su TTL (``configure_namespace``); las entradas quedan
+  etiquetadas con su namespace y con los ``tags`` adicionales que se indiquen,
+  y ``invalidate_tags`` las elimina en bloque (reemplaza a
+  ``clear_cache_by_prefix``, que se mantiene por compatibilidad).
+- Expiración con reloj monotónico (``time.monotonic``) en memoria; el backend
+  SQLite usa el reloj de pared porque es el único común entre procesos.
+- ``get_or_compute`` (usado por ``async_cache`` y por ``with_cache`` de
+  empréstito) agrega *single-flight* — N misses concurrentes de la misma
+  clave comparten una sola ejecución — y *stale-while-revalidate*: durante
+  ``stale_seconds`` tras vencer el TTL se sirve el valor anterior mientras
+  una única tarea en segundo plano lo recalcula.
+- Los valores se congelan al guardarse (``FrozenDict``/``FrozenList``): los
+  hits devuelven la misma instancia sin ``deepcopy`` y cualquier intento de
+  mutarla lanza ``TypeError``. Para modificar un hit, usar ``thaw(valor)`` o
+  copiar (``dict(valor)``).
 
 Uso:
     from api.core.cache import get_cache_key, get_from_cache, set_in_cache, async_cache
+    from api.core.cache import invalidate_tags
 """
 
+import asyncio
 import hashlib
-import threading
 import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
 from collections import OrderedDict
-from datetime import datetime
-from typing import Any, Tuple
+from functools import wraps
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from api.core.config import int_from_env
+from api.core.metrics import record_cache
 
 logger = logging.getLogger(__name__)
 
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory").strip().lower()
+CACHE_MEMORY_POLICY = os.getenv("CACHE_MEMORY_POLICY", "lru").strip().lower()
+CACHE_SQLITE_PATH = os.getenv(
+    "CACHE_SQLITE_PATH", os.path.join(tempfile.gettempdir(), "gestor_api_cache.sqlite3")
+)
+# Tope de vida de cualquier entrada sin TTL de namespace (libera memoria/disco)
+CACHE_DEFAULT_TTL_SECONDS = int_from_env("CACHE_DEFAULT_TTL_SECONDS", 3600)
+_CACHE_MAX_SIZE = int_from_env("CACHE_MAX_SIZE", 1000)
+# Ventana stale-while-revalidate por defecto de los decoradores
+CACHE_STALE_SECONDS = int_from_env("CACHE_STALE_SECONDS", 60)
+
+
+# ---------------------------------------------------------------------------
+# Valores inmutables
+# ---------------------------------------------------------------------------
+
+
+def _readonly(self, *args, **kwargs):
+    raise TypeError(
+        "Valor de caché inmutable: copiar con thaw()/dict()/list() antes de modificar"
+    )
+
+
+class FrozenDict(dict):
+    """``dict`` de solo lectura (serializa como dict en JSON y pickle)."""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+class FrozenList(list):
+    """``list`` de solo lectura."""
+
+    __slots__ = ()
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = clear = extend = insert = pop = remove = reverse = sort = _readonly
+
+    def __reduce__(self):
+        return (FrozenList, (list(self),))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value: Any) -> Any:
+    """Copia profunda inmutable de dicts/listas/sets; el resto se devuelve tal cual."""
+    if isinstance(value, (FrozenDict, FrozenList, frozenset)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((k, freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(v) for v in value)
+    if isinstance(value, tuple):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Copia profunda mutable de un valor congelado."""
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    if isinstance(value, tuple):
+        return tuple(thaw(v) for v in value)
+    if isinstance(value, frozenset):
+        return {thaw(v) for v in value}
+    return value
+
+
 # ---------------------------------------------------------------------------
-# Almacenamiento interno
+# Backends
 # ---------------------------------------------------------------------------
 
-_CACHE_MAX_SIZE = 1000
-_cache_lock = threading.Lock()
-_simple_cache: OrderedDict = OrderedDict()  # key -> value
-_cache_timestamps: dict = {}  # key -> datetime
-_cache_func_map: dict = {}  # key -> func_name (para invalidación por prefijo)
+
+def _namespace_of(key: str) -> str:
+    return key.split(":", 1)[0] if ":" in key else ""
+
+
+class MemoryBackend:
+    """Caché acotado en memoria del proceso con desalojo LRU o LFU."""
+
+    name = "memory"
+
+    def __init__(self, max_size: int = _CACHE_MAX_SIZE, policy: str = "lru"):
+        self.max_size = max_size
+        self.policy = policy if policy in ("lru", "lfu") else "lru"
+        self.lock = threading.Lock()
+        self.values: "OrderedDict[str, Any]" = OrderedDict()  # orden = recencia
+        self.timestamps: Dict[str, float] = {}  # key -> creación (monotonic)
+        self.expires: Dict[str, float] = {}  # key -> expiración (monotonic)
+        self.hits: Dict[str, int] = {}
+        self.tags: Dict[str, FrozenSet[str]] = {}
+        self.tag_index: Dict[str, set] = {}
+        self.evictions = 0
+
+    def _drop(self, key: str) -> None:
+        self.values.pop(key, None)
+        self.timestamps.pop(key, None)
+        self.expires.pop(key, None)
+        self.hits.pop(key, None)
+        for tag in self.tags.pop(key, ()):
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def _evict_one(self) -> None:
+        if self.policy == "lfu":
+            # Menos usado; en empate, el menos reciente (orden del OrderedDict)
+            victim = min(self.values, key=self.hits.__getitem__)
+        else:
+            victim = next(iter(self.values))
+        self._drop(victim)
+        self.evictions += 1
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(valor, edad en segundos) o ``None`` si no existe o expiró."""
+        with self.lock:
+            if key not in self.values:
+                return None
+            now = time.monotonic()
+            if now >= self.expires.get(key, float("inf")):
+                self._drop(key)
+                return None
+            self.values.move_to_end(key)
+            self.hits[key] += 1
+            return self.values[key], now - self.timestamps[key]
+
+    def set(self, key: str, value: Any, ttl: Optional[float], tags: FrozenSet[str]) -> None:
+        with self.lock:
+            if key in self.values:
+                self._drop(key)
+            while len(self.values) >= self.max_size:
+                self._evict_one()
+            now = time.monotonic()
+            self.values[key] = value
+            self.timestamps[key] = now
+            self.hits[key] = 0
+            if ttl is not None:
+                self.expires[key] = now + ttl
+            self.tags[key] = tags
+            for tag in tags:
+                self.tag_index.setdefault(tag, set()).add(key)
+
+    def delete(self, key: str) -> bool:
+        with self.lock:
+            found = key in self.values
+            self._drop(key)
+            return found
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        with self.lock:
+            keys = set()
+            for tag in tags:
+                keys |= self.tag_index.get(tag, set())
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def keys(self) -> List[str]:
+        with self.lock:
+            return list(self.values)
+
+    def clear(self) -> int:
+        with self.lock:
+            count = len(self.values)
+            for store in (self.values, self.timestamps, self.expires, self.hits, self.tags, self.tag_index):
+                store.clear()
+            return count
+
+    def entries_info(self, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "key": key,
+                    "age_seconds": now - self.timestamps[key],
+                    "hits": self.hits.get(key, 0),
+                    "expired": now >= self.expires.get(key, float("inf")),
+                }
+                for key in self.values
+                if namespace is None or _namespace_of(key) == namespace
+            ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                "backend": self.name,
+                "policy": self.policy,
+                "entries": len(self.values),
+                "max_size": self.max_size,
+                "evictions": self.evictions,
+                "tags": len(self.tag_index),
+            }
+
+
+class SQLiteBackend:
+    """Caché en un archivo SQLite local, compartido entre procesos del host.
+
+    Los valores se guardan con ``pickle`` ya congelados, así que al leerlos
+    vuelven como ``FrozenDict``/``FrozenList``. Cada hilo usa su propia
+    conexión; el modo WAL permite lecturas concurrentes entre workers.
+    """
+
+    name = "sqlite"
+    _PRUNE_EVERY = 200  # escrituras entre purgas de expirados/excedentes
+
+    def __init__(self, path: str = CACHE_SQLITE_PATH, max_size: int = 10 * _CACHE_MAX_SIZE):
+        self.path = path
+        self.max_size = max_size
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+        con = self._conn()
+        with con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY,
+                    namespace TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    expires_at REAL
+                );
+                CREATE TABLE IF NOT EXISTS cache_tags (
+                    tag TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    PRIMARY KEY (tag, key)
+                );
+                CREATE INDEX IF NOT EXISTS idx_cache_tags_key ON cache_tags (key);
+                CREATE INDEX IF NOT EXISTS idx_cache_entries_created ON cache_entries (created_at);
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+        return con
+
+    def _delete_keys(self, con: sqlite3.Connection, keys: List[str]) -> None:
+        for i in range(0, len(keys), 500):
+            chunk = keys[i : i + 500]
+            marks = ",".join("?" * len(chunk))
+            con.execute(f"DELETE FROM cache_entries WHERE key IN ({marks})", chunk)
+            con.execute(f"DELETE FROM cache_tags WHERE key IN ({marks})", chunk)
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        con = self._conn()
+        row = con.execute(
+            "SELECT value, created_at, expires_at FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        blob, created_at, expires_at = row
+        now = time.time()
+        if expires_at is not None and now >= expires_at:
+            with con:
+                self._delete_keys(con, [key])
+            return None
+        try:
+            return pickle.loads(blob), now - created_at
+        except Exception as exc:
+            logger.warning(f"Entrada de caché ilegible {key}: {exc}")
+            return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float], tags: FrozenSet[str]) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as exc:
+            logger.warning(f"Valor no serializable para caché compartido ({key}): {exc}")
+            return
+        now = time.time()
+        con = self._conn()
+        with con:
+            con.execute("DELETE FROM cache_tags WHERE key = ?", (key,))
+            con.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (key, _namespace_of(key), blob, now, now + ttl if ttl is not None else None),
+            )
+            con.executemany(
+                "INSERT OR IGNORE INTO cache_tags VALUES (?, ?)", [(t, key) for t in tags]
+            )
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % self._PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self) -> None:
+        """Elimina expirados y, si se excede ``max_size``, las entradas más antiguas."""
+        con = self._conn()
+        with con:
+            expired = [
+                r[0]
+                for r in con.execute(
+                    "SELECT key FROM cache_entries WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                    (time.time(),),
+                )
+            ]
+            self._delete_keys(con, expired)
+            (count,) = con.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+            if count > self.max_size:
+                oldest = [
+                    r[0]
+                    for r in con.execute(
+                        "SELECT key FROM cache_entries ORDER BY created_at LIMIT ?",
+                        (count - self.max_size,),
+                    )
+                ]
+                self._delete_keys(con, oldest)
+
+    def delete(self, key: str) -> bool:
+        con = self._conn()
+        with con:
+            found = con.execute(
+                "SELECT 1 FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone() is not None
+            self._delete_keys(con, [key])
+        return found
+
+    def invalidate_tags(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        if not tags:
+            return 0
+        con = self._conn()
+        marks = ",".join("?" * len(tags))
+        with con:
+            keys = [
+                r[0]
+                for r in con.execute(
+                    f"SELECT DISTINCT key FROM cache_tags WHERE tag IN ({marks})", tags
+                )
+            ]
+            self._delete_keys(con, keys)
+        return len(keys)
+
+    def keys(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT key FROM cache_entries")]
+
+    def clear(self) -> int:
+        con = self._conn()
+        with con:
+            (count,) = con.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+            con.execute("DELETE FROM cache_entries")
+            con.execute("DELETE FROM cache_tags")
+        return count
+
+    def entries_info(self, namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        now = time.time()
+        sql = "SELECT key, created_at, expires_at FROM cache_entries"
+        params: Tuple[Any, ...] = ()
+        if namespace is not None:
+            sql += " WHERE namespace = ?"
+            params = (namespace,)
+        return [
+            {
+                "key": key,
+                "age_seconds": now - created_at,
+                "hits": None,  # no se registran para no escribir en cada lectura
+                "expired": expires_at is not None and now >= expires_at,
+            }
+            for key, created_at, expires_at in self._conn().execute(sql, params)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        con = self._conn()
+        (count,) = con.execute("SELECT COUNT(*) FROM cache_entries").fetchone()
+        (tags,) = con.execute("SELECT COUNT(DISTINCT tag) FROM cache_tags").fetchone()
+        return {
+            "backend": self.name,
+            "path": self.path,
+            "entries": count,
+            "max_size": self.max_size,
+            "tags": tags,
+        }
+
+
+# Backend en memoria por defecto (sus estructuras se exponen para los tests)
+_memory_backend = MemoryBackend(_CACHE_MAX_SIZE, CACHE_MEMORY_POLICY)
+_cache_lock = _memory_backend.lock
+_simple_cache = _memory_backend.values
+_cache_timestamps = _memory_backend.timestamps
+
+
+def _build_backend():
+    if CACHE_BACKEND == "sqlite":
+        try:
+            return SQLiteBackend(CACHE_SQLITE_PATH)
+        except Exception as exc:
+            logger.warning(f"Caché SQLite no disponible ({exc}); usando memoria")
+    return _memory_backend
+
+
+_backend = _build_backend()
+_namespace_ttls: Dict[str, Optional[int]] = {}
+_counters = {"hits": 0, "misses": 0, "stale_hits": 0, "computations": 0, "coalesced": 0}
+_inflight: Dict[str, "asyncio.Task"] = {}  # clave -> cálculo en curso
+_background_tasks: set = set()  # referencias fuertes a los refrescos en segundo plano
+
+
+def get_cache_backend():
+    return _backend
+
+
+def set_cache_backend(backend) -> None:
+    """Reemplaza el backend activo (p. ej. en tests o al configurar workers)."""
+    global _backend
+    _backend = backend
+
+
+def configure_namespace(namespace: str, ttl_seconds: Optional[int]) -> None:
+    """Fija el TTL duro de las entradas de ``namespace`` (``None`` = tope por defecto)."""
+    _namespace_ttls[namespace] = ttl_seconds
 
 
 # ---------------------------------------------------------------------------
@@ -32,77 +493,213 @@ _cache_func_map: dict = {}  # key -> func_name (para invalidación por prefijo)
 
 
 def get_cache_key(func_name: str, *args, **kwargs) -> str:
-    """Genera una clave de caché única y determinista."""
+    """Genera una clave de caché única y determinista: ``"<func_name>:<hash>"``."""
     key_data = f"{func_name}:{args!s}:{sorted(kwargs.items())!s}"
-    key = hashlib.md5(key_data.encode()).hexdigest()
-    with _cache_lock:
-        _cache_func_map[key] = func_name
-    return key
+    return f"{func_name}:{hashlib.md5(key_data.encode()).hexdigest()}"
 
 
-def get_from_cache(cache_key: str, max_age_seconds: int = 300) -> Tuple[Any, bool]:
+def get_from_cache(cache_key: str, max_age_seconds: Optional[int] = 300) -> Tuple[Any, bool]:
     """
     Recupera un valor del caché si existe y no ha expirado.
 
+    ``max_age_seconds`` acota la edad aceptable en esta lectura (además del
+    TTL del namespace); ``None`` acepta cualquier entrada no expirada.
+
     Returns:
-        (value, True)  — cuando el hit es válido
+        (value, True)  — cuando el hit es válido (valor congelado, solo lectura)
         (None, False)  — cuando hay miss o el entry expiró
     """
-    with _cache_lock:
-        if cache_key in _simple_cache:
-            cached_time = _cache_timestamps.get(cache_key)
-            if (
-                cached_time
-                and (datetime.now() - cached_time).total_seconds() < max_age_seconds
-            ):
-                _simple_cache.move_to_end(cache_key)
-                return _simple_cache[cache_key], True
-            # Entrada expirada — desalojar
-            _simple_cache.pop(cache_key, None)
-            _cache_timestamps.pop(cache_key, None)
-            _cache_func_map.pop(cache_key, None)
+    try:
+        found = _backend.get(cache_key)
+    except Exception as exc:
+        logger.warning(f"Error leyendo caché: {exc}")
+        found = None
+    if found is not None:
+        value, age = found
+        if max_age_seconds is None or age < max_age_seconds:
+            _counters["hits"] += 1
+            record_cache(_namespace_of(cache_key), "hit")
+            return value, True
+        _backend.delete(cache_key)
+    _counters["misses"] += 1
+    record_cache(_namespace_of(cache_key), "miss")
     return None, False
 
 
-def set_in_cache(cache_key: str, value: Any) -> None:
+def set_in_cache(
+    cache_key: str,
+    value: Any,
+    ttl_seconds: Optional[int] = None,
+    tags: Iterable[str] = (),
+) -> None:
     """
-    Almacena un valor en el caché.
-    Evita desbordamiento de memoria expulsando el entry más antiguo (LRU).
+    Almacena una copia congelada de ``value``.
+
+    El TTL es ``ttl_seconds`` o, si no se indica, el del namespace de la clave
+    (``CACHE_DEFAULT_TTL_SECONDS`` si no se configuró). La entrada queda
+    etiquetada con su namespace más ``tags``.
     """
-    with _cache_lock:
-        while len(_simple_cache) >= _CACHE_MAX_SIZE:
-            oldest_key, _ = _simple_cache.popitem(last=False)
-            _cache_timestamps.pop(oldest_key, None)
-            _cache_func_map.pop(oldest_key, None)
-        _simple_cache[cache_key] = value
-        _cache_timestamps[cache_key] = datetime.now()
+    namespace = _namespace_of(cache_key)
+    if ttl_seconds is None:
+        ttl_seconds = _namespace_ttls.get(namespace)
+    if ttl_seconds is None:
+        ttl_seconds = CACHE_DEFAULT_TTL_SECONDS
+    all_tags = frozenset(tags) | ({namespace} if namespace else frozenset())
+    try:
+        _backend.set(cache_key, freeze(value), ttl_seconds, all_tags)
+    except Exception as exc:
+        logger.warning(f"No se pudo guardar en caché {cache_key}: {exc}")
+
+
+def delete_from_cache(cache_key: str) -> bool:
+    return _backend.delete(cache_key)
+
+
+def invalidate_tags(*tags: str) -> int:
+    """Elimina todas las entradas etiquetadas con alguno de ``tags``. Retorna cuántas."""
+    removed = _backend.invalidate_tags(tags)
+    if removed:
+        logger.debug(f"Caché: {removed} entradas invalidadas por tags {tags}")
+    return removed
 
 
 def clear_cache_by_prefix(func_name_prefix: str) -> int:
-    """Evict all cache entries whose func_name starts with *func_name_prefix*.
+    """Compatibilidad: elimina las entradas cuyo namespace empieza con el prefijo.
 
-    Returns the number of entries removed.
-    Útil para invalidar el cache del dashboard / init-360 tras mutaciones de
-    unidades_proyecto o intervenciones_unidades_proyecto.
+    Preferir ``invalidate_tags``, que no recorre todas las claves.
     """
-    with _cache_lock:
-        keys_to_delete = [
-            k
-            for k, fn in list(_cache_func_map.items())
-            if fn.startswith(func_name_prefix) and k in _simple_cache
-        ]
-        removed = 0
-        for key in keys_to_delete:
-            _simple_cache.pop(key, None)
-            _cache_timestamps.pop(key, None)
-            _cache_func_map.pop(key, None)
+    removed = 0
+    for key in _backend.keys():
+        if _namespace_of(key).startswith(func_name_prefix) and _backend.delete(key):
             removed += 1
-        return removed
+    return removed
+
+
+def clear_cache() -> int:
+    """Vacía el caché completo. Retorna el número de entradas eliminadas."""
+    return _backend.clear()
+
+
+def get_cache_entries(namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Edad, hits y estado de las entradas (opcionalmente de un namespace)."""
+    return _backend.entries_info(namespace)
+
 
+def get_cache_stats() -> Dict[str, Any]:
+    total = _counters["hits"] + _counters["misses"]
+    return {
+        **_backend.stats(),
+        **_counters,
+        "hit_rate": round(_counters["hits"] / total, 4) if total else None,
+        "in_flight": len(_inflight),
+        "namespace_ttls": dict(_namespace_ttls),
+    }
 
-def async_cache(ttl_seconds: int = 300):
+
+# ---------------------------------------------------------------------------
+# Single-flight + stale-while-revalidate
+# ---------------------------------------------------------------------------
+
+
+async def _single_flight(cache_key: str, compute: Callable[[], Awaitable[Any]], store) -> Any:
+    """Ejecuta ``compute`` una sola vez por clave; las llamadas concurrentes esperan el mismo resultado.
+
+    El cálculo corre en su propia tarea (``asyncio.shield``): si el request que
+    lo inició se cancela, los demás siguen esperando el resultado.
     """
-    Decorador para cachear funciones async con TTL.
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(cache_key)
+    if task is None or task.done() or task.get_loop() is not loop:
+
+        async def _leader():
+            try:
+                return store(await compute())
+            finally:
+                if _inflight.get(cache_key) is asyncio.current_task():
+                    del _inflight[cache_key]
+
+        task = loop.create_task(_leader())
+        _inflight[cache_key] = task
+        _counters["computations"] += 1
+    else:
+        _counters["coalesced"] += 1
+    return await asyncio.shield(task)
+
+
+def _refresh_in_background(cache_key: str, compute, store) -> None:
+    if cache_key in _inflight:
+        return
+
+    async def _refresh():
+        try:
+            await _single_flight(cache_key, compute, store)
+        except Exception as exc:
+            logger.warning(f"Refresco en segundo plano de {cache_key} falló: {exc}")
+
+    task = asyncio.get_running_loop().create_task(_refresh())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def get_or_compute(
+    cache_key: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl_seconds: int = 300,
+    stale_seconds: int = CACHE_STALE_SECONDS,
+    tags: Iterable[str] = (),
+    cacheable: Optional[Callable[[Any], bool]] = None,
+) -> Any:
+    """Valor cacheado de ``cache_key`` o resultado de ``compute()`` (coalescido).
+
+    - Fresco (edad < ``ttl_seconds``): se devuelve directamente.
+    - Vencido pero dentro de ``stale_seconds``: se devuelve el valor anterior
+      y se lanza un único refresco en segundo plano.
+    - Ausente: todas las llamadas concurrentes esperan una sola ejecución.
+
+    Solo se guardan los resultados para los que ``cacheable(result)`` es
+    verdadero (todos si es ``None``); esos se devuelven congelados.
+    """
+    tags = tuple(tags)
+
+    def store(result: Any) -> Any:
+        if cacheable is not None and not cacheable(result):
+            return result
+        frozen = freeze(result)
+        set_in_cache(cache_key, frozen, ttl_seconds=ttl_seconds + stale_seconds, tags=tags)
+        return frozen
+
+    try:
+        found = _backend.get(cache_key)
+    except Exception as exc:
+        logger.warning(f"Error leyendo caché: {exc}")
+        found = None
+    if found is not None:
+        value, age = found
+        if age < ttl_seconds:
+            _counters["hits"] += 1
+            record_cache(_namespace_of(cache_key), "hit")
+            return value
+        if age < ttl_seconds + stale_seconds:
+            _counters["stale_hits"] += 1
+            record_cache(_namespace_of(cache_key), "stale")
+            _refresh_in_background(cache_key, compute, store)
+            return value
+
+    _counters["misses"] += 1
+    record_cache(_namespace_of(cache_key), "miss")
+    return await _single_flight(cache_key, compute, store)
+
+
+def async_cache(
+    ttl_seconds: int = 300,
+    tags: Iterable[str] = (),
+    stale_seconds: int = CACHE_STALE_SECONDS,
+):
+    """
+    Decorador para cachear funciones async con TTL, single-flight y
+    stale-while-revalidate (ver ``get_or_compute``).
+
+    Los hits devuelven el valor congelado (sin copia).
 
     Uso::
 
@@ -112,27 +709,16 @@ def async_cache(ttl_seconds: int = 300):
     """
 
     def decorator(func):
-        import copy
-        from functools import wraps
-
         @wraps(func)
         async def wrapper(*args, **kwargs):
             cache_key = get_cache_key(func.__name__, *args, **kwargs)
-            cached_value, is_valid = get_from_cache(cache_key, ttl_seconds)
-            if is_valid:
-                logger.info(f"Cache hit: {func.__name__}")
-                try:
-                    return copy.deepcopy(cached_value)
-                except Exception:
-                    return cached_value
-
-            logger.info(f"Cache miss: {func.__name__}")
-            result = await func(*args, **kwargs)
-            try:
-                set_in_cache(cache_key, result)
-            except Exception as exc:
-                logger.warning(f"No se pudo cachear {func.__name__}: {exc}")
-            return result
+            return await get_or_compute(
+                cache_key,
+                lambda: func(*args, **kwargs),
+                ttl_seconds=ttl_seconds,
+                stale_seconds=stale_seconds,
+                tags=tags,
+            )
 
         return wrapper
 
@@ -5,6 +5,7 @@ api/core/config.py — Configuración centralizada de la API.
 Contiene la configuración de CORS, helpers de entorno y constantes globales.
 Uso:
     from api.core.config import get_cors_origins, CORS_ORIGINS
+    from api.core.config import bool_from_env, int_from_env
 """
 
 import os
@@ -26,13 +27,22 @@ def is_production() -> bool:
     )
 
 
-def _bool_from_env(name: str, default: bool = True) -> bool:
+def bool_from_env(name: str, default: bool = True) -> bool:
+    """Bandera booleana de entorno (``1/true/yes/y/on``); ``default`` si no está definida."""
     raw = os.getenv(name)
     if raw is None:
         return default
     return str(raw).strip().lower() in {"1", "true", "yes", "y", "on"}
 
 
+def int_from_env(name: str, default: int) -> int:
+    """Entero de entorno; ``default`` si no está definido o no es un entero."""
+    try:
+        return int(os.getenv(name, str(default)))
+    except (TypeError, ValueError):
+        return default
+
+
 # ---------------------------------------------------------------------------
 # CORS
 # ---------------------------------------------------------------------------
@@ -117,7 +127,7 @@ CORS_ORIGIN_REGEX: str = get_cors_origin_regex()
 # ---------------------------------------------------------------------------
 
 def s3_presigned_enabled() -> bool:
-    return _bool_from_env("S3_USE_PRESIGNED_URLS", True)
+    return bool_from_env("S3_USE_PRESIGNED_URLS", True)
 
 
 def s3_presigned_expiration() -> int:
@@ -0,0 +1,514 @@
+"""
+Trabajos en segundo plano
+Cola persistente en SQLite (``JOBS_SQLITE_PATH``) y pool de workers asíncronos
+para las operaciones largas que antes corrían dentro de la petición HTTP.
+
+- ``submit_job`` encola y devuelve de inmediato (el endpoint responde 202 con
+  ``job_id``). Un trabajo idéntico (mismo tipo, parámetros y usuario) que
+  siga en cola o corriendo se reutiliza en lugar de duplicarse; el de otro
+  usuario no, porque solo su creador (o super_admin) puede consultarlo.
+- ``GET /jobs/{id}`` expone estado, progreso, resultado parcial y final;
+  ``POST /jobs/{id}/cancelar`` pide la cancelación.
+- Cada proceso de la API corre ``JOBS_WORKERS`` workers que toman trabajos de
+  la cola compartida. Un trabajo cuyo worker dejó de latir (reinicio, deploy,
+  caída) vuelve a la cola hasta ``JOBS_MAX_ATTEMPTS`` intentos, así que el
+  trabajo no se pierde si el cliente o el proceso se desconectan. Esto exige
+  que ``JOBS_SQLITE_PATH`` esté en almacenamiento persistente: por defecto
+  ``logs/jobs/`` (el volumen ``/app/logs`` en la imagen), nunca ``/tmp``.
+
+Los handlers se registran con ``@job_handler("tipo")`` y reciben un
+``JobContext`` para reportar progreso y consultar la cancelación.
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+
+from api.core.config import int_from_env
+
+logger = logging.getLogger(__name__)
+
+
+# No usar el directorio temporal: la cola y los resultados se perderían en cada deploy
+JOBS_SQLITE_PATH = os.getenv(
+    "JOBS_SQLITE_PATH",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+        "logs", "jobs", "gestor_api_jobs.sqlite3",
+    ),
+)
+JOBS_WORKERS = int_from_env("JOBS_WORKERS", 2)
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "1.0"))
+JOBS_HEARTBEAT_SECONDS = int_from_env("JOBS_HEARTBEAT_SECONDS", 10)
+# Sin latido durante este tiempo, el trabajo se considera huérfano y vuelve a la cola
+JOBS_STALE_SECONDS = int_from_env("JOBS_STALE_SECONDS", 120)
+JOBS_MAX_ATTEMPTS = int_from_env("JOBS_MAX_ATTEMPTS", 3)
+# Tras pedir la cancelación, tiempo que se espera a que el handler pare solo
+JOBS_CANCEL_GRACE_SECONDS = int_from_env("JOBS_CANCEL_GRACE_SECONDS", 30)
+JOBS_RETENTION_SECONDS = int_from_env("JOBS_RETENTION_SECONDS", 7 * 24 * 3600)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# SQLite bloquea (BEGIN IMMEDIATE con espera de hasta 10 s si otro proceso
+# escribe): desde el event loop, las escrituras de progreso y estado final van
+# a este hilo. Un solo hilo conserva el orden entre progreso y resultado.
+_store_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="jobs-store")
+
+
+async def _in_store_thread(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_store_executor, functools.partial(fn, *args, **kwargs))
+
+
+class JobCancelled(Exception):
+    """Lanzada por ``JobContext.check_cancelled`` cuando se pidió cancelar."""
+
+
+class JobFailed(Exception):
+    """El handler terminó sin éxito; ``detail`` se guarda como error del trabajo."""
+
+    def __init__(self, detail: Any):
+        super().__init__(str(detail))
+        self.detail = detail
+
+
+def _dumps(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _loads(value: Optional[str]) -> Any:
+    return json.loads(value) if value else None
+
+
+def dedupe_key(kind: str, params: Dict[str, Any]) -> str:
+    """Clave de deduplicación: tipo + parámetros canónicos."""
+    canonical = json.dumps(params or {}, sort_keys=True, default=str)
+    return f"{kind}:{hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:24]}"
+
+
+class JobStore:
+    """Cola de trabajos en SQLite, compartida por los procesos del host.
+
+    Cada hilo usa su propia conexión; las transacciones de encolado y toma
+    usan ``BEGIN IMMEDIATE`` para que dos workers no tomen el mismo trabajo.
+    """
+
+    def __init__(self, path: str = JOBS_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        con = self._conn()
+        with con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    params TEXT,
+                    dedupe_key TEXT,
+                    status TEXT NOT NULL,
+                    progress TEXT,
+                    partial_result TEXT,
+                    result TEXT,
+                    error TEXT,
+                    created_by TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    cancel_requested INTEGER NOT NULL DEFAULT 0,
+                    worker TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+                CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs (dedupe_key, status);
+                """
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+        return con
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        for field in ("params", "progress", "partial_result", "result", "error"):
+            job[field] = _loads(job[field])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def submit(
+        self, kind: str, params: Dict[str, Any], created_by: Optional[str] = None, dedupe: bool = True
+    ) -> Tuple[Dict[str, Any], bool]:
+        """Encola un trabajo; devuelve ``(trabajo, creado)``.
+
+        La deduplicación es por usuario: ``GET /jobs/{id}`` solo muestra el
+        trabajo a su creador, así que reutilizar el de otro daría un 404.
+        """
+        key = dedupe_key(kind, params)
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            if dedupe:
+                row = con.execute(
+                    "SELECT * FROM jobs WHERE dedupe_key = ? AND created_by IS ? AND status IN (?, ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (key, created_by, *ACTIVE_STATUSES),
+                ).fetchone()
+                if row is not None:
+                    con.execute("COMMIT")
+                    return self._row_to_job(row), False
+            job_id = uuid.uuid4().hex
+            con.execute(
+                "INSERT INTO jobs (id, kind, params, dedupe_key, status, created_by, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, _dumps(params or {}), key, QUEUED, created_by, time.time()),
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return self.get(job_id), True
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list_jobs(
+        self, status: Optional[str] = None, created_by: Optional[str] = None, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        sql, params = "SELECT * FROM jobs WHERE 1 = 1", []
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        if created_by:
+            sql += " AND created_by = ?"
+            params.append(created_by)
+        sql += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        return [self._row_to_job(row) for row in self._conn().execute(sql, params)]
+
+    def claim(self, kinds: List[str]) -> Optional[Dict[str, Any]]:
+        """Toma el trabajo en cola más antiguo de alguno de ``kinds``."""
+        if not kinds:
+            return None
+        now = time.time()
+        con = self._conn()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            self._requeue_orphans(con, now)
+            marks = ",".join("?" * len(kinds))
+            row = con.execute(
+                f"SELECT id FROM jobs WHERE status = ? AND kind IN ({marks}) ORDER BY created_at LIMIT 1",
+                (QUEUED, *kinds),
+            ).fetchone()
+            if row is None:
+                con.execute("COMMIT")
+                return None
+            con.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ?, attempts = attempts + 1, worker = ? "
+                "WHERE id = ?",
+                (RUNNING, now, now, _WORKER_ID, row["id"]),
+            )
+            con.execute("COMMIT")
+        except BaseException:
+            con.execute("ROLLBACK")
+            raise
+        return self.get(row["id"])
+
+    def _requeue_orphans(self, con: sqlite3.Connection, now: float) -> None:
+        stale_before = now - JOBS_STALE_SECONDS
+        con.execute(
+            "UPDATE jobs SET status = ?, finished_at = ?, error = ? "
+            "WHERE status = ? AND heartbeat_at < ? AND attempts >= ?",
+            (FAILED, now, _dumps("El worker se detuvo y se agotaron los reintentos"), RUNNING, stale_before,
+             JOBS_MAX_ATTEMPTS),
+        )
+        con.execute(
+            "UPDATE jobs SET status = CASE WHEN cancel_requested THEN ? ELSE ? END, worker = NULL "
+            "WHERE status = ? AND heartbeat_at < ?",
+            (CANCELLED, QUEUED, RUNNING, stale_before),
+        )
+
+    def heartbeat(
+        self, job_id: str, progress: Any = None, partial: Any = None
+    ) -> bool:
+        """Actualiza latido (y progreso/parcial si se dan); devuelve si se pidió cancelar."""
+        con = self._conn()
+        sets, params = ["heartbeat_at = ?"], [time.time()]
+        if progress is not None:
+            sets.append("progress = ?")
+            params.append(_dumps(progress))
+        if partial is not None:
+            sets.append("partial_result = ?")
+            params.append(_dumps(partial))
+        params.append(job_id)
+        con.execute(f"UPDATE jobs SET {', '.join(sets)} WHERE id = ?", params)
+        row = con.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def finish(self, job_id: str, status: str, result: Any = None, error: Any = None) -> None:
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+            (status, _dumps(result), _dumps(error), time.time(), job_id),
+        )
+
+    def release(self, job_id: str) -> None:
+        """Devuelve a la cola un trabajo que este proceso no alcanzó a terminar."""
+        self._conn().execute(
+            "UPDATE jobs SET status = ?, worker = NULL WHERE id = ? AND status = ?", (QUEUED, job_id, RUNNING)
+        )
+
+    def request_cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancela en el acto si está en cola; si corre, marca la petición."""
+        con = self._conn()
+        con.execute(
+            "UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?",
+            (CANCELLED, time.time(), job_id, QUEUED),
+        )
+        con.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+        return self.get(job_id)
+
+    def purge(self, older_than: float) -> int:
+        cur = self._conn().execute(
+            "DELETE FROM jobs WHERE status NOT IN (?, ?) AND finished_at < ?",
+            (*ACTIVE_STATUSES, older_than),
+        )
+        return cur.rowcount
+
+
+class JobContext:
+    """Lo que ve un handler de su trabajo: parámetros, intento, progreso y cancelación."""
+
+    def __init__(self, store: JobStore, job: Dict[str, Any]):
+        self.store = store
+        self.job_id: str = job["id"]
+        self.kind: str = job["kind"]
+        self.params: Dict[str, Any] = job.get("params") or {}
+        self.attempt: int = job.get("attempts") or 1
+        self._cancelled = bool(job.get("cancel_requested"))
+
+    def report(self, progress: Optional[Dict[str, Any]] = None, partial: Any = None) -> None:
+        """Publica progreso y/o resultado parcial (visibles en ``GET /jobs/{id}``).
+
+        Desde el event loop no espera a SQLite: la escritura se encola en el
+        hilo de la cola y ``cancelled`` se actualiza al completarse. Un handler
+        que necesite ver la cancelación en el acto usa ``await areport(...)``.
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._heartbeat(progress, partial)
+            return
+        loop.run_in_executor(_store_executor, self._heartbeat, progress, partial)
+
+    async def areport(self, progress: Optional[Dict[str, Any]] = None, partial: Any = None) -> None:
+        """Como ``report``, esperando la escritura (y la lectura de la cancelación)."""
+        await _in_store_thread(self._heartbeat, progress, partial)
+
+    def _heartbeat(self, progress: Optional[Dict[str, Any]], partial: Any) -> None:
+        try:
+            self._cancelled = self.store.heartbeat(self.job_id, progress, partial) or self._cancelled
+        except sqlite3.Error as exc:
+            logger.warning(f"No se pudo reportar progreso del trabajo {self.job_id}: {exc}")
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def check_cancelled(self) -> None:
+        if self._cancelled:
+            raise JobCancelled()
+
+
+JobHandler = Callable[..., Awaitable[Any]]
+_handlers: Dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Registra ``async def handler(ctx: JobContext, **params)`` para el tipo ``kind``."""
+
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[kind] = func
+        return func
+
+    return decorator
+
+
+_store: Optional[JobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = JobStore(JOBS_SQLITE_PATH)
+    return _store
+
+
+def set_job_store(store: Optional[JobStore]) -> None:
+    """Reemplaza la cola en uso (tests)."""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+def submit_job(kind: str, params: Optional[Dict[str, Any]] = None, created_by: Optional[str] = None) -> Tuple[Dict[str, Any], bool]:
+    """
+    Encolar un trabajo de tipo ``kind``.
+
+    Returns:
+        ``(trabajo, creado)``; ``creado`` es False si se reutilizó uno idéntico
+        activo del mismo ``created_by``.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Tipo de trabajo no registrado: {kind}")
+    return get_job_store().submit(kind, params or {}, created_by=created_by)
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_job_store().get(job_id)
+
+
+def list_jobs(status: Optional[str] = None, created_by: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    return get_job_store().list_jobs(status=status, created_by=created_by, limit=limit)
+
+
+def cancel_job(job_id: str) -> Optional[Dict[str, Any]]:
+    return get_job_store().request_cancel(job_id)
+
+
+def job_accepted_response(job: Dict[str, Any], created: bool) -> JSONResponse:
+    """Respuesta 202 estándar para un endpoint que encoló un trabajo."""
+    status_url = f"/jobs/{job['id']}"
+    return JSONResponse(
+        status_code=202,
+        content={
+            "success": True,
+            "job_id": job["id"],
+            "status": job["status"],
+            "deduplicated": not created,
+            "status_url": status_url,
+            "cancel_url": f"{status_url}/cancelar",
+        },
+        headers={"Location": status_url},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Workers
+# ---------------------------------------------------------------------------
+
+
+async def _heartbeat_loop(ctx: JobContext, task: asyncio.Task) -> None:
+    cancel_seen_at: Optional[float] = None
+    while not task.done():
+        await asyncio.sleep(JOBS_HEARTBEAT_SECONDS)
+        await ctx.areport()
+        if ctx.cancelled:
+            cancel_seen_at = cancel_seen_at or time.monotonic()
+            if time.monotonic() - cancel_seen_at >= JOBS_CANCEL_GRACE_SECONDS:
+                task.cancel()
+
+
+async def run_job(store: JobStore, job: Dict[str, Any]) -> None:
+    """Ejecuta un trabajo ya tomado y guarda su estado final."""
+    ctx = JobContext(store, job)
+    handler = _handlers[job["kind"]]
+    logger.info(f"▶ Trabajo {job['id']} ({job['kind']}) intento {ctx.attempt}")
+    task = asyncio.ensure_future(handler(ctx, **ctx.params))
+    heartbeat = asyncio.ensure_future(_heartbeat_loop(ctx, task))
+    try:
+        result = await task
+    except (JobCancelled, asyncio.CancelledError):
+        if not ctx.cancelled:
+            # Apagado del proceso: el trabajo vuelve a la cola para otro worker
+            await _in_store_thread(store.release, job["id"])
+            raise
+        await _in_store_thread(store.finish, job["id"], CANCELLED)
+        logger.info(f"⏹ Trabajo {job['id']} cancelado")
+    except JobFailed as exc:
+        await _in_store_thread(store.finish, job["id"], FAILED, error=exc.detail)
+        logger.warning(f"❌ Trabajo {job['id']} falló: {exc}")
+    except Exception as exc:
+        await _in_store_thread(store.finish, job["id"], FAILED, error=str(exc))
+        logger.error(f"❌ Trabajo {job['id']} falló: {exc}", exc_info=True)
+    else:
+        await _in_store_thread(
+            store.finish, job["id"], CANCELLED if ctx.cancelled else SUCCEEDED, result=result
+        )
+        logger.info(f"✅ Trabajo {job['id']} terminado")
+    finally:
+        heartbeat.cancel()
+
+
+async def _worker_loop(store: JobStore, stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        try:
+            job = await loop.run_in_executor(None, store.claim, list(_handlers))
+        except Exception as exc:
+            logger.warning(f"Error tomando trabajos de la cola: {exc}")
+            job = None
+        if job is None:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=JOBS_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        await run_job(store, job)
+
+
+class JobWorkerPool:
+    """Workers del proceso actual; se arrancan y detienen en el lifespan de la app."""
+
+    def __init__(self, workers: int = JOBS_WORKERS, store: Optional[JobStore] = None):
+        self.workers = workers
+        self.store = store
+        self._stop: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._tasks or self.workers <= 0:
+            return
+        store = self.store or get_job_store()
+        asyncio.get_running_loop().run_in_executor(
+            _store_executor, store.purge, time.time() - JOBS_RETENTION_SECONDS
+        )
+        self._stop = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(_worker_loop(store, self._stop)) for _ in range(self.workers)]
+        logger.info(f"Job workers started: {self.workers}")
+
+    async def stop(self) -> None:
+        """Detiene los workers; los trabajos en curso vuelven a la cola."""
+        if self._stop is not None:
+            self._stop.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+api/core/metrics.py — Métricas Prometheus del proceso.
+
+Registro de métricas expuesto en ``GET /metrics`` (formato de texto
+Prometheus). Con ``PROMETHEUS_MULTIPROC_DIR`` definido antes de arrancar, cada
+worker de uvicorn escribe sus valores en ese directorio y ``/metrics`` agrega
+los de todos los procesos (``prometheus_client.multiprocess``).
+
+- ``MetricsStage`` (etapa del pipeline de peticiones): histograma de latencia
+  por ruta (plantilla de la ruta, no la URL) y peticiones en curso.
+- ``record_cache``: hits/misses/stale por namespace de ``api.core.cache``
+  (incluye ``emprestito``).
+- ``instrument_firestore``: documentos leídos y escritos por colección y ruta,
+  instrumentando ``Query``, ``DocumentReference.get``, ``Client.get_all`` y
+  ``WriteBatch.commit`` del cliente de Firestore.
+- ``track_outbound``: latencia de llamadas salientes (SECOP, S3, Gmail).
+
+Sin ``prometheus_client`` (o con ``PROMETHEUS_ENABLED=false``) todas las
+funciones son no-ops y ``/metrics`` responde 503.
+"""
+
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from api.core.pipeline import RequestContext, Stage
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+METRICS_ENABLED = PROMETHEUS_AVAILABLE and os.getenv("PROMETHEUS_ENABLED", "true").lower() != "false"
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR") or os.getenv("prometheus_multiproc_dir")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+if METRICS_ENABLED:
+    HTTP_REQUEST_DURATION = Histogram(
+        "http_request_duration_seconds",
+        "Latencia de las peticiones HTTP por ruta",
+        ["method", "route", "status"],
+        buckets=LATENCY_BUCKETS,
+    )
+    HTTP_REQUESTS_IN_FLIGHT = Gauge(
+        "http_requests_in_flight",
+        "Peticiones HTTP en curso",
+        ["method"],
+        multiprocess_mode="livesum",
+    )
+    CACHE_REQUESTS = Counter(
+        "cache_requests_total",
+        "Lecturas del caché por namespace y resultado (hit, miss, stale)",
+        ["namespace", "result"],
+    )
+    FIRESTORE_DOCUMENTS_READ = Counter(
+        "firestore_documents_read_total",
+        "Documentos leídos de Firestore por colección y ruta",
+        ["collection", "route"],
+    )
+    FIRESTORE_DOCUMENTS_WRITTEN = Counter(
+        "firestore_documents_written_total",
+        "Documentos escritos en Firestore por colección y ruta",
+        ["collection", "route"],
+    )
+    OUTBOUND_REQUEST_DURATION = Histogram(
+        "outbound_request_duration_seconds",
+        "Latencia de llamadas a servicios externos",
+        ["service", "operation", "outcome"],
+        buckets=LATENCY_BUCKETS,
+    )
+
+# Scope ASGI de la petición en curso: atribuye lecturas/escrituras a su ruta
+_current_scope: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "metrics_current_scope", default=None
+)
+
+
+def _route_label(scope: Optional[Dict[str, Any]]) -> str:
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+def _status_label(status_code: Optional[int]) -> str:
+    return f"{status_code // 100}xx" if status_code else "none"
+
+
+# ---------------------------------------------------------------------------
+# HTTP
+# ---------------------------------------------------------------------------
+
+class MetricsStage(Stage):
+    """Latencia por ruta y peticiones en curso; primera etapa del pipeline."""
+
+    async def before(self, ctx: RequestContext) -> None:
+        if not METRICS_ENABLED:
+            return None
+        ctx.extra["metrics_token"] = _current_scope.set(ctx.scope)
+        HTTP_REQUESTS_IN_FLIGHT.labels(ctx.method).inc()
+        return None
+
+    async def after(self, ctx: RequestContext) -> None:
+        token = ctx.extra.pop("metrics_token", None)
+        if token is None:
+            return
+        _current_scope.reset(token)
+        HTTP_REQUESTS_IN_FLIGHT.labels(ctx.method).dec()
+        HTTP_REQUEST_DURATION.labels(
+            ctx.method, _route_label(ctx.scope), _status_label(ctx.status_code)
+        ).observe(ctx.elapsed)
+
+
+# ---------------------------------------------------------------------------
+# Caché y servicios externos
+# ---------------------------------------------------------------------------
+
+def record_cache(namespace: str, result: str) -> None:
+    """``result``: ``hit``, ``miss`` o ``stale``."""
+    if METRICS_ENABLED:
+        CACHE_REQUESTS.labels(namespace or "default", result).inc()
+
+
+@contextmanager
+def track_outbound(service: str, operation: str) -> Iterator[None]:
+    """Mide una llamada saliente; ``outcome`` es ``ok`` o ``error``."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        OUTBOUND_REQUEST_DURATION.labels(service, operation, outcome).observe(time.perf_counter() - start)
+
+
+# ---------------------------------------------------------------------------
+# Firestore
+# ---------------------------------------------------------------------------
+
+def record_firestore_reads(collection: str, count: int) -> None:
+    if METRICS_ENABLED and count:
+        FIRESTORE_DOCUMENTS_READ.labels(collection, _route_label(_current_scope.get())).inc(count)
+
+
+def record_firestore_writes(collection: str, count: int) -> None:
+    if METRICS_ENABLED and count:
+        FIRESTORE_DOCUMENTS_WRITTEN.labels(collection, _route_label(_current_scope.get())).inc(count)
+
+
+def _collection_of(document_name: str) -> str:
+    """Colección de ``projects/.../documents/<col>/<id>``."""
+    parts = document_name.split("/")
+    return parts[-2] if len(parts) >= 2 else "unknown"
+
+
+_firestore_instrumented = False
+
+
+def instrument_firestore() -> bool:
+    """Instrumenta las clases del cliente de Firestore (idempotente)."""
+    global _firestore_instrumented
+    if not METRICS_ENABLED or _firestore_instrumented:
+        return _firestore_instrumented
+    try:
+        from google.cloud.firestore_v1.batch import WriteBatch
+        from google.cloud.firestore_v1.client import Client
+        from google.cloud.firestore_v1.document import DocumentReference
+        from google.cloud.firestore_v1.query import Query
+    except ImportError as exc:
+        logger.warning(f"Firestore no instrumentado: {exc}")
+        return False
+
+    make_stream = Query._make_stream
+    document_get = DocumentReference.get
+    get_all = Client.get_all
+    commit = WriteBatch.commit
+
+    def _make_stream(self, *args, **kwargs):
+        inner = make_stream(self, *args, **kwargs)
+        reads = 0
+        try:
+            while True:
+                try:
+                    snapshot = next(inner)
+                except StopIteration as stop:
+                    return stop.value
+                reads += 1
+                yield snapshot
+        finally:
+            # Una consulta sin resultados también se factura como una lectura
+            record_firestore_reads(getattr(self._parent, "id", "unknown"), max(reads, 1))
+
+    def _document_get(self, *args, **kwargs):
+        record_firestore_reads(self._path[-2] if len(self._path) >= 2 else "unknown", 1)
+        return document_get(self, *args, **kwargs)
+
+    def _get_all(self, *args, **kwargs):
+        counts: Dict[str, int] = {}
+        try:
+            for snapshot in get_all(self, *args, **kwargs):
+                collection = snapshot.reference._path[-2]
+                counts[collection] = counts.get(collection, 0) + 1
+                yield snapshot
+        finally:
+            for collection, count in counts.items():
+                record_firestore_reads(collection, count)
+
+    def _commit(self, *args, **kwargs):
+        counts: Dict[str, int] = {}
+        for write in self._write_pbs:
+            collection = _collection_of(write.delete or write.update.name)
+            counts[collection] = counts.get(collection, 0) + 1
+        result = commit(self, *args, **kwargs)
+        for collection, count in counts.items():
+            record_firestore_writes(collection, count)
+        return result
+
+    Query._make_stream = _make_stream
+    DocumentReference.get = _document_get
+    Client.get_all = _get_all
+    WriteBatch.commit = _commit
+    _firestore_instrumented = True
+    logger.info("Firestore instrumentado para métricas")
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Exposición
+# ---------------------------------------------------------------------------
+
+def render_metrics() -> Tuple[bytes, str]:
+    """``(cuerpo, content-type)`` en formato de texto Prometheus."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Limpia los gauges ``live*`` de este worker al apagarse (modo multiproceso)."""
+    if METRICS_ENABLED and MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+api/core/pipeline.py — Pipeline ASGI de peticiones HTTP.
+
+Un único middleware ASGI puro (``RequestPipeline``) reemplaza la cadena de
+``BaseHTTPMiddleware``/``app.middleware("http")``: cada capa de esa cadena
+creaba tareas y re-envolvía el stream de la respuesta en cada petición, y el
+timeout dejaba de cubrir el cuerpo de los ``StreamingResponse`` de forma
+poco predecible.
+
+Las responsabilidades se declaran como etapas (``Stage``) ordenadas, con tres
+ganchos opcionales:
+
+- ``before(ctx)``: antes de la aplicación; si devuelve una ``Response`` la
+  petición termina ahí (401, 413...).
+- ``on_response_start(ctx, headers)``: al enviar ``http.response.start``;
+  modifica cabeceras sin tocar el cuerpo (sirve igual para streaming).
+- ``after(ctx)``: cuando la respuesta terminó (auditoría, métricas).
+
+La configuración por ruta se expresa con ``RouteTable`` (primer fragmento de
+ruta que coincide), p. ej. los timeouts por endpoint.
+
+Uso:
+    from api.core.pipeline import RequestPipeline, TimeoutStage, RouteTable
+    app.add_middleware(RequestPipeline, stages=[TimeoutStage(RouteTable(..., default=30.0))])
+"""
+
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, Generic, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import anyio
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class RouteTable(Generic[T]):
+    """
+    Valores por ruta: el primer fragmento contenido en la ruta gana.
+
+    Mismo criterio (``fragmento in path``) que usaban las cadenas ``if/elif``.
+    """
+
+    def __init__(self, routes: Iterable[Tuple[str, T]] = (), default: Optional[T] = None):
+        self.routes: List[Tuple[str, T]] = list(routes)
+        self.default = default
+
+    def lookup(self, path: str) -> Optional[T]:
+        for fragment, value in self.routes:
+            if fragment in path:
+                return value
+        return self.default
+
+
+class RequestContext:
+    """Estado de una petición a lo largo del pipeline."""
+
+    __slots__ = (
+        "scope",
+        "method",
+        "path",
+        "started",
+        "status_code",
+        "response_started",
+        "timeout",
+        "extra",
+        "_headers",
+        "_request",
+    )
+
+    def __init__(self, scope: Scope):
+        self.scope = scope
+        self.method: str = scope["method"]
+        self.path: str = scope["path"]
+        self.started = time.perf_counter()
+        self.status_code: Optional[int] = None
+        self.response_started = False
+        # Fijado por TimeoutStage: segundos hasta el inicio de la respuesta
+        self.timeout: Optional[float] = None
+        # Datos que una etapa deja para su propio ``after``
+        self.extra: Dict[str, Any] = {}
+        self._headers: Optional[Headers] = None
+        self._request: Optional[Request] = None
+
+    @property
+    def headers(self) -> Headers:
+        if self._headers is None:
+            self._headers = Headers(scope=self.scope)
+        return self._headers
+
+    @property
+    def request(self) -> Request:
+        if self._request is None:
+            self._request = Request(self.scope)
+        return self._request
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        """Diccionario detrás de ``request.state`` en los endpoints."""
+        return self.scope.setdefault("state", {})
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+class Stage:
+    """Etapa del pipeline; solo se invocan los ganchos que la subclase redefine."""
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        return None
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders) -> None:
+        return None
+
+    async def after(self, ctx: RequestContext) -> None:
+        return None
+
+
+def _overrides(stage: Any, hook: str) -> bool:
+    return getattr(type(stage), hook, None) is not getattr(Stage, hook)
+
+
+class RequestPipeline:
+    """Middleware ASGI puro que ejecuta ``stages`` en orden alrededor de la app."""
+
+    def __init__(self, app: ASGIApp, stages: Sequence[Stage] = ()):
+        self.app = app
+        self.stages = list(stages)
+        self._before = [s for s in self.stages if _overrides(s, "before")]
+        self._on_start = [s for s in self.stages if _overrides(s, "on_response_start")]
+        self._after = [s for s in self.stages if _overrides(s, "after")]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        ctx = RequestContext(scope)
+        send = self._wrap_send(ctx, send)
+        try:
+            for stage in self._before:
+                response = await stage.before(ctx)
+                if response is not None:
+                    await response(scope, receive, send)
+                    return
+            await self._call_app(ctx, receive, send)
+        finally:
+            for stage in self._after:
+                try:
+                    await stage.after(ctx)
+                except Exception as exc:
+                    logger.warning("Etapa %s falló en after: %s", type(stage).__name__, exc)
+
+    def _wrap_send(self, ctx: RequestContext, send: Send) -> Send:
+        on_start = self._on_start
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                ctx.status_code = message["status"]
+                ctx.response_started = True
+                if on_start:
+                    headers = MutableHeaders(scope=message)
+                    for stage in on_start:
+                        stage.on_response_start(ctx, headers)
+            await send(message)
+
+        return send_wrapper
+
+    async def _call_app(self, ctx: RequestContext, receive: Receive, send: Send) -> None:
+        scope = ctx.scope
+        try:
+            if not ctx.timeout:
+                await self.app(scope, receive, send)
+                return
+
+            # El plazo cubre hasta el inicio de la respuesta: un streaming ya
+            # iniciado no se corta a mitad de cuerpo.
+            with anyio.CancelScope(deadline=anyio.current_time() + ctx.timeout) as cancel_scope:
+
+                async def send_until_started(message: Message) -> None:
+                    if message["type"] == "http.response.start":
+                        cancel_scope.deadline = math.inf
+                    await send(message)
+
+                await self.app(scope, receive, send_until_started)
+
+            if cancel_scope.cancelled_caught and not ctx.response_started:
+                await _timeout_response(ctx)(scope, receive, send)
+        except Exception as exc:
+            if ctx.response_started:
+                raise
+            logger.error(
+                "RequestPipeline caught exception for %s %s: %s",
+                ctx.method,
+                ctx.path,
+                exc,
+                exc_info=True,
+            )
+            response = JSONResponse(
+                status_code=500,
+                content={
+                    "error": "Internal server error",
+                    "timestamp": datetime.now().isoformat(),
+                },
+            )
+            await response(scope, receive, send)
+
+
+def _timeout_response(ctx: RequestContext) -> Response:
+    return JSONResponse(
+        status_code=504,
+        content={
+            "error": "Request timeout",
+            "message": f"La peticion tardó mas de {ctx.timeout}s",
+            "endpoint": ctx.path,
+            "timestamp": datetime.now().isoformat(),
+        },
+    )
+
+
+# ---------------------------------------------------------------------------
+# Etapas genéricas
+# ---------------------------------------------------------------------------
+
+class BodySizeLimitStage(Stage):
+    """413 cuando ``Content-Length`` supera ``max_bytes``."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        content_length = ctx.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={
+                    "success": False,
+                    "error": "Request body too large",
+                    "message": f"Tamano maximo permitido: {self.max_bytes // (1024 * 1024)} MB",
+                    "code": "PAYLOAD_TOO_LARGE",
+                },
+            )
+        return None
+
+
+class TimeoutStage(Stage):
+    """Timeout por endpoint (``routes``) — evita colgadas indefinidas."""
+
+    def __init__(self, routes: RouteTable[float]):
+        self.routes = routes
+
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
+        ctx.timeout = self.routes.lookup(ctx.path)
+        return None
+
+
+class TimingStage(Stage):
+    """``X-Process-Time``, ``nosniff`` y ``Cache-Control`` para GET 200 según ``cache_routes``."""
+
+    def __init__(self, cache_routes: Optional[RouteTable[str]] = None):
+        self.cache_routes = cache_routes or RouteTable()
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders) -> None:
+        headers["X-Process-Time"] = f"{ctx.elapsed:.3f}"
+        headers["X-Content-Type-Options"] = "nosniff"
+        if ctx.method == "GET" and ctx.status_code == 200:
+            cache_control = self.cache_routes.lookup(ctx.path)
+            if cache_control:
+                headers["Cache-Control"] = cache_control
+
+
+class CharsetStage(Stage):
+    """Declara ``charset=utf-8`` en las respuestas JSON."""
+
+    def on_response_start(self, ctx: RequestContext, headers: MutableHeaders) -> None:
+        if headers.get("content-type", "").startswith("application/json"):
+            headers["content-type"] = "application/json; charset=utf-8"
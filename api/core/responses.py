@@ -15,15 +15,15 @@ from zoneinfo import ZoneInfo
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 
-logger = logging.getLogger(__name__)
+from .serialization import (
+    JSON_UTF8_HEADERS,
+    FirestoreJSONResponse,
+    StreamingJSONResponse,
+    should_stream,
+    to_jsonable,
+)
 
-# Importar tipos de Firebase si están disponibles
-try:
-    from google.cloud.firestore_v1._helpers import DatetimeWithNanoseconds
-    _FIREBASE_TYPES_AVAILABLE = True
-except ImportError:
-    _FIREBASE_TYPES_AVAILABLE = False
-    DatetimeWithNanoseconds = None
+logger = logging.getLogger(__name__)
 
 
 # ---------------------------------------------------------------------------
@@ -31,12 +31,19 @@ except ImportError:
 # ---------------------------------------------------------------------------
 
 def create_utf8_response(content: Dict[str, Any], status_code: int = 200) -> JSONResponse:
-    """Crea una JSONResponse con Content-Type explícitamente UTF-8."""
-    return JSONResponse(
+    """
+    Crea una respuesta JSON con Content-Type explícitamente UTF-8.
+
+    Los tipos de Firestore se codifican directamente (no hace falta limpiar
+    el payload antes) y una lista ``data`` de ``JSON_STREAM_MIN_ITEMS`` o más
+    elementos se envía en streaming.
+    """
+    if should_stream(content):
+        return StreamingJSONResponse(content, status_code=status_code, headers=JSON_UTF8_HEADERS)
+    return FirestoreJSONResponse(
         content=content,
         status_code=status_code,
-        headers={"Content-Type": "application/json; charset=utf-8"},
-        media_type="application/json",
+        headers=JSON_UTF8_HEADERS,
     )
 
 
@@ -48,16 +55,11 @@ def clean_firebase_data(data: Any) -> Any:
     """
     Convierte tipos de Firebase no serializables (DatetimeWithNanoseconds, etc.)
     a tipos nativos de Python aptos para JSON.
+
+    Solo hace falta si el resultado se procesa antes de responder:
+    ``create_utf8_response`` ya codifica esos tipos.
     """
-    if isinstance(data, dict):
-        return {key: clean_firebase_data(value) for key, value in data.items()}
-    if isinstance(data, list):
-        return [clean_firebase_data(item) for item in data]
-    if _FIREBASE_TYPES_AVAILABLE and isinstance(data, DatetimeWithNanoseconds):
-        return data.isoformat()
-    if isinstance(data, datetime):
-        return data.isoformat()
-    return data
+    return to_jsonable(data)
 
 
 def handle_utf8_text(text: str) -> str:
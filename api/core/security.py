@@ -91,11 +91,11 @@ async def verify_firebase_token(request: Request) -> dict:
     token = auth_header.split(" ", 1)[1]
 
     try:
-        from firebase_admin import auth
+        from auth_system.auth_cache import verify_id_token_cached
         from database.firebase_config import get_firestore_client
 
         def _verify_sync():
-            decoded = auth.verify_id_token(token)
+            decoded = verify_id_token_cached(token)
             db = get_firestore_client()
             user_data = {}
             if db is not None:
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+api/core/serialization.py — Serialización de datos de Firestore a JSON.
+
+Un solo módulo para convertir documentos de Firestore en JSON:
+
+- ``dumps`` codifica en una sola pasada con orjson (si está instalado; si no,
+  con ``json`` de la librería estándar). Los tipos de Firestore se resuelven
+  en el hook ``default`` del codificador, sin recorrer antes el payload:
+  ``DatetimeWithNanoseconds``/``datetime``/``date`` → ISO 8601,
+  ``GeoPoint`` → ``{"latitude", "longitude"}``, ``DocumentReference`` → ruta,
+  ``Decimal`` → float, ``set``/``tuple`` → lista.
+- ``FirestoreJSONResponse`` escribe esos bytes directamente;
+  ``StreamingJSONResponse`` emite el arreglo ``data`` por tramos de
+  ``JSON_STREAM_CHUNK_ITEMS`` para los listados grandes.
+- ``to_jsonable`` aplica las mismas conversiones sobre objetos Python, para
+  el código que todavía filtra o cachea el resultado antes de responder.
+
+Uso:
+    from api.core.serialization import FirestoreJSONResponse, to_jsonable
+"""
+
+import base64
+import json
+import logging
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from api.core.config import int_from_env
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+try:
+    from google.cloud.firestore_v1._helpers import GeoPoint
+    from google.cloud.firestore_v1.document import DocumentReference
+
+    _FIREBASE_TYPES_AVAILABLE = True
+except ImportError:
+    GeoPoint = None
+    DocumentReference = None
+    _FIREBASE_TYPES_AVAILABLE = False
+
+
+# Listas ``data`` desde este tamaño se responden en streaming (0 = nunca)
+JSON_STREAM_MIN_ITEMS = max(0, int_from_env("JSON_STREAM_MIN_ITEMS", 2000))
+JSON_STREAM_CHUNK_ITEMS = max(1, int_from_env("JSON_STREAM_CHUNK_ITEMS", 500))
+
+JSON_MEDIA_TYPE = "application/json"
+JSON_UTF8_HEADERS = {"Content-Type": "application/json; charset=utf-8"}
+
+# Formato de ``serialize_datetime_objects`` en los módulos de empréstito
+LEGACY_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+# ---------------------------------------------------------------------------
+# Conversión de tipos
+# ---------------------------------------------------------------------------
+
+def encode_value(value: Any, datetime_format: Optional[str] = None) -> Any:
+    """
+    Equivalente JSON de un valor no nativo; ``value`` sin cambios si no se conoce.
+
+    ``datetime_format`` (strftime) reemplaza a ISO 8601 solo para datetimes.
+    """
+    if isinstance(value, datetime):
+        return value.strftime(datetime_format) if datetime_format else value.isoformat()
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    if _FIREBASE_TYPES_AVAILABLE:
+        if isinstance(value, GeoPoint):
+            return {"latitude": value.latitude, "longitude": value.longitude}
+        if isinstance(value, DocumentReference):
+            return value.path
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    return value
+
+
+@lru_cache(maxsize=None)
+def _default_hook(datetime_format: Optional[str]) -> Callable[[Any], Any]:
+    def default(value: Any) -> Any:
+        encoded = encode_value(value, datetime_format)
+        if encoded is value:
+            raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+        return encoded
+
+    return default
+
+
+def to_jsonable(data: Any, datetime_format: Optional[str] = None) -> Any:
+    """Copia de ``data`` con los tipos de Firestore convertidos (dicts y listas nuevos)."""
+    if isinstance(data, _SCALARS):
+        return data
+    if isinstance(data, dict):
+        return {key: to_jsonable(value, datetime_format) for key, value in data.items()}
+    if isinstance(data, list):
+        return [to_jsonable(item, datetime_format) for item in data]
+    encoded = encode_value(data, datetime_format)
+    if isinstance(encoded, (dict, list)):
+        return to_jsonable(encoded, datetime_format)
+    return encoded
+
+
+# ---------------------------------------------------------------------------
+# Codificación
+# ---------------------------------------------------------------------------
+
+if ORJSON_AVAILABLE:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(content: Any, datetime_format: Optional[str] = None) -> bytes:
+    """``content`` como JSON UTF-8 compacto, en una sola pasada."""
+    default = _default_hook(datetime_format)
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=default, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        content,
+        default=default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def iter_json_chunks(
+    content: Mapping[str, Any],
+    items_key: str = "data",
+    chunk_items: int = JSON_STREAM_CHUNK_ITEMS,
+    datetime_format: Optional[str] = None,
+) -> Iterator[bytes]:
+    """
+    ``content`` codificado por partes: primero el resto del objeto y luego
+    ``content[items_key]`` en tramos de ``chunk_items`` elementos.
+
+    El arreglo queda como última clave del objeto.
+    """
+    items: List[Any] = content.get(items_key) or []
+    head = dumps({key: value for key, value in content.items() if key != items_key}, datetime_format)
+    key = dumps(items_key)
+    yield (b"{" if head == b"{}" else head[:-1] + b",") + key + b":["
+    for start in range(0, len(items), chunk_items):
+        chunk = dumps(items[start : start + chunk_items], datetime_format)[1:-1]
+        yield chunk if start == 0 else b"," + chunk
+    yield b"]}"
+
+
+# ---------------------------------------------------------------------------
+# Respuestas
+# ---------------------------------------------------------------------------
+
+class FirestoreJSONResponse(JSONResponse):
+    """JSONResponse que codifica con ``dumps`` (tipos de Firestore incluidos)."""
+
+    media_type = JSON_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class StreamingJSONResponse(StreamingResponse):
+    """Respuesta JSON cuyo arreglo ``items_key`` se codifica y envía por tramos."""
+
+    def __init__(
+        self,
+        content: Mapping[str, Any],
+        status_code: int = 200,
+        headers: Optional[Dict[str, str]] = None,
+        items_key: str = "data",
+        chunk_items: int = JSON_STREAM_CHUNK_ITEMS,
+    ):
+        super().__init__(
+            iter_json_chunks(content, items_key, chunk_items),
+            status_code=status_code,
+            headers=headers,
+            media_type=JSON_MEDIA_TYPE,
+        )
+
+
+def should_stream(content: Any, items_key: str = "data") -> bool:
+    """True si ``content[items_key]`` es una lista que supera ``JSON_STREAM_MIN_ITEMS``."""
+    if not JSON_STREAM_MIN_ITEMS or not isinstance(content, dict):
+        return False
+    items = content.get(items_key)
+    return isinstance(items, list) and len(items) >= JSON_STREAM_MIN_ITEMS
@@ -12,12 +12,18 @@ Esa tabla se serializa, a elección, en:
   - KMZ      (.kmz, = KML comprimido)
   - Shapefile(.zip con .shp/.shx/.dbf/.prj/.cpg; si hay geometrías mixtas se
               separa un shapefile por tipo, porque un .shp admite un solo tipo)
+  - GeoPackage (.gpkg)
+  - CSV      (.csv, solo atributos)
 
 Es el inverso de la importación combinada: los nombres de columna se truncan a
 10 chars en shapefile (límite DBF) coincidiendo con los alias de importación,
 de modo que el archivo descargado se puede volver a cargar.
 
-El módulo es PURO (no toca Firestore): recibe listas de dicts y devuelve bytes.
+El módulo es PURO (no toca Firestore): recibe iterables de dicts y devuelve
+bytes. Cada formato tiene un serializador generador (``iter_*``) que produce el
+archivo por fragmentos, para servirlo con ``StreamingResponse`` sin armar el
+payload completo en memoria; las funciones ``to_*`` son envolturas que unen
+esos fragmentos.
 """
 
 from __future__ import annotations
@@ -25,9 +31,12 @@ from __future__ import annotations
 import csv
 import io
 import json
+import os
+import sqlite3
 import struct
+import tempfile
 import zipfile
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from xml.sax.saxutils import escape
 
 # Orden canónico de columnas de la tabla exportada.
@@ -86,6 +95,79 @@ _WGS84_PRJ = (
     'UNIT["Degree",0.0174532925199433]]'
 )
 
+# Tamaño objetivo de cada fragmento emitido por los serializadores ``iter_*``.
+CHUNK_SIZE = 64 * 1024
+
+# Por encima de este tamaño los archivos intermedios (shapefile) pasan a disco.
+_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def _chunked(pieces: Iterable[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """Agrupa piezas pequeñas en fragmentos de ~``chunk_size`` bytes."""
+    buf: List[bytes] = []
+    size = 0
+    for piece in pieces:
+        buf.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(buf)
+            buf = []
+            size = 0
+    if buf:
+        yield b"".join(buf)
+
+
+def _read_chunks(fileobj, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    fileobj.seek(0)
+    while True:
+        data = fileobj.read(chunk_size)
+        if not data:
+            break
+        yield data
+
+
+class _ZipSink:
+    """Destino de solo escritura para ``zipfile`` que se vacía tras cada escritura.
+
+    Al no exponer ``tell``/``seek``, ``zipfile`` escribe en modo streaming
+    (descriptores de datos tras cada entrada), así el .zip se emite a medida
+    que se comprime en lugar de quedar completo en un ``BytesIO``.
+    """
+
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _iter_zip(entries: Iterable[Tuple[str, Iterable[bytes]]]) -> Iterator[bytes]:
+    """Emite un .zip (DEFLATE) a partir de ``(nombre, fragmentos)`` por entrada."""
+    sink = _ZipSink()
+    with zipfile.ZipFile(sink, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, chunks in entries:
+            with zf.open(name, "w") as dest:
+                for chunk in chunks:
+                    dest.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()  # directorio central
+    if data:
+        yield data
+
 
 def _coerce_geometry(geom: Any) -> Optional[Dict[str, Any]]:
     """Devuelve una geometría GeoJSON con ``coordinates`` como array real.
@@ -107,16 +189,16 @@ def _coerce_geometry(geom: Any) -> Optional[Dict[str, Any]]:
     return {"type": geom.get("type"), "coordinates": coords}
 
 
-def build_flat_features(
-    ups: List[Dict[str, Any]],
+def iter_flat_features(
+    ups: Iterable[Dict[str, Any]],
     intervenciones_by_upid: Dict[str, List[Dict[str, Any]]],
-) -> List[Dict[str, Any]]:
-    """Arma la tabla plana: una fila por intervención (o una por UP si no tiene).
+) -> Iterator[Dict[str, Any]]:
+    """Genera la tabla plana: una fila por intervención (o una por UP si no tiene).
 
     Cada fila es ``{"geometry": <geom de la UP>, "properties": {col: valor}}``
-    con todas las columnas de :data:`EXPORT_COLUMNS`.
+    con todas las columnas de :data:`EXPORT_COLUMNS`. Los dicts de entrada no
+    se modifican.
     """
-    features: List[Dict[str, Any]] = []
     for up in ups:
         upid = up.get("upid")
         geom = _coerce_geometry(up.get("geometry"))
@@ -126,7 +208,7 @@ def build_flat_features(
 
         ints = intervenciones_by_upid.get(str(upid), []) if upid is not None else []
         if not ints:
-            features.append({"geometry": geom, "properties": dict(base)})
+            yield {"geometry": geom, "properties": dict(base)}
             continue
 
         for it in ints:
@@ -136,26 +218,41 @@ def build_flat_features(
                 if val is not None:
                     props[col] = val
             props["upid"] = upid  # el vínculo siempre el de la UP
-            features.append({"geometry": geom, "properties": props})
-    return features
+            yield {"geometry": geom, "properties": props}
+
+
+def build_flat_features(
+    ups: List[Dict[str, Any]],
+    intervenciones_by_upid: Dict[str, List[Dict[str, Any]]],
+) -> List[Dict[str, Any]]:
+    """Versión materializada de :func:`iter_flat_features`."""
+    return list(iter_flat_features(ups, intervenciones_by_upid))
 
 
 # ─── GeoJSON ────────────────────────────────────────────────────────────────
 
 
-def to_geojson(features: List[Dict[str, Any]]) -> bytes:
-    fc = {
-        "type": "FeatureCollection",
-        "features": [
-            {
+def iter_geojson(features: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """FeatureCollection emitida feature a feature (mismo texto que ``json.dumps``)."""
+
+    def pieces() -> Iterator[bytes]:
+        yield b'{"type": "FeatureCollection", "features": ['
+        sep = b""
+        for f in features:
+            feature = {
                 "type": "Feature",
                 "geometry": f.get("geometry"),
                 "properties": {c: f["properties"].get(c) for c in EXPORT_COLUMNS},
             }
-            for f in features
-        ],
-    }
-    return json.dumps(fc, ensure_ascii=False).encode("utf-8")
+            yield sep + json.dumps(feature, ensure_ascii=False).encode("utf-8")
+            sep = b", "
+        yield b"]}"
+
+    return _chunked(pieces())
+
+
+def to_geojson(features: List[Dict[str, Any]]) -> bytes:
+    return b"".join(iter_geojson(features))
 
 
 # ─── KML / KMZ ────────────────────────────────────────────────────────────────
@@ -201,35 +298,51 @@ def _geometry_to_kml(geom: Optional[Dict[str, Any]]) -> str:
     return ""
 
 
-def to_kml(features: List[Dict[str, Any]], doc_name: str = "Unidades de Proyecto") -> bytes:
-    placemarks = []
-    for f in features:
-        props = f["properties"]
-        name = escape(str(props.get("upid") or props.get("nombre_up") or ""))
-        data = "".join(
-            f'<Data name="{escape(col)}"><value>{escape("" if props.get(col) is None else str(props.get(col)))}</value></Data>'
-            for col in EXPORT_COLUMNS
-        )
-        geom_kml = _geometry_to_kml(f.get("geometry"))
-        placemarks.append(
-            f"<Placemark><name>{name}</name>"
-            f"<ExtendedData>{data}</ExtendedData>{geom_kml}</Placemark>"
-        )
-    kml = (
-        '<?xml version="1.0" encoding="UTF-8"?>'
-        '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
-        f"<name>{escape(doc_name)}</name>{''.join(placemarks)}"
-        "</Document></kml>"
+def _placemark(f: Dict[str, Any]) -> str:
+    props = f["properties"]
+    name = escape(str(props.get("upid") or props.get("nombre_up") or ""))
+    data = "".join(
+        f'<Data name="{escape(col)}"><value>{escape("" if props.get(col) is None else str(props.get(col)))}</value></Data>'
+        for col in EXPORT_COLUMNS
+    )
+    geom_kml = _geometry_to_kml(f.get("geometry"))
+    return (
+        f"<Placemark><name>{name}</name>"
+        f"<ExtendedData>{data}</ExtendedData>{geom_kml}</Placemark>"
     )
-    return kml.encode("utf-8")
+
+
+def iter_kml(
+    features: Iterable[Dict[str, Any]], doc_name: str = "Unidades de Proyecto"
+) -> Iterator[bytes]:
+    """Documento KML emitido placemark a placemark."""
+
+    def pieces() -> Iterator[bytes]:
+        yield (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<kml xmlns="http://www.opengis.net/kml/2.2"><Document>'
+            f"<name>{escape(doc_name)}</name>"
+        ).encode("utf-8")
+        for f in features:
+            yield _placemark(f).encode("utf-8")
+        yield b"</Document></kml>"
+
+    return _chunked(pieces())
+
+
+def to_kml(features: List[Dict[str, Any]], doc_name: str = "Unidades de Proyecto") -> bytes:
+    return b"".join(iter_kml(features, doc_name))
+
+
+def iter_kmz(
+    features: Iterable[Dict[str, Any]], doc_name: str = "Unidades de Proyecto"
+) -> Iterator[bytes]:
+    """KMZ: el KML se comprime a medida que se genera."""
+    return _iter_zip([("doc.kml", iter_kml(features, doc_name))])
 
 
 def to_kmz(features: List[Dict[str, Any]], doc_name: str = "Unidades de Proyecto") -> bytes:
-    kml_bytes = to_kml(features, doc_name)
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("doc.kml", kml_bytes)
-    return buf.getvalue()
+    return b"".join(iter_kmz(features, doc_name))
 
 
 # ─── Shapefile ────────────────────────────────────────────────────────────────
@@ -348,7 +461,9 @@ def _write_one_shapefile(category: str, items: List[Any]):
     """Escribe un shapefile para una categoría homogénea.
 
     ``items`` es una lista de ``(norm, properties)`` donde ``norm`` es la geometría
-    ya normalizada (o ``None``). Devuelve ``{ext: bytes}``.
+    ya normalizada (o ``None``). Devuelve ``{ext: archivo}`` con archivos
+    temporales (en memoria hasta ``_SPOOL_MAX_SIZE``, luego en disco) que el
+    llamador debe cerrar.
     """
     import shapefile  # pyshp
 
@@ -359,7 +474,9 @@ def _write_one_shapefile(category: str, items: List[Any]):
         "none": shapefile.NULL,
     }[category]
 
-    shp, shx, dbf = io.BytesIO(), io.BytesIO(), io.BytesIO()
+    shp, shx, dbf = (
+        tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_SIZE) for _ in range(3)
+    )
     w = shapefile.Writer(shp=shp, shx=shx, dbf=dbf, shapeType=shape_type)
 
     names = _dbf_field_names(EXPORT_COLUMNS)
@@ -382,28 +499,46 @@ def _write_one_shapefile(category: str, items: List[Any]):
         w.record(*rec)
 
     w.close()
-    return {"shp": shp.getvalue(), "shx": shx.getvalue(), "dbf": dbf.getvalue()}
+    return {"shp": shp, "shx": shx, "dbf": dbf}
+
+
+def iter_csv(features: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """CSV con nombres de columna completos, emitido fila a fila (UTF-8 con BOM para Excel)."""
+
+    def pieces() -> Iterator[bytes]:
+        buf = io.StringIO()
+        writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        yield "\ufeff".encode("utf-8") + buf.getvalue().encode("utf-8")
+        for f in features:
+            buf.seek(0)
+            buf.truncate()
+            props = f.get("properties", {})
+            writer.writerow(
+                {col: ("" if props.get(col) is None else str(props.get(col))) for col in EXPORT_COLUMNS}
+            )
+            yield buf.getvalue().encode("utf-8")
+
+    return _chunked(pieces())
 
 
 def _write_attributes_csv(features: List[Dict[str, Any]]) -> bytes:
     """CSV con nombres de columna completos — compañero del shapefile (DBF limita a 10 chars)."""
-    buf = io.StringIO()
-    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
-    writer.writeheader()
-    for f in features:
-        props = f.get("properties", {})
-        writer.writerow(
-            {col: ("" if props.get(col) is None else str(props.get(col))) for col in EXPORT_COLUMNS}
-        )
-    return buf.getvalue().encode("utf-8-sig")  # BOM para compatibilidad con Excel
+    return b"".join(iter_csv(features))
 
 
-def to_shapefile_zip(features: List[Dict[str, Any]], base_name: str = "unidades_proyecto") -> bytes:
-    """Agrupa por tipo de geometría y devuelve un .zip con un shapefile por tipo.
+def iter_shapefile_zip(
+    features: Iterable[Dict[str, Any]], base_name: str = "unidades_proyecto"
+) -> Iterator[bytes]:
+    """Agrupa por tipo de geometría y emite un .zip con un shapefile por tipo.
 
     Normaliza cada geometría primero; las inusables/malformadas se exportan como
-    shape NULA (no rompen la descarga).
+    shape NULA (no rompen la descarga). El DBF declara el ancho de cada campo
+    antes de los registros, por lo que los features se recorren dos veces; los
+    .shp/.shx/.dbf se generan en archivos temporales y se copian al zip por
+    fragmentos.
     """
+    features = features if isinstance(features, list) else list(features)
     groups: Dict[str, List[Any]] = {}
     for f in features:
         norm = _normalize_geometry(f.get("geometry"))
@@ -411,18 +546,26 @@ def to_shapefile_zip(features: List[Dict[str, Any]], base_name: str = "unidades_
         groups.setdefault(cat, []).append((norm, f.get("properties", {})))
 
     multi = len(groups) > 1
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+
+    def entries() -> Iterator[Tuple[str, Iterable[bytes]]]:
         for cat, feats in groups.items():
             parts = _write_one_shapefile(cat, feats)
             stem = f"{base_name}_{cat}" if multi else base_name
-            zf.writestr(f"{stem}.shp", parts["shp"])
-            zf.writestr(f"{stem}.shx", parts["shx"])
-            zf.writestr(f"{stem}.dbf", parts["dbf"])
-            zf.writestr(f"{stem}.prj", _WGS84_PRJ.encode("utf-8"))
-            zf.writestr(f"{stem}.cpg", b"UTF-8")
-        zf.writestr(f"{base_name}_atributos.csv", _write_attributes_csv(features))
-    return buf.getvalue()
+            try:
+                for ext in ("shp", "shx", "dbf"):
+                    yield f"{stem}.{ext}", _read_chunks(parts[ext])
+            finally:
+                for part in parts.values():
+                    part.close()
+            yield f"{stem}.prj", [_WGS84_PRJ.encode("utf-8")]
+            yield f"{stem}.cpg", [b"UTF-8"]
+        yield f"{base_name}_atributos.csv", iter_csv(features)
+
+    return _iter_zip(entries())
+
+
+def to_shapefile_zip(features: List[Dict[str, Any]], base_name: str = "unidades_proyecto") -> bytes:
+    return b"".join(iter_shapefile_zip(features, base_name))
 
 
 # ─── GeoPackage ───────────────────────────────────────────────────────────────
@@ -523,15 +666,7 @@ _GPKG_WGS84 = (
 )
 
 
-def to_geopackage(features: List[Dict[str, Any]], base_name: str = "unidades_proyecto") -> bytes:
-    """Serialize features to GeoPackage (.gpkg) — full-length field names, OGC standard.
-
-    Uses Python 3.12+ ``sqlite3.Connection.serialize()`` to produce the file in memory.
-    QGIS, ArcGIS, GDAL, and most GIS tools read .gpkg natively.
-    """
-    import sqlite3
-
-    con = sqlite3.connect(":memory:")
+def _write_geopackage(con: sqlite3.Connection, features: Iterable[Dict[str, Any]], base_name: str) -> None:
     con.execute("PRAGMA application_id = 1196444487")  # 0x47504B47 = 'GPKG'
     con.execute("PRAGMA user_version = 10300")          # GeoPackage 1.3.0
 
@@ -586,19 +721,50 @@ def to_geopackage(features: List[Dict[str, Any]], base_name: str = "unidades_pro
     placeholders = ", ".join("?" for _ in EXPORT_COLUMNS)
     sql = f'INSERT INTO "{base_name}" (geom, {cols_quoted}) VALUES (?, {placeholders})'
 
-    for f in features:
-        geom = _coerce_geometry(f.get("geometry"))
-        wkb = _geojson_to_wkb(geom)
-        props = f.get("properties", {})
-        row = [_gpkg_geom(wkb)] + [
-            ("" if props.get(c) is None else str(props.get(c))) for c in EXPORT_COLUMNS
-        ]
-        con.execute(sql, row)
+    def rows() -> Iterator[List[Any]]:
+        for f in features:
+            geom = _coerce_geometry(f.get("geometry"))
+            wkb = _geojson_to_wkb(geom)
+            props = f.get("properties", {})
+            yield [_gpkg_geom(wkb)] + [
+                ("" if props.get(c) is None else str(props.get(c))) for c in EXPORT_COLUMNS
+            ]
 
+    con.executemany(sql, rows())
     con.commit()
-    data = con.serialize()  # Python 3.12+ — SQLite in-memory → bytes
-    con.close()
-    return data
+
+
+def iter_geopackage(
+    features: Iterable[Dict[str, Any]], base_name: str = "unidades_proyecto"
+) -> Iterator[bytes]:
+    """Serialize features to GeoPackage (.gpkg) — full-length field names, OGC standard.
+
+    The SQLite database is spooled to a temporary file (rows are inserted as
+    the features are produced) and then streamed in chunks; the file is
+    removed when the generator finishes or is closed.
+    QGIS, ArcGIS, GDAL, and most GIS tools read .gpkg natively.
+    """
+    fd, path = tempfile.mkstemp(suffix=".gpkg")
+    os.close(fd)
+    try:
+        con = sqlite3.connect(path)
+        try:
+            con.execute("PRAGMA synchronous = OFF")
+            con.execute("PRAGMA journal_mode = MEMORY")
+            _write_geopackage(con, features, base_name)
+        finally:
+            con.close()
+        with open(path, "rb") as fh:
+            yield from _read_chunks(fh)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def to_geopackage(features: List[Dict[str, Any]], base_name: str = "unidades_proyecto") -> bytes:
+    return b"".join(iter_geopackage(features, base_name))
 
 
 # ─── Round-trip compatibility alias map ──────────────────────────────────────
@@ -622,18 +788,26 @@ FORMAT_SPEC = {
     "kmz": ("application/vnd.google-earth.kmz", "kmz"),
     "shp": ("application/zip", "zip"),
     "gpkg": ("application/geopackage+sqlite3", "gpkg"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
 }
 
 
-def export_features(features: List[Dict[str, Any]], formato: str, base_name: str) -> bytes:
+def iter_export(features: Iterable[Dict[str, Any]], formato: str, base_name: str) -> Iterator[bytes]:
+    """Serializador por fragmentos para ``formato`` (para ``StreamingResponse``)."""
     if formato == "geojson":
-        return to_geojson(features)
+        return iter_geojson(features)
     if formato == "kml":
-        return to_kml(features, base_name)
+        return iter_kml(features, base_name)
     if formato == "kmz":
-        return to_kmz(features, base_name)
+        return iter_kmz(features, base_name)
     if formato == "shp":
-        return to_shapefile_zip(features, base_name)
+        return iter_shapefile_zip(features, base_name)
     if formato == "gpkg":
-        return to_geopackage(features, base_name)
+        return iter_geopackage(features, base_name)
+    if formato == "csv":
+        return iter_csv(features)
     raise ValueError(f"Formato no soportado: {formato}")
+
+
+def export_features(features: List[Dict[str, Any]], formato: str, base_name: str) -> bytes:
+    return b"".join(iter_export(features, formato, base_name))
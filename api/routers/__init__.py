@@ -7,6 +7,7 @@ Routers disponibles:
     emprestito_quality_router — Calidad de datos de emprestito
     core_routes          — Salud, ping, debug, CORS
     general_routes       — Bug reports, escaladas, recomendaciones, centros gestores, Firebase
+    jobs                 — Estado y cancelación de trabajos en segundo plano
     proyectos            — Proyectos presupuestales (BPIN, BP, Centro Gestor)
 """
 
@@ -16,5 +17,6 @@ __all__ = [
     "emprestito_quality_router",
     "core_routes",
     "general_routes",
+    "jobs",
     "proyectos",
 ]
@@ -8,6 +8,8 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Optional, List
 from datetime import datetime, timezone
 
+from auth_system.auth_cache import invalidate_user_cache
+from auth_system.user_directory import get_user_directory
 from auth_system.decorators import require_permission, require_role, get_current_user
 from auth_system.permissions import get_user_permissions
 from auth_system.models import (
@@ -21,6 +23,8 @@ from auth_system.models import (
 from auth_system.constants import ROLES, FIREBASE_COLLECTIONS, DEFAULT_USER_ROLE
 from auth_system.utils import validate_role_assignment, sanitize_user_data
 from database.firebase_config import get_firestore_client
+from database.audit_sink import get_log_sink
+from database.firestore_repository import stream_collection
 
 router = APIRouter(prefix="/auth/admin", tags=["Administración y Control de Accesos"])
 
@@ -101,6 +105,8 @@ async def list_users(
     current_user: dict = Depends(get_current_user),
     limit: Optional[int] = Query(100, ge=1, le=500),
     offset: Optional[int] = Query(0, ge=0),
+    centro_gestor: Optional[str] = Query(None, description="Filtrar por centro gestor"),
+    role: Optional[str] = Query(None, description="Filtrar por rol"),
 ):
     """
     Listar todos los usuarios del sistema.
@@ -115,27 +121,11 @@ async def list_users(
     try:
         db = _get_db_or_raise()
 
-        # Obtener usuarios con paginación
-        query = db.collection(FIREBASE_COLLECTIONS["users"]).limit(limit).offset(offset)
-        users_ref = query.stream()
-
-        users = []
-        for user_doc in users_ref:
-            user_data = user_doc.to_dict()
-            user_data["uid"] = user_doc.id
-
-            # Sanitizar datos sensibles
-            sanitized = sanitize_user_data(user_data)
-            users.append(sanitized)
-
-        # Contar total de usuarios (aggregation query to avoid loading all docs)
-        try:
-            count_query = db.collection(FIREBASE_COLLECTIONS["users"]).count()
-            count_result = count_query.get()
-            total_count = count_result[0][0].value if count_result else 0
-        except Exception:
-            # Fallback: use offset + current page size as estimate
-            total_count = offset + len(users)
+        # Página desde el directorio de usuarios (índices por centro y rol)
+        page, total_count = get_user_directory().page(
+            offset, limit, centros=centro_gestor, roles=role, db=db
+        )
+        users = [sanitize_user_data(user_data) for user_data in page]
 
         return {
             "success": True,
@@ -166,21 +156,10 @@ async def list_super_admin_users(
 
     try:
         db = _get_db_or_raise()
-        users_collection = db.collection(FIREBASE_COLLECTIONS["users"])
-        query = users_collection.where("roles", "array_contains", "super_admin")
-        users_ref = query.stream()
-
-        all_super_admins = []
-        for user_doc in users_ref:
-            user_data = user_doc.to_dict() or {}
-            user_data["uid"] = user_doc.id
-
-            sanitized = sanitize_user_data(user_data)
-            all_super_admins.append(sanitized)
-
-        # Aplicar paginación manual
-        total_count = len(all_super_admins)
-        paginated_users = all_super_admins[offset : offset + limit]
+        page, total_count = get_user_directory().page(
+            offset, limit, roles="super_admin", db=db
+        )
+        paginated_users = [sanitize_user_data(user_data) for user_data in page]
 
         return {
             "success": True,
@@ -320,9 +299,10 @@ async def update_user_info(
 
         # Actualizar en Firestore
         user_ref.update(update_fields)
+        invalidate_user_cache(uid)
 
         # Registrar en audit_logs
-        db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "action": "update_user_info",
@@ -401,6 +381,7 @@ async def assign_roles_to_user(
                 "updated_by": current_user.get("uid"),
             }
         )
+        invalidate_user_cache(uid)
 
         # Sincronizar custom claims en Firebase Auth (best-effort)
         try:
@@ -417,7 +398,7 @@ async def assign_roles_to_user(
             pass
 
         # Registrar en audit_logs
-        db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "action": "assign_roles",
@@ -485,6 +466,7 @@ async def change_users_role_by_uid(
                 "updated_by": current_user.get("uid"),
             }
         )
+        invalidate_user_cache(uid)
 
         # Sincronizar custom claims en Firebase Auth (best-effort)
         try:
@@ -500,7 +482,7 @@ async def change_users_role_by_uid(
         except Exception:
             pass
 
-        db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "action": "change_users_rol",
@@ -571,6 +553,7 @@ async def update_user_centro_gestor(
                 "updated_by": current_user.get("uid"),
             }
         )
+        invalidate_user_cache(uid)
 
         # Sincronizar custom claims (best-effort)
         try:
@@ -586,7 +569,7 @@ async def update_user_centro_gestor(
         except Exception:
             pass
 
-        db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "action": "update_centro_gestor",
@@ -657,9 +640,10 @@ async def grant_temporary_permission(
                 "updated_at": datetime.now(timezone.utc),
             }
         )
+        invalidate_user_cache(uid)
 
         # Registrar en audit_logs
-        db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(
             {
                 "timestamp": datetime.now(timezone.utc),
                 "action": "grant_temporary_permission",
@@ -723,6 +707,7 @@ async def revoke_temporary_permission(
                 "updated_at": datetime.now(timezone.utc),
             }
         )
+        invalidate_user_cache(uid)
 
         return {"success": True, "message": f"Permiso temporal '{permission}' revocado"}
     except HTTPException:
@@ -882,7 +867,7 @@ async def get_role_details(
 
     try:
         db = _get_db_or_raise()
-        users_docs = list(db.collection(FIREBASE_COLLECTIONS["users"]).stream())
+        users_docs = await stream_collection(FIREBASE_COLLECTIONS["users"], db=db)
         users_with_role = []
 
         for user_doc in users_docs:
@@ -26,6 +26,7 @@ from fastapi.responses import JSONResponse
 
 from api.core.responses import clean_firebase_data, create_utf8_response
 from api.core.security import verify_firebase_token, optional_rate_limit
+from auth_system.auth_cache import invalidate_user_cache
 
 logger = logging.getLogger(__name__)
 
@@ -1133,6 +1134,7 @@ async def delete_user(
         result = await delete_user_account(
             uid, soft_delete if soft_delete is not None else True
         )
+        invalidate_user_cache(uid)
 
         if not result.get("success", False):
             error_code = result.get("code", "USER_DELETE_ERROR")
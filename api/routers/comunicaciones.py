@@ -52,6 +52,7 @@ from api.services.comunicaciones_service import (
 )
 from auth_system.constants import ROLES
 from auth_system.decorators import get_current_user
+from database.firestore_repository import stream_collection
 
 logger = logging.getLogger(__name__)
 
@@ -423,7 +424,7 @@ async def listar_centros_gestores(
 
     nombres: set[str] = set()
     try:
-        for udoc in db.collection("users").stream():
+        for udoc in await stream_collection("users", db=db):
             ud = udoc.to_dict() or {}
             for key in (
                 "nombre_centro_gestor",
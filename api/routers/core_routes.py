@@ -118,8 +118,8 @@ async def health_check():
     cache_key = get_cache_key("health_check")
     cached_data, is_valid = get_from_cache(cache_key, max_age_seconds=30)
     if is_valid:
-        cached_data["timestamp"] = datetime.now().isoformat()
-        return cached_data
+        # Los valores cacheados son inmutables: responder con una copia superficial
+        return {**cached_data, "timestamp": datetime.now().isoformat()}
 
     try:
         response = {
@@ -168,13 +168,19 @@ async def health_check():
 
 @router.get("/metrics", tags=["Monitoring"])
 async def metrics():
-    """Endpoint de metricas Prometheus (requiere configuracion)."""
+    """Métricas Prometheus (formato de texto); agrega todos los workers en modo multiproceso."""
     from fastapi import HTTPException
+    from fastapi.responses import Response
 
-    raise HTTPException(
-        status_code=503,
-        detail="Prometheus metrics not enabled. Set PROMETHEUS_ENABLED=true and configure prometheus_multiproc_dir.",
-    )
+    from api.core.metrics import METRICS_ENABLED, render_metrics
+
+    if not METRICS_ENABLED:
+        raise HTTPException(
+            status_code=503,
+            detail="Prometheus metrics not enabled. Install prometheus-client and unset PROMETHEUS_ENABLED=false.",
+        )
+    body, content_type = await asyncio.to_thread(render_metrics)
+    return Response(content=body, media_type=content_type)
 
 
 @router.get("/cors-test")
@@ -6,11 +6,11 @@ Cubre: contratos, procesos, ordenes de compra, convenios, pagos, RPC,
 solicitudes de cambio, reportes, flujo de caja, proyecciones, SECOP.
 """
 
+import asyncio
 import json
 import logging
 import os
 from datetime import datetime, timezone, timedelta
-from functools import lru_cache
 from typing import Any, Dict, List, Optional, Tuple
 from urllib.parse import urlparse
 
@@ -61,6 +61,7 @@ def _scope_result(current_user, result):
     return result
 
 
+from api.core.jobs import JobContext, JobFailed, job_accepted_response, job_handler, submit_job
 from api.core.responses import clean_firebase_data, create_utf8_response
 from api.core.security import optional_rate_limit
 
@@ -79,6 +80,11 @@ except Exception:
     FIREBASE_AVAILABLE = False
     get_firestore_client = lambda: None
 
+from api.scripts.secop_mirror import get_secop_mirror_status, sincronizar_mirror_secop
+from api.scripts.emprestito_referencia_index import get_fresh_referencia_index, invalidate_referencia_index
+from api.utils.s3_clients import get_presigned_url_signer
+from database.firestore_repository import stream_collection
+
 try:
     from api.scripts import (
         procesar_emprestito_completo,
@@ -119,6 +125,7 @@ try:
         obtener_datos_secop_completos,
         actualizar_proceso_emprestito_completo,
         procesar_todos_procesos_emprestito_completo,
+        get_secop_sync_progress,
         crear_tabla_proyecciones_desde_sheets,
         leer_proyecciones_emprestito,
         leer_proyecciones_no_guardadas,
@@ -255,33 +262,16 @@ def _extract_s3_bucket_key_from_url(url: str) -> Tuple[Optional[str], Optional[s
         return None, None
 
 
-@lru_cache(maxsize=6)
-def _get_s3_client_for_presign_cached(credentials_path: str = ""):
-    try:
-        if not BOTO3_AVAILABLE or S3DocumentManager is None:
-            return None
-        manager = S3DocumentManager(credentials_path=credentials_path or None)
-        return manager.s3_client
-    except Exception:
-        return None
-
-
 def _generate_presigned_s3_url(
     bucket: str, key: str, credentials_path: str = ""
 ) -> Optional[str]:
-    if not _s3_presigned_enabled() or not bucket or not key:
+    """Firma con el cliente S3 compartido; la URL se reutiliza hasta poco antes de vencer."""
+    if not _s3_presigned_enabled() or not bucket or not key or not BOTO3_AVAILABLE:
         return None
-    try:
-        s3_client = _get_s3_client_for_presign_cached(credentials_path or "")
-        if s3_client is None:
-            return None
-        return s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=_s3_presigned_expiration(),
-        )
-    except Exception:
+    signer = get_presigned_url_signer(credentials_path, _s3_presigned_expiration())
+    if signer is None:
         return None
+    return signer.sign(bucket, key)
 
 
 def check_emprestito_availability():
@@ -4529,6 +4519,7 @@ async def aprobar_solicitud_cambio_emprestito(
         # Aplicar al documento original
         update_data["updated_at"] = datetime.now(tz=_BOGOTA_TZ).isoformat()
         target_ref.update(update_data)
+        invalidate_referencia_index(target_ref.parent.id, target_ref.id)
 
         # Actualizar solicitud
         now_iso = datetime.now(tz=_BOGOTA_TZ).isoformat()
@@ -4729,28 +4720,21 @@ async def resumen_emprestito_centro_gestor(
                 status_code=503, detail="No se pudo conectar a Firestore"
             )
 
-        # Cargar contratos (run_in_executor: firebase-admin client es síncrono)
-        contratos_docs = await asyncio.to_thread(
-            lambda: list(db.collection("contratos_emprestito").stream())
+        # Contratos desde el índice de referencias (sin recorrer contratos_emprestito)
+        # y reportes en paralelo, en el pool de Firestore
+        index, reportes_docs = await asyncio.gather(
+            get_fresh_referencia_index(db),
+            stream_collection("reportes_contratos", db=db),
         )
         contratos_by_centro: Dict[str, list] = {}
 
-        for doc in contratos_docs:
-            data = doc.to_dict() or {}
-            data["_doc_id"] = doc.id
-            centro = (
-                data.get("nombre_centro_gestor")
-                or data.get("nombreCentroGestor")
-                or "Sin centro gestor"
-            )
+        for contrato in index.entries("contratos_emprestito"):
+            centro = contrato["nombre_centro_gestor"] or "Sin centro gestor"
             if isinstance(centro, str):
                 centro = centro.strip()
-            contratos_by_centro.setdefault(centro, []).append(data)
+            contratos_by_centro.setdefault(centro, []).append(contrato)
 
-        # Cargar reportes de contratos (últimos avances)
-        reportes_docs = await asyncio.to_thread(
-            lambda: list(db.collection("reportes_contratos").stream())
-        )
+        # Reportes de contratos (últimos avances)
         reportes_by_referencia: Dict[str, list] = {}
 
         for doc in reportes_docs:
@@ -4760,7 +4744,7 @@ async def resumen_emprestito_centro_gestor(
             for key, value in data.items():
                 if hasattr(value, "isoformat"):
                     data[key] = value.isoformat()
-            ref = data.get("referencia_contrato", "")
+            ref = str(data.get("referencia_contrato") or "").strip()
             reportes_by_referencia.setdefault(ref, []).append(data)
 
         # Construir resumen
@@ -4773,28 +4757,17 @@ async def resumen_emprestito_centro_gestor(
             }
 
             for contrato in contratos:
-                ref = contrato.get("referencia_contrato", "")
+                ref = contrato["referencia"]
                 reportes = reportes_by_referencia.get(ref, [])
                 reportes.sort(key=lambda r: r.get("created_at", ""), reverse=True)
                 ultimo_reporte = reportes[0] if reportes else None
 
-                # Normalizar timestamps en contrato
-                contrato_clean = {}
-                for key, value in contrato.items():
-                    if key.startswith("_"):
-                        continue
-                    if hasattr(value, "isoformat"):
-                        contrato_clean[key] = value.isoformat()
-                    else:
-                        contrato_clean[key] = value
-
                 centro_data["contratos"].append(
                     {
                         "referencia_contrato": ref,
-                        "estado_contrato": contrato.get("estado_contrato"),
-                        "valor_contrato": contrato.get("valor_contrato"),
-                        "contratista": contrato.get("nombre_contratista")
-                        or contrato.get("proveedor"),
+                        "estado_contrato": contrato["estado_contrato"],
+                        "valor_contrato": contrato["valor_contrato"],
+                        "contratista": contrato["contratista"],
                         "ultimo_reporte": ultimo_reporte,
                         "total_reportes": len(reportes),
                     }
@@ -4952,6 +4925,7 @@ async def eliminar_contrato_emprestito(
         for pago_doc in pago_docs:
             pago_doc.reference.delete()
         db.collection("contratos_emprestito").document(doc.id).delete()
+        invalidate_referencia_index("contratos_emprestito", doc.id)
 
         return create_utf8_response(
             {
@@ -5209,46 +5183,48 @@ async def obtener_contratos_secop_endpoint(
     - **Mapeo**: proceso_de_compra → proceso_contractual (sobrescribe valor heredado)
     - **Nuevos campos**: sector desde SECOP
     - **Límite**: 2000 registros por consulta
+
+    ###  Ejecución en segundo plano:
+    Responde `202` con `job_id`; el resumen anterior queda en `result` de
+    `GET /jobs/{job_id}`. Una misma petición repetida mientras corre devuelve el
+    mismo trabajo (`deduplicated: true`).
     """
-    try:
-        check_emprestito_availability()
+    check_emprestito_availability()
+
+    # Si limit es None, procesar TODO sin límite
+    if limit is not None:
+        if limit > 50:
+            limit = 50
+        if limit < 1:
+            limit = 10
+        if offset < 0:
+            offset = 0
+
+    job, created = submit_job(
+        "emprestito_contratos_secop",
+        {"offset": offset, "limit": limit},
+        created_by=current_user.get("uid"),
+    )
+    return job_accepted_response(job, created)
+
 
-        # Si limit es None, procesar TODO sin límite
+@job_handler("emprestito_contratos_secop")
+async def _job_obtener_contratos_secop(ctx: JobContext, offset: int = 0, limit: Optional[int] = None):
+    ctx.report({"etapa": "consultando SECOP", "offset": offset, "limit": limit})
+    try:
         if limit is None:
-            # Procesar todos los procesos sin limitación
             resultado = await obtener_contratos_desde_proceso_contractual_completo()
         else:
-            # Si se especifica limit, mantener comportamiento por lotes
-            if limit > 50:
-                limit = 50
-            if limit < 1:
-                limit = 10
-            if offset < 0:
-                offset = 0
             resultado = await obtener_contratos_desde_proceso_contractual(
                 offset=offset, limit=limit
             )
-
-        # Retornar resultado
-        return JSONResponse(
-            content=resultado,
-            status_code=200 if resultado.get("success") else 404,
-            headers={"Content-Type": "application/json; charset=utf-8"},
-        )
-
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error en endpoint obtener contratos SECOP: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "success": False,
-                "error": "Error interno del servidor",
-                "message": "Error obteniendo contratos de SECOP",
-                "detalles": str(e),
-            },
-        )
+        logger.error(f"Error en trabajo obtener contratos SECOP: {e}")
+        raise JobFailed(f"Error obteniendo contratos de SECOP: {str(e)}")
+
+    if not resultado.get("success"):
+        raise JobFailed(resultado)
+    return resultado
 
 
 @router.get(
@@ -5927,12 +5903,15 @@ async def obtener_procesos_bp(
                 status_code=503, detail="No se pudo conectar a Firestore"
             )
 
-        collection_ref = db.collection("procesos_emprestito").select([
-            "bp", "nombre_banco", "nombre_centro_gestor",
-            "nombre_resumido_proceso", "tipo_contrato",
-            "urlproceso", "valor_publicacion",
-        ])
-        docs = await asyncio.to_thread(lambda: list(collection_ref.stream()))
+        docs = await stream_collection(
+            "procesos_emprestito",
+            select=[
+                "bp", "nombre_banco", "nombre_centro_gestor",
+                "nombre_resumido_proceso", "tipo_contrato",
+                "urlproceso", "valor_publicacion",
+            ],
+            db=db,
+        )
         procesos_data = []
 
         for doc in docs:
@@ -6071,9 +6050,14 @@ async def obtener_contratos_bp(
         # Lista para almacenar todos los datos combinados
         todos_los_datos = []
 
+        # Las tres colecciones se leen en paralelo en el pool de Firestore
+        docs, ordenes_docs, convenios_docs = await asyncio.gather(
+            stream_collection("contratos_emprestito", db=db),
+            stream_collection("ordenes_compra_emprestito", db=db),
+            stream_collection("convenios_transferencias_emprestito", db=db),
+        )
+
         # 1. Obtener contratos_emprestito
-        collection_ref = db.collection("contratos_emprestito")
-        docs = collection_ref.stream()
         contratos_count = 0
 
         for doc in docs:
@@ -6083,8 +6067,6 @@ async def obtener_contratos_bp(
             contratos_count += 1
 
         # 2. Obtener ordenes_compra_emprestito
-        ordenes_ref = db.collection("ordenes_compra_emprestito")
-        ordenes_docs = ordenes_ref.stream()
         ordenes_count = 0
 
         for doc in ordenes_docs:
@@ -6114,8 +6096,6 @@ async def obtener_contratos_bp(
             ordenes_count += 1
 
         # 3. Obtener convenios_transferencias_emprestito
-        convenios_ref = db.collection("convenios_transferencias_emprestito")
-        convenios_docs = convenios_ref.stream()
         convenios_count = 0
 
         for doc in convenios_docs:
@@ -6326,6 +6306,9 @@ async def obtener_ordenes_por_centro_gestor(
 
 @router.post("/emprestito/obtener-procesos-secop", tags=["Gestión de Empréstito"])
 async def obtener_procesos_secop_completo_endpoint(
+    resume: bool = Query(
+        False, description="Reanudar la última sincronización interrumpida omitiendo los procesos ya escritos"
+    ),
     current_user: dict = Depends(require_resource("contratos", "write")),
 ):
     """
@@ -6375,8 +6358,10 @@ async def obtener_procesos_secop_completo_endpoint(
     ###  Ejemplo de request:
     ```http
     POST /emprestito/obtener-procesos-secop
+    POST /emprestito/obtener-procesos-secop?resume=true
     ```
-    **No requiere parámetros - procesamiento automático**
+    **No requiere parámetros - procesamiento automático.** `resume=true` continúa una
+    corrida interrumpida desde su checkpoint (`sync_checkpoints/secop_procesos_emprestito`).
 
     ### [OK] Respuesta exitosa:
     ```json
@@ -6427,48 +6412,112 @@ async def obtener_procesos_secop_completo_endpoint(
     ###  API de SECOP utilizada:
     - **Dominio**: www.datos.gov.co
     - **Dataset**: p6dx-8zbt (Procesos de contratación)
-    - **Filtro**: nit_entidad='890399011' AND referencia_del_proceso='{referencia_proceso}'
+    - **Filtro**: nit_entidad='890399011' AND referencia_del_proceso IN (...) por lotes;
+      las referencias no encontradas se reintentan sin filtro de NIT
 
     ### ⏱ Tiempo de procesamiento:
-    - **Timeout extendido**: 5 minutos (300 segundos)
-    - **Tiempo estimado**: ~10-15 segundos por proceso
-    - **Progreso**: Se reporta en logs con ETA para procesos restantes
-    - **Recomendación**: Monitor logs del servidor para ver progreso en tiempo real
+    - **Segundo plano**: responde `202` con `job_id`; el resumen anterior queda en
+      `result` de `GET /jobs/{job_id}` y el avance (con ETA) en `progress`
+    - **Cancelación**: `POST /jobs/{job_id}/cancelar` detiene la corrida tras el lote en
+      curso; lo escrito se conserva y `resume=true` la continúa
+    - **Lotes paralelos**: `SECOP_BATCH_SIZE` referencias por consulta, `SECOP_SYNC_CONCURRENCY` lotes a la vez
+    - **Límite de velocidad**: `SECOP_RATE_PER_SECOND` consultas/s con reintentos ante 429/5xx
+    - **Concurrencia**: una sola corrida a la vez; repetir la petición devuelve el mismo trabajo
     """
-    try:
-        check_emprestito_availability()
+    check_emprestito_availability()
 
-        # Procesar todos los procesos de empréstito automáticamente
-        resultado = await procesar_todos_procesos_emprestito_completo()
+    job, created = submit_job(
+        "emprestito_procesos_secop", {"resume": resume}, created_by=current_user.get("uid")
+    )
+    return job_accepted_response(job, created)
 
-        # Manejar respuesta según el resultado
-        if not resultado.get("success"):
-            # Si no se encontraron procesos
-            if "No se encontraron procesos" in resultado.get("error", ""):
-                raise HTTPException(status_code=404, detail=resultado)
-            else:
-                # Otros errores
-                raise HTTPException(status_code=500, detail=resultado)
 
-        # Respuesta exitosa
-        return JSONResponse(
-            content=resultado,
-            status_code=200,
-            headers={"Content-Type": "application/json; charset=utf-8"},
+@job_handler("emprestito_procesos_secop")
+async def _job_obtener_procesos_secop(ctx: JobContext, resume: bool = False):
+    try:
+        # Un reintento tras reinicio del worker retoma desde el checkpoint
+        resultado = await procesar_todos_procesos_emprestito_completo(
+            resume=resume or ctx.attempt > 1,
+            on_progress=lambda progreso: ctx.report(progress=progreso),
+            should_stop=lambda: ctx.cancelled,
         )
-
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.error(f"Error en endpoint obtener procesos SECOP completo: {e}")
-        raise HTTPException(
-            status_code=500,
-            detail={
-                "success": False,
-                "error": "Error interno del servidor",
-                "message": "Error obteniendo datos completos de SECOP para todos los procesos",
-            },
-        )
+        logger.error(f"Error en trabajo obtener procesos SECOP completo: {e}")
+        raise JobFailed(f"Error obteniendo datos completos de SECOP: {str(e)}")
+
+    if not resultado.get("success"):
+        raise JobFailed(resultado)
+    return resultado
+
+
+@router.get("/emprestito/obtener-procesos-secop/progreso", tags=["Gestión de Empréstito"])
+async def obtener_progreso_procesos_secop_endpoint(
+    current_user: dict = Depends(require_resource("contratos", "read")),
+):
+    """
+    ##  Progreso de la Sincronización SECOP
+
+    Estado de la corrida de `POST /emprestito/obtener-procesos-secop` en curso (o de la
+    última en este worker): `status` (`idle`, `running`, `completed`, `interrupted`),
+    procesos procesados/actualizados/con errores, tiempo transcurrido y ETA en segundos.
+    """
+    return JSONResponse(
+        content=get_secop_sync_progress(),
+        status_code=200,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+    )
+
+
+@router.post("/emprestito/secop-mirror/sincronizar", tags=["Gestión de Empréstito"])
+async def sincronizar_mirror_secop_endpoint(
+    full: bool = Query(False, description="Recargar completo y purgar filas eliminadas en SECOP"),
+    current_user: dict = Depends(require_resource("contratos", "write")),
+):
+    """
+    ##  Sincronizar Mirror Local de SECOP/TVEC
+
+    Trae al mirror local (SQLite) las filas de procesos (`p6dx-8zbt`), contratos
+    (`jbjy-vk9h`) y órdenes TVEC (`rgxm-mmea`) de la entidad que cambiaron desde la
+    última sincronización (`:updated_at`). Las consultas SECOP de la API responden
+    desde este mirror y solo van a datos.gov.co cuando no encuentran la referencia.
+
+    El mirror se refresca solo cada `SECOP_MIRROR_REFRESH_SECONDS` (y recarga completo
+    cada `SECOP_MIRROR_FULL_REFRESH_SECONDS`); este endpoint fuerza una corrida
+    (`full=true` para recarga completa).
+
+    ### ⏱ Tiempo de procesamiento:
+    - **Segundo plano**: responde `202` con `job_id`; el resumen por dataset queda en
+      `result` de `GET /jobs/{job_id}`
+    """
+    job, created = submit_job(
+        "emprestito_secop_mirror", {"full": full}, created_by=current_user.get("uid")
+    )
+    return job_accepted_response(job, created)
+
+
+@job_handler("emprestito_secop_mirror")
+async def _job_sincronizar_mirror_secop(ctx: JobContext, full: bool = False):
+    resultado = await sincronizar_mirror_secop(full=full)
+    if not resultado.get("success"):
+        raise JobFailed(resultado)
+    return resultado
+
+
+@router.get("/emprestito/secop-mirror/estado", tags=["Gestión de Empréstito"])
+async def estado_mirror_secop_endpoint(
+    current_user: dict = Depends(require_resource("contratos", "read")),
+):
+    """
+    ##  Estado del Mirror Local de SECOP/TVEC
+
+    Filas por dataset, última marca `:updated_at` sincronizada, hora de la última
+    sincronización y aciertos/fallos de consulta del mirror.
+    """
+    return JSONResponse(
+        content=await asyncio.to_thread(get_secop_mirror_status),
+        status_code=200,
+        headers={"Content-Type": "application/json; charset=utf-8"},
+    )
 
 
 @router.get(
@@ -7485,6 +7534,7 @@ async def modificar_orden_compra(
         # Actualizar solo los campos proporcionados
         campos_actualizados = list(datos_actualizados.keys())
         coleccion.document(doc_id).update(datos_actualizados)
+        invalidate_referencia_index("ordenes_compra_emprestito", doc_id)
 
         return create_utf8_response(
             {
@@ -8155,6 +8205,7 @@ async def modificar_contrato(
         # Actualizar solo los campos proporcionados
         campos_actualizados = list(datos_actualizados.keys())
         coleccion.document(doc_id).update(datos_actualizados)
+        invalidate_referencia_index("contratos_emprestito", doc_id)
 
         return create_utf8_response(
             {
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+api/routers/jobs.py — Estado y cancelación de trabajos en segundo plano.
+
+Rutas expuestas:
+    GET  /jobs                — Trabajos recientes del usuario (todos para super_admin)
+    GET  /jobs/{job_id}       — Estado, progreso, resultado parcial y final
+    POST /jobs/{job_id}/cancelar — Pedir la cancelación de un trabajo
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from api.core.jobs import cancel_job, get_job, list_jobs
+from api.core.responses import create_utf8_response
+from auth_system.decorators import get_current_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(tags=["Trabajos"])
+
+
+def _is_admin(user: Dict[str, Any]) -> bool:
+    return "*" in (user.get("permissions") or [])
+
+
+async def _job_for_user(job_id: str, user: Dict[str, Any]) -> Dict[str, Any]:
+    # La cola es SQLite (bloqueante): las consultas van fuera del event loop
+    job = await asyncio.to_thread(get_job, job_id)
+    # Un trabajo ajeno responde igual que uno inexistente
+    if job is None or not (_is_admin(user) or job.get("created_by") == user.get("uid")):
+        raise HTTPException(status_code=404, detail=f"Trabajo {job_id} no encontrado")
+    return job
+
+
+def _serialize_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    data = dict(job)
+    data.pop("dedupe_key", None)
+    for field in ("created_at", "started_at", "finished_at", "heartbeat_at"):
+        if data.get(field):
+            data[field] = datetime.fromtimestamp(data[field], tz=timezone.utc).isoformat()
+    return data
+
+
+@router.get("/jobs", summary=" Listar Trabajos en Segundo Plano")
+async def listar_trabajos(
+    status: Optional[str] = Query(
+        None, description="Filtrar por estado: queued, running, succeeded, failed, cancelled"
+    ),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: dict = Depends(get_current_user),
+):
+    """Trabajos más recientes primero; cada usuario ve los suyos y super_admin todos."""
+    created_by = None if _is_admin(current_user) else current_user.get("uid")
+    jobs = await asyncio.to_thread(list_jobs, status=status, created_by=created_by, limit=limit)
+    return create_utf8_response(
+        {"success": True, "data": [_serialize_job(job) for job in jobs], "count": len(jobs)}
+    )
+
+
+@router.get("/jobs/{job_id}", summary=" Estado de un Trabajo")
+async def obtener_trabajo(job_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    ##  Estado de un Trabajo en Segundo Plano
+
+    - `status`: `queued`, `running`, `succeeded`, `failed` o `cancelled`
+    - `progress`: avance publicado por el trabajo (procesados, total, ETA...)
+    - `partial_result`: resultado acumulado mientras corre
+    - `result` / `error`: resultado final o detalle del fallo
+    - `attempts`: intentos (un trabajo interrumpido por un reinicio vuelve a la cola)
+    """
+    job = await _job_for_user(job_id, current_user)
+    return create_utf8_response({"success": True, "data": _serialize_job(job)})
+
+
+@router.post("/jobs/{job_id}/cancelar", summary=" Cancelar un Trabajo")
+async def cancelar_trabajo(job_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Un trabajo en cola se cancela en el acto. Uno en curso se detiene en su
+    siguiente punto de control (lo ya escrito se conserva y queda en
+    `partial_result`).
+    """
+    await _job_for_user(job_id, current_user)
+    job = await asyncio.to_thread(cancel_job, job_id)
+    logger.info(f"Cancelación solicitada para trabajo {job_id} por {current_user.get('uid')}")
+    return create_utf8_response({"success": True, "data": _serialize_job(job)})
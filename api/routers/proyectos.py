@@ -73,8 +73,19 @@ def _apply_field_filter(data: List[Dict[str, Any]], campos: Optional[str]) -> Li
     return [{f: row.get(f) for f in selected if f in row} for row in data if isinstance(row, dict)]
 
 
-def _build_pagination(limit: int, offset: int, count: int) -> Dict[str, Any]:
-    return {"limit": limit, "offset": offset, "returned": count}
+def _build_pagination(result: Dict[str, Any], limit: int, offset: int, count: int) -> Dict[str, Any]:
+    """Paginación de la consulta (``next_cursor`` incluido) con el conteo ya filtrado."""
+    pagination = dict(result.get("pagination") or {"limit": limit, "offset": offset})
+    pagination["returned"] = count
+    return pagination
+
+
+def _raise_for_result(result: Dict[str, Any]) -> None:
+    if not result["success"]:
+        raise HTTPException(
+            status_code=result.get("status_code", 500),
+            detail=result.get("error", "Error desconocido"),
+        )
 
 
 def _filter_records_by_centro(
@@ -97,6 +108,7 @@ async def get_proyectos_all(
     request: Request,
     limit: int = Query(200, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior (reemplaza a offset)"),
     campos: Optional[str] = Query(None, description="Campos separados por coma"),
     current_user: dict = Depends(require_resource("proyectos", "read")),
 ):
@@ -109,14 +121,13 @@ async def get_proyectos_all(
         effective_centro = enforce_resource_access(current_user, "read:proyectos", None)
         if effective_centro:
             result = await get_proyectos_presupuestales_by_centro_gestor(
-                effective_centro, limit=limit, offset=offset
+                effective_centro, limit=limit, offset=offset, cursor=cursor
             )
         else:
             result = await get_proyectos_presupuestales(
-                limit=limit, offset=offset if offset > 0 else None
+                limit=limit, offset=offset if offset > 0 else None, cursor=cursor
             )
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "Error desconocido"))
+        _raise_for_result(result)
 
         data = _apply_field_filter(result["data"], campos)
         return {
@@ -125,7 +136,7 @@ async def get_proyectos_all(
             "count": len(data),
             "collection": result.get("collection"),
             "timestamp": result.get("timestamp"),
-            "pagination": _build_pagination(limit, offset, len(data)),
+            "pagination": _build_pagination(result, limit, offset, len(data)),
             "message": f"Se obtuvieron {len(data)} proyectos presupuestales",
         }
     except HTTPException:
@@ -139,6 +150,7 @@ async def get_proyectos_by_bpin(
     bpin: str,
     limit: int = Query(200, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior (reemplaza a offset)"),
     campos: Optional[str] = Query(None),
     current_user: dict = Depends(require_resource("proyectos", "read")),
 ):
@@ -146,9 +158,8 @@ async def get_proyectos_by_bpin(
     _check_availability()
     try:
         effective_centro = enforce_resource_access(current_user, "read:proyectos", None)
-        result = await get_proyectos_presupuestales_by_bpin(bpin, limit=limit, offset=offset)
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "Error desconocido"))
+        result = await get_proyectos_presupuestales_by_bpin(bpin, limit=limit, offset=offset, cursor=cursor)
+        _raise_for_result(result)
 
         data = _filter_records_by_centro(result["data"], effective_centro)
         data = _apply_field_filter(data, campos)
@@ -159,7 +170,7 @@ async def get_proyectos_by_bpin(
             "collection": result.get("collection"),
             "filter": result.get("filter"),
             "timestamp": result.get("timestamp"),
-            "pagination": _build_pagination(limit, offset, len(data)),
+            "pagination": _build_pagination(result, limit, offset, len(data)),
             "message": f"Se encontraron {len(data)} proyectos con BPIN '{bpin}'",
         }
     except HTTPException:
@@ -173,6 +184,7 @@ async def get_proyectos_by_bp(
     bp: str,
     limit: int = Query(200, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior (reemplaza a offset)"),
     campos: Optional[str] = Query(None),
     current_user: dict = Depends(require_resource("proyectos", "read")),
 ):
@@ -180,9 +192,8 @@ async def get_proyectos_by_bp(
     _check_availability()
     try:
         effective_centro = enforce_resource_access(current_user, "read:proyectos", None)
-        result = await get_proyectos_presupuestales_by_bp(bp, limit=limit, offset=offset)
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "Error desconocido"))
+        result = await get_proyectos_presupuestales_by_bp(bp, limit=limit, offset=offset, cursor=cursor)
+        _raise_for_result(result)
 
         data = _filter_records_by_centro(result["data"], effective_centro)
         data = _apply_field_filter(data, campos)
@@ -193,7 +204,7 @@ async def get_proyectos_by_bp(
             "collection": result.get("collection"),
             "filter": result.get("filter"),
             "timestamp": result.get("timestamp"),
-            "pagination": _build_pagination(limit, offset, len(data)),
+            "pagination": _build_pagination(result, limit, offset, len(data)),
             "message": f"Se encontraron {len(data)} proyectos con BP '{bp}'",
         }
     except HTTPException:
@@ -207,6 +218,7 @@ async def get_proyectos_by_centro_gestor(
     nombre_centro_gestor: str,
     limit: int = Query(200, ge=1, le=5000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior (reemplaza a offset)"),
     campos: Optional[str] = Query(None),
     current_user: dict = Depends(require_resource("proyectos", "read")),
 ):
@@ -223,10 +235,9 @@ async def get_proyectos_by_centro_gestor(
     target_centro = effective_centro or nombre_centro_gestor
     try:
         result = await get_proyectos_presupuestales_by_centro_gestor(
-            target_centro, limit=limit, offset=offset
+            target_centro, limit=limit, offset=offset, cursor=cursor
         )
-        if not result["success"]:
-            raise HTTPException(status_code=500, detail=result.get("error", "Error desconocido"))
+        _raise_for_result(result)
 
         data = _apply_field_filter(result["data"], campos)
         return {
@@ -236,7 +247,7 @@ async def get_proyectos_by_centro_gestor(
             "collection": result.get("collection"),
             "filter": result.get("filter"),
             "timestamp": result.get("timestamp"),
-            "pagination": _build_pagination(limit, offset, len(data)),
+            "pagination": _build_pagination(result, limit, offset, len(data)),
             "message": f"Se encontraron {len(data)} proyectos para '{nombre_centro_gestor}'",
         }
     except HTTPException:
@@ -19,8 +19,8 @@ import logging
 import os
 import re
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple, cast
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, cast
 from urllib.parse import urlparse
 from functools import lru_cache
 
@@ -42,11 +42,29 @@ from fastapi.responses import JSONResponse, StreamingResponse, Response
 from api.core.cache import (
     get_cache_key,
     get_from_cache,
+    get_or_compute,
     set_in_cache,
-    clear_cache_by_prefix,
+    invalidate_tags,
 )
+from api.core.jobs import JobContext, JobFailed, job_accepted_response, job_handler, submit_job
 from api.core.responses import clean_firebase_data, create_utf8_response
+from api.scripts.secop_mirror import lookup_secop_mirror
+from api.scripts.unidades_proyecto_import import (
+    AUDIT_COLLECTION,
+    ImportBatchWriter,
+    ImportWrite,
+    intervencion_dedup_key,
+    prefetch_existing_upids,
+    prefetch_intervenciones,
+)
+from api.scripts.unidades_proyecto_snapshot import (
+    get_intervenciones_snapshot,
+    get_unidades_snapshot,
+    invalidate_unidades_snapshots,
+)
 from api.core.security import optional_rate_limit
+from api.utils.s3_clients import get_presigned_url_signer
+from api.utils.s3_uploads import S3UploadService, UploadRequest, normalize_images
 from auth_system.decorators import require_unidades, enforce_unidades_access
 from auth_system.centros_catalog import canonicalize_centro
 from auth_system.centro_scoping import scope_records_by_centro
@@ -55,6 +73,10 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["Unidades de Proyecto"])
 
+# Tag del caché de servidor para todo lo derivado de UP/intervenciones
+# (dashboard, init-360, lookup de intervenciones); ver _invalidate_unidades_cache.
+_UNIDADES_CACHE_TAG = "unidades_proyecto"
+
 # ---------------------------------------------------------------------------
 # Rutas a basemaps (corregido: viven en back/basemaps, no en back/api/routers/basemaps)
 # ---------------------------------------------------------------------------
@@ -77,6 +99,9 @@ except Exception:
     PROJECT_ID = os.getenv("FIREBASE_PROJECT_ID", "NOT_CONFIGURED")
     get_firestore_client = lambda: None
 
+from database.firestore_repository import fetch_page, run_blocking, stream_collection
+from database.pagination import InvalidCursorError, cursor_matches
+
 # ---------------------------------------------------------------------------
 # Scripts — importación segura
 # ---------------------------------------------------------------------------
@@ -135,6 +160,16 @@ except Exception:
     shapely_shape = None
     ShapelyPoint = None
 
+try:
+    from api.scripts.basemap_engine import (
+        SHAPELY_AVAILABLE as BASEMAP_ENGINE_AVAILABLE,
+        enrich_geometries,
+        lookup_containing,
+        lookup_proyectos_estrategicos,
+    )
+except Exception:
+    BASEMAP_ENGINE_AVAILABLE = False
+
 # ---------------------------------------------------------------------------
 # Tipos Firebase y helpers de casting
 # ---------------------------------------------------------------------------
@@ -271,33 +306,16 @@ def _delete_s3_objects_batch(s3_client, object_pairs: set) -> tuple:
     return deleted, failed
 
 
-@lru_cache(maxsize=6)
-def _get_s3_client_for_presign_cached(credentials_path: str = ""):
-    try:
-        if not BOTO3_AVAILABLE:
-            return None
-        manager = S3DocumentManager(credentials_path=credentials_path or None)
-        return manager.s3_client
-    except Exception:
-        return None
-
-
 def _generate_presigned_s3_url(
     bucket: str, key: str, credentials_path: str = ""
 ) -> Optional[str]:
-    if not _s3_presigned_enabled() or not bucket or not key:
+    """Firma con el cliente S3 compartido; la URL se reutiliza hasta poco antes de vencer."""
+    if not _s3_presigned_enabled() or not bucket or not key or not BOTO3_AVAILABLE:
         return None
-    try:
-        s3_client = _get_s3_client_for_presign_cached(credentials_path or "")
-        if s3_client is None:
-            return None
-        return s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": key},
-            ExpiresIn=_s3_presigned_expiration(),
-        )
-    except Exception:
+    signer = get_presigned_url_signer(credentials_path, _s3_presigned_expiration())
+    if signer is None:
         return None
+    return signer.sign(bucket, key)
 
 
 # ---------------------------------------------------------------------------
@@ -342,6 +360,9 @@ async def consultar_unidades_proyecto(
         None, ge=1, le=10000, description="Límite de registros"
     ),
     offset: Optional[int] = Query(None, ge=0, description="Offset para paginación"),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor de la página anterior (reemplaza a offset)"
+    ),
 ):
     """
     ##  Consultar Unidades de Proyecto
@@ -390,14 +411,17 @@ async def consultar_unidades_proyecto(
 
     ### Paginación
 
-    Use `limit` y `offset`:
+    Use `limit` y el `next_cursor` de la respuesta (cada página continúa tras
+    la anterior sin releer los documentos saltados):
     ```bash
     # Primera página (50 resultados)
-    GET /unidades-proyecto?limit=50&offset=0
+    GET /unidades-proyecto?limit=50
 
-    # Segunda página
-    GET /unidades-proyecto?limit=50&offset=50
+    # Siguiente página
+    GET /unidades-proyecto?limit=50&cursor=<next_cursor>
     ```
+    `offset` se mantiene por compatibilidad, pero Firestore lee y cobra cada
+    documento saltado.
 
     ### Ejemplos
 
@@ -480,18 +504,18 @@ async def consultar_unidades_proyecto(
 
         # Construir query optimizada
         logger.info(f" Construyendo query para unidades_proyecto...")
-        query = db.collection("unidades_proyecto")
+        where: List[Tuple[str, str, Any]] = []
 
         # Aplicar filtros
         filters_applied = 0
         active_filters = {}
 
         if upid:
-            query = query.where("upid", "==", upid)
+            where.append(("upid", "==", upid))
             filters_applied += 1
             active_filters["upid"] = upid
         if nombre_centro_gestor:
-            query = query.where("nombre_centro_gestor", "==", nombre_centro_gestor)
+            where.append(("nombre_centro_gestor", "==", nombre_centro_gestor))
             filters_applied += 1
             active_filters["nombre_centro_gestor"] = nombre_centro_gestor
         if estado:
@@ -501,41 +525,39 @@ async def consultar_unidades_proyecto(
             filters_applied += 1
             active_filters["estado"] = estado
         if tipo_intervencion:
-            query = query.where("tipo_intervencion", "==", tipo_intervencion)
+            where.append(("tipo_intervencion", "==", tipo_intervencion))
             filters_applied += 1
             active_filters["tipo_intervencion"] = tipo_intervencion
         if clase_up:
-            query = query.where("clase_up", "==", clase_up)
+            where.append(("clase_up", "==", clase_up))
             filters_applied += 1
             active_filters["clase_up"] = clase_up
         if tipo_equipamiento:
-            query = query.where("tipo_equipamiento", "==", tipo_equipamiento)
+            where.append(("tipo_equipamiento", "==", tipo_equipamiento))
             filters_applied += 1
             active_filters["tipo_equipamiento"] = tipo_equipamiento
         if comuna_corregimiento:
-            query = query.where("comuna_corregimiento", "==", comuna_corregimiento)
+            where.append(("comuna_corregimiento", "==", comuna_corregimiento))
             filters_applied += 1
             active_filters["comuna_corregimiento"] = comuna_corregimiento
         if barrio_vereda:
-            query = query.where("barrio_vereda", "==", barrio_vereda)
+            where.append(("barrio_vereda", "==", barrio_vereda))
             filters_applied += 1
             active_filters["barrio_vereda"] = barrio_vereda
         if frente_activo:
-            query = query.where("frente_activo", "==", frente_activo)
+            where.append(("frente_activo", "==", frente_activo))
             filters_applied += 1
             active_filters["frente_activo"] = frente_activo
         if fuente_financiacion:
-            query = query.where("fuente_financiacion", "==", fuente_financiacion)
+            where.append(("fuente_financiacion", "==", fuente_financiacion))
             filters_applied += 1
             active_filters["fuente_financiacion"] = fuente_financiacion
         if proyectos_estrategicos:
-            query = query.where(
-                "proyectos_estrategicos", "array_contains", proyectos_estrategicos
-            )
+            where.append(("proyectos_estrategicos", "array_contains", proyectos_estrategicos))
             filters_applied += 1
             active_filters["proyectos_estrategicos"] = proyectos_estrategicos
         if ano:
-            query = query.where("ano", "==", ano)
+            where.append(("ano", "==", ano))
             filters_applied += 1
             active_filters["ano"] = ano
 
@@ -545,16 +567,19 @@ async def consultar_unidades_proyecto(
         # truncamiento silencioso en colecciones grandes: registros recientes no
         # aparecían porque Firestore devuelve en orden interno, no cronológico.
         query_limit = min(limit or 500, 10000)
-        query = query.limit(query_limit)
-
-        # Aplicar offset si existe
-        if offset:
-            query = query.offset(offset)
 
-        logger.info(f" Ejecutando query (limit={query_limit}, offset={offset or 0})...")
+        logger.info(f" Ejecutando query (limit={query_limit}, offset={offset or 0}, cursor={bool(cursor)})...")
 
-        # Ejecutar query
-        docs = query.stream()
+        # Ejecutar query: keyset con start_after; offset solo sin cursor
+        page = await fetch_page(
+            "unidades_proyecto",
+            limit=query_limit,
+            where=where,
+            cursor=cursor,
+            offset=offset or 0,
+            db=db,
+        )
+        docs = page["docs"]
 
         # Procesar resultados de forma eficiente
         data = []
@@ -564,11 +589,7 @@ async def consultar_unidades_proyecto(
             doc_count += 1
             doc_dict = doc.to_dict()
 
-            # Optimización: Convertir timestamps solo si existen
-            if FIREBASE_TYPES_AVAILABLE:
-                for key, value in doc_dict.items():
-                    if isinstance(value, FIREBASE_DATETIME_TYPES):
-                        doc_dict[key] = value.isoformat()
+            # Los timestamps de Firestore los codifica create_utf8_response
 
             # Normalizar proyectos_estrategicos: string legacy → lista
             pe = doc_dict.get("proyectos_estrategicos")
@@ -636,13 +657,15 @@ async def consultar_unidades_proyecto(
             "success": True,
             "data": data,
             "count": len(data),
-            "has_more": len(data) == query_limit,
+            "has_more": page["has_more"],
+            "next_cursor": page["next_cursor"],
             "collection": "unidades_proyecto",
             "filters": {
                 "applied": filters_applied,
                 "active": active_filters,
                 "limit": query_limit,
                 "offset": offset or 0,
+                "cursor": cursor,
             },
             "performance": {
                 "query_time_seconds": round(elapsed_time, 3),
@@ -661,6 +684,8 @@ async def consultar_unidades_proyecto(
 
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {str(e)}")
     except Exception as e:
         logger.error(f"[ERROR] Error consultando unidades_proyecto: {str(e)}")
         raise HTTPException(
@@ -711,7 +736,9 @@ async def get_unidades_proyecto_dashboard_endpoint(
             current_user, "read:unidades", nombre_centro_gestor
         )
 
-    # F20: cache por filtros con TTL de 5 min.
+    # F20: cache por filtros con TTL de 5 min; los misses concurrentes
+    # comparten un solo cálculo y al vencer se sirve el valor anterior
+    # mientras se refresca en segundo plano.
     cache_key = get_cache_key(
         "unidades_proyecto_dashboard",
         estado=estado or "",
@@ -720,9 +747,6 @@ async def get_unidades_proyecto_dashboard_endpoint(
         comuna_corregimiento=comuna_corregimiento or "",
         barrio_vereda=barrio_vereda or "",
     )
-    cached_value, hit = get_from_cache(cache_key, max_age_seconds=300)
-    if hit:
-        return create_utf8_response(cached_value)
 
     try:
         from api.scripts import get_unidades_proyecto_dashboard
@@ -739,8 +763,12 @@ async def get_unidades_proyecto_dashboard_endpoint(
         if barrio_vereda:
             filters["barrio_vereda"] = barrio_vereda
 
-        result = await get_unidades_proyecto_dashboard(filters or None)
-        set_in_cache(cache_key, result)
+        result = await get_or_compute(
+            cache_key,
+            lambda: get_unidades_proyecto_dashboard(filters or None),
+            ttl_seconds=300,
+            tags=(_UNIDADES_CACHE_TAG,),
+        )
         return create_utf8_response(result)
 
     except HTTPException:
@@ -835,26 +863,44 @@ async def post_unidades_proyecto_calidad_datos_analizar(
         None,
         description="Filtrar análisis por centro gestor antes de persistir snapshot",
     ),
+    full: bool = Query(
+        False,
+        description="Reevaluar todos los registros y guardar un snapshot completo",
+    ),
 ):
-    """Genera y persiste un snapshot completo en colecciones quality para consulta controlada."""
+    """
+    Genera y persiste un snapshot completo en colecciones quality para consulta controlada.
+
+    El análisis corre como trabajo en segundo plano: responde `202` con `job_id`
+    y el resultado se consulta en `GET /jobs/{job_id}`. Es incremental: solo
+    se reevalúan y persisten los registros que cambiaron desde el último snapshot.
+    """
     if not FIREBASE_AVAILABLE:
         raise HTTPException(
             status_code=503, detail="Firebase no disponible - verifica las credenciales"
         )
 
+    current_user = getattr(request.state, "current_user", None) or {}
+    job, created = submit_job(
+        "unidades_calidad_analizar",
+        {"nombre_centro_gestor": nombre_centro_gestor, "full": full},
+        created_by=current_user.get("uid"),
+    )
+    return job_accepted_response(job, created)
+
+
+@job_handler("unidades_calidad_analizar")
+async def _job_calidad_analizar(ctx: JobContext, nombre_centro_gestor: Optional[str] = None, full: bool = False):
+    ctx.report({"etapa": "analizando"})
     try:
-        result = await generate_unidades_proyecto_quality_report(
+        return await generate_unidades_proyecto_quality_report(
             nombre_centro_gestor=nombre_centro_gestor,
             persist=True,
+            full=full,
         )
-        return create_utf8_response(result)
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"[ERROR] Error generando snapshot de calidad: {str(e)}")
-        raise HTTPException(
-            status_code=500, detail=f"Error generando snapshot de calidad: {str(e)}"
-        )
+        raise JobFailed(f"Error generando snapshot de calidad: {str(e)}")
 
 
 @router.get(
@@ -1234,18 +1280,16 @@ async def get_unidades_proyecto_init_360(
             current_user, "read:unidades", nombre_centro_gestor
         )
 
-    # F20: cache por (centro_gestor, limit, offset) con TTL de 5 min.
+    # F20: cache por (centro_gestor, limit, offset) con TTL de 5 min,
+    # con single-flight y stale-while-revalidate (ver get_or_compute).
     cache_key = get_cache_key(
         "init_360",
         nombre_centro_gestor=nombre_centro_gestor or "__ALL__",
         limit=limit,
         offset=offset,
     )
-    cached_value, hit = get_from_cache(cache_key, max_age_seconds=300)
-    if hit:
-        return create_utf8_response(cached_value)
 
-    try:
+    async def _build_init_360() -> Dict[str, Any]:
         # Conectar a Firestore
         db = get_firestore_client()
         if db is None:
@@ -1280,18 +1324,17 @@ async def get_unidades_proyecto_init_360(
 
         from api.scripts.unidades_proyecto import _calcular_estado
 
-        # Consultar colección con filtro opcional por centro gestor (F2 + F20).
-        query = db.collection("unidades_proyecto")
+        # Snapshot compartido con filtro opcional por centro gestor (F2 + F20).
+        docs = await get_unidades_snapshot().adocuments()
         if nombre_centro_gestor:
-            query = query.where("nombre_centro_gestor", "==", nombre_centro_gestor)
-        docs = query.stream()
+            docs = [
+                d for d in docs if d.get("nombre_centro_gestor") == nombre_centro_gestor
+            ]
 
         # Procesar documentos
         registros_filtrados = []
 
-        for doc in docs:
-            doc_data = doc.to_dict()
-
+        for doc_data in docs:
             # Extraer campos, buscando en el nivel raíz y en properties
             def get_field_value(field_name):
                 """Obtener valor del campo desde el documento o properties"""
@@ -1360,9 +1403,12 @@ async def get_unidades_proyecto_init_360(
             "fields_returned": campos_requeridos,
         }
 
-        # F20: cachear resultado (5 min)
-        set_in_cache(cache_key, response_data)
+        return response_data
 
+    try:
+        response_data = await get_or_compute(
+            cache_key, _build_init_360, ttl_seconds=300, tags=(_UNIDADES_CACHE_TAG,)
+        )
         return create_utf8_response(response_data)
 
     except HTTPException:
@@ -1413,6 +1459,9 @@ async def get_intervenciones_filtradas_endpoint(
     offset: int = Query(
         0, ge=0, description="Número de registros a omitir para paginación"
     ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor de la página anterior (reemplaza a offset)"
+    ),
 ):
     """
     ##  GET | Filtrar Intervenciones
@@ -1507,43 +1556,45 @@ async def get_intervenciones_filtradas_endpoint(
                         "tipo_equipamiento": ud.get("tipo_equipamiento")
                         or props.get("tipo_equipamiento"),
                     }
-            set_in_cache(_lookup_cache_key, unidades_props_lookup)
+            set_in_cache(
+                _lookup_cache_key, unidades_props_lookup, tags=(_UNIDADES_CACHE_TAG,)
+            )
 
-        query = db.collection("intervenciones_unidades_proyecto")
+        where: List[Tuple[str, str, Any]] = []
         if avance_obra is not None:
-            query = query.where("avance_obra", "==", avance_obra)
+            where.append(("avance_obra", "==", avance_obra))
         if bpin is not None:
-            query = query.where("bpin", "==", bpin)
+            where.append(("bpin", "==", bpin))
         if cantidad is not None:
-            query = query.where("cantidad", "==", cantidad)
+            where.append(("cantidad", "==", cantidad))
         if clase_up:
-            query = query.where("clase_up", "==", clase_up)
+            where.append(("clase_up", "==", clase_up))
         if fecha_fin:
-            query = query.where("fecha_fin", "==", fecha_fin)
+            where.append(("fecha_fin", "==", fecha_fin))
         if fecha_inicio:
-            query = query.where("fecha_inicio", "==", fecha_inicio)
+            where.append(("fecha_inicio", "==", fecha_inicio))
         if fuente_financiacion:
-            query = query.where("fuente_financiacion", "==", fuente_financiacion)
+            where.append(("fuente_financiacion", "==", fuente_financiacion))
         if identificador:
-            query = query.where("identificador", "==", identificador)
+            where.append(("identificador", "==", identificador))
         if intervencion_id:
-            query = query.where("intervencion_id", "==", intervencion_id)
+            where.append(("intervencion_id", "==", intervencion_id))
         if nombre_centro_gestor:
-            query = query.where("nombre_centro_gestor", "==", nombre_centro_gestor)
+            where.append(("nombre_centro_gestor", "==", nombre_centro_gestor))
         if presupuesto_base is not None:
-            query = query.where("presupuesto_base", "==", presupuesto_base)
+            where.append(("presupuesto_base", "==", presupuesto_base))
         if referencia_contrato:
-            query = query.where("referencia_contrato", "==", referencia_contrato)
+            where.append(("referencia_contrato", "==", referencia_contrato))
         if referencia_proceso:
-            query = query.where("referencia_proceso", "==", referencia_proceso)
+            where.append(("referencia_proceso", "==", referencia_proceso))
         if tipo_intervencion:
-            query = query.where("tipo_intervencion", "==", tipo_intervencion)
+            where.append(("tipo_intervencion", "==", tipo_intervencion))
         if unidad:
-            query = query.where("unidad", "==", unidad)
+            where.append(("unidad", "==", unidad))
         if upid:
-            query = query.where("upid", "==", upid)
+            where.append(("upid", "==", upid))
         if url_proceso:
-            query = query.where("url_proceso", "==", url_proceso)
+            where.append(("url_proceso", "==", url_proceso))
 
         fields = [
             "avance_obra",
@@ -1567,11 +1618,16 @@ async def get_intervenciones_filtradas_endpoint(
             "url_proceso",
         ]
 
-        query = query.select(fields)
-        if offset > 0:
-            query = query.offset(offset)
-        query = query.limit(limit)
-        docs = query.stream()
+        page = await fetch_page(
+            "intervenciones_unidades_proyecto",
+            limit=limit,
+            where=where,
+            select=fields,
+            cursor=cursor,
+            offset=offset,
+            db=db,
+        )
+        docs = page["docs"]
 
         filters_payload = {
             "avance_obra": avance_obra,
@@ -1594,20 +1650,6 @@ async def get_intervenciones_filtradas_endpoint(
             "url_proceso": url_proceso,
         }
 
-        should_convert = FIREBASE_TYPES_AVAILABLE
-        datetime_type = FIREBASE_DATETIME_TYPES
-
-        def normalize_value(value):
-            if should_convert and isinstance(value, datetime_type):
-                return value.isoformat()
-            if isinstance(value, dict):
-                for inner_key, inner_value in value.items():
-                    value[inner_key] = normalize_value(inner_value)
-                return value
-            if isinstance(value, list):
-                return [normalize_value(item) for item in value]
-            return value
-
         def coerce_float_value(value):
             if value is None or value == "":
                 return None
@@ -1630,8 +1672,6 @@ async def get_intervenciones_filtradas_endpoint(
         data = []
         for doc in docs:
             doc_data = doc.to_dict()
-            if should_convert:
-                doc_data = normalize_value(doc_data)
 
             record = {field: doc_data.get(field) for field in fields}
             record["intervencion_id"] = record.get("intervencion_id") or doc.id
@@ -1669,11 +1709,16 @@ async def get_intervenciones_filtradas_endpoint(
                 "filters": filters_payload,
                 "pagination": {
                     "limit": limit,
-                    "offset": offset,
+                    "offset": 0 if cursor else offset,
                     "returned": len(data),
+                    "cursor": cursor,
+                    "next_cursor": page["next_cursor"],
+                    "has_more": page["has_more"],
                 },
             }
         )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {str(e)}")
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error filtrando intervenciones: {str(e)}"
@@ -1746,10 +1791,7 @@ async def exportar_intervenciones_xlsx(
             )
 
         upid_location_map = {}
-        for unidad_doc in await asyncio.to_thread(
-            lambda: list(db.collection("unidades_proyecto").stream())
-        ):
-            unidad_data = unidad_doc.to_dict() or {}
+        for unidad_data in await get_unidades_snapshot().adocuments():
             props = (
                 unidad_data.get("properties", {})
                 if isinstance(unidad_data.get("properties"), dict)
@@ -1784,55 +1826,35 @@ async def exportar_intervenciones_xlsx(
                 return [normalize_for_excel(v) for v in value]
             return value
 
-        interv_query = db.collection("intervenciones_unidades_proyecto")
-        if avance_obra is not None:
-            interv_query = interv_query.where("avance_obra", "==", avance_obra)
-        if bpin is not None:
-            interv_query = interv_query.where("bpin", "==", bpin)
-        if cantidad is not None:
-            interv_query = interv_query.where("cantidad", "==", cantidad)
-        if clase_up:
-            interv_query = interv_query.where("clase_up", "==", clase_up)
-        # El estado es efímero (se deriva de avance_obra): no se filtra en Firestore
-        # sobre el valor crudo; se aplica client-side tras recalcular (ver loop).
-        if fecha_fin:
-            interv_query = interv_query.where("fecha_fin", "==", fecha_fin)
-        if fecha_inicio:
-            interv_query = interv_query.where("fecha_inicio", "==", fecha_inicio)
-        if fuente_financiacion:
-            interv_query = interv_query.where(
-                "fuente_financiacion", "==", fuente_financiacion
-            )
-        if identificador:
-            interv_query = interv_query.where("identificador", "==", identificador)
-        if intervencion_id:
-            interv_query = interv_query.where("intervencion_id", "==", intervencion_id)
-        if nombre_centro_gestor:
-            interv_query = interv_query.where(
-                "nombre_centro_gestor", "==", nombre_centro_gestor
-            )
-        if presupuesto_base is not None:
-            interv_query = interv_query.where(
-                "presupuesto_base", "==", presupuesto_base
-            )
-        if referencia_contrato:
-            interv_query = interv_query.where(
-                "referencia_contrato", "==", referencia_contrato
-            )
-        if referencia_proceso:
-            interv_query = interv_query.where(
-                "referencia_proceso", "==", referencia_proceso
-            )
-        if tipo_intervencion:
-            interv_query = interv_query.where(
-                "tipo_intervencion", "==", tipo_intervencion
-            )
-        if unidad:
-            interv_query = interv_query.where("unidad", "==", unidad)
-        if upid:
-            interv_query = interv_query.where("upid", "==", upid)
-        if url_proceso:
-            interv_query = interv_query.where("url_proceso", "==", url_proceso)
+        # Filtros de igualdad (mismas semánticas que where("campo", "==", valor)),
+        # evaluados sobre el snapshot compartido de intervenciones.
+        # El estado es efímero (se deriva de avance_obra): no se filtra sobre el
+        # valor crudo; se aplica tras recalcular (ver loop).
+        equality_filters = {
+            "avance_obra": avance_obra,
+            "bpin": bpin,
+            "cantidad": cantidad,
+            "clase_up": clase_up or None,
+            "fecha_fin": fecha_fin or None,
+            "fecha_inicio": fecha_inicio or None,
+            "fuente_financiacion": fuente_financiacion or None,
+            "identificador": identificador or None,
+            "intervencion_id": intervencion_id or None,
+            "nombre_centro_gestor": nombre_centro_gestor or None,
+            "presupuesto_base": presupuesto_base,
+            "referencia_contrato": referencia_contrato or None,
+            "referencia_proceso": referencia_proceso or None,
+            "tipo_intervencion": tipo_intervencion or None,
+            "unidad": unidad or None,
+            "upid": upid or None,
+            "url_proceso": url_proceso or None,
+        }
+        equality_filters = {k: v for k, v in equality_filters.items() if v is not None}
+        interv_docs = [
+            d
+            for d in await get_intervenciones_snapshot().adocuments()
+            if all(k in d and d[k] == v for k, v in equality_filters.items())
+        ]
 
         from api.scripts.unidades_proyecto import (
             _calcular_estado,
@@ -1842,8 +1864,8 @@ async def exportar_intervenciones_xlsx(
         estado_norm = _normalizar_estado(str(estado)) if estado else None
 
         export_rows = []
-        for interv_doc in await asyncio.to_thread(lambda: list(interv_query.stream())):
-            interv_data = interv_doc.to_dict() or {}
+        for interv_doc in interv_docs:
+            interv_data = dict(interv_doc)
 
             # Recalcular estado (efímero) desde avance_obra antes de proyectar el row
             # (avance_obra se excluye del export, por eso debe hacerse aquí).
@@ -2035,20 +2057,6 @@ async def get_avances_unidades_proyecto(
         )
         presign_cache: Dict[Tuple[str, str], str] = {}
 
-        should_convert = FIREBASE_TYPES_AVAILABLE
-        datetime_type = FIREBASE_DATETIME_TYPES
-
-        def normalize_value(value):
-            if should_convert and isinstance(value, datetime_type):
-                return value.isoformat()
-            if isinstance(value, dict):
-                for inner_key, inner_value in value.items():
-                    value[inner_key] = normalize_value(inner_value)
-                return value
-            if isinstance(value, list):
-                return [normalize_value(item) for item in value]
-            return value
-
         def _content_type_from_url(url: str) -> str:
             url_lower = (url or "").lower()
             if url_lower.endswith(
@@ -2247,8 +2255,6 @@ async def get_avances_unidades_proyecto(
                 )
 
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data = _normalize_avance_links(doc_data, doc.id)
 
             if (
@@ -2276,8 +2282,6 @@ async def get_avances_unidades_proyecto(
         data = []
         for doc in docs:
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data = _normalize_avance_links(doc_data, doc.id)
             if (
                 forced_centro is not None
@@ -2495,6 +2499,34 @@ async def eliminar_avance_unidades_proyecto(
         )
 
 
+async def _fetch_page_newest_first(
+    collection: str, page_args: Dict[str, Any]
+) -> Tuple[Dict[str, Any], bool]:
+    """
+    Página de solicitudes por ``created_at`` descendente; sin índice compuesto
+    en Firestore se pagina por documento, sin orden por fecha.
+
+    Returns:
+        ``(página, ordenada_por_fecha)``
+    """
+    # Un cursor emitido por la variante sin orden se sigue con esa variante:
+    # la ordenada lo rechazaría por ser de otra consulta
+    if cursor_matches(page_args.get("cursor"), collection, page_args["where"]):
+        return await fetch_page(collection, **page_args), False
+    try:
+        page = await fetch_page(
+            collection, order_by=[("created_at", "DESCENDING")], **page_args
+        )
+        return page, True
+    except InvalidCursorError:
+        raise
+    except Exception as e:
+        error_text = str(e).lower()
+        if "failed_precondition" in error_text or "index" in error_text:
+            return await fetch_page(collection, **page_args), False
+        raise
+
+
 @router.get(
     "/solicitudes_cambios_unidades_proyecto",
     tags=["Unidades de Proyecto"],
@@ -2510,6 +2542,9 @@ async def consultar_solicitudes_cambios_unidades_proyecto(
         None, ge=1, le=10000, description="Límite de registros"
     ),
     offset: Optional[int] = Query(None, ge=0, description="Offset para paginación"),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor de la página anterior (reemplaza a offset)"
+    ),
 ):
     if not FIREBASE_AVAILABLE:
         raise HTTPException(status_code=503, detail="Firebase not available")
@@ -2526,20 +2561,6 @@ async def consultar_solicitudes_cambios_unidades_proyecto(
 
         collection_ref = db.collection("solicitudes_cambios_unidades_proyecto")
 
-        should_convert = FIREBASE_TYPES_AVAILABLE
-        datetime_type = FIREBASE_DATETIME_TYPES
-
-        def normalize_value(value):
-            if should_convert and isinstance(value, datetime_type):
-                return value.isoformat()
-            if isinstance(value, dict):
-                for inner_key, inner_value in value.items():
-                    value[inner_key] = normalize_value(inner_value)
-                return value
-            if isinstance(value, list):
-                return [normalize_value(item) for item in value]
-            return value
-
         if doc_id:
             doc = _as_firestore_doc_snapshot(collection_ref.document(doc_id).get())
             if not doc.exists:
@@ -2548,8 +2569,6 @@ async def consultar_solicitudes_cambios_unidades_proyecto(
                 )
 
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data["id"] = doc.id
 
             if (
@@ -2576,50 +2595,23 @@ async def consultar_solicitudes_cambios_unidades_proyecto(
                 }
             )
 
-        query = collection_ref
+        where: List[Tuple[str, str, Any]] = []
         if upid:
-            query = query.where("upid", "==", upid)
-
-        order_applied = False
-        try:
-            import google.cloud.firestore
-
-            query = query.order_by(
-                "created_at", direction=google.cloud.firestore.Query.DESCENDING
-            )
-            order_applied = True
-        except Exception:
-            order_applied = False
+            where.append(("upid", "==", upid))
 
         query_limit = min(limit or 100, 10000)
-        query = query.limit(query_limit)
-
-        if offset:
-            query = query.offset(offset)
+        page_args = dict(
+            limit=query_limit, where=where, cursor=cursor, offset=offset or 0, db=db
+        )
 
-        try:
-            docs = query.stream()
-        except Exception as e:
-            error_text = str(e).lower()
-            if order_applied and (
-                "failed_precondition" in error_text or "index" in error_text
-            ):
-                fallback_query = collection_ref
-                if upid:
-                    fallback_query = fallback_query.where("upid", "==", upid)
-                fallback_query = fallback_query.limit(query_limit)
-                if offset:
-                    fallback_query = fallback_query.offset(offset)
-                docs = fallback_query.stream()
-                order_applied = False
-            else:
-                raise
+        page, order_applied = await _fetch_page_newest_first(
+            "solicitudes_cambios_unidades_proyecto", page_args
+        )
+        docs = page["docs"]
 
         data = []
         for doc in docs:
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data["id"] = doc.id
             if (
                 effective_centro
@@ -2638,13 +2630,18 @@ async def consultar_solicitudes_cambios_unidades_proyecto(
                     "doc_id": doc_id,
                     "upid": upid,
                     "limit": query_limit,
-                    "offset": offset or 0,
+                    "offset": 0 if cursor else offset or 0,
+                    "cursor": cursor,
                     "ordered_by": "created_at_desc" if order_applied else None,
                 },
+                "has_more": page["has_more"],
+                "next_cursor": page["next_cursor"],
             }
         )
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {str(e)}")
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -2670,6 +2667,9 @@ async def consultar_solicitudes_cambios_intervenciones(
         None, ge=1, le=10000, description="Límite de registros"
     ),
     offset: Optional[int] = Query(None, ge=0, description="Offset para paginación"),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor de la página anterior (reemplaza a offset)"
+    ),
 ):
     if not FIREBASE_AVAILABLE:
         raise HTTPException(status_code=503, detail="Firebase not available")
@@ -2686,20 +2686,6 @@ async def consultar_solicitudes_cambios_intervenciones(
 
         collection_ref = db.collection("solicitudes_cambios_intervenciones")
 
-        should_convert = FIREBASE_TYPES_AVAILABLE
-        datetime_type = FIREBASE_DATETIME_TYPES
-
-        def normalize_value(value):
-            if should_convert and isinstance(value, datetime_type):
-                return value.isoformat()
-            if isinstance(value, dict):
-                for inner_key, inner_value in value.items():
-                    value[inner_key] = normalize_value(inner_value)
-                return value
-            if isinstance(value, list):
-                return [normalize_value(item) for item in value]
-            return value
-
         if doc_id:
             doc = _as_firestore_doc_snapshot(collection_ref.document(doc_id).get())
             if not doc.exists:
@@ -2708,8 +2694,6 @@ async def consultar_solicitudes_cambios_intervenciones(
                 )
 
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data["id"] = doc.id
 
             if (
@@ -2737,56 +2721,25 @@ async def consultar_solicitudes_cambios_intervenciones(
                 }
             )
 
-        query = collection_ref
+        where: List[Tuple[str, str, Any]] = []
         if intervencion_id:
-            query = query.where("intervencion_id", "==", intervencion_id)
+            where.append(("intervencion_id", "==", intervencion_id))
         if upid:
-            query = query.where("upid", "==", upid)
-
-        order_applied = False
-        try:
-            import google.cloud.firestore
-
-            query = query.order_by(
-                "created_at", direction=google.cloud.firestore.Query.DESCENDING
-            )
-            order_applied = True
-        except Exception:
-            order_applied = False
+            where.append(("upid", "==", upid))
 
         query_limit = min(limit or 100, 10000)
-        query = query.limit(query_limit)
-
-        if offset:
-            query = query.offset(offset)
+        page_args = dict(
+            limit=query_limit, where=where, cursor=cursor, offset=offset or 0, db=db
+        )
 
-        try:
-            docs = query.stream()
-        except Exception as e:
-            error_text = str(e).lower()
-            if order_applied and (
-                "failed_precondition" in error_text or "index" in error_text
-            ):
-                fallback_query = collection_ref
-                if intervencion_id:
-                    fallback_query = fallback_query.where(
-                        "intervencion_id", "==", intervencion_id
-                    )
-                if upid:
-                    fallback_query = fallback_query.where("upid", "==", upid)
-                fallback_query = fallback_query.limit(query_limit)
-                if offset:
-                    fallback_query = fallback_query.offset(offset)
-                docs = fallback_query.stream()
-                order_applied = False
-            else:
-                raise
+        page, order_applied = await _fetch_page_newest_first(
+            "solicitudes_cambios_intervenciones", page_args
+        )
+        docs = page["docs"]
 
         data = []
         for doc in docs:
             doc_data = doc.to_dict() or {}
-            if should_convert:
-                doc_data = normalize_value(doc_data)
             doc_data["id"] = doc.id
             if (
                 effective_centro
@@ -2806,13 +2759,18 @@ async def consultar_solicitudes_cambios_intervenciones(
                     "intervencion_id": intervencion_id,
                     "upid": upid,
                     "limit": query_limit,
-                    "offset": offset or 0,
+                    "offset": 0 if cursor else offset or 0,
+                    "cursor": cursor,
                     "ordered_by": "created_at_desc" if order_applied else None,
                 },
+                "has_more": page["has_more"],
+                "next_cursor": page["next_cursor"],
             }
         )
     except HTTPException:
         raise
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=f"Cursor inválido: {str(e)}")
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -3222,12 +3180,13 @@ def _list_estrategicos_filenames(estrategicos_dir: str) -> tuple:
     )
 
 
-def _invalidate_unidades_cache() -> None:
+def _invalidate_unidades_cache(full_reload: bool = False) -> None:
     """Invalida entradas del cache de servidor relacionadas con unidades_proyecto.
-    Se llama tras cualquier mutación (crear, modificar, eliminar UP o intervención)."""
-    clear_cache_by_prefix("unidades_proyecto")
-    clear_cache_by_prefix("init_360")
-    clear_cache_by_prefix("intervenciones_unidades_lookup")
+    Se llama tras cualquier mutación (crear, modificar, eliminar UP o intervención).
+    ``full_reload=True`` fuerza recargar el snapshot completo (necesario tras
+    eliminaciones, que el refresco incremental por ``updated_at`` no detecta)."""
+    invalidate_tags(_UNIDADES_CACHE_TAG)
+    invalidate_unidades_snapshots(full=full_reload)
 
 
 def _buscar_en_geojson(
@@ -3236,8 +3195,14 @@ def _buscar_en_geojson(
     """Cruza una geometría GeoJSON con una capa y retorna la propiedad del polígono que la contiene.
     Acepta [lon, lat] (legacy) o un dict GeoJSON geometry de cualquier tipo.
     Para geometrías no-Point usa el centroide para determinar contención.
-    Usa _load_geojson_cached para evitar recargar el archivo en cada request."""
+    Delegado al motor de basemaps (STRtree con polígonos preparados, cargado una vez)."""
+    if not isinstance(point_coords_or_geometry, (dict, list, tuple)):
+        return None
     try:
+        if BASEMAP_ENGINE_AVAILABLE:
+            return lookup_containing(
+                geojson_path, property_name, [point_coords_or_geometry]
+            )[0]
         geojson_data = _load_geojson_cached(geojson_path)
         if isinstance(point_coords_or_geometry, dict) and point_coords_or_geometry.get(
             "type"
@@ -3265,8 +3230,17 @@ def _buscar_proyectos_estrategicos(geometry_input) -> list:
     """Intersecta una geometría GeoJSON con todos los GeoJSON en basemaps/proyectos_estrategicos/
     y retorna lista de Name coincidentes.
     Acepta [lon, lat] (legacy) o un dict GeoJSON geometry de cualquier tipo (Point, Polygon, LineString, etc.).
-    Usa _load_geojson_cached y _list_estrategicos_filenames para minimizar I/O de disco.
+    Delegado al motor de basemaps; sin Shapely 2 recorre los archivos cacheados.
     """
+    if BASEMAP_ENGINE_AVAILABLE:
+        try:
+            return lookup_proyectos_estrategicos(
+                [geometry_input], PROYECTOS_ESTRATEGICOS_DIR
+            )[0]
+        except Exception as e:
+            logger.warning(f"Error en _buscar_proyectos_estrategicos: {type(e).__name__}")
+            return []
+
     nombres = []
     estrategicos_dir = PROYECTOS_ESTRATEGICOS_DIR
     filenames = _list_estrategicos_filenames(estrategicos_dir)
@@ -3300,6 +3274,66 @@ def _buscar_proyectos_estrategicos(geometry_input) -> list:
     return nombres
 
 
+def _enriquecer_geometrias(geometries: List[Any]) -> List[Tuple[Optional[str], Optional[str], List[str]]]:
+    """Deriva (comuna_corregimiento, barrio_vereda, proyectos_estrategicos) para N geometrías.
+
+    Valida el CRS de cada geometría (las inválidas producen ``(None, None, [])``)
+    y cruza todas las válidas contra cada basemap en una sola consulta vectorizada.
+    """
+    results: List[Tuple[Optional[str], Optional[str], List[str]]] = [
+        (None, None, []) for _ in geometries
+    ]
+    valid_positions: List[int] = []
+    for idx, geometry in enumerate(geometries):
+        if not (
+            isinstance(geometry, dict)
+            and geometry.get("type")
+            and geometry.get("coordinates")
+        ):
+            continue
+        try:
+            _validate_crs_coords(_normalizar_geometry(geometry))
+        except HTTPException as geo_err:
+            logger.warning("geometría %d fuera de CRS: %s", idx, geo_err.detail)
+            continue
+        valid_positions.append(idx)
+
+    if not valid_positions:
+        return results
+
+    valid_geometries = [geometries[i] for i in valid_positions]
+    if BASEMAP_ENGINE_AVAILABLE:
+        try:
+            enriched = [
+                (e["comuna_corregimiento"], e["barrio_vereda"], e["proyectos_estrategicos"])
+                for e in enrich_geometries(valid_geometries)
+            ]
+        except Exception as geo_err:
+            logger.warning("Error enriqueciendo geometrías por lote: %s", geo_err)
+            return results
+    else:
+        enriched = [
+            (
+                _buscar_en_geojson(
+                    os.path.join(BASEMAPS_DIR, "comunas_corregimientos.geojson"),
+                    "comuna_corregimiento",
+                    geometry,
+                ),
+                _buscar_en_geojson(
+                    os.path.join(BASEMAPS_DIR, "barrios_veredas.geojson"),
+                    "barrio_vereda",
+                    geometry,
+                ),
+                _buscar_proyectos_estrategicos(geometry),
+            )
+            for geometry in valid_geometries
+        ]
+
+    for idx, values in zip(valid_positions, enriched):
+        results[idx] = values
+    return results
+
+
 @router.post(
     "/crear_unidad_proyecto",
     tags=["Unidades de Proyecto"],
@@ -3381,7 +3415,7 @@ async def crear_unidad_proyecto(
         collections_to_scan = ["unidades_proyecto"]
 
         for collection_name in collections_to_scan:
-            docs = db.collection(collection_name).select(["upid"]).stream()
+            docs = await stream_collection(collection_name, select=["upid"], db=db)
             for doc in docs:
                 doc_data = doc.to_dict() or {}
                 upid_number = extract_upid_number(doc_data.get("upid"))
@@ -3427,7 +3461,7 @@ async def crear_unidad_proyecto(
         unidad_payload["upid"] = new_upid
         unidad_payload["proyectos_estrategicos"] = proyectos_estrategicos
         unidad_payload["created_at"] = now_iso
-        unidad_payload["updated_at"] = now_iso
+        unidad_payload["updated_at"] = datetime.now(timezone.utc)
         unidad_payload["created_by"] = current_user.get("uid")
 
         db.collection("unidades_proyecto").document(new_upid).set(unidad_payload)
@@ -3597,7 +3631,7 @@ async def crear_intervencion(
         intervencion_payload["upid"] = upid_value
         intervencion_payload["intervencion_id"] = new_intervencion_id
         intervencion_payload["created_at"] = now_iso
-        intervencion_payload["updated_at"] = now_iso
+        intervencion_payload["updated_at"] = datetime.now(timezone.utc)
         intervencion_payload["created_by"] = current_user.get("uid")
 
         doc_id = str(uuid.uuid4())
@@ -3821,8 +3855,7 @@ async def modificar_unidad_proyecto(
 
         changes_to_apply = dict(changes)
         if aprobado:
-            now_iso = datetime.now().isoformat()
-            changes_to_apply["updated_at"] = now_iso
+            changes_to_apply["updated_at"] = datetime.now(timezone.utc)
             doc_ref.update(changes_to_apply)
 
         updated_data = dict(previous_data)
@@ -3954,8 +3987,7 @@ async def modificar_intervencion(
 
         changes_to_apply = dict(changes)
         if aprobado:
-            now_iso = datetime.now().isoformat()
-            changes_to_apply["updated_at"] = now_iso
+            changes_to_apply["updated_at"] = datetime.now(timezone.utc)
             doc.reference.update(changes_to_apply)
 
         updated_data = dict(previous_data)
@@ -4124,7 +4156,7 @@ async def eliminar_unidad_proyecto(
                     audit_err,
                 )
 
-        _invalidate_unidades_cache()
+        _invalidate_unidades_cache(full_reload=True)
         return create_utf8_response(
             {
                 "deleted": True,
@@ -4257,7 +4289,7 @@ async def eliminar_intervencion(
                     audit_err,
                 )
 
-        _invalidate_unidades_cache()
+        _invalidate_unidades_cache(full_reload=True)
         return create_utf8_response(
             {
                 "deleted": True,
@@ -4313,10 +4345,8 @@ async def registrar_avance_up(
         raise HTTPException(status_code=503, detail="Firebase or scripts not available")
 
     try:
-        import io
         import unicodedata
         import mimetypes
-        from PIL import Image, UnidentifiedImageError
         from api.utils.s3_document_manager import S3DocumentManager, BOTO3_AVAILABLE
 
         if not BOTO3_AVAILABLE:
@@ -4510,36 +4540,33 @@ async def registrar_avance_up(
                     }
                 )
 
-        def _process_and_upload_soporte(item: Dict[str, Any]) -> Dict[str, Any]:
+        # Imágenes: miniatura JPEG en el pool de procesos (las idénticas, una vez)
+        normalized_images = iter(
+            await normalize_images(
+                [item["file_bytes"] for item in soporte_items if item["is_image"]]
+            )
+        )
+
+        prepared: List[Tuple[Dict[str, Any], Dict[str, Any], UploadRequest]] = []
+        for item in soporte_items:
             original_name = item["original_name"]
             ext_lower = item["ext_lower"]
-            is_image = item["is_image"]
-            file_bytes = item["file_bytes"]
-            indice = item["indice"]
 
-            if is_image:
-                try:
-                    image = Image.open(io.BytesIO(file_bytes))
-                except UnidentifiedImageError:
-                    raise ValueError(
-                        f"No se reconoce como imagen válida: {original_name}"
+            if item["is_image"]:
+                upload_bytes = next(normalized_images)
+                if isinstance(upload_bytes, Exception):
+                    fallidos.append(
+                        {
+                            "indice": item["indice"],
+                            "filename": original_name,
+                            "error": (
+                                f"No se reconoce como imagen válida: {original_name}"
+                                if isinstance(upload_bytes, ValueError)
+                                else str(upload_bytes)
+                            ),
+                        }
                     )
-
-                if image.mode != "RGB":
-                    image = image.convert("RGB")
-
-                image.thumbnail((1280, 1280), Image.Resampling.LANCZOS)
-
-                buf = io.BytesIO()
-                image.save(
-                    buf,
-                    format="JPEG",
-                    quality=72,
-                    optimize=True,
-                    progressive=True,
-                    subsampling=2,
-                )
-                upload_bytes = buf.getvalue()
+                    continue
                 content_type = "image/jpeg"
                 s3_filename = f"{intervencion_id}_{ts_safe}_{item['img_seq']:03d}.jpg"
                 s3_key = f"{photos_folder}{s3_filename}"
@@ -4551,7 +4578,7 @@ async def registrar_avance_up(
                     mimetypes.guess_type(original_name)[0]
                     or "application/octet-stream",
                 )
-                upload_bytes = file_bytes
+                upload_bytes = item["file_bytes"]
                 base_name = safe_s3_name(os.path.splitext(original_name)[0])
                 s3_filename = f"{intervencion_id}_{ts_safe}_{item['doc_seq']:03d}_{base_name}{ext_lower}"
                 s3_key = f"{docs_folder}{s3_filename}"
@@ -4562,13 +4589,21 @@ async def registrar_avance_up(
                 )
                 soporte_tipo = "documento"
 
-            s3_client.put_object(
-                Bucket=bucket,
-                Key=s3_key,
-                Body=upload_bytes,
-                ContentType=content_type,
-                ContentDisposition=content_disposition,
-                Metadata={
+            record = {
+                "indice": item["indice"],
+                "tipo": soporte_tipo,
+                "nombre_original": original_name,
+                "extension": ext_lower,
+                "content_type": content_type,
+                "bucket": bucket,
+            }
+            upload_request = UploadRequest(
+                bucket=bucket,
+                key=s3_key,
+                body=upload_bytes,
+                content_type=content_type,
+                content_disposition=content_disposition,
+                metadata={
                     "intervencion-id": to_ascii_s3_metadata(
                         intervencion_id, "sin_intervencion"
                     ),
@@ -4582,46 +4617,35 @@ async def registrar_avance_up(
                     "tipo": soporte_tipo,
                 },
             )
+            prepared.append((item, record, upload_request))
 
-            url_directa = f"https://{bucket}.s3.amazonaws.com/{s3_key}"
-            url_presigned = None
-            if _s3_presigned_enabled():
-                try:
-                    url_presigned = s3_client.generate_presigned_url(
-                        "get_object",
-                        Params={"Bucket": bucket, "Key": s3_key},
-                        ExpiresIn=presigned_expiration,
-                    )
-                except Exception:
-                    url_presigned = None
-            final_url = url_presigned or url_directa
-            return {
-                "indice": indice,
-                "tipo": soporte_tipo,
-                "nombre_original": original_name,
-                "extension": ext_lower,
-                "content_type": content_type,
-                "bucket": bucket,
-                "s3_key": s3_key,
-                "url_directa": url_directa,
-                "url_presigned": url_presigned,
-                "url": final_url,
-                "uploaded_at": now_iso,
-            }
-
+        # Subidas concurrentes (multipart si el archivo es grande); un archivo
+        # repetido en el mismo registro se sube una sola vez
         max_parallel_uploads = int(
             os.getenv("REGISTRAR_AVANCE_UP_UPLOAD_CONCURRENCY", "4")
         )
-        upload_semaphore = asyncio.Semaphore(max(1, max_parallel_uploads))
-
-        async def _run_upload(item: Dict[str, Any]) -> Dict[str, Any]:
-            async with upload_semaphore:
-                return await asyncio.to_thread(_process_and_upload_soporte, item)
-
-        upload_tasks = [_run_upload(item) for item in soporte_items]
-        upload_results = await asyncio.gather(*upload_tasks, return_exceptions=True)
+        upload_results = await S3UploadService(
+            s3_client, workers=max_parallel_uploads
+        ).upload_many_async([upload_request for _, _, upload_request in prepared])
+
+        signer = (
+            get_presigned_url_signer(credentials_path, presigned_expiration)
+            if _s3_presigned_enabled()
+            else None
+        )
+        presigned_urls = (
+            signer.sign_many(
+                [
+                    (result["bucket"], result["key"])
+                    for result in upload_results
+                    if not isinstance(result, Exception)
+                ]
+            )
+            if signer is not None
+            else {}
+        )
 
-        for item, result in zip(soporte_items, upload_results):
+        for (item, record, _), result in zip(prepared, upload_results):
             if isinstance(result, Exception):
                 fallidos.append(
                     {
@@ -4632,11 +4656,24 @@ async def registrar_avance_up(
                 )
                 continue
 
-            soportes_registros.append(result)
-            if result["tipo"] == "imagen":
-                imagenes_urls.append(result["url"])
+            s3_key = result["key"]
+            url_directa = f"https://{bucket}.s3.amazonaws.com/{s3_key}"
+            url_presigned = presigned_urls.get((bucket, s3_key))
+            final_url = url_presigned or url_directa
+            record.update(
+                {
+                    "s3_key": s3_key,
+                    "url_directa": url_directa,
+                    "url_presigned": url_presigned,
+                    "url": final_url,
+                    "uploaded_at": now_iso,
+                }
+            )
+            soportes_registros.append(record)
+            if record["tipo"] == "imagen":
+                imagenes_urls.append(final_url)
             else:
-                documentos_urls.append(result["url"])
+                documentos_urls.append(final_url)
 
         soportes_registros.sort(key=lambda x: x.get("indice", 0))
 
@@ -4682,8 +4719,9 @@ async def registrar_avance_up(
         )
         if interv_docs:
             interv_docs[0].reference.update(
-                {"avance_obra": avance_obra, "updated_at": now_iso}
+                {"avance_obra": avance_obra, "updated_at": now.astimezone(timezone.utc)}
             )
+            _invalidate_unidades_cache()
 
         return create_utf8_response(
             {
@@ -4777,6 +4815,9 @@ async def sincronizar_links_secop_intervenciones(request: Request):
     ```
 
     ###  Respuesta:
+    La sincronización corre como trabajo en segundo plano: responde `202` con
+    `job_id` y `status_url`. `GET /jobs/{job_id}` muestra el avance por lote y,
+    al terminar, el resumen en `result`:
     ```json
     {
         "success": true,
@@ -4795,16 +4836,28 @@ async def sincronizar_links_secop_intervenciones(request: Request):
         raise HTTPException(status_code=503, detail="Firebase not available")
 
     try:
-        from sodapy import Socrata
+        from sodapy import Socrata  # noqa: F401
     except ImportError:
         raise HTTPException(
             status_code=500,
             detail="sodapy no está disponible. Instala con: pip install sodapy",
         )
 
+    current_user = getattr(request.state, "current_user", None) or {}
+    job, created = submit_job(
+        "intervenciones_sincronizar_links_secop", {}, created_by=current_user.get("uid")
+    )
+    return job_accepted_response(job, created)
+
+
+@job_handler("intervenciones_sincronizar_links_secop")
+async def _job_sincronizar_links_secop(ctx: JobContext):
+    """Sincronización incremental de links SECOP (corre en un worker de trabajos)."""
+    from sodapy import Socrata
+
     db = get_firestore_client()
     if db is None:
-        raise HTTPException(status_code=503, detail="No se pudo conectar a Firestore")
+        raise JobFailed("No se pudo conectar a Firestore")
 
     import time as _time
 
@@ -4815,15 +4868,12 @@ async def sincronizar_links_secop_intervenciones(request: Request):
         10  # Consultas simultáneas a SECOP (aumentado con app_token autenticado)
     )
     PAUSA_ENTRE_LOTES = 0.2  # Segundos de espera entre lotes (reducido con app_token)
-    TIMEOUT_INTERNO = (
-        540.0  # 9 minutos — detenerse antes del timeout del middleware (600s)
-    )
     _inicio_total = _time.monotonic()
 
     # ── 1. Cargar estado actual de la colección de links ─────────────────────
     links_col = db.collection("intervenciones_unidades_proyecto_links")
     links_existentes: Dict[str, Dict[str, Any]] = {}
-    for doc in await asyncio.to_thread(lambda: list(links_col.stream())):
+    for doc in await stream_collection("intervenciones_unidades_proyecto_links", db=db):
         data = doc.to_dict() or {}
         intervencion_id_key = data.get("intervencion_id") or doc.id
         links_existentes[intervencion_id_key] = {
@@ -4835,9 +4885,7 @@ async def sincronizar_links_secop_intervenciones(request: Request):
         }
 
     # ── 2. Cargar intervenciones ──────────────────────────────────────────────
-    intervenciones_docs = await asyncio.to_thread(
-        lambda: list(db.collection("intervenciones_unidades_proyecto").stream())
-    )
+    intervenciones_docs = await stream_collection("intervenciones_unidades_proyecto", db=db)
 
     # ── 3. Filtrar cuáles necesitan procesarse (lógica incremental) ──────────
     a_procesar = []
@@ -4963,7 +5011,10 @@ async def sincronizar_links_secop_intervenciones(request: Request):
         return ""
 
     def _buscar_en_dataset_sync(dataset: str, campo_where: str, referencia: str) -> str:
-        """Consulta urlproceso en un dataset SECOP específico."""
+        """Consulta urlproceso en un dataset SECOP específico (mirror local primero)."""
+        results = lookup_secop_mirror(dataset, campo_where, referencia, limit=1)
+        if results is not None:
+            return _extraer_url(results[0].get("urlproceso")) if results else ""
         try:
             client = Socrata(
                 SECOP_DOMAIN, os.environ.get("SOCRATA_APP_TOKEN"), timeout=30
@@ -5104,14 +5155,13 @@ async def sincronizar_links_secop_intervenciones(request: Request):
 
     try:
         for lote_inicio in range(0, len(a_procesar), MAX_PARALELO):
-            # ── Verificar si queda tiempo suficiente antes de iniciar otro lote ──
-            elapsed = _time.monotonic() - _inicio_total
-            if elapsed >= TIMEOUT_INTERNO:
+            # ── Detenerse entre lotes si se pidió cancelar el trabajo ──
+            if ctx.cancelled:
                 completado = False
                 pendientes = len(a_procesar) - lote_inicio
-                motivo_corte = f"Tiempo límite interno alcanzado ({elapsed:.1f}s/{TIMEOUT_INTERNO}s)"
+                motivo_corte = "Cancelado por el usuario"
                 logger.warning(
-                    f"⏱ {motivo_corte}. Guardados hasta ahora: {nuevos} nuevos, {actualizados} actualizados."
+                    f"⏹ {motivo_corte}. Guardados hasta ahora: {nuevos} nuevos, {actualizados} actualizados."
                 )
                 break
 
@@ -5168,6 +5218,15 @@ async def sincronizar_links_secop_intervenciones(request: Request):
 
             lotes_procesados += 1
             pendientes = len(a_procesar) - (lote_inicio + len(lote))
+            ctx.report(
+                progress={
+                    "total_a_procesar": len(a_procesar),
+                    "procesados": nuevos + actualizados + errores,
+                    "pendientes": pendientes,
+                    "lotes_procesados": lotes_procesados,
+                },
+                partial={"nuevos": nuevos, "actualizados": actualizados, "errores": errores},
+            )
 
             # Pausa entre lotes para respetar rate limits de SECOP sin app_token
             if lote_inicio + MAX_PARALELO < len(a_procesar):
@@ -5182,31 +5241,29 @@ async def sincronizar_links_secop_intervenciones(request: Request):
     elapsed_total = round(_time.monotonic() - _inicio_total, 2)
     procesados_efectivos = nuevos + actualizados + errores
 
-    return create_utf8_response(
-        {
-            "success": completado and errores == 0,
-            "completado": completado,
-            "motivo_corte": motivo_corte,
-            "total_a_procesar": len(a_procesar),
-            "procesados": procesados_efectivos,
-            "pendientes": pendientes if not completado else 0,
-            "omitidos_sin_cambios": omitidos_sin_cambios,
-            "omitidos_sin_referencias": omitidos_sin_referencias,
-            "nuevos": nuevos,
-            "actualizados": actualizados,
-            "errores": errores,
-            "llamadas_secop_ahorradas": llamadas_secop_ahorradas,
-            "lotes_procesados": lotes_procesados,
-            "tiempo_ejecucion_seg": elapsed_total,
-            "detalles_errores": detalles_errores[:50],
-            "timestamp": datetime.now().isoformat(),
-            "nota": (
-                "Ejecución parcial — vuelva a llamar para continuar con los pendientes (carga incremental)."
-                if not completado
-                else "Sincronización completa."
-            ),
-        }
-    )
+    return {
+        "success": completado and errores == 0,
+        "completado": completado,
+        "motivo_corte": motivo_corte,
+        "total_a_procesar": len(a_procesar),
+        "procesados": procesados_efectivos,
+        "pendientes": pendientes if not completado else 0,
+        "omitidos_sin_cambios": omitidos_sin_cambios,
+        "omitidos_sin_referencias": omitidos_sin_referencias,
+        "nuevos": nuevos,
+        "actualizados": actualizados,
+        "errores": errores,
+        "llamadas_secop_ahorradas": llamadas_secop_ahorradas,
+        "lotes_procesados": lotes_procesados,
+        "tiempo_ejecucion_seg": elapsed_total,
+        "detalles_errores": detalles_errores[:50],
+        "timestamp": datetime.now().isoformat(),
+        "nota": (
+            "Ejecución parcial — vuelva a llamar para continuar con los pendientes (carga incremental)."
+            if not completado
+            else "Sincronización completa."
+        ),
+    }
 
 
 # ============================================================================
@@ -5943,41 +6000,89 @@ async def importar_up_validar(
     return create_utf8_response(response)
 
 
-@router.post(
-    "/unidades-proyecto/importar/ejecutar",
-    tags=["Unidades de Proyecto"],
-    summary="POST | Importar features geoespaciales a Firestore",
-    dependencies=[Depends(require_unidades("write"))],
-)
-@optional_rate_limit("5/minute")
-async def importar_up_ejecutar(
-    request: Request,
-    body: ImportarGeoRequest,
-):
-    """
-    Importa features geoespaciales ya validados a Firestore.
-    Reutiliza la misma lógica de auto-generación de IDs, detección de
-    comuna/barrio/proyectos estratégicos que los endpoints de creación individuales.
-    """
-    if not FIREBASE_AVAILABLE:
-        raise HTTPException(status_code=503, detail="Firebase not available")
+# Tareas de importación en modo streaming: se mantienen referenciadas hasta
+# terminar para que una desconexión del cliente no las interrumpa a medias.
+_import_tasks: set = set()
 
-    current_user = getattr(request.state, "current_user", None)
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="No autenticado")
 
-    if body.entity_type not in ("unidad_proyecto", "intervencion", "combinado"):
-        raise HTTPException(status_code=400, detail="entity_type debe ser 'unidad_proyecto', 'intervencion' o 'combinado'")
+async def _ejecutar_importacion(
+    body: ImportarGeoRequest,
+    current_user: Dict[str, Any],
+    db,
+    progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Dict[str, Any]:
+    """Pipeline de ``/unidades-proyecto/importar/ejecutar``.
 
-    db = get_firestore_client()
-    if db is None:
-        raise HTTPException(status_code=503, detail="No se pudo conectar a Firestore")
+    Etapas: mapeo y validación → prefetch de UPs e intervenciones existentes
+    (consultas ``in`` por lotes) → enriquecimiento geoespacial en una pasada →
+    planificación de escrituras → WriteBatches de ``IMPORT_WRITE_CHUNK_SIZE``
+    (UP, intervenciones y auditoría juntas). ``progress`` recibe un evento por
+    etapa y por batch confirmado.
+    """
+    def _report(stage: str, **extra: Any) -> None:
+        if progress is not None:
+            progress({"event": "progress", "stage": stage, **extra})
 
-    created_ids: List[str] = []
     errors_by_feature: List[Dict[str, Any]] = []
     now_iso = datetime.now().isoformat()
+    # updated_at como timestamp UTC: el snapshot lo usa como marca de agua
+    updated_at = datetime.now(timezone.utc)
+    combinado = body.entity_type == "combinado"
 
-    # Pre-cargar el max upid actual una sola vez (para batch eficiente)
+    # 1) Mapear filas (+ centro gestor global + RBAC) y validar
+    mapped_rows: List[Optional[Dict[str, Any]]] = []
+    for idx, feat in enumerate(body.features):
+        mapped = _apply_mapping_to_properties(feat.properties, body.column_mapping)
+        if not mapped.get("nombre_centro_gestor") and body.nombre_centro_gestor_global:
+            mapped["nombre_centro_gestor"] = body.nombre_centro_gestor_global
+        try:
+            effective_centro = enforce_unidades_access(
+                current_user, "write:unidades", mapped.get("nombre_centro_gestor")
+            )
+        except Exception as feat_err:
+            # En modo combinado un centro no permitido rechaza toda la importación
+            if combinado:
+                raise
+            errors_by_feature.append({
+                "feature_index": idx,
+                "errors": [f"Error procesando feature {idx + 1}: {str(feat_err)}"],
+            })
+            mapped_rows.append(None)
+            continue
+        if effective_centro:
+            mapped["nombre_centro_gestor"] = effective_centro
+        mapped_rows.append(mapped)
+
+    groups: List[Tuple[str, List[int]]] = []
+    if combinado:
+        for file_upid, indices in _group_indices_by_upid(mapped_rows):
+            group_errors = False
+            for idx in indices:
+                ferr = _validate_combinado_feature(mapped_rows[idx], idx)
+                if ferr:
+                    errors_by_feature.append({"feature_index": idx, "errors": ferr})
+                    group_errors = True
+            if not group_errors:
+                groups.append((file_upid, indices))
+    else:
+        validate = _validate_up_feature if body.entity_type == "unidad_proyecto" else _validate_intervencion_feature
+        for idx, mapped in enumerate(mapped_rows):
+            if mapped is None:
+                continue
+            feat_errors = validate(mapped, idx)
+            if feat_errors:
+                errors_by_feature.append({"feature_index": idx, "errors": feat_errors})
+            else:
+                groups.append((str(mapped.get("upid", "")).strip(), [idx]))
+    _report("validacion", total_features=len(body.features), error_count=len(errors_by_feature))
+
+    # 2) Prefetch: UPs e intervenciones existentes de todos los upid del archivo
+    file_upids = [upid for upid, _ in groups if upid] if body.entity_type != "unidad_proyecto" else []
+    existing_upids = await prefetch_existing_upids(db, file_upids) if file_upids else set()
+    int_state = await prefetch_intervenciones(db, existing_upids) if existing_upids else {}
+
+    # Si el frontend provee upid_start (chunked import), se usa directamente para
+    # evitar el scan completo de la colección en cada chunk.
     def _get_max_upid() -> int:
         max_n = 0
         for doc in db.collection("unidades_proyecto").select(["upid"]).stream():
@@ -5987,359 +6092,250 @@ async def importar_up_ejecutar(
                 max_n = max(max_n, int(m.group(1)))
         return max_n
 
-    # Las UP se autogeneran en modo 'unidad_proyecto' y 'combinado' (UP nuevas).
-    # Si el frontend provee upid_start (chunked import), se usa directamente para
-    # evitar el scan completo de la colección en cada chunk.
     if body.entity_type in ("unidad_proyecto", "combinado"):
         upid_counter = (
             body.upid_start
             if body.upid_start is not None
-            else _get_max_upid()
+            else await run_blocking("unidades_proyecto", _get_max_upid)
         )
     else:
         upid_counter = 0
+    _report("prefetch", upids=len(set(file_upids)), existing_upids=len(existing_upids))
 
-    # Cache de max intervencion por upid para batch eficiente
-    intervencion_counters: Dict[str, int] = {}
-    # Cache de claves de dedup para intervenciones existentes por upid
-    _existing_int_keys_cache: Dict[str, set] = {}
-
-    def _norm_str(v: Any) -> str:
-        return str(v).strip().lower() if v is not None else ""
-
-    def _round_budget(v: Any) -> str:
-        try:
-            return str(round(float(v), -3))  # redondear a miles para tolerar diferencias menores
-        except (TypeError, ValueError):
-            return ""
-
-    def _intervencion_dedup_key(data: Dict[str, Any]) -> tuple:
-        """Clave natural de unicidad para una intervención."""
-        ref = _norm_str(data.get("referencia_contrato"))
-        tipo = _norm_str(data.get("tipo_intervencion"))
-        if ref:
-            return (tipo, ref)
-        return (tipo, _round_budget(data.get("presupuesto_base")), _norm_str(data.get("fecha_inicio")))
-
-    def _get_existing_int_keys(upid_val: str) -> set:
-        """Carga las claves de dedup de las intervenciones existentes para un UP."""
-        if upid_val in _existing_int_keys_cache:
-            return _existing_int_keys_cache[upid_val]
-        keys: set = set()
-        for coll in ["intervenciones_unidades_proyecto", "unidades_proyecto_intervenciones"]:
-            for doc in db.collection(coll).where("upid", "==", upid_val).stream():
-                d = doc.to_dict() or {}
-                keys.add(_intervencion_dedup_key(d))
-        _existing_int_keys_cache[upid_val] = keys
-        return keys
-
-    def _get_max_intervencion(upid_val: str) -> int:
-        if upid_val in intervencion_counters:
-            return intervencion_counters[upid_val]
-        max_n = 0
-        for coll in ["intervenciones_unidades_proyecto", "unidades_proyecto_intervenciones"]:
-            for doc in db.collection(coll).where("upid", "==", upid_val).stream():
-                data = doc.to_dict() or {}
-                iid = data.get("intervencion_id", doc.id)
-                m = re.match(rf"^{re.escape(upid_val)}-INT-(\d+)$", str(iid), re.IGNORECASE)
-                if m:
-                    max_n = max(max_n, int(m.group(1)))
-        intervencion_counters[upid_val] = max_n
-        return max_n
-
-    def _enrich_geometry(geometry: Optional[Dict[str, Any]], idx: int):
-        """Deriva comuna/corregimiento, barrio/vereda y proyectos estratégicos de una geometría."""
-        comarca_corr = None
-        barrio_vrd = None
-        proy_estrat: List[str] = []
-        if geometry and geometry.get("type") and geometry.get("coordinates"):
-            try:
-                _validate_crs_coords(_normalizar_geometry(geometry))
-                comarca_corr = _buscar_en_geojson(
-                    os.path.join(BASEMAPS_DIR, "comunas_corregimientos.geojson"),
-                    "comuna_corregimiento",
-                    geometry,
-                )
-                barrio_vrd = _buscar_en_geojson(
-                    os.path.join(BASEMAPS_DIR, "barrios_veredas.geojson"),
-                    "barrio_vereda",
-                    geometry,
-                )
-                proy_estrat = _buscar_proyectos_estrategicos(geometry)
-            except Exception as geo_err:
-                logger.warning("importar: error geo feature %d: %s", idx, geo_err)
-        return comarca_corr, barrio_vrd, proy_estrat
+    # 3) Cruce espacial de todas las geometrías del lote en una sola pasada
+    # (STRtree por capa), fuera del event loop.
+    geo_enrichment = await asyncio.to_thread(
+        _enriquecer_geometrias, [feat.geometry for feat in body.features]
+    )
+    _report("geometria", features=len(body.features))
+
+    # 4) Planificar escrituras: cada grupo = UP y/o intervenciones + auditoría
+    def _audit(upid_for_audit: Optional[str], payload: Dict[str, Any], entity: str) -> ImportWrite:
+        return ImportWrite(AUDIT_COLLECTION, None, {
+            "upid": upid_for_audit,
+            "accion": "importar",
+            "entity_type": entity,
+            "uid": current_user.get("uid"),
+            "email": current_user.get("email"),
+            "payload": payload,
+            "timestamp": now_iso,
+        })
 
-    def _audit_import(upid_for_audit: Optional[str], payload: Dict[str, Any], entity: str, idx: int):
-        try:
-            db.collection("cambios_implementados_unidades_proyecto").add({
-                "upid": upid_for_audit,
-                "accion": "importar",
-                "entity_type": entity,
-                "uid": current_user.get("uid"),
-                "email": current_user.get("email"),
-                "payload": payload,
-                "timestamp": now_iso,
-            })
-        except Exception as audit_err:
-            logger.warning("importar: fallo auditoría feature %d: %s", idx, audit_err)
+    def _stamp(payload: Dict[str, Any]) -> Dict[str, Any]:
+        payload["created_at"] = now_iso
+        payload["updated_at"] = updated_at
+        payload["created_by"] = current_user.get("uid")
+        payload["importado"] = True
+        return payload
+
+    def _up_write(idx: int, store_geometry: Callable[[Dict[str, Any]], Dict[str, Any]]) -> List[ImportWrite]:
+        nonlocal upid_counter
+        geometry = body.features[idx].geometry
+        comarca_corr, barrio_vrd, proy_estrat = geo_enrichment[idx]
+        upid_counter += 1
+        new_upid = f"UNP-{upid_counter}"
+        payload = _up_payload_fields(mapped_rows[idx])
+        if comarca_corr is not None:
+            payload["comuna_corregimiento"] = comarca_corr
+        if barrio_vrd is not None:
+            payload["barrio_vereda"] = barrio_vrd
+        if geometry is not None:
+            payload["geometry"] = store_geometry(geometry)
+        payload["upid"] = new_upid
+        payload["proyectos_estrategicos"] = proy_estrat
+        _stamp(payload)
+        return [
+            ImportWrite("unidades_proyecto", new_upid, payload, feature_index=idx, created_id=new_upid),
+            _audit(new_upid, payload, "unidad_proyecto"),
+        ]
 
-    # ── Modo combinado: una tabla con UP + intervenciones, separadas por 'upid' ──
-    if body.entity_type == "combinado":
-        created_up_ids: List[str] = []
-        created_int_ids: List[str] = []
-        skipped_duplicate_count: int = 0
-
-        # 1) Mapear todas las filas (+ centro gestor global + RBAC)
-        mapped_rows: List[Dict[str, Any]] = []
-        for idx, feat in enumerate(body.features):
-            mapped = _apply_mapping_to_properties(feat.properties, body.column_mapping)
-            if not mapped.get("nombre_centro_gestor") and body.nombre_centro_gestor_global:
-                mapped["nombre_centro_gestor"] = body.nombre_centro_gestor_global
-            effective_centro = enforce_unidades_access(
-                current_user, "write:unidades", mapped.get("nombre_centro_gestor")
-            )
-            if effective_centro:
-                mapped["nombre_centro_gestor"] = effective_centro
-            mapped_rows.append(mapped)
+    def _int_write(idx: int, upid_val: str) -> Tuple[ImportWrite, Dict[str, Any]]:
+        state = int_state.setdefault(upid_val, {"keys": set(), "max": 0})
+        state["max"] += 1
+        int_id = f"{upid_val}-INT-{state['max']}"
+        payload = _intervencion_payload_fields(mapped_rows[idx])
+        payload["upid"] = upid_val
+        payload["intervencion_id"] = int_id
+        _stamp(payload)
+        return ImportWrite("intervenciones_unidades_proyecto", int_id, payload, feature_index=idx, created_id=int_id), payload
+
+    def _geometry_as_stored(geometry: Dict[str, Any]) -> Dict[str, Any]:
+        geo_to_store = dict(geometry)
+        coords = geo_to_store.get("coordinates")
+        if isinstance(coords, list):
+            geo_to_store["coordinates"] = json.dumps(coords, separators=(",", ":"))
+        return geo_to_store
+
+    write_groups: List[List[ImportWrite]] = []
+    skipped_duplicate_count = 0
+    for file_upid, indices in groups:
+        group: List[ImportWrite] = []
+        if body.entity_type == "unidad_proyecto":
+            group.extend(_up_write(indices[0], lambda geometry: geometry))
 
-        # 2) Agrupar por el upid del archivo, preservando orden.
-        #    Filas sin upid → cada una es una UP nueva (1 UP + 1 intervención).
-        for file_upid, indices in _group_indices_by_upid(mapped_rows):
-            # Validación per-fila del grupo
-            group_errors = False
-            for idx in indices:
-                ferr = _validate_combinado_feature(mapped_rows[idx], idx)
-                if ferr:
-                    errors_by_feature.append({"feature_index": idx, "errors": ferr})
-                    group_errors = True
-            if group_errors:
+        elif body.entity_type == "intervencion":
+            idx = indices[0]
+            if file_upid not in existing_upids:
+                errors_by_feature.append({
+                    "feature_index": idx,
+                    "errors": [f"Feature {idx + 1}: upid {file_upid} no existe en unidades_proyecto"],
+                })
                 continue
+            write, payload = _int_write(idx, file_upid)
+            group.extend([write, _audit(file_upid, payload, "intervencion")])
 
-            try:
-                # ¿La UP ya existe en Firestore? Solo si el archivo trae upid.
-                # Si existe → se preserva y solo se cuelgan intervenciones.
-                existing = (
-                    list(
-                        db.collection("unidades_proyecto").where("upid", "==", file_upid).limit(1).stream()
-                    )
-                    if file_upid
-                    else []
+        else:  # combinado
+            # Si la UP ya existe se preserva y solo se cuelgan intervenciones.
+            if file_upid and file_upid in existing_upids:
+                target_upid = file_upid
+            else:
+                # UP nueva: necesita nombre. Se toma la primera fila del grupo que lo traiga.
+                rep_idx = next(
+                    (i for i in indices if mapped_rows[i].get("nombre_up") or mapped_rows[i].get("nombre_up_detalle")),
+                    None,
                 )
+                if rep_idx is None:
+                    for idx in indices:
+                        errors_by_feature.append({
+                            "feature_index": idx,
+                            "errors": [f"Feature {idx + 1}: la UP nueva (upid {file_upid}) requiere nombre_up o nombre_up_detalle"],
+                        })
+                    continue
+                group.extend(_up_write(rep_idx, _geometry_as_stored))
+                target_upid = group[0].doc_id
 
-                if existing:
-                    target_upid = file_upid
-                else:
-                    # UP nueva: necesita nombre. Se toma la primera fila del grupo que lo traiga.
-                    rep_idx = next(
-                        (i for i in indices if mapped_rows[i].get("nombre_up") or mapped_rows[i].get("nombre_up_detalle")),
-                        None,
-                    )
-                    if rep_idx is None:
-                        for idx in indices:
-                            errors_by_feature.append({
-                                "feature_index": idx,
-                                "errors": [f"Feature {idx + 1}: la UP nueva (upid {file_upid}) requiere nombre_up o nombre_up_detalle"],
-                            })
-                        continue
+            # Una intervención por fila del grupo, salvo las que ya existen
+            keys = int_state.setdefault(target_upid, {"keys": set(), "max": 0})["keys"]
+            for idx in indices:
+                incoming_key = intervencion_dedup_key(_intervencion_payload_fields(mapped_rows[idx]))
+                if incoming_key in keys:
+                    skipped_duplicate_count += 1
+                    continue
+                write, payload = _int_write(idx, target_upid)
+                keys.add(incoming_key)  # evita duplicados dentro del mismo import
+                group.extend([write, _audit(target_upid, payload, "intervencion")])
 
-                    up_mapped = mapped_rows[rep_idx]
-                    geometry = body.features[rep_idx].geometry
-                    comarca_corr, barrio_vrd, proy_estrat = _enrich_geometry(geometry, rep_idx)
-
-                    upid_counter += 1
-                    target_upid = f"UNP-{upid_counter}"
-
-                    up_payload = _up_payload_fields(up_mapped)
-                    if comarca_corr is not None:
-                        up_payload["comuna_corregimiento"] = comarca_corr
-                    if barrio_vrd is not None:
-                        up_payload["barrio_vereda"] = barrio_vrd
-                    if geometry is not None:
-                        geo_to_store = dict(geometry)
-                        coords = geo_to_store.get("coordinates")
-                        if isinstance(coords, list):
-                            geo_to_store["coordinates"] = json.dumps(
-                                coords, separators=(",", ":")
-                            )
-                        up_payload["geometry"] = geo_to_store
-                    up_payload["upid"] = target_upid
-                    up_payload["proyectos_estrategicos"] = proy_estrat
-                    up_payload["created_at"] = now_iso
-                    up_payload["updated_at"] = now_iso
-                    up_payload["created_by"] = current_user.get("uid")
-                    up_payload["importado"] = True
-
-                    db.collection("unidades_proyecto").document(target_upid).set(up_payload)
-                    created_up_ids.append(target_upid)
-                    created_ids.append(target_upid)
-                    _audit_import(target_upid, up_payload, "unidad_proyecto", rep_idx)
-
-                # Crear una intervención por cada fila del grupo (solo si no existe ya)
-                for idx in indices:
-                    int_mapped = mapped_rows[idx]
-                    int_payload = _intervencion_payload_fields(int_mapped)
-
-                    # Dedup: skip si ya existe una intervención con la misma clave natural
-                    incoming_key = _intervencion_dedup_key(int_payload)
-                    existing_keys = _get_existing_int_keys(target_upid)
-                    if incoming_key in existing_keys:
-                        skipped_duplicate_count += 1
-                        continue
+        if group:
+            write_groups.append(group)
 
-                    new_int_num = _get_max_intervencion(target_upid) + 1
-                    int_id = f"{target_upid}-INT-{new_int_num}"
-                    intervencion_counters[target_upid] = new_int_num
-
-                    int_payload["upid"] = target_upid
-                    int_payload["intervencion_id"] = int_id
-                    int_payload["created_at"] = now_iso
-                    int_payload["updated_at"] = now_iso
-                    int_payload["created_by"] = current_user.get("uid")
-                    int_payload["importado"] = True
-
-                    db.collection("intervenciones_unidades_proyecto").document(int_id).set(int_payload)
-                    existing_keys.add(incoming_key)  # evita duplicados dentro del mismo import
-                    created_int_ids.append(int_id)
-                    created_ids.append(int_id)
-                    _audit_import(target_upid, int_payload, "intervencion", idx)
-
-            except Exception as grp_err:
-                logger.error("importar combinado: error en grupo upid %s: %s", file_upid, grp_err)
-                for idx in indices:
-                    errors_by_feature.append({
-                        "feature_index": idx,
-                        "errors": [f"Error procesando grupo upid {file_upid}: {str(grp_err)}"],
-                    })
+    # 5) Escritura por WriteBatches con progreso por batch
+    writer = ImportBatchWriter(db, on_commit=lambda info: _report("escritura", **info))
+    await writer.write_groups(write_groups)
+    errors_by_feature.extend(writer.feature_errors())
+    created_ids = writer.created_ids()
 
-        _invalidate_unidades_cache()
+    _invalidate_unidades_cache()
 
-        return create_utf8_response({
-            "success": True,
-            "entity_type": "combinado",
-            "created_count": len(created_ids),
+    result: Dict[str, Any] = {
+        "success": True,
+        "entity_type": body.entity_type,
+        "created_count": len(created_ids),
+    }
+    if combinado:
+        created_up_ids = writer.created_ids("unidades_proyecto")
+        created_int_ids = writer.created_ids("intervenciones_unidades_proyecto")
+        result.update({
             "created_up_count": len(created_up_ids),
             "created_intervencion_count": len(created_int_ids),
             "skipped_duplicate_count": skipped_duplicate_count,
-            "error_count": len(errors_by_feature),
-            "created_ids": created_ids,
-            "created_up_ids": created_up_ids,
-            "created_intervencion_ids": created_int_ids,
-            "errors": errors_by_feature,
-            "next_upid_start": upid_counter,
         })
+    result.update({
+        "error_count": len(errors_by_feature),
+        "created_ids": created_ids,
+    })
+    if combinado:
+        result.update({"created_up_ids": created_up_ids, "created_intervencion_ids": created_int_ids})
+    result.update({"errors": errors_by_feature, "next_upid_start": upid_counter})
+    return result
 
-    for idx, feat in enumerate(body.features):
-        try:
-            mapped = _apply_mapping_to_properties(feat.properties, body.column_mapping)
 
-            if not mapped.get("nombre_centro_gestor") and body.nombre_centro_gestor_global:
-                mapped["nombre_centro_gestor"] = body.nombre_centro_gestor_global
+def _stream_importacion(body: ImportarGeoRequest, current_user: Dict[str, Any], db) -> StreamingResponse:
+    """Ejecuta la importación en una tarea y emite su progreso como NDJSON.
 
-            # Forzar centro gestor según permisos del usuario
-            effective_centro = enforce_unidades_access(
-                current_user, "write:unidades", mapped.get("nombre_centro_gestor")
-            )
-            if effective_centro:
-                mapped["nombre_centro_gestor"] = effective_centro
+    Los headers salen de inmediato, así una importación grande no choca con el
+    timeout de ``/importar/``; la última línea es ``result`` o ``error``.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
 
-            if body.entity_type == "unidad_proyecto":
-                feat_errors = _validate_up_feature(mapped, idx)
-            else:
-                feat_errors = _validate_intervencion_feature(mapped, idx)
+    async def _run() -> None:
+        try:
+            result = await _ejecutar_importacion(body, current_user, db, progress=queue.put_nowait)
+            queue.put_nowait({"event": "result", **result})
+        except HTTPException as e:
+            queue.put_nowait({"event": "error", "status_code": e.status_code, "detail": e.detail})
+        except Exception as e:
+            logger.error("importar (stream): error inesperado: %s", e)
+            queue.put_nowait({"event": "error", "status_code": 500, "detail": str(e)})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(_run())
+    _import_tasks.add(task)
+    task.add_done_callback(_import_tasks.discard)
+
+    async def _events():
+        while True:
+            event = await queue.get()
+            if event is None:
+                break
+            yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
 
-            if feat_errors:
-                errors_by_feature.append({"feature_index": idx, "errors": feat_errors})
-                continue
+    return StreamingResponse(_events(), media_type="application/x-ndjson")
 
-            geometry = feat.geometry
-            comarca_corr, barrio_vrd, proy_estrat = _enrich_geometry(geometry, idx)
-
-            if body.entity_type == "unidad_proyecto":
-                upid_counter += 1
-                new_id = f"UNP-{upid_counter}"
-                payload: Dict[str, Any] = _up_payload_fields(mapped)
-                if comarca_corr is not None:
-                    payload["comuna_corregimiento"] = comarca_corr
-                if barrio_vrd is not None:
-                    payload["barrio_vereda"] = barrio_vrd
-                if geometry is not None:
-                    payload["geometry"] = geometry
-                payload["upid"] = new_id
-                payload["proyectos_estrategicos"] = proy_estrat
-                payload["created_at"] = now_iso
-                payload["updated_at"] = now_iso
-                payload["created_by"] = current_user.get("uid")
-                payload["importado"] = True
-
-                db.collection("unidades_proyecto").document(new_id).set(payload)
-
-            else:  # intervencion
-                upid_val = str(mapped.get("upid", "")).strip()
-                upid_docs = list(
-                    db.collection("unidades_proyecto").where("upid", "==", upid_val).limit(1).stream()
-                )
-                if not upid_docs:
-                    errors_by_feature.append({
-                        "feature_index": idx,
-                        "errors": [f"Feature {idx + 1}: upid {upid_val} no existe en unidades_proyecto"],
-                    })
-                    continue
 
-                max_int = _get_max_intervencion(upid_val)
-                new_int_num = max_int + 1
-                new_id = f"{upid_val}-INT-{new_int_num}"
-                intervencion_counters[upid_val] = new_int_num
-
-                payload = _intervencion_payload_fields(mapped)
-                payload["upid"] = upid_val
-                payload["intervencion_id"] = new_id
-                payload["created_at"] = now_iso
-                payload["updated_at"] = now_iso
-                payload["created_by"] = current_user.get("uid")
-                payload["importado"] = True
-
-                db.collection("intervenciones_unidades_proyecto").document(new_id).set(payload)
-
-            _audit_import(
-                new_id if body.entity_type == "unidad_proyecto" else mapped.get("upid"),
-                payload,
-                body.entity_type,
-                idx,
-            )
+@router.post(
+    "/unidades-proyecto/importar/ejecutar",
+    tags=["Unidades de Proyecto"],
+    summary="POST | Importar features geoespaciales a Firestore",
+    dependencies=[Depends(require_unidades("write"))],
+)
+@optional_rate_limit("5/minute")
+async def importar_up_ejecutar(
+    request: Request,
+    body: ImportarGeoRequest,
+    stream: bool = Query(
+        False,
+        description="Si es true, responde NDJSON con el progreso por etapa y por batch, y el resultado al final",
+    ),
+):
+    """
+    Importa features geoespaciales ya validados a Firestore.
+    Reutiliza la misma lógica de auto-generación de IDs, detección de
+    comuna/barrio/proyectos estratégicos que los endpoints de creación individuales.
+    Las escrituras se agrupan en WriteBatches; con ``stream=true`` el progreso
+    se emite a medida que avanza (útil para archivos grandes).
+    """
+    if not FIREBASE_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Firebase not available")
 
-            created_ids.append(new_id)
+    current_user = getattr(request.state, "current_user", None)
+    if current_user is None:
+        raise HTTPException(status_code=401, detail="No autenticado")
 
-        except Exception as feat_err:
-            logger.error("importar: error procesando feature %d: %s", idx, feat_err)
-            errors_by_feature.append({
-                "feature_index": idx,
-                "errors": [f"Error procesando feature {idx + 1}: {str(feat_err)}"],
-            })
+    if body.entity_type not in ("unidad_proyecto", "intervencion", "combinado"):
+        raise HTTPException(status_code=400, detail="entity_type debe ser 'unidad_proyecto', 'intervencion' o 'combinado'")
 
-    _invalidate_unidades_cache()
+    db = get_firestore_client()
+    if db is None:
+        raise HTTPException(status_code=503, detail="No se pudo conectar a Firestore")
 
-    return create_utf8_response({
-        "success": True,
-        "entity_type": body.entity_type,
-        "created_count": len(created_ids),
-        "error_count": len(errors_by_feature),
-        "created_ids": created_ids,
-        "errors": errors_by_feature,
-        "next_upid_start": upid_counter,
-    })
+    if stream:
+        return _stream_importacion(body, current_user, db)
+    return create_utf8_response(await _ejecutar_importacion(body, current_user, db))
 
 
 @router.get(
     "/unidades-proyecto/exportar",
     tags=["Unidades de Proyecto"],
-    summary="GET | Exportar UP + intervenciones (tabla única) a GeoJSON/KML/KMZ/Shapefile",
+    summary="GET | Exportar UP + intervenciones (tabla única) a GeoJSON/KML/KMZ/Shapefile/GeoPackage/CSV",
     dependencies=[Depends(require_unidades("read"))],
 )
 @optional_rate_limit("10/minute")
 async def exportar_unidades_proyecto(
     request: Request,
-    formato: str = Query("geojson", description="Formato de salida: geojson | kml | kmz | shp"),
+    formato: str = Query(
+        "geojson", description="Formato de salida: geojson | kml | kmz | shp | gpkg | csv"
+    ),
     nombre_centro_gestor: Optional[str] = Query(
         None,
         description=(
@@ -6357,8 +6353,12 @@ async def exportar_unidades_proyecto(
     - ``admin_general`` / ``super_admin``: pueden filtrar por ``nombre_centro_gestor``
       o exportar todo si no lo envían.
     - ``admin_centro_gestor``: se fuerza su propio centro de la sesión (ignora el filtro).
+
+    La respuesta se emite por fragmentos (``StreamingResponse``): las filas se
+    generan y serializan a medida que se envían, sin materializar la tabla ni
+    el archivo completo en memoria.
     """
-    from api.exportar_geo import FORMAT_SPEC, build_flat_features, export_features
+    from api.exportar_geo import FORMAT_SPEC, iter_export, iter_flat_features
 
     if formato not in FORMAT_SPEC:
         raise HTTPException(
@@ -6384,31 +6384,34 @@ async def exportar_unidades_proyecto(
         raise HTTPException(status_code=503, detail="No se pudo conectar a Firestore")
 
     def _iso(d: Dict[str, Any]) -> Dict[str, Any]:
-        if FIREBASE_TYPES_AVAILABLE:
-            for k, v in list(d.items()):
-                if isinstance(v, FIREBASE_DATETIME_TYPES):
-                    d[k] = v.isoformat()
+        # Copia solo si hay fechas Firestore que convertir: los documentos del
+        # snapshot son compartidos y no se mutan.
+        if FIREBASE_TYPES_AVAILABLE and any(
+            isinstance(v, FIREBASE_DATETIME_TYPES) for v in d.values()
+        ):
+            return {
+                k: v.isoformat() if isinstance(v, FIREBASE_DATETIME_TYPES) else v
+                for k, v in d.items()
+            }
         return d
 
     # UPs (filtradas por centro si aplica) + defensa en profundidad
-    up_query = db.collection("unidades_proyecto")
-    if effective_centro:
-        up_query = up_query.where("nombre_centro_gestor", "==", effective_centro)
-    ups = [_iso(doc.to_dict() or {}) for doc in up_query.stream()]
+    ups = await get_unidades_snapshot().adocuments()
     if effective_centro:
+        ups = [d for d in ups if d.get("nombre_centro_gestor") == effective_centro]
         ups = scope_records_by_centro(ups, effective_centro, log_label="exportar_up")
 
     upid_set = {str(u.get("upid")) for u in ups if u.get("upid") is not None}
 
     # Intervenciones agrupadas por upid (solo de las UP en alcance)
     intervenciones_by_upid: Dict[str, List[Dict[str, Any]]] = {}
-    for doc in db.collection("intervenciones_unidades_proyecto").stream():
-        it = _iso(doc.to_dict() or {})
-        up_ref = str(it.get("upid"))
+    for d in await get_intervenciones_snapshot().adocuments():
+        up_ref = str(d.get("upid"))
         if up_ref in upid_set:
-            intervenciones_by_upid.setdefault(up_ref, []).append(it)
+            intervenciones_by_upid.setdefault(up_ref, []).append(_iso(d))
 
-    features = build_flat_features(ups, intervenciones_by_upid)
+    # Filas generadas bajo demanda mientras se serializa la respuesta
+    features = iter_flat_features((_iso(up) for up in ups), intervenciones_by_upid)
 
     media_type, ext = FORMAT_SPEC[formato]
     safe_centro = (
@@ -6417,10 +6420,18 @@ async def exportar_unidades_proyecto(
         else "todos"
     )
     base_name = f"unidades_proyecto_{safe_centro}"
-    content = export_features(features, formato, base_name)
 
-    return Response(
-        content=content,
+    def _stream():
+        try:
+            yield from iter_export(features, formato, base_name)
+        except Exception as e:
+            # Los headers ya se enviaron: solo queda registrar y cortar la descarga.
+            logger.error("exportar_unidades_proyecto (%s) interrumpido: %s", formato, e)
+            raise
+
+    # Generador síncrono: Starlette lo itera en el threadpool, fuera del event loop.
+    return StreamingResponse(
+        _stream(),
         media_type=media_type,
         headers={"Content-Disposition": f'attachment; filename="{base_name}.{ext}"'},
     )
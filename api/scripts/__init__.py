@@ -87,7 +87,7 @@ except ImportError as e:
         }
 
     async def generate_unidades_proyecto_quality_report(
-        nombre_centro_gestor: Optional[str] = None, persist: bool = True
+        nombre_centro_gestor: Optional[str] = None, persist: bool = True, full: bool = False
     ):
         return {
             "success": False,
@@ -305,6 +305,7 @@ try:
         obtener_datos_secop_completos,
         actualizar_proceso_emprestito_completo,
         procesar_todos_procesos_emprestito_completo,
+        get_secop_sync_progress,
         # Nuevas funciones para proyecciones de empréstito
         crear_tabla_proyecciones_desde_sheets,
         leer_proyecciones_emprestito,
@@ -538,9 +539,12 @@ except ImportError as e:
     async def actualizar_proceso_emprestito_completo(referencia_proceso: str):
         return {"success": False, "error": "Emprestito operations not available"}
 
-    async def procesar_todos_procesos_emprestito_completo():
+    async def procesar_todos_procesos_emprestito_completo(resume: bool = False, on_progress=None, should_stop=None):
         return {"success": False, "error": "Emprestito operations not available"}
 
+    def get_secop_sync_progress():
+        return {"status": "unavailable", "error": "Emprestito operations not available"}
+
     # Nuevas funciones dummy para proyecciones
     async def crear_tabla_proyecciones_desde_sheets(sheet_url: str):
         return {"success": False, "error": "Emprestito operations not available"}
@@ -898,6 +902,7 @@ __all__ = [
     "obtener_datos_secop_completos",
     "actualizar_proceso_emprestito_completo",
     "procesar_todos_procesos_emprestito_completo",
+    "get_secop_sync_progress",
     # Nuevas funciones para proyecciones de empréstito
     "crear_tabla_proyecciones_desde_sheets",
     "leer_proyecciones_emprestito",
@@ -0,0 +1,287 @@
+"""
+Motor de cruces espaciales contra los basemaps (comunas/corregimientos,
+barrios/veredas y proyectos estratégicos).
+
+Cada capa se carga una sola vez por proceso: los polígonos se convierten a
+geometrías Shapely preparadas y se indexan en un ``STRtree``. Las consultas
+se hacen por lotes (un solo ``STRtree.query`` vectorizado para N geometrías),
+lo que permite enriquecer miles de features de una importación sin volver a
+parsear los polígonos por feature.
+
+Semántica (idéntica a la de los helpers históricos del router):
+- Propiedad de capa: el primer polígono (en orden del archivo) que *contiene*
+  el punto de prueba. Para geometrías que no son Point se usa el centroide.
+- Proyectos estratégicos: ``Name`` de todos los polígonos que *intersectan*
+  la geometría, sin duplicados, en orden de archivo y de feature.
+
+Uso:
+    from api.scripts.basemap_engine import enrich_geometries
+    resultados = enrich_geometries([geom1, geom2, ...])
+"""
+
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+    import shapely
+    from shapely.geometry import Point, shape as shapely_shape
+    from shapely.strtree import STRtree
+
+    SHAPELY_AVAILABLE = True
+except Exception:
+    np = None
+    shapely = None
+    Point = None
+    shapely_shape = None
+    STRtree = None
+    SHAPELY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_BACK_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+BASEMAPS_DIR = os.path.join(_BACK_DIR, "basemaps")
+COMUNAS_GEOJSON = os.path.join(BASEMAPS_DIR, "comunas_corregimientos.geojson")
+BARRIOS_GEOJSON = os.path.join(BASEMAPS_DIR, "barrios_veredas.geojson")
+PROYECTOS_ESTRATEGICOS_DIR = os.path.join(BASEMAPS_DIR, "proyectos_estrategicos")
+
+
+def _normalizar_geometry(geometry_dict: dict) -> dict:
+    """Si ``coordinates`` viene serializado como string (formato Firestore), lo parsea."""
+    coords = geometry_dict.get("coordinates")
+    if isinstance(coords, str):
+        try:
+            geometry_dict = dict(geometry_dict)
+            geometry_dict["coordinates"] = json.loads(coords)
+        except (json.JSONDecodeError, ValueError):
+            pass
+    return geometry_dict
+
+
+def to_shapely(geometry_input: Any):
+    """Convierte [lon, lat] o un dict GeoJSON geometry a Shapely. ``None`` si no aplica o es inválido."""
+    try:
+        if isinstance(geometry_input, dict) and geometry_input.get("type"):
+            return shapely_shape(_normalizar_geometry(geometry_input))
+        if isinstance(geometry_input, (list, tuple)) and len(geometry_input) >= 2:
+            return Point(float(geometry_input[0]), float(geometry_input[1]))
+    except Exception as e:
+        logger.debug("Geometría no convertible a Shapely: %s", type(e).__name__)
+    return None
+
+
+class BasemapLayer:
+    """Polígonos de uno o varios GeoJSON, preparados e indexados en un STRtree.
+
+    El orden de los polígonos en el árbol es el orden de archivo (y de
+    feature dentro de cada archivo), de modo que "el primero que cumple"
+    equivale al menor índice del árbol.
+    """
+
+    def __init__(self, paths: Sequence[str]):
+        self.paths = tuple(paths)
+        geometries = []
+        properties: List[Dict[str, Any]] = []
+        for path in self.paths:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                logger.warning(
+                    "Basemap %s no disponible: %s", os.path.basename(path), type(e).__name__
+                )
+                continue
+            for feature in data.get("features", []):
+                try:
+                    geom = shapely_shape(feature["geometry"])
+                except Exception:
+                    continue
+                if geom.is_empty:
+                    continue
+                geometries.append(geom)
+                properties.append(feature.get("properties") or {})
+
+        self.geometries = np.array(geometries, dtype=object)
+        self.properties = properties
+        shapely.prepare(self.geometries)
+        self.tree = STRtree(self.geometries)
+        logger.info(
+            "Basemap cargado: %s (%d polígonos)",
+            ", ".join(os.path.basename(p) for p in self.paths),
+            len(geometries),
+        )
+
+    def __len__(self) -> int:
+        return len(self.properties)
+
+    def _query(self, geoms: List[Any], predicate: str) -> Tuple["np.ndarray", "np.ndarray"]:
+        """Pares (índice de entrada, índice de polígono) que cumplen ``predicate``, ordenados."""
+        if not geoms or not len(self):
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty
+        input_idx, tree_idx = self.tree.query(
+            np.array(geoms, dtype=object), predicate=predicate
+        )
+        order = np.lexsort((tree_idx, input_idx))
+        return input_idx[order], tree_idx[order]
+
+    def containing_property(self, geoms: List[Any], property_name: str) -> List[Optional[Any]]:
+        """Para cada geometría (Shapely o ``None``), la propiedad del primer polígono que la contiene."""
+        results: List[Optional[Any]] = [None] * len(geoms)
+        positions = [i for i, g in enumerate(geoms) if g is not None and not g.is_empty]
+        if not positions:
+            return results
+        candidates = np.array([geoms[i] for i in positions], dtype=object)
+        test_points = np.where(
+            shapely.get_type_id(candidates) == 0, candidates, shapely.centroid(candidates)
+        )
+        # within(punto, polígono) == polígono.contains(punto)
+        input_idx, tree_idx = self._query(list(test_points), "within")
+        seen = set()
+        for i, t in zip(input_idx.tolist(), tree_idx.tolist()):
+            if i in seen:
+                continue
+            seen.add(i)
+            results[positions[i]] = self.properties[t].get(property_name)
+        return results
+
+    def intersecting_property(self, geoms: List[Any], property_name: str) -> List[List[Any]]:
+        """Para cada geometría, valores únicos de ``property_name`` de los polígonos que la intersectan."""
+        results: List[List[Any]] = [[] for _ in geoms]
+        positions = [i for i, g in enumerate(geoms) if g is not None and not g.is_empty]
+        if not positions:
+            return results
+        input_idx, tree_idx = self._query([geoms[i] for i in positions], "intersects")
+        for i, t in zip(input_idx.tolist(), tree_idx.tolist()):
+            value = self.properties[t].get(property_name)
+            bucket = results[positions[i]]
+            if value and value not in bucket:
+                bucket.append(value)
+        return results
+
+
+# ---------------------------------------------------------------------------
+# Capas compartidas por proceso
+# ---------------------------------------------------------------------------
+
+_layers: Dict[Tuple[str, ...], BasemapLayer] = {}
+_layers_lock = threading.Lock()
+
+
+def get_layer(*paths: str) -> Optional[BasemapLayer]:
+    """Capa (cacheada) formada por los GeoJSON indicados. ``None`` sin Shapely 2."""
+    if not SHAPELY_AVAILABLE:
+        return None
+    key = tuple(paths)
+    layer = _layers.get(key)
+    if layer is not None:
+        return layer
+    with _layers_lock:
+        layer = _layers.get(key)
+        if layer is None:
+            layer = _layers[key] = BasemapLayer(key)
+    return layer
+
+
+def _estrategicos_paths(estrategicos_dir: str) -> Tuple[str, ...]:
+    if not os.path.isdir(estrategicos_dir):
+        return ()
+    return tuple(
+        os.path.join(estrategicos_dir, f)
+        for f in sorted(os.listdir(estrategicos_dir))
+        if f.lower().endswith(".geojson")
+    )
+
+
+def get_estrategicos_layer(
+    estrategicos_dir: str = PROYECTOS_ESTRATEGICOS_DIR,
+) -> Optional[BasemapLayer]:
+    """Capa con todos los ``*.geojson`` de ``basemaps/proyectos_estrategicos``."""
+    paths = _estrategicos_paths(estrategicos_dir)
+    if not paths:
+        logger.warning(
+            "proyectos_estrategicos: directorio vacío o no encontrado en %s",
+            estrategicos_dir,
+        )
+        return None
+    return get_layer(*paths)
+
+
+def clear_layers() -> None:
+    """Descarta las capas cargadas (p. ej. tras reemplazar un basemap en disco)."""
+    with _layers_lock:
+        _layers.clear()
+
+
+def warm_basemaps() -> None:
+    """Carga las capas por defecto (pensado para el arranque). Bloqueante; no lanza."""
+    try:
+        get_layer(COMUNAS_GEOJSON)
+        get_layer(BARRIOS_GEOJSON)
+        get_estrategicos_layer()
+    except Exception as e:
+        logger.warning("No se pudieron precargar los basemaps: %s", e)
+
+
+# ---------------------------------------------------------------------------
+# API por lotes
+# ---------------------------------------------------------------------------
+
+
+def lookup_containing(
+    geojson_path: str, property_name: str, geometries: Sequence[Any]
+) -> List[Optional[Any]]:
+    """Versión por lotes de ``_buscar_en_geojson``."""
+    layer = get_layer(geojson_path)
+    if layer is None:
+        return [None] * len(geometries)
+    return layer.containing_property([to_shapely(g) for g in geometries], property_name)
+
+
+def lookup_proyectos_estrategicos(
+    geometries: Sequence[Any], estrategicos_dir: str = PROYECTOS_ESTRATEGICOS_DIR
+) -> List[List[str]]:
+    """Versión por lotes de ``_buscar_proyectos_estrategicos``."""
+    layer = get_estrategicos_layer(estrategicos_dir)
+    if layer is None:
+        return [[] for _ in geometries]
+    return layer.intersecting_property([to_shapely(g) for g in geometries], "Name")
+
+
+def enrich_geometries(geometries: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Deriva comuna/corregimiento, barrio/vereda y proyectos estratégicos de N geometrías.
+
+    Cada geometría se convierte a Shapely una sola vez y cada capa se consulta
+    con una única llamada vectorizada. Las entradas ``None`` o inválidas
+    producen ``{"comuna_corregimiento": None, "barrio_vereda": None,
+    "proyectos_estrategicos": []}``.
+    """
+    shapes = [to_shapely(g) if g is not None else None for g in geometries]
+    empty = [None] * len(shapes)
+
+    comunas = get_layer(COMUNAS_GEOJSON)
+    barrios = get_layer(BARRIOS_GEOJSON)
+    estrategicos = get_estrategicos_layer()
+
+    comuna_values = (
+        comunas.containing_property(shapes, "comuna_corregimiento") if comunas else empty
+    )
+    barrio_values = (
+        barrios.containing_property(shapes, "barrio_vereda") if barrios else empty
+    )
+    proyectos_values = (
+        estrategicos.intersecting_property(shapes, "Name")
+        if estrategicos
+        else [[] for _ in shapes]
+    )
+    return [
+        {
+            "comuna_corregimiento": comuna,
+            "barrio_vereda": barrio,
+            "proyectos_estrategicos": proyectos,
+        }
+        for comuna, barrio, proyectos in zip(comuna_values, barrio_values, proyectos_values)
+    ]
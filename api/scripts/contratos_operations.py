@@ -8,14 +8,8 @@ import asyncio
 from typing import Dict, List, Any, Optional
 from datetime import datetime
 from database.firebase_config import get_firestore_client
-
-# Importar para manejar tipos de Firebase
-try:
-    from google.cloud.firestore_v1._helpers import DatetimeWithNanoseconds
-    FIREBASE_TYPES_AVAILABLE = True
-except ImportError:
-    FIREBASE_TYPES_AVAILABLE = False
-    DatetimeWithNanoseconds = None
+from database.firestore_repository import get_all_paginated
+from api.core.serialization import to_jsonable
 
 
 def clean_firebase_data(data):
@@ -23,19 +17,7 @@ def clean_firebase_data(data):
     Limpia datos de Firebase para serialización JSON
     Convierte DatetimeWithNanoseconds y otros tipos no serializables
     """
-    if isinstance(data, dict):
-        cleaned = {}
-        for key, value in data.items():
-            cleaned[key] = clean_firebase_data(value)
-        return cleaned
-    elif isinstance(data, list):
-        return [clean_firebase_data(item) for item in data]
-    elif FIREBASE_TYPES_AVAILABLE and isinstance(data, DatetimeWithNanoseconds):
-        return data.isoformat()
-    elif isinstance(data, datetime):
-        return data.isoformat()
-    else:
-        return data
+    return to_jsonable(data)
 
 
 def clean_text_field(text: Any) -> str:
@@ -71,29 +53,6 @@ def clean_text_field(text: Any) -> str:
     return text_str
 
 
-def get_all_docs_paginated(collection_ref, batch_size: int = 500):
-    """Obtener todos los documentos de una colección usando paginación por cursor."""
-    docs = []
-    last_doc = None
-
-    while True:
-        query = collection_ref.order_by("__name__").limit(batch_size)
-        if last_doc is not None:
-            query = query.start_after(last_doc)
-
-        batch_docs = query.get()
-        if not batch_docs:
-            break
-
-        docs.extend(batch_docs)
-        last_doc = batch_docs[-1]
-
-        if len(batch_docs) < batch_size:
-            break
-
-    return docs
-
-
 def extract_contract_fields(doc_data: Dict[str, Any], nombre_resumido_proceso: str = '') -> Dict[str, Any]:
     """Extraer solo los campos requeridos para el endpoint con texto limpio"""
     registro_origen = doc_data.get('registro_origen', {})
@@ -456,8 +415,7 @@ def extract_orden_compra_fields_all(orden_data: dict) -> dict:
 async def get_ordenes_compra_all_data(db) -> list:
     """Obtener datos de órdenes de compra mapeados para contratos_emprestito_all (versión legacy)"""
     try:
-        collection_ref = db.collection('ordenes_compra_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('ordenes_compra_emprestito', db=db)
         ordenes_data = []
         
         for doc in docs:
@@ -493,8 +451,7 @@ async def get_ordenes_compra_all_data(db) -> list:
 async def get_contratos_emprestito_all_optimized(db, proceso_map: Dict[str, str]) -> list:
     """Obtener contratos de empréstito usando el mapa de procesos precargado"""
     try:
-        collection_ref = db.collection('contratos_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('contratos_emprestito', db=db)
         contratos_data = []
         
         for doc in docs:
@@ -528,8 +485,7 @@ async def get_contratos_emprestito_all_optimized(db, proceso_map: Dict[str, str]
 async def get_ordenes_compra_all_data_optimized(db, proceso_map: Dict[str, str]) -> list:
     """Obtener datos de órdenes de compra mapeados usando el mapa de procesos precargado"""
     try:
-        collection_ref = db.collection('ordenes_compra_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('ordenes_compra_emprestito', db=db)
         ordenes_data = []
         
         for doc in docs:
@@ -566,8 +522,7 @@ async def get_ordenes_compra_all_data_optimized(db, proceso_map: Dict[str, str])
 async def get_convenios_transferencias_all_data(db) -> list:
     """Obtener todos los convenios de transferencia de la colección convenios_transferencias_emprestito"""
     try:
-        collection_ref = db.collection('convenios_transferencias_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('convenios_transferencias_emprestito', db=db)
         convenios_data = []
         
         for doc in docs:
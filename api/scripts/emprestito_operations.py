@@ -10,7 +10,25 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 import pandas as pd
 import re
+from api.core.metrics import track_outbound
+from api.core.serialization import LEGACY_DATETIME_FORMAT, to_jsonable
 from database.firebase_config import get_firestore_client
+from database.firestore_repository import (
+    diff_upsert,
+    get_all_paginated,
+    stream_collection,
+)
+from api.scripts.emprestito_referencia_index import invalidate_referencia_index
+from api.scripts.secop_mirror import (
+    SECOP_CONTRATOS_DATASET,
+    TVEC_ORDENES_DATASET,
+    alookup_secop_mirror,
+)
+from api.scripts.secop_sync import (
+    get_secop_sync_progress,
+    mapear_proceso_secop_completo,
+    sincronizar_procesos_emprestito,
+)
 
 # Token de Socrata para acceso sin límites de velocidad ni consultas
 SOCRATA_APP_TOKEN = os.environ.get("SOCRATA_APP_TOKEN")
@@ -42,40 +60,8 @@ except Exception as e:
 # ---------------------------------------------------------------------------
 
 def serialize_datetime_objects(obj):
-    """Serializar objetos datetime para JSON"""
-    if isinstance(obj, dict):
-        return {key: serialize_datetime_objects(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime_objects(item) for item in obj]
-    elif hasattr(obj, 'timestamp'):  # Firebase Timestamp
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(obj, datetime):
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        return obj
-
-
-def get_all_docs_paginated(collection_ref, batch_size: int = 500):
-    """Obtener todos los documentos de una colección usando paginación por cursor."""
-    docs = []
-    last_doc = None
-
-    while True:
-        query = collection_ref.order_by("__name__").limit(batch_size)
-        if last_doc is not None:
-            query = query.start_after(last_doc)
-
-        batch_docs = query.get()
-        if not batch_docs:
-            break
-
-        docs.extend(batch_docs)
-        last_doc = batch_docs[-1]
-
-        if len(batch_docs) < batch_size:
-            break
-
-    return docs
+    """Serializar objetos datetime para JSON (formato 'YYYY-MM-DD HH:MM:SS')"""
+    return to_jsonable(obj, LEGACY_DATETIME_FORMAT)
 
 
 async def get_procesos_emprestito_all() -> Dict[str, Any]:
@@ -96,26 +82,8 @@ async def get_procesos_emprestito_all() -> Dict[str, Any]:
             return {"success": False, "error": "No se pudo conectar a Firestore (cliente es None)", "data": [], "count": 0}
 
         try:
-            collection_ref = db.collection('procesos_emprestito')
-            batch_size = 500
-            docs = []
-            last_doc = None
-
             # Evitar pérdidas parciales en colecciones grandes usando paginación por cursor.
-            while True:
-                query = collection_ref.order_by("__name__").limit(batch_size)
-                if last_doc is not None:
-                    query = query.start_after(last_doc)
-
-                batch_docs = query.get()
-                if not batch_docs:
-                    break
-
-                docs.extend(batch_docs)
-                last_doc = batch_docs[-1]
-
-                if len(batch_docs) < batch_size:
-                    break
+            docs = await get_all_paginated('procesos_emprestito', db=db)
         except Exception as e:
             return {
                 "success": False,
@@ -186,8 +154,7 @@ async def restaurar_procesos_emprestito_usando_post() -> Dict[str, Any]:
             return {"success": False, "error": "No se pudo conectar a Firestore"}
         
         # Obtener todos los procesos actuales
-        collection_ref = db.collection('procesos_emprestito')
-        procesos_docs = list(collection_ref.stream())
+        procesos_docs = await stream_collection('procesos_emprestito', db=db)
         
         if not procesos_docs:
             logger.warning("⚠️ No se encontraron procesos para restaurar")
@@ -370,9 +337,9 @@ async def verificar_proceso_existente(referencia_proceso: str) -> Dict[str, Any]
             return {"existe": False, "error": "No se pudo conectar a Firestore"}
         
         # Buscar en colección procesos_emprestito (SECOP)
-        procesos_ref = db.collection('procesos_emprestito')
-        procesos_query = procesos_ref.where('referencia_proceso', '==', referencia_proceso).limit(1)
-        procesos_docs = list(procesos_query.stream())
+        procesos_docs = await stream_collection(
+            'procesos_emprestito', where=[('referencia_proceso', '==', referencia_proceso)], limit=1, db=db
+        )
         
         if procesos_docs:
             doc = procesos_docs[0]
@@ -384,9 +351,9 @@ async def verificar_proceso_existente(referencia_proceso: str) -> Dict[str, Any]
             }
         
         # Buscar en colección ordenes_compra_emprestito (TVEC)
-        ordenes_ref = db.collection('ordenes_compra_emprestito')
-        ordenes_query = ordenes_ref.where('referencia_proceso', '==', referencia_proceso).limit(1)
-        ordenes_docs = list(ordenes_query.stream())
+        ordenes_docs = await stream_collection(
+            'ordenes_compra_emprestito', where=[('referencia_proceso', '==', referencia_proceso)], limit=1, db=db
+        )
         
         if ordenes_docs:
             doc = ordenes_docs[0]
@@ -413,34 +380,40 @@ async def obtener_datos_secop(referencia_proceso: str, nit_entidad: Optional[str
         nit_entidad: NIT de la entidad (opcional). Si no se proporciona, busca sin filtro de NIT.
     """
     try:
-        # Importar Socrata aquí para evitar errores de importación si no está disponible
-        from sodapy import Socrata
-        
         # Configuración SECOP
         SECOP_DOMAIN = "www.datos.gov.co"
         DATASET_ID = "p6dx-8zbt"
-        NIT_ENTIDAD_CALI = "890399011"
-
-        # Cliente autenticado con app_token para eliminar límites de velocidad
-        client = Socrata(SECOP_DOMAIN, SOCRATA_APP_TOKEN, timeout=30)
 
-        # Construir filtro para búsqueda específica
-        # Si se proporciona NIT, filtrar por él. Si no, buscar sin filtro de NIT
-        if nit_entidad:
-            where_clause = f"nit_entidad='{nit_entidad}' AND referencia_del_proceso='{referencia_proceso}'"
-            logger.info(f"🔍 Buscando proceso {referencia_proceso} con NIT {nit_entidad}")
-        else:
-            where_clause = f"referencia_del_proceso='{referencia_proceso}'"
-            logger.info(f"🔍 Buscando proceso {referencia_proceso} sin filtro de NIT")
-
-        # Realizar consulta
-        results = client.get(
-            DATASET_ID,
-            where=where_clause,
-            limit=1  # Solo necesitamos un resultado
+        # Responder desde el mirror local si tiene el proceso
+        results = await alookup_secop_mirror(
+            DATASET_ID, "referencia_del_proceso", referencia_proceso, nit_entidad=nit_entidad, limit=1
         )
 
-        client.close()
+        if results is None:
+            # Importar Socrata aquí para evitar errores de importación si no está disponible
+            from sodapy import Socrata
+
+            # Cliente autenticado con app_token para eliminar límites de velocidad
+            client = Socrata(SECOP_DOMAIN, SOCRATA_APP_TOKEN, timeout=30)
+
+            # Construir filtro para búsqueda específica
+            # Si se proporciona NIT, filtrar por él. Si no, buscar sin filtro de NIT
+            if nit_entidad:
+                where_clause = f"nit_entidad='{nit_entidad}' AND referencia_del_proceso='{referencia_proceso}'"
+                logger.info(f"🔍 Buscando proceso {referencia_proceso} con NIT {nit_entidad}")
+            else:
+                where_clause = f"referencia_del_proceso='{referencia_proceso}'"
+                logger.info(f"🔍 Buscando proceso {referencia_proceso} sin filtro de NIT")
+
+            # Realizar consulta
+            with track_outbound("secop", DATASET_ID):
+                results = client.get(
+                    DATASET_ID,
+                    where=where_clause,
+                    limit=1  # Solo necesitamos un resultado
+                )
+
+            client.close()
 
         if not results:
             # Si no se encontró con el NIT proporcionado (o sin NIT), intentar sin restricción
@@ -528,24 +501,29 @@ async def obtener_datos_tvec(referencia_proceso: str) -> Dict[str, Any]:
     Obtener datos de una orden desde la API de TVEC
     """
     try:
-        # Importar Socrata aquí para evitar errores de importación si no está disponible
-        # pyrefly: ignore [missing-import]
-        from sodapy import Socrata
-        
-        # Cliente para API de TVEC con app_token para eliminar límites
-        client = Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30)
-
-        # Buscar por identificador_de_la_orden
-        where_clause = f"identificador_de_la_orden='{referencia_proceso}'"
-
-        # Realizar consulta en dataset TVEC
-        results = client.get(
-            "rgxm-mmea",  # Dataset ID de TVEC según documentación
-            where=where_clause,
-            limit=1
-        )
+        # Responder desde el mirror local si tiene la orden
+        results = await alookup_secop_mirror(TVEC_ORDENES_DATASET, "identificador_de_la_orden", referencia_proceso, limit=1)
+
+        if results is None:
+            # Importar Socrata aquí para evitar errores de importación si no está disponible
+            # pyrefly: ignore [missing-import]
+            from sodapy import Socrata
+
+            # Cliente para API de TVEC con app_token para eliminar límites
+            client = Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30)
+
+            # Buscar por identificador_de_la_orden
+            where_clause = f"identificador_de_la_orden='{referencia_proceso}'"
+
+            # Realizar consulta en dataset TVEC
+            with track_outbound("secop", "rgxm-mmea"):
+                results = client.get(
+                    "rgxm-mmea",  # Dataset ID de TVEC según documentación
+                    where=where_clause,
+                    limit=1
+                )
 
-        client.close()
+            client.close()
 
         if not results:
             return {
@@ -698,6 +676,7 @@ async def guardar_orden_compra_emprestito(datos: Dict[str, Any]) -> Dict[str, An
 
         # Guardar en Firestore
         doc_ref = db_client.collection('ordenes_compra_emprestito').add(datos)
+        invalidate_referencia_index('ordenes_compra_emprestito', doc_ref[1].id)
 
         return {
             "success": True,
@@ -878,25 +857,30 @@ async def procesar_proceso_individual(db_client, proceso_data, referencia_proces
     }
 
     try:
-        from sodapy import Socrata
-        
         logger.info(f"🔍 Buscando contratos en SECOP para proceso: {proceso_contractual}")
 
         # Buscar contratos que contengan el proceso_contractual
-        # Primero intentar con NIT específico de Cali
+        # Primero intentar con NIT específico de Cali (desde el mirror local si lo tiene)
         NIT_ENTIDAD_CALI = "890399011"
-        where_clause = f"proceso_de_compra LIKE '%{proceso_contractual}%' AND nit_entidad = '{NIT_ENTIDAD_CALI}'"
+        contratos_secop = await alookup_secop_mirror(
+            SECOP_CONTRATOS_DATASET, "proceso_de_compra", proceso_contractual,
+            nit_entidad=NIT_ENTIDAD_CALI, contains=True, limit=100
+        )
 
-        with Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30) as client:
-            contratos_secop = client.get("jbjy-vk9h", limit=100, where=where_clause)
+        if contratos_secop is None:
+            from sodapy import Socrata
 
-        # Si no se encuentran contratos con el NIT de Cali, buscar sin restricción de NIT
-        if not contratos_secop:
-            logger.warning(f"⚠️ No se encontraron contratos para {proceso_contractual} con NIT {NIT_ENTIDAD_CALI}, buscando sin restricción de NIT...")
-            where_clause = f"proceso_de_compra LIKE '%{proceso_contractual}%'"
-            with Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30) as client:
+            where_clause = f"proceso_de_compra LIKE '%{proceso_contractual}%' AND nit_entidad = '{NIT_ENTIDAD_CALI}'"
+            with Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30) as client, track_outbound("secop", "jbjy-vk9h"):
                 contratos_secop = client.get("jbjy-vk9h", limit=100, where=where_clause)
 
+            # Si no se encuentran contratos con el NIT de Cali, buscar sin restricción de NIT
+            if not contratos_secop:
+                logger.warning(f"⚠️ No se encontraron contratos para {proceso_contractual} con NIT {NIT_ENTIDAD_CALI}, buscando sin restricción de NIT...")
+                where_clause = f"proceso_de_compra LIKE '%{proceso_contractual}%'"
+                with Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN, timeout=30) as client, track_outbound("secop", "jbjy-vk9h"):
+                    contratos_secop = client.get("jbjy-vk9h", limit=100, where=where_clause)
+
         # Filtrar contratos excluyendo estados "Borrador" y "Cancelado"
         estados_excluidos = ["Borrador", "Cancelado"]
         contratos_secop_filtrados = [
@@ -968,6 +952,7 @@ async def procesar_proceso_individual(db_client, proceso_data, referencia_proces
                     if campos_actualizacion:
                         campos_actualizacion["fecha_actualizacion"] = datetime.now()
                         existing_doc.reference.update(campos_actualizacion)
+                        invalidate_referencia_index('contratos_emprestito', existing_doc.id)
                         resultado["documentos_actualizados"] += 1
                         logger.info(f"🔄 Contrato actualizado ({len(campos_actualizacion)} campos): {referencia_contrato or id_contrato}")
                     else:
@@ -975,6 +960,7 @@ async def procesar_proceso_individual(db_client, proceso_data, referencia_proces
                 else:
                     # Crear nuevo documento con UID automático de Firebase (como procesos_emprestito)
                     doc_ref = contratos_ref.add(contrato_transformado)
+                    invalidate_referencia_index('contratos_emprestito', doc_ref[1].id)
 
                     resultado["documentos_nuevos"] += 1
                     logger.info(f"✅ Nuevo contrato guardado: {referencia_contrato or id_contrato}")
@@ -1122,8 +1108,7 @@ async def get_bancos_emprestito_all() -> Dict[str, Any]:
         if db is None:
             return {"success": False, "error": "No se pudo conectar a Firestore", "data": [], "count": 0}
         
-        collection_ref = db.collection('bancos_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('bancos_emprestito', db=db)
         bancos_data = []
         
         for doc in docs:
@@ -1163,8 +1148,7 @@ async def get_convenios_transferencia_emprestito_all() -> Dict[str, Any]:
         if db is None:
             return {"success": False, "error": "No se pudo conectar a Firestore", "data": [], "count": 0}
         
-        collection_ref = db.collection('convenios_transferencias_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('convenios_transferencias_emprestito', db=db)
         convenios_data = []
         
         for doc in docs:
@@ -1337,8 +1321,7 @@ async def obtener_contratos_desde_proceso_contractual(offset: int = 0, limit: in
             }
 
         # 1. Obtener todos los registros de la colección procesos_emprestito
-        procesos_ref = db_client.collection('procesos_emprestito')
-        todos_procesos_docs = list(procesos_ref.stream())
+        todos_procesos_docs = await stream_collection('procesos_emprestito', db=db_client)
         
         total_procesos_coleccion = len(todos_procesos_docs)
 
@@ -1558,8 +1541,7 @@ async def obtener_contratos_desde_proceso_contractual_completo() -> Dict[str, An
             }
 
         # 1. Obtener todos los registros de la colección procesos_emprestito
-        procesos_ref = db_client.collection('procesos_emprestito')
-        todos_procesos_docs = list(procesos_ref.stream())
+        todos_procesos_docs = await stream_collection('procesos_emprestito', db=db_client)
         
         total_procesos_coleccion = len(todos_procesos_docs)
 
@@ -1806,6 +1788,7 @@ async def cargar_orden_compra_directa(datos_orden: Dict[str, Any]) -> Dict[str,
         # Guardar en Firestore
         doc_ref = db_client.collection('ordenes_compra_emprestito').add(datos_completos)
         doc_id = doc_ref[1].id
+        invalidate_referencia_index('ordenes_compra_emprestito', doc_id)
 
         logger.info(f"Orden de compra creada exitosamente: {doc_id}")
 
@@ -1906,6 +1889,7 @@ async def cargar_convenio_transferencia(datos_convenio: Dict[str, Any]) -> Dict[
         # Guardar en Firestore
         doc_ref = db_client.collection('convenios_transferencias_emprestito').add(datos_completos)
         doc_id = doc_ref[1].id
+        invalidate_referencia_index('convenios_transferencias_emprestito', doc_id)
 
         logger.info(f"Convenio de transferencia creado exitosamente: {doc_id}")
 
@@ -1970,6 +1954,7 @@ async def modificar_convenio_transferencia(doc_id: str, campos_actualizar: Dict[
 
         # Actualizar documento
         doc_ref.update(datos_actualizacion)
+        invalidate_referencia_index('convenios_transferencias_emprestito', doc_id)
 
         # Obtener documento actualizado
         doc_actualizado = doc_ref.get()
@@ -2391,7 +2376,7 @@ async def get_pagos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando contratos_emprestito...")
         contratos_map = {}  # {referencia_contrato: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('contratos_emprestito')):
+            for doc in await get_all_paginated('contratos_emprestito', db=db_client):
                 data = doc.to_dict()
                 ref = str(data.get('referencia_contrato') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2404,7 +2389,7 @@ async def get_pagos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando convenios_transferencias_emprestito...")
         convenios_map = {}  # {referencia_contrato: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('convenios_transferencias_emprestito')):
+            for doc in await get_all_paginated('convenios_transferencias_emprestito', db=db_client):
                 data = doc.to_dict()
                 ref = str(data.get('referencia_contrato') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2417,7 +2402,7 @@ async def get_pagos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando ordenes_compra_emprestito...")
         ordenes_map = {}  # {nombre_centro_gestor: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('ordenes_compra_emprestito')):
+            for doc in await get_all_paginated('ordenes_compra_emprestito', db=db_client):
                 data = doc.to_dict()
                 centro = str(data.get('nombre_centro_gestor') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2429,8 +2414,7 @@ async def get_pagos_emprestito_all() -> Dict[str, Any]:
 
         # PASO 2: Obtener y procesar pagos
         logger.info("Procesando pagos...")
-        pagos_ref = db_client.collection('pagos_emprestito')
-        docs = get_all_docs_paginated(pagos_ref)
+        docs = await get_all_paginated('pagos_emprestito', db=db_client)
 
         pagos_list = []
         bp_stats = {'contratos': 0, 'convenios': 0, 'ordenes': 0, 'sin_bp': 0}
@@ -2544,7 +2528,7 @@ async def get_rpc_contratos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando contratos_emprestito...")
         contratos_map = {}  # {referencia_contrato: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('contratos_emprestito')):
+            for doc in await get_all_paginated('contratos_emprestito', db=db_client):
                 data = doc.to_dict()
                 ref = str(data.get('referencia_contrato') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2557,7 +2541,7 @@ async def get_rpc_contratos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando convenios_transferencias_emprestito...")
         convenios_map = {}  # {referencia_contrato: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('convenios_transferencias_emprestito')):
+            for doc in await get_all_paginated('convenios_transferencias_emprestito', db=db_client):
                 data = doc.to_dict()
                 ref = str(data.get('referencia_contrato') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2570,7 +2554,7 @@ async def get_rpc_contratos_emprestito_all() -> Dict[str, Any]:
         logger.info("Cargando ordenes_compra_emprestito...")
         ordenes_map = {}  # {nombre_centro_gestor: bp}
         try:
-            for doc in get_all_docs_paginated(db_client.collection('ordenes_compra_emprestito')):
+            for doc in await get_all_paginated('ordenes_compra_emprestito', db=db_client):
                 data = doc.to_dict()
                 centro = str(data.get('nombre_centro_gestor') or '').strip()
                 bp = str(data.get('bp') or '').strip()
@@ -2582,8 +2566,7 @@ async def get_rpc_contratos_emprestito_all() -> Dict[str, Any]:
 
         # PASO 2: Obtener y procesar RPCs
         logger.info("Procesando RPCs...")
-        rpc_ref = db_client.collection('rpc_contratos_emprestito')
-        docs = get_all_docs_paginated(rpc_ref)
+        docs = await get_all_paginated('rpc_contratos_emprestito', db=db_client)
 
         rpc_list = []
         bp_stats = {'contratos': 0, 'convenios': 0, 'ordenes': 0, 'sin_bp': 0}
@@ -2813,8 +2796,7 @@ async def get_asignaciones_emprestito_banco_centro_gestor_all() -> Dict[str, Any
             }
 
         # Obtener todos los documentos de la colección
-        asignaciones_ref = db_client.collection('montos_emprestito_asignados_centro_gestor')
-        docs = get_all_docs_paginated(asignaciones_ref)
+        docs = await get_all_paginated('montos_emprestito_asignados_centro_gestor', db=db_client)
 
         # Procesar documentos
         asignaciones_list = []
@@ -2856,34 +2838,40 @@ async def obtener_datos_secop_completos(referencia_proceso: str, nit_entidad: Op
         nit_entidad: NIT de la entidad (opcional). Si no se proporciona, busca sin filtro de NIT.
     """
     try:
-        # Importar Socrata aquí para evitar errores de importación si no está disponible
-        from sodapy import Socrata
-        
         # Configuración SECOP
         SECOP_DOMAIN = "www.datos.gov.co"
         DATASET_ID = "p6dx-8zbt"
-        NIT_ENTIDAD_CALI = "890399011"
 
-        # Cliente autenticado con app_token para eliminar límites de velocidad
-        client = Socrata(SECOP_DOMAIN, SOCRATA_APP_TOKEN, timeout=30)
-
-        # Construir filtro para búsqueda específica
-        # Si se proporciona NIT, filtrar por él. Si no, buscar sin filtro de NIT
-        if nit_entidad:
-            where_clause = f"nit_entidad='{nit_entidad}' AND referencia_del_proceso='{referencia_proceso}'"
-            logger.info(f"🔍 Buscando proceso {referencia_proceso} con NIT {nit_entidad}")
-        else:
-            where_clause = f"referencia_del_proceso='{referencia_proceso}'"
-            logger.info(f"🔍 Buscando proceso {referencia_proceso} sin filtro de NIT")
-
-        # Realizar consulta
-        results = client.get(
-            DATASET_ID,
-            where=where_clause,
-            limit=1  # Solo necesitamos un resultado
+        # Responder desde el mirror local si tiene el proceso
+        results = await alookup_secop_mirror(
+            DATASET_ID, "referencia_del_proceso", referencia_proceso, nit_entidad=nit_entidad, limit=1
         )
 
-        client.close()
+        if results is None:
+            # Importar Socrata aquí para evitar errores de importación si no está disponible
+            from sodapy import Socrata
+
+            # Cliente autenticado con app_token para eliminar límites de velocidad
+            client = Socrata(SECOP_DOMAIN, SOCRATA_APP_TOKEN, timeout=30)
+
+            # Construir filtro para búsqueda específica
+            # Si se proporciona NIT, filtrar por él. Si no, buscar sin filtro de NIT
+            if nit_entidad:
+                where_clause = f"nit_entidad='{nit_entidad}' AND referencia_del_proceso='{referencia_proceso}'"
+                logger.info(f"🔍 Buscando proceso {referencia_proceso} con NIT {nit_entidad}")
+            else:
+                where_clause = f"referencia_del_proceso='{referencia_proceso}'"
+                logger.info(f"🔍 Buscando proceso {referencia_proceso} sin filtro de NIT")
+
+            # Realizar consulta
+            with track_outbound("secop", DATASET_ID):
+                results = client.get(
+                    DATASET_ID,
+                    where=where_clause,
+                    limit=1  # Solo necesitamos un resultado
+                )
+
+            client.close()
 
         if not results:
             # Si no se encontró con el NIT proporcionado (o sin NIT), intentar sin restricción
@@ -2902,68 +2890,8 @@ async def obtener_datos_secop_completos(referencia_proceso: str, nit_entidad: Op
         # Log para debugging: ver todos los campos disponibles
         logger.info(f"Obteniendo datos completos SECOP para {referencia_proceso}")
 
-        # Mapear campos completos según especificaciones
-        # Mantener nombres de variables en Firebase sin cambiar, pero mapear desde SECOP
-        
-        # Determinar estado del proceso de manera inteligente
-        # Prioridad: estado_resumen > adjudicado > estado_del_procedimiento
-        adjudicado_raw = proceso_raw.get("adjudicado", "")
-        estado_resumen_raw = proceso_raw.get("estado_resumen", "")
-        estado_procedimiento_raw = proceso_raw.get("estado_del_procedimiento", "")
-        
-        # Lógica para determinar el estado correcto
-        estado_proceso_final = estado_procedimiento_raw  # Default
-        if estado_resumen_raw and estado_resumen_raw.strip():
-            # Si hay estado_resumen, usarlo como estado principal
-            estado_proceso_final = estado_resumen_raw
-        elif adjudicado_raw and adjudicado_raw.lower() in ["sí", "si", "yes", "true"]:
-            # Si está marcado como adjudicado, el estado debe ser Adjudicado
-            estado_proceso_final = "Adjudicado"
-        
-        proceso_datos_completos = {
-            # Campos básicos existentes
-            "adjudicado": adjudicado_raw,
-            "fase": proceso_raw.get("fase", ""),
-            "estado_proceso": estado_proceso_final,  # Estado determinado inteligentemente
-            
-            # Campos adicionales solicitados con mapeo exacto
-            "fecha_publicacion_fase": proceso_raw.get("fecha_de_publicacion_del", ""),
-            "fecha_publicacion_fase_1": None,  # No disponible en SECOP
-            "fecha_publicacion_fase_2": None,  # No disponible en SECOP
-            "fecha_publicacion_fase_3": proceso_raw.get("fecha_de_publicacion_fase_3", ""),
-            
-            "proveedores_invitados": proceso_raw.get("proveedores_invitados", 0),
-            "proveedores_con_invitacion": proceso_raw.get("proveedores_con_invitacion", 0),
-            "visualizaciones_proceso": proceso_raw.get("visualizaciones_del", 0),
-            "proveedores_que_manifestaron": proceso_raw.get("proveedores_que_manifestaron", 0),
-            "numero_lotes": proceso_raw.get("numero_de_lotes", 0),
-            "fecha_adjudicacion": None,  # No disponible directamente en SECOP
-            "estado_resumen": proceso_raw.get("estado_resumen", ""),
-            "fecha_recepcion_respuestas": None,  # No disponible en SECOP
-            "fecha_apertura_respuestas": None,  # No disponible en SECOP
-            "fecha_apertura_efectiva": None,  # No disponible en SECOP
-            "respuestas_procedimiento": proceso_raw.get("respuestas_al_procedimiento", 0),
-            "respuestas_externas": proceso_raw.get("respuestas_externas", 0),
-            "conteo_respuestas_ofertas": proceso_raw.get("conteo_de_respuestas_a_ofertas", 0),
-        }
-
-        # Convertir valores numéricos
-        campos_numericos = [
-            "proveedores_invitados", "proveedores_con_invitacion", "visualizaciones_proceso",
-            "proveedores_que_manifestaron", "numero_lotes", "respuestas_procedimiento",
-            "respuestas_externas", "conteo_respuestas_ofertas"
-        ]
-        
-        for campo in campos_numericos:
-            try:
-                valor = proceso_datos_completos.get(campo, 0)
-                if valor is not None and str(valor).strip() != "":
-                    proceso_datos_completos[campo] = int(float(str(valor)))
-                else:
-                    proceso_datos_completos[campo] = 0
-            except (ValueError, TypeError):
-                logger.warning(f"⚠️ Error convertiendo campo numérico {campo}: {proceso_datos_completos.get(campo)}")
-                proceso_datos_completos[campo] = 0
+        # Mapear campos completos según especificaciones (compartido con el motor de sincronización)
+        proceso_datos_completos = mapear_proceso_secop_completo(proceso_raw)
 
         return {
             "success": True,
@@ -2997,9 +2925,9 @@ async def actualizar_proceso_emprestito_completo(referencia_proceso: str) -> Dic
             return {"success": False, "error": "No se pudo conectar a Firestore"}
         
         # 1. Verificar que el proceso existe en procesos_emprestito
-        collection_ref = db.collection('procesos_emprestito')
-        query = collection_ref.where('referencia_proceso', '==', referencia_proceso).limit(1)
-        docs = list(query.stream())
+        docs = await stream_collection(
+            'procesos_emprestito', where=[('referencia_proceso', '==', referencia_proceso)], limit=1, db=db
+        )
         
         if not docs:
             return {
@@ -3068,15 +2996,25 @@ async def actualizar_proceso_emprestito_completo(referencia_proceso: str) -> Dic
             "error": str(e)
         }
 
-async def procesar_todos_procesos_emprestito_completo() -> Dict[str, Any]:
+async def procesar_todos_procesos_emprestito_completo(
+    resume: bool = False,
+    on_progress=None,
+    should_stop=None,
+) -> Dict[str, Any]:
     """
     Procesar TODOS los procesos de empréstito de la colección para actualizarlos
     con datos completos de SECOP sin requerir parámetros de entrada
+
+    Las referencias se consultan en lotes paralelos y con límite de velocidad
+    (ver ``api.scripts.secop_sync``).
+
+    Args:
+        resume: Reanudar la última corrida interrumpida omitiendo los procesos
+            que ya quedaron escritos
+        on_progress, should_stop: Ganchos de progreso y cancelación (ver
+            ``sincronizar_procesos_emprestito``)
     """
     try:
-        import time
-        start_time = time.time()
-        
         if not FIRESTORE_AVAILABLE:
             return {"success": False, "error": "Firebase no disponible"}
         
@@ -3084,150 +3022,9 @@ async def procesar_todos_procesos_emprestito_completo() -> Dict[str, Any]:
         if db is None:
             return {"success": False, "error": "No se pudo conectar a Firestore"}
         
-        # 1. Obtener todos los procesos de la colección procesos_emprestito
-        logger.info("🔍 Obteniendo todos los procesos de empréstito para actualización completa...")
-        collection_ref = db.collection('procesos_emprestito')
-        docs = list(collection_ref.stream())
-        
-        if not docs:
-            return {
-                "success": False,
-                "error": "No se encontraron procesos en la colección procesos_emprestito",
-                "total_procesos_encontrados": 0
-            }
-        
-        logger.info(f"📊 Encontrados {len(docs)} procesos para actualizar con datos completos de SECOP")
-        
-        # 2. Inicializar contadores y resultados
-        total_procesos = len(docs)
-        procesos_procesados = 0
-        procesos_actualizados = 0
-        procesos_sin_cambios = 0
-        procesos_con_errores = 0
-        total_campos_actualizados = 0
-        
-        resultados_detallados = []
-        errores_detallados = []
-        
-        # 3. Procesar cada proceso individualmente
-        for i, doc in enumerate(docs, 1):
-            doc_data = doc.to_dict()
-            referencia_proceso = doc_data.get('referencia_proceso')
-            
-            if not referencia_proceso:
-                error_msg = f"Proceso {doc.id} no tiene 'referencia_proceso'"
-                logger.warning(f"⚠️ {error_msg}")
-                errores_detallados.append(error_msg)
-                procesos_con_errores += 1
-                continue
-            
-            try:
-                # Calcular tiempo estimado restante
-                if i > 1:
-                    tiempo_transcurrido = time.time() - start_time
-                    tiempo_promedio_por_proceso = tiempo_transcurrido / (i - 1)
-                    procesos_restantes = total_procesos - i + 1
-                    tiempo_estimado_restante = tiempo_promedio_por_proceso * procesos_restantes
-                    logger.info(f"🔄 Procesando {i}/{total_procesos}: {referencia_proceso} (ETA: {tiempo_estimado_restante:.1f}s)")
-                else:
-                    logger.info(f"🔄 Procesando {i}/{total_procesos}: {referencia_proceso}")
-                
-                # Actualizar proceso individual con datos completos
-                resultado_individual = await actualizar_proceso_emprestito_completo(referencia_proceso)
-                
-                procesos_procesados += 1
-                
-                if resultado_individual.get("success"):
-                    changes_count = resultado_individual.get("changes_count", 0)
-                    
-                    if changes_count > 0:
-                        procesos_actualizados += 1
-                        total_campos_actualizados += changes_count
-                        logger.info(f"✅ {referencia_proceso}: {changes_count} campos actualizados")
-                    else:
-                        procesos_sin_cambios += 1
-                        logger.info(f"ℹ️ {referencia_proceso}: sin cambios necesarios")
-                    
-                    # Agregar resultado detallado
-                    resultado_detalle = {
-                        "referencia_proceso": referencia_proceso,
-                        "success": True,
-                        "changes_count": changes_count,
-                        "changes_summary": resultado_individual.get("changes_summary", [])[:3]  # Máximo 3 cambios
-                    }
-                    
-                    if changes_count == 0:
-                        resultado_detalle["message"] = "Ya está actualizado"
-                    
-                    resultados_detallados.append(resultado_detalle)
-                    
-                else:
-                    procesos_con_errores += 1
-                    error_msg = f"{referencia_proceso}: {resultado_individual.get('error', 'Error desconocido')}"
-                    logger.error(f"❌ {error_msg}")
-                    errores_detallados.append(error_msg)
-                    
-                    resultados_detallados.append({
-                        "referencia_proceso": referencia_proceso,
-                        "success": False,
-                        "error": resultado_individual.get("error", "Error desconocido")
-                    })
-                
-            except Exception as e:
-                procesos_con_errores += 1
-                error_msg = f"{referencia_proceso}: Excepción - {str(e)}"
-                logger.error(f"❌ {error_msg}")
-                errores_detallados.append(error_msg)
-                
-                resultados_detallados.append({
-                    "referencia_proceso": referencia_proceso,
-                    "success": False,
-                    "error": str(e)
-                })
-        
-        # 4. Calcular tiempo de procesamiento
-        end_time = time.time()
-        tiempo_procesamiento = round(end_time - start_time, 2)
-        
-        # 5. Preparar respuesta final
-        mensaje_resumen = f"Se procesaron {procesos_procesados} procesos de empréstito exitosamente"
-        if procesos_con_errores > 0:
-            mensaje_resumen += f" ({procesos_con_errores} con errores)"
-        
-        resultado_final = {
-            "success": True,
-            "message": mensaje_resumen,
-            "resumen_procesamiento": {
-                "total_procesos_encontrados": total_procesos,
-                "procesos_procesados": procesos_procesados,
-                "procesos_actualizados": procesos_actualizados,
-                "procesos_sin_cambios": procesos_sin_cambios,
-                "procesos_con_errores": procesos_con_errores
-            },
-            "resultados_detallados": resultados_detallados,
-            "estadisticas": {
-                "total_campos_actualizados": total_campos_actualizados,
-                "tiempo_procesamiento": f"{tiempo_procesamiento} segundos"
-            },
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # 6. Agregar errores si los hay
-        if errores_detallados:
-            resultado_final["errores"] = errores_detallados[:10]  # Máximo 10 errores
-        
-        logger.info(f"""
-✅ Procesamiento completo finalizado:
-   📊 Total procesos: {total_procesos}
-   ✅ Procesados: {procesos_procesados}
-   🔄 Actualizados: {procesos_actualizados}
-   ℹ️ Sin cambios: {procesos_sin_cambios}
-   ❌ Con errores: {procesos_con_errores}
-   📈 Campos actualizados: {total_campos_actualizados}
-   ⏱️ Tiempo: {tiempo_procesamiento}s
-        """)
-        
-        return resultado_final
+        return await sincronizar_procesos_emprestito(
+            db, resume=resume, on_progress=on_progress, should_stop=should_stop
+        )
         
     except Exception as e:
         logger.error(f"Error procesando todos los procesos de empréstito: {e}")
@@ -3769,57 +3566,34 @@ async def guardar_proyecciones_emprestito(registros: List[Dict[str, Any]]) -> Di
                 "error": "No se pudo conectar a Firestore"
             }
         
-        # Limpiar la colección existente (reemplazar datos completos)
-        logger.info("🗑️ Limpiando colección proyecciones_emprestito existente...")
-        collection_ref = db.collection('proyecciones_emprestito')
-        
-        # Eliminar documentos existentes
-        docs = collection_ref.stream()
-        batch = db.batch()
-        docs_eliminados = 0
-        
-        for doc in docs:
-            batch.delete(doc.reference)
-            docs_eliminados += 1
-            
-            # Ejecutar batch cada 500 documentos para evitar límites
-            if docs_eliminados % 500 == 0:
-                batch.commit()
-                batch = db.batch()
-        
-        # Ejecutar batch final si hay documentos pendientes
-        if docs_eliminados % 500 != 0:
-            batch.commit()
-        
-        logger.info(f"🗑️ Eliminados {docs_eliminados} documentos existentes")
-        
-        # Guardar nuevos registros
-        logger.info(f"💾 Guardando {len(registros)} nuevos registros...")
-        documentos_guardados = 0
-        
-        # Usar batch para operaciones eficientes
-        batch = db.batch()
-        
+        # ID determinístico por fila de la hoja para poder comparar con lo
+        # guardado: solo se escriben las filas que cambiaron y se borran las
+        # que ya no vienen (antes: borrar todo y recrear con ID automático)
+        ahora = datetime.now()
+        registros_por_id = {}
         for i, registro in enumerate(registros):
-            # Agregar timestamp de guardado
-            registro_con_timestamp = registro.copy()
-            registro_con_timestamp["fecha_guardado"] = datetime.now()
-            registro_con_timestamp["ultima_actualizacion"] = datetime.now()
-            
-            # Crear documento con ID automático
-            doc_ref = collection_ref.document()
-            batch.set(doc_ref, registro_con_timestamp)
-            documentos_guardados += 1
-            
-            # Ejecutar batch cada 500 documentos
-            if documentos_guardados % 500 == 0:
-                batch.commit()
-                batch = db.batch()
-                logger.info(f"💾 Guardados {documentos_guardados}/{len(registros)} registros...")
+            fila = registro.get("fila_origen") or i + 1
+            registros_por_id[f"fila_{int(fila):05d}"] = {
+                **registro,
+                "fecha_guardado": ahora,
+                "ultima_actualizacion": ahora,
+            }
+        
+        logger.info(f"💾 Sincronizando {len(registros_por_id)} registros en proyecciones_emprestito...")
+        conteos = await diff_upsert(
+            'proyecciones_emprestito',
+            registros_por_id,
+            mode="replace",
+            ignore_fields=("fecha_carga", "fecha_guardado", "ultima_actualizacion"),
+            db=db,
+        )
+        documentos_guardados = len(registros_por_id)
+        docs_eliminados = conteos["deleted"]
         
-        # Ejecutar batch final
-        if documentos_guardados % 500 != 0:
-            batch.commit()
+        logger.info(
+            f"🗑️ Eliminados {docs_eliminados} documentos; escritos {conteos['created'] + conteos['updated']}, "
+            f"sin cambios {conteos['unchanged']}"
+        )
         
         # Guardar metadatos de la carga
         metadatos_carga = {
@@ -3840,6 +3614,8 @@ async def guardar_proyecciones_emprestito(registros: List[Dict[str, Any]]) -> Di
             "message": f"Se guardaron {documentos_guardados} registros exitosamente",
             "registros_guardados": documentos_guardados,
             "docs_eliminados_previos": docs_eliminados,
+            "registros_escritos": conteos["created"] + conteos["updated"],
+            "registros_sin_cambios": conteos["unchanged"],
             "coleccion": "proyecciones_emprestito",
             "operacion": "reemplazo_completo",
             "metadatos_guardados": True
@@ -3875,8 +3651,7 @@ async def leer_proyecciones_emprestito() -> Dict[str, Any]:
             }
         
         # Leer todos los documentos de la colección
-        collection_ref = db.collection('proyecciones_emprestito')
-        docs = collection_ref.stream()
+        docs = await stream_collection('proyecciones_emprestito', db=db)
         
         proyecciones_data = []
         for doc in docs:
@@ -3934,8 +3709,8 @@ async def get_referencias_from_collection(db, collection_name: str, field_name:
         Set de referencias únicas (strings)
     """
     try:
-        collection_ref = db.collection(collection_name)
-        docs = collection_ref.stream()
+        # Solo se necesita el campo de referencia: proyección para aligerar el escaneo
+        docs = await stream_collection(collection_name, select=[field_name], db=db)
         referencias = set()
         
         for doc in docs:
@@ -4131,8 +3906,10 @@ async def get_proyecciones_sin_proceso() -> Dict[str, Any]:
             return {"success": False, "error": "No se pudo conectar a Firestore", "data": [], "count": 0}
 
         # Obtener todos los procesos existentes y construir un set de referencias
-        procesos_ref = db.collection('procesos_emprestito')
-        procesos_docs = list(procesos_ref.stream())
+        procesos_docs, proyecciones_docs = await asyncio.gather(
+            stream_collection('procesos_emprestito', select=['referencia_proceso'], db=db),
+            stream_collection('proyecciones_emprestito', db=db),
+        )
         referencias_procesos = set()
         for doc in procesos_docs:
             d = doc.to_dict()
@@ -4140,9 +3917,7 @@ async def get_proyecciones_sin_proceso() -> Dict[str, Any]:
             if ref:
                 referencias_procesos.add(str(ref).strip())
 
-        # Obtener todas las proyecciones
-        proyecciones_ref = db.collection('proyecciones_emprestito')
-        proyecciones_docs = list(proyecciones_ref.stream())
+        # Las proyecciones se cargaron junto con los procesos
 
         # PASO 1: Filtrar PRIMERO solo registros con referencia_proceso VÁLIDA (no nulo, no vacío, no cero)
         proyecciones_con_referencia_valida = []
@@ -4292,9 +4067,9 @@ async def actualizar_proyeccion_emprestito(referencia_proceso: str, datos_actual
             }
         
         # Buscar el documento por referencia_proceso
-        collection_ref = db.collection('proyecciones_emprestito')
-        query = collection_ref.where('referencia_proceso', '==', referencia_proceso)
-        docs = list(query.stream())
+        docs = await stream_collection(
+            'proyecciones_emprestito', where=[('referencia_proceso', '==', referencia_proceso)], db=db
+        )
         
         if not docs:
             return {
@@ -4415,6 +4190,7 @@ async def actualizar_orden_compra_por_numero(numero_orden: str, campos_actualiza
 
         # Actualizar documento
         doc.reference.update(datos_actualizacion)
+        invalidate_referencia_index('ordenes_compra_emprestito', doc.id)
 
         # Obtener documento actualizado
         doc_actualizado = doc.reference.get()
@@ -4483,6 +4259,7 @@ async def eliminar_orden_compra_por_numero(numero_orden: str) -> Dict[str, Any]:
         doc = query_resultado[0]
         datos_previos = serialize_datetime_objects(doc.to_dict())
         doc.reference.delete()
+        invalidate_referencia_index('ordenes_compra_emprestito', doc.id)
 
         logger.info(f"Orden de compra eliminada exitosamente por numero_orden: {numero_orden_limpio}")
 
@@ -4543,6 +4320,7 @@ async def eliminar_convenio_transferencia_por_referencia(referencia_contrato: st
         doc = query_resultado[0]
         datos_previos = serialize_datetime_objects(doc.to_dict())
         doc.reference.delete()
+        invalidate_referencia_index('convenios_transferencias_emprestito', doc.id)
 
         logger.info(f"Convenio eliminado exitosamente por referencia_contrato: {referencia_limpia}")
 
@@ -4631,6 +4409,7 @@ async def actualizar_convenio_por_referencia(referencia_contrato: str, campos_ac
 
         # Actualizar documento
         doc.reference.update(datos_actualizacion)
+        invalidate_referencia_index('convenios_transferencias_emprestito', doc.id)
 
         # Obtener documento actualizado
         doc_actualizado = doc.reference.get()
@@ -4727,6 +4506,7 @@ async def actualizar_contrato_secop_por_referencia(referencia_contrato: str, cam
 
         # Actualizar documento
         doc.reference.update(datos_actualizacion)
+        invalidate_referencia_index('contratos_emprestito', doc.id)
 
         # Obtener documento actualizado
         doc_actualizado = doc.reference.get()
@@ -16,17 +16,8 @@ logger = logging.getLogger(__name__)
 try:
     from api.scripts.emprestito_operations import serialize_datetime_objects, FIRESTORE_AVAILABLE
 except ImportError:
+    from api.core.serialization import to_jsonable as serialize_datetime_objects
     FIRESTORE_AVAILABLE = False
-    def serialize_datetime_objects(obj):
-        """Fallback si no está disponible"""
-        if isinstance(obj, dict):
-            return {key: serialize_datetime_objects(value) for key, value in obj.items()}
-        elif isinstance(obj, list):
-            return [serialize_datetime_objects(item) for item in obj]
-        elif isinstance(obj, datetime):
-            return obj.isoformat()
-        else:
-            return obj
 
 
 def apply_field_projection(data: List[Dict[str, Any]], fields: Optional[List[str]]) -> List[Dict[str, Any]]:
@@ -17,8 +17,9 @@ import uuid
 import logging
 from typing import Any, Dict, List, Optional
 
+from api.scripts.quality_snapshot_index import get_quality_index, record_filters
 from database.firebase_config import get_firestore_client
-from auth_system.centro_scoping import same_centro
+from database.firestore_repository import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -486,14 +487,6 @@ def _build_rules(summary: Dict[str, Any]) -> List[Dict[str, Any]]:
 def _persist_snapshot(db, report_id: str, payload: Dict[str, Any], records: List[Dict[str, Any]]) -> None:
     """Persiste snapshot y registros en Firestore."""
     report_ref = db.collection(EMPRESTITO_QUALITY_REPORTS).document(report_id)
-    report_ref.set(payload)
-
-    db.collection(EMPRESTITO_QUALITY_LATEST).document("latest").set({
-        "report_id": report_id,
-        "generated_at": payload.get("generated_at"),
-        "filtro": payload.get("filtro", {}),
-    })
-
     batch = db.batch()
     writes = 0
 
@@ -531,6 +524,15 @@ def _persist_snapshot(db, report_id: str, payload: Dict[str, Any], records: List
     if writes > 0:
         batch.commit()
 
+    # El reporte se publica al final: el índice local de un report_id se
+    # construye una sola vez y no debe ver registros a medio escribir
+    report_ref.set(payload)
+    db.collection(EMPRESTITO_QUALITY_LATEST).document("latest").set({
+        "report_id": report_id,
+        "generated_at": payload.get("generated_at"),
+        "filtro": payload.get("filtro", {}),
+    })
+
 
 # ---------------------------------------------------------------------------
 # Lectura de reportes
@@ -594,41 +596,39 @@ async def get_emprestito_quality_records(
     centro_gestor: Optional[str] = None,
     tipo_registro: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Retorna registros individuales evaluados con paginación offset."""
+    """Retorna registros individuales evaluados con paginación offset (índice local por reporte)."""
     db = _get_db()
     selected = report_id or _read_latest_report_id(db)
 
     if selected is None:
         return {"success": False, "error": "No existe snapshot de calidad de empréstito."}
 
-    # Leer todos los registros del reporte
-    query = db.collection(EMPRESTITO_QUALITY_RECORDS)
-    docs = [d for d in query.stream() if (d.to_dict() or {}).get("report_id") == selected]
-
-    all_records = []
-    for d in docs:
-        data = d.to_dict() or {}
-        # Filtros
-        if tipo_registro and data.get("record_type") != tipo_registro:
-            continue
-        if centro_gestor and not same_centro(data.get("nombre_centro_gestor"), centro_gestor):
-            continue
-        all_records.append(data)
+    if not db.collection(EMPRESTITO_QUALITY_REPORTS).document(selected).get().exists:
+        return {"success": False, "error": f"No se encontró report_id: {selected}"}
 
-    all_records.sort(key=lambda r: r.get("record_index", 0))
+    def loader():
+        docs = db.collection(EMPRESTITO_QUALITY_RECORDS).where("report_id", "==", selected).stream()
+        records = sorted((d.to_dict() or {} for d in docs), key=lambda r: r.get("record_index", 0))
+        return records, []
 
-    # Paginar
     size = max(1, min(limit, 200))
     offset = (max(1, page) - 1) * size
-    paged = all_records[offset:offset + size]
-    total_pages = max(1, -(-len(all_records) // size))
+    where = record_filters(record_type=tipo_registro, centro=centro_gestor)
+
+    def _read():
+        index = get_quality_index("emprestito", selected, loader)
+        rows = index.select("records", where, order_by=("record_index",), offset=offset, limit=size)
+        return rows, index.count("records", where)
+
+    paged, total = await run_blocking(EMPRESTITO_QUALITY_RECORDS, _read)
+    total_pages = max(1, -(-total // size))
 
     return {
         "success": True,
         "report_id": selected,
         "page": page,
         "limit": size,
-        "total_records": len(all_records),
+        "total_records": total,
         "total_pages": total_pages,
         "has_more": page < total_pages,
         "records": paged,
@@ -0,0 +1,290 @@
+"""
+Índice de Referencias de Empréstito
+Mapa en memoria referencia → {nombre_centro_gestor, bp, referencia_proceso}
+construido desde ``contratos_emprestito``, ``ordenes_compra_emprestito``
+(clave ``numero_orden``) y ``convenios_transferencias_emprestito``, para que
+los lectores de ``reportes_contratos`` no recorran las tres colecciones en cada
+petición.
+
+- Se carga una vez y se recarga cuando pasan ``EMPRESTITO_INDEX_TTL_SECONDS``
+  (red de seguridad para escrituras de otros procesos).
+- Las rutas de escritura de empréstito llaman ``invalidate_referencia_index``:
+  con ``doc_id`` el documento se relee en la próxima consulta; con solo la
+  colección se recarga esa colección; sin argumentos, todo el índice.
+- Resolución de una referencia: el primer documento que tenga centro gestor
+  o bp, en el orden contratos → órdenes → convenios (el mismo que usaba
+  ``get_all_centros_gestores_map``).
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from api.core.config import int_from_env
+from database.firestore_repository import run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+EMPRESTITO_INDEX_TTL_SECONDS = int_from_env("EMPRESTITO_INDEX_TTL_SECONDS", 600)
+
+# (colección, campo de referencia) en orden de prioridad
+INDEX_SOURCES: Tuple[Tuple[str, str], ...] = (
+    ("contratos_emprestito", "referencia_contrato"),
+    ("ordenes_compra_emprestito", "numero_orden"),
+    ("convenios_transferencias_emprestito", "referencia_contrato"),
+)
+_PRIORITY = {collection: i for i, (collection, _) in enumerate(INDEX_SOURCES)}
+_REF_FIELD = dict(INDEX_SOURCES)
+
+# Un documento resuelve una referencia si trae alguno de estos campos
+_RESOLVE_FIELDS = ("nombre_centro_gestor", "bp")
+
+_GET_ALL_CHUNK_SIZE = 100
+
+DocKey = Tuple[str, str]
+
+
+def index_entry(collection: str, doc_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos del documento que guarda el índice."""
+    referencia = data.get(_REF_FIELD[collection])
+    return {
+        "referencia": str(referencia).strip() if referencia else "",
+        "nombre_centro_gestor": data.get("nombre_centro_gestor") or data.get("nombreCentroGestor") or "",
+        "bp": data.get("bp") or "",
+        "referencia_proceso": data.get("referencia_proceso") or "",
+        "estado_contrato": data.get("estado_contrato"),
+        "valor_contrato": data.get("valor_contrato"),
+        "contratista": data.get("nombre_contratista") or data.get("proveedor"),
+        "collection": collection,
+        "doc_id": doc_id,
+    }
+
+
+def _centro_key(value: Any) -> str:
+    return value.strip() if isinstance(value, str) else ""
+
+
+class ReferenciaIndex:
+    """Índice por referencia y por centro gestor; las lecturas devuelven copias."""
+
+    def __init__(
+        self,
+        db_getter: Optional[Callable[[], Any]] = None,
+        ttl_seconds: int = EMPRESTITO_INDEX_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._db_getter = db_getter
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._docs: Dict[DocKey, Dict[str, Any]] = {}
+        self._by_ref: Dict[str, Set[DocKey]] = {}
+        self._by_centro: Dict[str, Set[DocKey]] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale_collections: Set[str] = set()
+        self._dirty: Set[DocKey] = set()
+        self._stats = {"loads": 0, "collection_loads": 0, "point_reads": 0}
+
+    # ------------------------------------------------------------------
+    # Carga e índices
+    # ------------------------------------------------------------------
+
+    def _db(self, db=None):
+        if db is not None:
+            return db
+        if self._db_getter is not None:
+            return self._db_getter()
+        from database.firebase_config import get_firestore_client
+
+        return get_firestore_client()
+
+    def _unindex(self, key: DocKey) -> None:
+        old = self._docs.pop(key, None)
+        if old is None:
+            return
+        for index, value in ((self._by_ref, old["referencia"]), (self._by_centro, _centro_key(old["nombre_centro_gestor"]))):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
+
+    def _index(self, collection: str, doc_id: str, data: Dict[str, Any]) -> None:
+        key = (collection, doc_id)
+        self._unindex(key)
+        entry = index_entry(collection, doc_id, data)
+        self._docs[key] = entry
+        if entry["referencia"]:
+            self._by_ref.setdefault(entry["referencia"], set()).add(key)
+        centro = _centro_key(entry["nombre_centro_gestor"])
+        if centro:
+            self._by_centro.setdefault(centro, set()).add(key)
+
+    def _load_collection(self, db, collection: str) -> None:
+        docs = list(db.collection(collection).stream())
+        with self._lock:
+            for key in [k for k in self._docs if k[0] == collection]:
+                self._unindex(key)
+            for doc in docs:
+                self._index(collection, doc.id, doc.to_dict() or {})
+            self._stale_collections.discard(collection)
+            self._dirty = {k for k in self._dirty if k[0] != collection}
+            self._stats["collection_loads"] += 1
+
+    def _read_docs(self, db, keys: List[DocKey]) -> None:
+        found: Dict[DocKey, Optional[Dict[str, Any]]] = {key: None for key in keys}
+        for collection in {c for c, _ in keys}:
+            ids = [doc_id for c, doc_id in keys if c == collection]
+            ref = db.collection(collection)
+            for i in range(0, len(ids), _GET_ALL_CHUNK_SIZE):
+                for doc in db.get_all([ref.document(doc_id) for doc_id in ids[i : i + _GET_ALL_CHUNK_SIZE]]):
+                    if doc.exists:
+                        found[(collection, doc.id)] = doc.to_dict() or {}
+        with self._lock:
+            for key, data in found.items():
+                if data is None:
+                    self._unindex(key)
+                else:
+                    self._index(key[0], key[1], data)
+                self._dirty.discard(key)
+            self._stats["point_reads"] += len(keys)
+
+    def refresh(self, db=None, force: bool = False) -> None:
+        """Recarga lo vencido o invalidado (todo con ``force``)."""
+        with self._lock:
+            expired = (
+                force
+                or self._loaded_at is None
+                or self._clock() - self._loaded_at >= self.ttl_seconds
+            )
+            stale = [c for c, _ in INDEX_SOURCES] if expired else sorted(self._stale_collections)
+            dirty = sorted(self._dirty)
+        if not stale and not dirty:
+            return
+        db = self._db(db)
+        for collection in stale:
+            self._load_collection(db, collection)
+        if expired:
+            with self._lock:
+                self._loaded_at = self._clock()
+                self._stats["loads"] += 1
+            logger.debug("Índice de referencias de empréstito cargado: %d documentos", len(self._docs))
+            return
+        dirty = [key for key in dirty if key[0] not in stale]
+        if dirty:
+            self._read_docs(db, dirty)
+
+    def invalidate(self, collection: Optional[str] = None, doc_id: Optional[str] = None) -> None:
+        """Marca un documento, una colección o todo el índice para releerlo."""
+        with self._lock:
+            if collection is None:
+                self._loaded_at = None
+            elif collection not in _PRIORITY:
+                return
+            elif doc_id:
+                self._dirty.add((collection, str(doc_id)))
+            else:
+                self._stale_collections.add(collection)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _resolve(self, referencia: str, fields: Tuple[str, ...] = _RESOLVE_FIELDS) -> Optional[Dict[str, Any]]:
+        candidates = [
+            self._docs[key]
+            for key in self._by_ref.get(referencia, ())
+            if any(self._docs[key][field] for field in fields)
+        ]
+        if not candidates:
+            return None
+        return dict(min(candidates, key=lambda e: (_PRIORITY[e["collection"]], e["doc_id"])))
+
+    def lookup(
+        self, referencia: str, db=None, fields: Tuple[str, ...] = _RESOLVE_FIELDS
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Entrada de ``referencia`` (centro gestor, bp, proceso...) o None.
+
+        Solo cuentan los documentos con alguno de ``fields`` no vacío.
+        """
+        if not referencia:
+            return None
+        self.refresh(db)
+        with self._lock:
+            return self._resolve(str(referencia).strip(), fields)
+
+    def lookup_many(self, referencias: Iterable[str], db=None) -> Dict[str, Dict[str, Any]]:
+        self.refresh(db)
+        with self._lock:
+            result = {}
+            for referencia in referencias:
+                entry = self._resolve(str(referencia).strip()) if referencia else None
+                if entry is not None:
+                    result[referencia] = entry
+            return result
+
+    def centro_gestor_map(self, db=None) -> Dict[str, Dict[str, str]]:
+        """Mapa referencia → {nombre_centro_gestor, bp} (formato de ``get_all_centros_gestores_map``)."""
+        self.refresh(db)
+        with self._lock:
+            result = {}
+            for referencia in self._by_ref:
+                entry = self._resolve(referencia)
+                if entry is not None:
+                    result[referencia] = {"nombre_centro_gestor": entry["nombre_centro_gestor"], "bp": entry["bp"]}
+            return result
+
+    def referencias_by_centro(self, nombre_centro_gestor: str, db=None) -> Set[str]:
+        """Referencias de los documentos de cualquier colección con ese centro gestor."""
+        self.refresh(db)
+        with self._lock:
+            return {
+                self._docs[key]["referencia"]
+                for key in self._by_centro.get(_centro_key(nombre_centro_gestor), ())
+                if self._docs[key]["referencia"]
+            }
+
+    def entries(self, collection: str, db=None) -> List[Dict[str, Any]]:
+        """Todas las entradas de una colección, ordenadas por doc_id."""
+        self.refresh(db)
+        with self._lock:
+            return [dict(self._docs[key]) for key in sorted(k for k in self._docs if k[0] == collection)]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self._docs),
+                "referencias": len(self._by_ref),
+                "centros": len(self._by_centro),
+                "ttl_seconds": self.ttl_seconds,
+                **self._stats,
+            }
+
+
+_index: Optional[ReferenciaIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_referencia_index() -> ReferenciaIndex:
+    """Índice compartido del proceso."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = ReferenciaIndex()
+        return _index
+
+
+async def get_fresh_referencia_index(db=None) -> ReferenciaIndex:
+    """Índice compartido con las recargas pendientes hechas en el pool de Firestore."""
+    index = get_referencia_index()
+    await run_blocking(INDEX_SOURCES[0][0], index.refresh, db)
+    return index
+
+
+def invalidate_referencia_index(collection: Optional[str] = None, doc_id: Optional[str] = None) -> None:
+    """Marca un documento, una colección o todo el índice; no carga nada si aún no se usó."""
+    if _index is not None:
+        _index.invalidate(collection, doc_id)
@@ -16,6 +16,8 @@ except ImportError:
     gcp_exceptions = None
 
 from database.firebase_config import get_firestore_client, get_auth_client, PROJECT_ID
+from database.firestore_repository import fetch_page
+from database.pagination import InvalidCursorError, pagination_block
 BATCH_SIZE = 500
 TIMEOUT = 30
 
@@ -250,7 +252,47 @@ async def get_collections_summary() -> Dict[str, Any]:
         }
 
 
-async def get_proyectos_presupuestales(limit: Optional[int] = 500, offset: Optional[int] = None) -> Dict[str, Any]:
+async def _fetch_ejecucion_presupuestal_page(
+    db,
+    where: List[tuple],
+    limit: Optional[int],
+    offset: Optional[int],
+    cursor: Optional[str],
+) -> Dict[str, Any]:
+    """Página de "ejecucion_presupuestal" por cursor (``offset`` solo sin cursor)."""
+    page = await fetch_page(
+        "ejecucion_presupuestal",
+        limit=limit if limit and limit > 0 else 500,
+        where=where,
+        cursor=cursor,
+        offset=offset or 0,
+        db=db,
+    )
+    proyectos = []
+    for doc in page["docs"]:
+        doc_data = doc.to_dict()
+        if doc_data:  # Verificar que el documento no esté vacío
+            doc_data["id"] = doc.id  # Incluir el ID del documento
+            proyectos.append(doc_data)
+    page["data"] = proyectos
+    return page
+
+
+def _invalid_cursor_result(e: InvalidCursorError) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "error": f"Cursor de paginación inválido: {str(e)}",
+        "status_code": 400,
+        "data": [],
+        "count": 0
+    }
+
+
+async def get_proyectos_presupuestales(
+    limit: Optional[int] = 500,
+    offset: Optional[int] = None,
+    cursor: Optional[str] = None
+) -> Dict[str, Any]:
     """
     Obtener documentos de la colección "proyectos_presupuestales" con paginación
     
@@ -258,7 +300,8 @@ async def get_proyectos_presupuestales(limit: Optional[int] = 500, offset: Optio
     
     Args:
         limit: Número máximo de documentos a retornar (default: 500)
-        offset: Saltar N documentos (paginación)
+        offset: Saltar N documentos (compatibilidad; preferir ``cursor``)
+        cursor: ``next_cursor`` de la página anterior
     
     Returns:
         Dict con proyectos presupuestales paginados
@@ -276,25 +319,9 @@ async def get_proyectos_presupuestales(limit: Optional[int] = 500, offset: Optio
         if db is None:
             raise Exception("No se pudo conectar a Firestore")
         
-        # OPTIMIZACIÓN: Aplicar límite para reducir carga
-        collection_ref = db.collection("ejecucion_presupuestal")
-        
-        # Aplicar offset si se proporciona
-        if offset:
-            # Firestore no soporta offset directo, simular con limit + skip
-            docs = collection_ref.limit(limit + offset).stream()
-            all_docs = list(docs)
-            docs_to_process = all_docs[offset:]
-        else:
-            docs = collection_ref.limit(limit).stream()
-            docs_to_process = docs
-        
-        proyectos = []
-        for doc in docs_to_process:
-            doc_data = doc.to_dict()
-            if doc_data:  # Verificar que el documento no esté vacío
-                doc_data["id"] = doc.id  # Incluir el ID del documento
-                proyectos.append(doc_data)
+        # Keyset: cada página continúa tras el último documento entregado
+        page = await _fetch_ejecucion_presupuestal_page(db, [], limit, offset, cursor)
+        proyectos = page["data"]
         
         return {
             "success": True,
@@ -302,13 +329,11 @@ async def get_proyectos_presupuestales(limit: Optional[int] = 500, offset: Optio
             "count": len(proyectos),
             "collection": "ejecucion_presupuestal",
             "timestamp": datetime.now().isoformat(),
-            "pagination": {
-                "limit": limit,
-                "offset": offset or 0,
-                "returned": len(proyectos)
-            }
+            "pagination": pagination_block(limit, offset, len(proyectos), page, cursor)
         }
         
+    except InvalidCursorError as e:
+        return _invalid_cursor_result(e)
     except Exception as e:
         return {
             "success": False,
@@ -377,7 +402,8 @@ async def get_unique_nombres_centros_gestores() -> Dict[str, Any]:
 async def get_proyectos_presupuestales_by_bpin(
     bpin: str,
     limit: Optional[int] = 200,
-    offset: Optional[int] = 0
+    offset: Optional[int] = 0,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Obtener proyectos presupuestales filtrados por BPIN
@@ -407,22 +433,11 @@ async def get_proyectos_presupuestales_by_bpin(
         except ValueError:
             raise Exception(f"BPIN '{bpin}' no es un número válido")
         
-        # Filtrar por BPIN con paginación
-        collection_ref = db.collection("ejecucion_presupuestal")
-        query = collection_ref.where("bpin", "==", bpin_int)
-
-        if offset and offset > 0:
-            query = query.offset(offset)
-        if limit and limit > 0:
-            query = query.limit(limit)
-
-        docs = query.stream()
-        
-        proyectos = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data["id"] = doc.id  # Incluir el ID del documento
-            proyectos.append(doc_data)
+        # Filtrar por BPIN con paginación por cursor
+        page = await _fetch_ejecucion_presupuestal_page(
+            db, [("bpin", "==", bpin_int)], limit, offset, cursor
+        )
+        proyectos = page["data"]
         
         return {
             "success": True,
@@ -430,14 +445,12 @@ async def get_proyectos_presupuestales_by_bpin(
             "count": len(proyectos),
             "collection": "ejecucion_presupuestal",
             "filter": {"field": "bpin", "value": bpin_int},
-            "pagination": {
-                "limit": limit,
-                "offset": offset or 0,
-                "returned": len(proyectos)
-            },
+            "pagination": pagination_block(limit, offset, len(proyectos), page, cursor),
             "timestamp": datetime.now().isoformat()
         }
         
+    except InvalidCursorError as e:
+        return _invalid_cursor_result(e)
     except Exception as e:
         return {
             "success": False,
@@ -450,7 +463,8 @@ async def get_proyectos_presupuestales_by_bpin(
 async def get_proyectos_presupuestales_by_bp(
     bp: str,
     limit: Optional[int] = 200,
-    offset: Optional[int] = 0
+    offset: Optional[int] = 0,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Obtener proyectos presupuestales filtrados por BP
@@ -474,22 +488,11 @@ async def get_proyectos_presupuestales_by_bp(
         if db is None:
             raise Exception("No se pudo conectar a Firestore")
         
-        # Filtrar por BP con paginación
-        collection_ref = db.collection("ejecucion_presupuestal")
-        query = collection_ref.where("bp", "==", bp)
-
-        if offset and offset > 0:
-            query = query.offset(offset)
-        if limit and limit > 0:
-            query = query.limit(limit)
-
-        docs = query.stream()
-        
-        proyectos = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data["id"] = doc.id  # Incluir el ID del documento
-            proyectos.append(doc_data)
+        # Filtrar por BP con paginación por cursor
+        page = await _fetch_ejecucion_presupuestal_page(
+            db, [("bp", "==", bp)], limit, offset, cursor
+        )
+        proyectos = page["data"]
         
         return {
             "success": True,
@@ -497,14 +500,12 @@ async def get_proyectos_presupuestales_by_bp(
             "count": len(proyectos),
             "collection": "ejecucion_presupuestal",
             "filter": {"field": "bp", "value": bp},
-            "pagination": {
-                "limit": limit,
-                "offset": offset or 0,
-                "returned": len(proyectos)
-            },
+            "pagination": pagination_block(limit, offset, len(proyectos), page, cursor),
             "timestamp": datetime.now().isoformat()
         }
         
+    except InvalidCursorError as e:
+        return _invalid_cursor_result(e)
     except Exception as e:
         return {
             "success": False,
@@ -517,7 +518,8 @@ async def get_proyectos_presupuestales_by_bp(
 async def get_proyectos_presupuestales_by_centro_gestor(
     nombre_centro_gestor: str,
     limit: Optional[int] = 200,
-    offset: Optional[int] = 0
+    offset: Optional[int] = 0,
+    cursor: Optional[str] = None
 ) -> Dict[str, Any]:
     """
     Obtener proyectos presupuestales filtrados por nombre de centro gestor
@@ -541,22 +543,11 @@ async def get_proyectos_presupuestales_by_centro_gestor(
         if db is None:
             raise Exception("No se pudo conectar a Firestore")
         
-        # Filtrar por nombre_centro_gestor con paginación
-        collection_ref = db.collection("ejecucion_presupuestal")
-        query = collection_ref.where("nombre_centro_gestor", "==", nombre_centro_gestor)
-
-        if offset and offset > 0:
-            query = query.offset(offset)
-        if limit and limit > 0:
-            query = query.limit(limit)
-
-        docs = query.stream()
-        
-        proyectos = []
-        for doc in docs:
-            doc_data = doc.to_dict()
-            doc_data["id"] = doc.id  # Incluir el ID del documento
-            proyectos.append(doc_data)
+        # Filtrar por nombre_centro_gestor con paginación por cursor
+        page = await _fetch_ejecucion_presupuestal_page(
+            db, [("nombre_centro_gestor", "==", nombre_centro_gestor)], limit, offset, cursor
+        )
+        proyectos = page["data"]
         
         return {
             "success": True,
@@ -564,14 +555,12 @@ async def get_proyectos_presupuestales_by_centro_gestor(
             "count": len(proyectos),
             "collection": "ejecucion_presupuestal",
             "filter": {"field": "nombre_centro_gestor", "value": nombre_centro_gestor},
-            "pagination": {
-                "limit": limit,
-                "offset": offset or 0,
-                "returned": len(proyectos)
-            },
+            "pagination": pagination_block(limit, offset, len(proyectos), page, cursor),
             "timestamp": datetime.now().isoformat()
         }
         
+    except InvalidCursorError as e:
+        return _invalid_cursor_result(e)
     except Exception as e:
         return {
             "success": False,
@@ -26,6 +26,7 @@ MESES_ABREV: Dict[str, int] = {
 # Importar Firebase
 try:
     from database.firebase_config import get_firestore_client
+    from database.firestore_repository import diff_upsert
     FIREBASE_AVAILABLE = True
 except ImportError:
     FIREBASE_AVAILABLE = False
@@ -220,80 +221,38 @@ async def save_flujo_caja_to_firebase(records: List[Dict[str, Any]], update_mode
     try:
         db = get_firestore_client()
         collection_name = "flujo_caja_emprestito"
-        collection_ref = db.collection(collection_name)
-        
-        # Determinar estrategia según el modo
-        if update_mode == "replace":
-            # Eliminar todos los documentos existentes
-            docs = collection_ref.limit(1000).stream()
-            batch = db.batch()
-            count = 0
-            for doc in docs:
-                batch.delete(doc.reference)
-                count += 1
-                if count % 500 == 0:  # Commit en lotes de 500
-                    batch.commit()
-                    batch = db.batch()
-            if count % 500 != 0:
-                batch.commit()
         
-        # Agregar/actualizar nuevos registros
-        successful_saves = 0
+        # Registros por id_registro (el último repetido gana, como con set)
         failed_saves = 0
-        updated_records = 0
-        
-        batch = db.batch()
-        batch_count = 0
-        
+        records_by_id = {}
         for record in records:
-            try:
-                doc_id = record['id_registro']
-                doc_ref = collection_ref.document(doc_id)
-                
-                if update_mode == "merge":
-                    # Verificar si existe para determinar si es actualización
-                    existing_doc = doc_ref.get()
-                    if existing_doc.exists:
-                        updated_records += 1
-                    
-                    batch.set(doc_ref, record, merge=True)
-                elif update_mode == "append":
-                    # Solo agregar si no existe
-                    existing_doc = doc_ref.get()
-                    if not existing_doc.exists:
-                        batch.set(doc_ref, record)
-                        successful_saves += 1
-                    else:
-                        # Ya existe, no hacer nada
-                        continue
-                else:  # replace
-                    batch.set(doc_ref, record)
-                
-                batch_count += 1
-                
-                # Commit en lotes de 500
-                if batch_count >= 500:
-                    batch.commit()
-                    batch = db.batch()
-                    successful_saves += batch_count
-                    batch_count = 0
-                    
-            except Exception as e:
-                logger.error(f"Error guardando registro {record.get('id_registro', 'unknown')}: {e}")
+            doc_id = record.get('id_registro')
+            if not doc_id:
+                logger.error(f"Registro sin id_registro, se omite: {record}")
                 failed_saves += 1
+                continue
+            records_by_id[str(doc_id)] = record
         
-        # Commit del último lote
-        if batch_count > 0:
-            batch.commit()
-            successful_saves += batch_count
+        # Lectura de existentes en lotes y escritura solo de lo que cambió;
+        # replace además borra (paginando) los registros que ya no vienen
+        counts = await diff_upsert(
+            collection_name,
+            records_by_id,
+            mode=update_mode if update_mode in ("merge", "append", "replace") else "merge",
+            ignore_fields=("fecha_procesamiento",),
+            db=db,
+        )
         
         return {
             "success": True,
             "message": f"Flujos de caja guardados exitosamente en {collection_name}",
             "summary": {
                 "registros_procesados": len(records),
-                "guardados_exitosamente": successful_saves,
-                "actualizados": updated_records if update_mode == "merge" else 0,
+                "guardados_exitosamente": counts["created"] + counts["updated"] + counts["unchanged"],
+                "actualizados": counts["updated"] if update_mode == "merge" else 0,
+                "sin_cambios": counts["unchanged"],
+                "eliminados": counts["deleted"],
+                "escrituras": counts["written"],
                 "errores": failed_saves,
                 "modo_actualizacion": update_mode,
                 "coleccion": collection_name
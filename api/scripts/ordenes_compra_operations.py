@@ -5,7 +5,9 @@ Operaciones para obtener órdenes de compra enriquecidas
 import logging
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from api.core.serialization import LEGACY_DATETIME_FORMAT, to_jsonable
 from database.firebase_config import get_firestore_client
+from database.firestore_repository import get_all_paginated
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -20,41 +22,10 @@ except Exception as e:
     logger.warning(f"Firebase no disponible: {e}")
 
 def serialize_datetime_objects(obj):
-    """Serializar objetos datetime para JSON"""
-    if isinstance(obj, dict):
-        return {key: serialize_datetime_objects(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime_objects(item) for item in obj]
-    elif hasattr(obj, 'timestamp'):  # Firebase Timestamp
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(obj, datetime):
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        return obj
+    """Serializar objetos datetime para JSON (formato 'YYYY-MM-DD HH:MM:SS')"""
+    return to_jsonable(obj, LEGACY_DATETIME_FORMAT)
 
 
-def get_all_docs_paginated(collection_ref, batch_size: int = 500):
-    """Obtener todos los documentos de una colección usando paginación por cursor."""
-    docs = []
-    last_doc = None
-
-    while True:
-        query = collection_ref.order_by("__name__").limit(batch_size)
-        if last_doc is not None:
-            query = query.start_after(last_doc)
-
-        batch_docs = query.get()
-        if not batch_docs:
-            break
-
-        docs.extend(batch_docs)
-        last_doc = batch_docs[-1]
-
-        if len(batch_docs) < batch_size:
-            break
-
-    return docs
-
 async def get_ordenes_compra_emprestito_all() -> Dict[str, Any]:
     """Obtener todos los registros de la colección ordenes_compra_emprestito"""
     try:
@@ -65,8 +36,7 @@ async def get_ordenes_compra_emprestito_all() -> Dict[str, Any]:
         if db is None:
             return {"success": False, "error": "No se pudo conectar a Firestore", "data": [], "count": 0}
         
-        collection_ref = db.collection('ordenes_compra_emprestito')
-        docs = get_all_docs_paginated(collection_ref)
+        docs = await get_all_paginated('ordenes_compra_emprestito', db=db)
         ordenes_data = []
         
         for doc in docs:
@@ -16,6 +16,7 @@ except ImportError:
     firestore = None
 
 from database.firebase_config import get_firestore_client
+from database.firestore_repository import diff_upsert
 
 # Configuración
 COLLECTION_NAME = "proyectos_presupuestales"
@@ -52,8 +53,6 @@ async def process_proyectos_presupuestales_json(
         if db is None:
             raise Exception("No se pudo conectar a Firestore")
         
-        collection_ref = db.collection(COLLECTION_NAME)
-        
         if not proyectos_data:
             return {
                 "success": False,
@@ -63,49 +62,30 @@ async def process_proyectos_presupuestales_json(
                 "updated_count": 0
             }
         
-        # Si el modo es 'replace', limpiar colección primero
-        if update_mode == "replace":
-            docs = collection_ref.stream()
-            for doc in docs:
-                doc.reference.delete()
+        # Un documento por proyecto; el último con el mismo ID gana
+        now = datetime.now()
+        records = {}
+        for proyecto in proyectos_data:
+            records[_generate_document_id(proyecto)] = {
+                **proyecto,
+                "created_at": now,
+                "updated_at": now
+            }
         
-        processed_count = 0
-        created_count = 0
-        updated_count = 0
+        # Lectura de existentes en lotes y escritura solo de lo que cambió;
+        # 'replace' borra los que ya no vienen en vez de vaciar la colección.
+        # 'append' siempre sobrescribió los existentes: se trata como 'merge'.
+        counts = await diff_upsert(
+            COLLECTION_NAME,
+            records,
+            mode="replace" if update_mode == "replace" else "merge",
+            ignore_fields=("created_at", "updated_at"),
+            db=db,
+        )
         
-        # Procesar cada proyecto
-        for proyecto in proyectos_data:
-            try:
-                # Generar ID único
-                doc_id = _generate_document_id(proyecto)
-                doc_ref = collection_ref.document(doc_id)
-                
-                # Preparar datos del documento
-                doc_data = {
-                    **proyecto,
-                    "created_at": datetime.now(),
-                    "updated_at": datetime.now()
-                }
-                
-                # Verificar si existe para merge
-                if update_mode == "merge":
-                    doc_snapshot = doc_ref.get()
-                    if doc_snapshot.exists:
-                        doc_ref.update(doc_data)
-                        updated_count += 1
-                    else:
-                        doc_ref.set(doc_data)
-                        created_count += 1
-                else:
-                    # Modo append o replace
-                    doc_ref.set(doc_data)
-                    created_count += 1
-                
-                processed_count += 1
-                
-            except Exception as e:
-                print(f"Error procesando proyecto: {str(e)}")
-                continue
+        processed_count = len(proyectos_data)
+        created_count = counts["created"]
+        updated_count = counts["updated"]
         
         return {
             "success": True,
@@ -113,6 +93,8 @@ async def process_proyectos_presupuestales_json(
             "processed_count": processed_count,
             "created_count": created_count,
             "updated_count": updated_count,
+            "unchanged_count": counts["unchanged"],
+            "deleted_count": counts["deleted"],
             "collection_name": COLLECTION_NAME,
             "timestamp": datetime.now().isoformat()
         }
@@ -0,0 +1,362 @@
+"""
+Índice local de snapshots de calidad
+Cada reporte de calidad (unidades de proyecto, empréstito) se materializa una
+sola vez en un archivo SQLite de solo lectura con índices secundarios por tipo
+de registro, issues, centro gestor, severidad y campo. Los lectores paginados
+hacen búsquedas indexadas con conteos exactos y cursores estables (la posición
+del registro o issue en el snapshot) en lugar de filtrar en memoria.
+
+- Los reportes son inmutables: el archivo de un ``report_id`` se construye la
+  primera vez que se lee y se reutiliza (también entre procesos del host).
+- Los índices abiertos se cachean por ``report_id`` (``QUALITY_INDEX_CACHE_SIZE``).
+  Al salir del caché se cierran sus conexiones en todos los hilos.
+- La construcción escribe a un archivo temporal y lo renombra, así un lector
+  concurrente nunca abre un índice a medias. Se construye fuera del lock
+  global (un lock por reporte), así un reporte lento no bloquea a los demás.
+- ``QUALITY_INDEX_DIR`` guarda como máximo ``QUALITY_INDEX_MAX_FILES``
+  índices: tras cada construcción se borran los menos usados recientemente
+  (los reportes viejos dejan de leerse y salen solos).
+
+Uso:
+    index = get_quality_index("unidades", report_id, loader)
+    rows, next_cursor = index.seek("records", {"record_type": "unidad"}, after=-1, limit=50)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from api.core.config import int_from_env
+from auth_system.centro_scoping import centro_match_key
+
+logger = logging.getLogger(__name__)
+
+
+QUALITY_INDEX_DIR = os.getenv(
+    "QUALITY_INDEX_DIR", os.path.join(tempfile.gettempdir(), "gestor_api_quality_index")
+)
+QUALITY_INDEX_CACHE_SIZE = int_from_env("QUALITY_INDEX_CACHE_SIZE", 8)
+QUALITY_INDEX_MAX_FILES = int_from_env("QUALITY_INDEX_MAX_FILES", 32)
+# Temporales de construcciones interrumpidas más viejos que esto se borran
+_TMP_MAX_AGE_SECONDS = 3600
+
+# Columnas indexables por tabla; la primera es la posición (cursor)
+_COLUMNS = {
+    "records": ("record_index", "record_type", "has_issues", "centro_key", "centro_source", "source_doc_id"),
+    "issues": ("issue_index", "record_type", "severity", "field_key", "centro_key"),
+}
+
+_SCHEMA = """
+CREATE TABLE records (
+    record_index INTEGER PRIMARY KEY,
+    record_type TEXT,
+    has_issues INTEGER,
+    centro_key TEXT,
+    centro_source TEXT,
+    source_doc_id TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_records_type ON records (record_type, record_index);
+CREATE INDEX idx_records_issues ON records (has_issues, record_index);
+CREATE INDEX idx_records_centro ON records (centro_key, record_index);
+CREATE INDEX idx_records_source ON records (centro_source, record_type, source_doc_id);
+CREATE TABLE issues (
+    issue_index INTEGER PRIMARY KEY,
+    record_type TEXT,
+    severity TEXT,
+    field_key TEXT,
+    centro_key TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_issues_type ON issues (record_type, issue_index);
+CREATE INDEX idx_issues_severity ON issues (severity, issue_index);
+CREATE INDEX idx_issues_field ON issues (field_key, issue_index);
+CREATE INDEX idx_issues_centro ON issues (centro_key, issue_index);
+"""
+
+
+def _lower(value: Any) -> Optional[str]:
+    return str(value).lower() if value is not None else None
+
+
+def record_filters(
+    record_type: Optional[str] = None,
+    has_issues: Optional[bool] = None,
+    centro: Optional[str] = None,
+    centro_source: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filtros de ``records`` normalizados como se guardan en el índice."""
+    where: Dict[str, Any] = {}
+    if record_type:
+        where["record_type"] = record_type.lower()
+    if has_issues is not None:
+        where["has_issues"] = int(bool(has_issues))
+    if centro:
+        where["centro_key"] = centro_match_key(centro)
+    if centro_source:
+        where["centro_source"] = centro_source
+    return where
+
+
+def issue_filters(
+    record_type: Optional[str] = None,
+    severity: Optional[str] = None,
+    field: Optional[str] = None,
+    centro: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Filtros de ``issues`` normalizados como se guardan en el índice."""
+    where: Dict[str, Any] = {}
+    if record_type:
+        where["record_type"] = record_type.lower()
+    if severity:
+        where["severity"] = severity
+    if field:
+        where["field_key"] = field.lower()
+    if centro:
+        where["centro_key"] = centro_match_key(centro)
+    return where
+
+
+class QualitySnapshotIndex:
+    """Índice SQLite de solo lectura de un reporte de calidad."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        # Conexiones de todos los hilos, para cerrarlas al salir del caché
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+
+    @classmethod
+    def build(
+        cls, path: str, records: Iterable[Dict[str, Any]], issues: Iterable[Dict[str, Any]]
+    ) -> "QualitySnapshotIndex":
+        """
+        Construye el índice en ``path``.
+
+        Args:
+            records: Registros con ``record_index`` (orden del reporte)
+            issues: Issues ya en el orden de lectura; su posición es el cursor
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        con = sqlite3.connect(tmp_path)
+        try:
+            con.executescript("PRAGMA journal_mode = OFF; PRAGMA synchronous = OFF;" + _SCHEMA)
+            con.executemany(
+                "INSERT INTO records VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        int(record["record_index"]),
+                        _lower(record.get("record_type")),
+                        int(bool(record.get("has_issues"))),
+                        centro_match_key(record.get("nombre_centro_gestor")),
+                        record.get("nombre_centro_gestor_source"),
+                        record.get("source_doc_id"),
+                        json.dumps(record, ensure_ascii=False, default=str),
+                    )
+                    for record in records
+                ),
+            )
+            con.executemany(
+                "INSERT INTO issues VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    (
+                        index,
+                        _lower(issue.get("record_type")),
+                        issue.get("severity"),
+                        _lower(issue.get("field")),
+                        centro_match_key(issue.get("nombre_centro_gestor")),
+                        json.dumps(issue, ensure_ascii=False, default=str),
+                    )
+                    for index, issue in enumerate(issues)
+                ),
+            )
+            con.commit()
+        finally:
+            con.close()
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None or getattr(self._local, "generation", None) != self._generation:
+            # check_same_thread=False solo para que close() pueda cerrarla desde otro hilo
+            con = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            with self._connections_lock:
+                self._connections.append(con)
+            self._local.con = con
+            self._local.generation = self._generation
+        return con
+
+    @staticmethod
+    def _where(table: str, where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+        allowed = _COLUMNS[table]
+        clauses, params = [], []
+        for column, value in where.items():
+            if column not in allowed:
+                raise ValueError(f"Columna no indexada en {table}: {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        return (" AND ".join(clauses) or "1 = 1"), params
+
+    def count(self, table: str, where: Dict[str, Any]) -> int:
+        clause, params = self._where(table, where)
+        return self._conn().execute(f"SELECT COUNT(*) FROM {table} WHERE {clause}", params).fetchone()[0]
+
+    def seek(
+        self, table: str, where: Dict[str, Any], after: int = -1, limit: int = 50
+    ) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Página por cursor: filas con posición mayor que ``after``.
+
+        Returns:
+            ``(filas, siguiente_cursor)``; el cursor es la posición de la última
+            fila devuelta, o None si no hay más.
+        """
+        key = _COLUMNS[table][0]
+        clause, params = self._where(table, where)
+        rows = self._conn().execute(
+            f"SELECT {key}, data FROM {table} WHERE {clause} AND {key} > ? ORDER BY {key} LIMIT ?",
+            [*params, after, limit + 1],
+        ).fetchall()
+        next_cursor = rows[limit - 1][0] if len(rows) > limit else None
+        return [json.loads(data) for _, data in rows[:limit]], next_cursor
+
+    def select(
+        self, table: str, where: Dict[str, Any], order_by: Iterable[str], offset: int = 0, limit: int = 50
+    ) -> List[Dict[str, Any]]:
+        """Página por desplazamiento con otro orden (el snapshot es inmutable: la posición es estable)."""
+        order = list(order_by)
+        for column in order:
+            if column not in _COLUMNS[table]:
+                raise ValueError(f"Columna no indexada en {table}: {column}")
+        clause, params = self._where(table, where)
+        rows = self._conn().execute(
+            f"SELECT data FROM {table} WHERE {clause} ORDER BY {', '.join(order)} LIMIT ? OFFSET ?",
+            [*params, limit, offset],
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def close(self) -> None:
+        """Cierra las conexiones de todos los hilos; un uso posterior abre otra."""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._generation += 1
+        for con in connections:
+            con.close()
+
+
+Loader = Callable[[], Tuple[Iterable[Dict[str, Any]], Iterable[Dict[str, Any]]]]
+
+_indexes: "OrderedDict[str, QualitySnapshotIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+# Un lock por reporte en construcción: quien llega después espera ese reporte, no todos
+_build_locks: Dict[str, threading.Lock] = {}
+
+
+def _index_path(namespace: str, report_id: str) -> str:
+    safe_id = "".join(ch if ch.isalnum() or ch in "-_" else "_" for ch in report_id)
+    return os.path.join(QUALITY_INDEX_DIR, f"{namespace}__{safe_id}.sqlite3")
+
+
+def get_quality_index(namespace: str, report_id: str, loader: Loader) -> QualitySnapshotIndex:
+    """
+    Índice del reporte ``report_id``; si no existe se construye con
+    ``loader() -> (registros, issues)``. Bloqueante.
+    """
+    cache_key = f"{namespace}:{report_id}"
+    with _indexes_lock:
+        index = _indexes.get(cache_key)
+        if index is not None:
+            _indexes.move_to_end(cache_key)
+            return index
+        build_lock = _build_locks.setdefault(cache_key, threading.Lock())
+
+    with build_lock:
+        with _indexes_lock:
+            index = _indexes.get(cache_key)
+        if index is not None:
+            return index
+
+        path = _index_path(namespace, report_id)
+        built = False
+        if os.path.exists(path):
+            _touch(path)
+            index = QualitySnapshotIndex(path)
+        else:
+            records, issues = loader()
+            index = QualitySnapshotIndex.build(path, records, issues)
+            built = True
+            logger.info(f"Índice de calidad construido: {namespace}/{report_id}")
+
+        evicted = []
+        with _indexes_lock:
+            _indexes[cache_key] = index
+            _build_locks.pop(cache_key, None)
+            while len(_indexes) > max(1, QUALITY_INDEX_CACHE_SIZE):
+                evicted.append(_indexes.popitem(last=False)[1])
+            in_use = {cached.path for cached in _indexes.values()}
+
+    for old in evicted:
+        old.close()
+    if built:
+        _prune_index_dir(in_use)
+    return index
+
+
+def _touch(path: str) -> None:
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def _prune_index_dir(in_use: Iterable[str]) -> int:
+    """
+    Deja en ``QUALITY_INDEX_DIR`` los ``QUALITY_INDEX_MAX_FILES`` índices más
+    recientes (por último uso) y borra temporales huérfanos. Nunca borra los
+    índices abiertos en este proceso; en Linux los abiertos por otro proceso
+    siguen siendo legibles hasta que los cierre.
+    """
+    keep = {os.path.abspath(path) for path in in_use}
+    now = time.time()
+    indexes, removed = [], 0
+    try:
+        names = os.listdir(QUALITY_INDEX_DIR)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.abspath(os.path.join(QUALITY_INDEX_DIR, name))
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            continue
+        if name.endswith(".tmp"):
+            if now - mtime > _TMP_MAX_AGE_SECONDS:
+                removed += _remove(path)
+        elif name.endswith(".sqlite3") and path not in keep:
+            indexes.append((mtime, path))
+
+    excess = len(indexes) + len(keep) - max(1, QUALITY_INDEX_MAX_FILES)
+    for _, path in sorted(indexes)[:max(0, excess)]:
+        removed += _remove(path)
+    if removed:
+        logger.info(f"Índices de calidad eliminados de {QUALITY_INDEX_DIR}: {removed}")
+    return removed
+
+
+def _remove(path: str) -> int:
+    try:
+        os.remove(path)
+        return 1
+    except OSError:
+        return 0
@@ -9,13 +9,14 @@ import logging
 import json
 import mimetypes
 import unicodedata
-from functools import lru_cache
 from urllib.parse import urlparse
 from datetime import datetime
 from typing import Dict, Any, List, Tuple, Optional
 
 # Firebase imports
 from database.firebase_config import get_firestore_client
+from database.firestore_repository import query_in
+from api.core.serialization import to_jsonable
 
 # Intentar importar DatetimeWithNanoseconds, con fallback seguro
 try:
@@ -34,6 +35,9 @@ except Exception:
     S3DocumentManager = None
     BOTO3_AVAILABLE = False
 
+from api.utils.s3_clients import get_presigned_url_signer
+from api.scripts.emprestito_referencia_index import get_fresh_referencia_index
+
 # Configurar logger
 logger = logging.getLogger(__name__)
 
@@ -142,36 +146,29 @@ def _extract_bucket_key_from_url(url: str) -> Tuple[Optional[str], Optional[str]
         return None, None
 
 
-@lru_cache(maxsize=4)
-def _get_s3_client_for_presign(credentials_path: str = ""):
-    if not BOTO3_AVAILABLE or S3DocumentManager is None:
+def _presign_signer():
+    if not _presigned_enabled() or not BOTO3_AVAILABLE:
         return None
-    manager = S3DocumentManager(credentials_path=credentials_path or None)
-    return manager.s3_client
+    credentials_path = (
+        os.getenv("AWS_CREDENTIALS_FILE_REPORTES_CONTRATOS")
+        or os.getenv("AWS_CREDENTIALS_FILE_UNIDADES_PROYECTO")
+        or ""
+    )
+    return get_presigned_url_signer(credentials_path, _presigned_expiration())
+
+
+def _generate_presigned_urls(
+    pairs: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Optional[str]]:
+    """Firma en un solo lote; las firmas vigentes se reutilizan desde la caché del firmador."""
+    signer = _presign_signer()
+    if signer is None:
+        return {}
+    return signer.sign_many(pairs)
 
 
 def _generate_presigned_url(bucket: str, s3_key: str) -> Optional[str]:
-    if not _presigned_enabled() or not bucket or not s3_key:
-        return None
-    try:
-        credentials_path = (
-            os.getenv("AWS_CREDENTIALS_FILE_REPORTES_CONTRATOS")
-            or os.getenv("AWS_CREDENTIALS_FILE_UNIDADES_PROYECTO")
-            or ""
-        )
-        s3_client = _get_s3_client_for_presign(credentials_path)
-        if s3_client is None:
-            return None
-        return s3_client.generate_presigned_url(
-            "get_object",
-            Params={"Bucket": bucket, "Key": s3_key},
-            ExpiresIn=_presigned_expiration(),
-        )
-    except Exception as e:
-        logger.warning(
-            f"No se pudo generar presigned URL para s3://{bucket}/{s3_key}: {e}"
-        )
-        return None
+    return _generate_presigned_urls([(bucket, s3_key)]).get((bucket, s3_key))
 
 
 def _normalize_archivos_for_frontend(doc_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -181,10 +178,11 @@ def _normalize_archivos_for_frontend(doc_data: Dict[str, Any]) -> Dict[str, Any]
     documentos_urls = []
     archivos_normalizados = []
 
-    for idx, archivo in enumerate(archivos):
+    ubicaciones = []
+    for archivo in archivos:
         if not isinstance(archivo, dict):
+            ubicaciones.append(None)
             continue
-
         url_publica_directa = (
             archivo.get("url_publica")
             or archivo.get("s3_url")
@@ -200,8 +198,18 @@ def _normalize_archivos_for_frontend(doc_data: Dict[str, Any]) -> Dict[str, Any]
             )
             bucket = bucket or parsed_bucket
             s3_key = s3_key or parsed_key
+        ubicaciones.append((url_publica_directa, bucket, s3_key))
 
-        presigned_url = _generate_presigned_url(str(bucket or ""), str(s3_key or ""))
+    presigned_urls = _generate_presigned_urls(
+        [(str(u[1] or ""), str(u[2] or "")) for u in ubicaciones if u is not None]
+    )
+
+    for idx, archivo in enumerate(archivos):
+        if ubicaciones[idx] is None:
+            continue
+
+        url_publica_directa, bucket, s3_key = ubicaciones[idx]
+        presigned_url = presigned_urls.get((str(bucket or ""), str(s3_key or "")))
         url_publica = presigned_url or url_publica_directa
         content_type = str(archivo.get("content_type") or archivo.get("type") or "")
         extension = str(archivo.get("extension") or "").lower()
@@ -406,36 +414,7 @@ def convert_firebase_timestamps(doc_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Convertir timestamps de Firebase a strings serializables
     """
-    converted_data = {}
-    for key, value in doc_data.items():
-        # Verificar si el valor tiene el método isoformat (datetime-like)
-        if hasattr(value, "isoformat") and callable(getattr(value, "isoformat")):
-            # Convertir a ISO string
-            converted_data[key] = value.isoformat()
-        elif isinstance(value, datetime):
-            # Convertir datetime regular a ISO string
-            converted_data[key] = value.isoformat()
-        elif isinstance(value, dict):
-            # Recursivamente convertir diccionarios anidados
-            converted_data[key] = convert_firebase_timestamps(value)
-        elif isinstance(value, list):
-            # Convertir listas que pueden contener objetos con fechas
-            converted_list = []
-            for item in value:
-                if isinstance(item, dict):
-                    converted_list.append(convert_firebase_timestamps(item))
-                elif hasattr(item, "isoformat") and callable(
-                    getattr(item, "isoformat")
-                ):
-                    converted_list.append(item.isoformat())
-                elif isinstance(item, datetime):
-                    converted_list.append(item.isoformat())
-                else:
-                    converted_list.append(item)
-            converted_data[key] = converted_list
-        else:
-            converted_data[key] = value
-    return converted_data
+    return to_jsonable(doc_data)
 
 
 def create_drive_folder(
@@ -646,44 +625,9 @@ async def get_nombre_centro_gestor_from_emprestito(
         if db is None:
             return None
 
-        # Buscar primero en la colección contratos_emprestito
-        collection_ref = db.collection("contratos_emprestito")
-        query = collection_ref.where(
-            "referencia_contrato", "==", referencia_contrato
-        ).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            if nombre_cg:
-                return nombre_cg
-
-        # Si no se encuentra en contratos, buscar en ordenes_compra_emprestito (usando numero_orden)
-        collection_ref = db.collection("ordenes_compra_emprestito")
-        query = collection_ref.where("numero_orden", "==", referencia_contrato).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            if nombre_cg:
-                return nombre_cg
-
-        # Si no se encuentra en ordenes, buscar en convenios_transferencias_emprestito
-        collection_ref = db.collection("convenios_transferencias_emprestito")
-        query = collection_ref.where(
-            "referencia_contrato", "==", referencia_contrato
-        ).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            if nombre_cg:
-                return nombre_cg
-
-        return None
+        index = await get_fresh_referencia_index(db)
+        entry = index.lookup(referencia_contrato, fields=("nombre_centro_gestor",))
+        return entry["nombre_centro_gestor"] if entry else None
 
     except Exception as e:
         logger.warning(
@@ -708,47 +652,11 @@ async def get_data_from_emprestito(
         if db is None:
             return None
 
-        # Buscar primero en la colección contratos_emprestito
-        collection_ref = db.collection("contratos_emprestito")
-        query = collection_ref.where(
-            "referencia_contrato", "==", referencia_contrato
-        ).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if nombre_cg or bp:
-                return {"nombre_centro_gestor": nombre_cg, "bp": bp}
-
-        # Si no se encuentra en contratos, buscar en ordenes_compra_emprestito (usando numero_orden)
-        collection_ref = db.collection("ordenes_compra_emprestito")
-        query = collection_ref.where("numero_orden", "==", referencia_contrato).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if nombre_cg or bp:
-                return {"nombre_centro_gestor": nombre_cg, "bp": bp}
-
-        # Si no se encuentra en ordenes, buscar en convenios_transferencias_emprestito
-        collection_ref = db.collection("convenios_transferencias_emprestito")
-        query = collection_ref.where(
-            "referencia_contrato", "==", referencia_contrato
-        ).limit(1)
-        docs = list(query.stream())
-
-        if docs:
-            doc_data = docs[0].to_dict()
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if nombre_cg or bp:
-                return {"nombre_centro_gestor": nombre_cg, "bp": bp}
-
-        return None
+        index = await get_fresh_referencia_index(db)
+        entry = index.lookup(referencia_contrato)
+        if entry is None:
+            return None
+        return {"nombre_centro_gestor": entry["nombre_centro_gestor"], "bp": entry["bp"]}
 
     except Exception as e:
         logger.warning(
@@ -761,74 +669,16 @@ async def get_all_centros_gestores_map() -> Dict[str, Dict[str, str]]:
     """
     Obtener un mapa de referencia_contrato -> {nombre_centro_gestor, bp}
     de las colecciones contratos_emprestito, ordenes_compra_emprestito
-    y convenios_transferencias_emprestito de una sola vez
+    y convenios_transferencias_emprestito, servido desde el índice de referencias
+    (``emprestito_referencia_index``) en lugar de recorrer las tres colecciones
     """
     try:
         db = get_firestore_client()
         if db is None:
             return {}
 
-        # Crear mapa en memoria
-        centro_gestor_map = {}
-
-        # Obtener todos los contratos de empréstito
-        collection_ref = db.collection("contratos_emprestito")
-        docs = collection_ref.stream()
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-            ref_contrato = doc_data.get("referencia_contrato")
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if ref_contrato and (nombre_cg or bp):
-                centro_gestor_map[ref_contrato] = {
-                    "nombre_centro_gestor": nombre_cg,
-                    "bp": bp,
-                }
-
-        # Obtener todas las órdenes de compra
-        collection_ref = db.collection("ordenes_compra_emprestito")
-        docs = collection_ref.stream()
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-            # Usar numero_orden como referencia_contrato
-            ref_contrato = doc_data.get("numero_orden")
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if (
-                ref_contrato
-                and (nombre_cg or bp)
-                and ref_contrato not in centro_gestor_map
-            ):
-                centro_gestor_map[ref_contrato] = {
-                    "nombre_centro_gestor": nombre_cg,
-                    "bp": bp,
-                }
-
-        # Obtener todos los convenios de transferencia
-        collection_ref = db.collection("convenios_transferencias_emprestito")
-        docs = collection_ref.stream()
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-            ref_contrato = doc_data.get("referencia_contrato")
-            nombre_cg = doc_data.get("nombre_centro_gestor", "")
-            bp = doc_data.get("bp", "")
-            if (
-                ref_contrato
-                and (nombre_cg or bp)
-                and ref_contrato not in centro_gestor_map
-            ):
-                centro_gestor_map[ref_contrato] = {
-                    "nombre_centro_gestor": nombre_cg,
-                    "bp": bp,
-                }
-
-        logger.info(
-            f"✅ Mapa de centros gestores y BP creado con {len(centro_gestor_map)} entradas (contratos + órdenes + convenios)"
-        )
-        return centro_gestor_map
+        index = await get_fresh_referencia_index(db)
+        return index.centro_gestor_map()
 
     except Exception as e:
         logger.warning(f"Error creando mapa de centros gestores: {e}")
@@ -1100,79 +950,41 @@ async def get_reportes_by_centro_gestor(nombre_centro_gestor: str) -> Dict[str,
             reporte_data = {"id": doc.id, **converted_data}
             reportes.append(reporte_data)
 
-        # Recopilar referencias de contrato de todas las colecciones de empréstito
-        referencias_emprestito = set()
-
         try:
-            # Obtener referencias desde contratos_emprestito
-            emprestito_docs = (
-                db.collection("contratos_emprestito")
-                .where("nombre_centro_gestor", "==", nombre_centro_gestor)
-                .stream()
-            )
-
-            for emp_doc in emprestito_docs:
-                emp_data = emp_doc.to_dict()
-                ref_contrato = emp_data.get("referencia_contrato")
-                if ref_contrato:
-                    referencias_emprestito.add(ref_contrato)
-
-            # Obtener referencias desde ordenes_compra_emprestito
-            ordenes_docs = (
-                db.collection("ordenes_compra_emprestito")
-                .where("nombre_centro_gestor", "==", nombre_centro_gestor)
-                .stream()
-            )
-
-            for orden_doc in ordenes_docs:
-                orden_data = orden_doc.to_dict()
-                ref_contrato = orden_data.get(
-                    "numero_orden"
-                )  # En órdenes es numero_orden
-                if ref_contrato:
-                    referencias_emprestito.add(ref_contrato)
-
-            # Obtener referencias desde convenios_transferencias_emprestito
-            convenios_docs = (
-                db.collection("convenios_transferencias_emprestito")
-                .where("nombre_centro_gestor", "==", nombre_centro_gestor)
-                .stream()
+            # Referencias de contratos, órdenes y convenios del centro gestor (índice en memoria)
+            index = await get_fresh_referencia_index(db)
+            referencias_emprestito = index.referencias_by_centro(nombre_centro_gestor)
+
+            # Reportes con estas referencias que no tengan nombre_centro_gestor establecido
+            # (consultas ``in`` por lotes en lugar de una por referencia)
+            ids_existentes = {r["id"] for r in reportes}
+            ref_docs = await query_in(
+                "reportes_contratos",
+                "referencia_contrato",
+                sorted(referencias_emprestito),
+                db=db,
             )
-
-            for conv_doc in convenios_docs:
-                conv_data = conv_doc.to_dict()
-                ref_contrato = conv_data.get("referencia_contrato")
-                if ref_contrato:
-                    referencias_emprestito.add(ref_contrato)
-
-            # Buscar reportes con estas referencias que no tengan nombre_centro_gestor establecido
-            for referencia in referencias_emprestito:
-                ref_docs = (
-                    db.collection("reportes_contratos")
-                    .where("referencia_contrato", "==", referencia)
-                    .stream()
-                )
-
-                for ref_doc in ref_docs:
-                    ref_doc_data = ref_doc.to_dict()
-                    # Solo agregar si no tiene nombre_centro_gestor o está vacío
-                    if not ref_doc_data.get("nombre_centro_gestor", "").strip():
-                        converted_data = convert_firebase_timestamps(ref_doc_data)
-                        converted_data = _normalize_archivos_for_frontend(
-                            converted_data
+            for ref_doc in ref_docs:
+                ref_doc_data = ref_doc.to_dict() or {}
+                # Solo agregar si no tiene nombre_centro_gestor o está vacío
+                if not ref_doc_data.get("nombre_centro_gestor", "").strip():
+                    converted_data = convert_firebase_timestamps(ref_doc_data)
+                    converted_data = _normalize_archivos_for_frontend(
+                        converted_data
+                    )
+                    reporte_data = {
+                        "id": ref_doc.id,
+                        **converted_data,
+                        "nombre_centro_gestor": nombre_centro_gestor,
+                        "nombre_centro_gestor_source": "emprestito_collections",
+                    }
+                    # Verificar que no esté duplicado
+                    if reporte_data["id"] not in ids_existentes:
+                        ids_existentes.add(reporte_data["id"])
+                        reportes.append(reporte_data)
+                        logger.info(
+                            f"✅ Agregado reporte desde colecciones de empréstito: {ref_doc_data.get('referencia_contrato')}"
                         )
-                        reporte_data = {
-                            "id": ref_doc.id,
-                            **converted_data,
-                            "nombre_centro_gestor": nombre_centro_gestor,
-                            "nombre_centro_gestor_source": "emprestito_collections",
-                        }
-                        # Verificar que no esté duplicado
-                        if not any(r["id"] == reporte_data["id"] for r in reportes):
-                            reportes.append(reporte_data)
-                            logger.info(
-                                f"✅ Agregado reporte desde colecciones de empréstito: {referencia}"
-                            )
 
         except Exception as emprestito_error:
             logger.warning(
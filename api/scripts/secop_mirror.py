@@ -0,0 +1,472 @@
+"""
+Mirror local de datasets SECOP/TVEC
+Copia en SQLite de las filas de datos.gov.co que pertenecen a la entidad
+(procesos ``p6dx-8zbt``, contratos ``jbjy-vk9h`` y órdenes TVEC ``rgxm-mmea``),
+indexadas por referencia de proceso, de contrato y número de orden.
+
+- Sincronización delta: cada corrida pide solo las filas con
+  ``:updated_at`` posterior a la última vista (``full=True`` recarga el
+  dataset y purga las filas que ya no existen en la fuente). Se pagina por
+  keyset ``(:updated_at, :id)``: con ``$offset`` una fila modificada durante
+  la corrida cambia de posición y puede saltarse otra.
+- Consultas: ``lookup_secop_mirror`` responde desde el índice local
+  (``alookup_secop_mirror`` desde código asíncrono, en un hilo). Devuelve
+  ``None`` cuando el mirror no puede responder (deshabilitado, dataset nunca
+  sincronizado o desactualizado, o fila ausente con
+  ``SECOP_MIRROR_LIVE_FALLBACK`` activo); en ese caso el llamador consulta la
+  API en vivo como antes.
+- ``refrescar_mirror_periodicamente`` se lanza en el arranque de la app cada
+  ``SECOP_MIRROR_REFRESH_SECONDS``; los datasets sin recarga completa en
+  ``SECOP_MIRROR_FULL_REFRESH_SECONDS`` se recargan completos (purga de filas
+  eliminadas en la fuente, que la sincronización delta no ve).
+
+Los tests pueden apuntar ``SECOP_MIRROR_PATH`` a un mirror de prueba y
+desactivar el fallback para correr sin red.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from api.core.config import bool_from_env, int_from_env
+from api.scripts.secop_sync import (
+    NIT_ENTIDAD_CALI,
+    SECOP_PAGE_SIZE,
+    SECOP_PROCESOS_DATASET,
+    SECOP_RATE_BURST,
+    SECOP_RATE_PER_SECOND,
+    TokenBucket,
+    soql_get,
+)
+
+logger = logging.getLogger(__name__)
+
+
+SECOP_MIRROR_ENABLED = bool_from_env("SECOP_MIRROR_ENABLED", True)
+SECOP_MIRROR_PATH = os.getenv(
+    "SECOP_MIRROR_PATH", os.path.join(tempfile.gettempdir(), "gestor_api_secop_mirror.sqlite3")
+)
+SECOP_MIRROR_REFRESH_SECONDS = int_from_env("SECOP_MIRROR_REFRESH_SECONDS", 900)
+SECOP_MIRROR_FULL_REFRESH_SECONDS = int_from_env("SECOP_MIRROR_FULL_REFRESH_SECONDS", 24 * 3600)
+# Pasado este tiempo sin sincronizar, el mirror deja de responder y se consulta en vivo
+SECOP_MIRROR_MAX_AGE_SECONDS = int_from_env("SECOP_MIRROR_MAX_AGE_SECONDS", 24 * 3600)
+SECOP_MIRROR_LIVE_FALLBACK = bool_from_env("SECOP_MIRROR_LIVE_FALLBACK", True)
+
+SECOP_CONTRATOS_DATASET = "jbjy-vk9h"
+TVEC_ORDENES_DATASET = "rgxm-mmea"
+
+# dataset → filtro SoQL del subconjunto de la entidad y campos indexados
+MIRROR_DATASETS: Dict[str, Dict[str, Any]] = {
+    SECOP_PROCESOS_DATASET: {
+        "nombre": "procesos",
+        "where": f"nit_entidad='{NIT_ENTIDAD_CALI}'",
+        "keys": ("referencia_del_proceso",),
+    },
+    SECOP_CONTRATOS_DATASET: {
+        "nombre": "contratos",
+        "where": f"nit_entidad='{NIT_ENTIDAD_CALI}'",
+        "keys": ("referencia_del_contrato", "proceso_de_compra"),
+    },
+    TVEC_ORDENES_DATASET: {
+        "nombre": "ordenes_tvec",
+        "where": os.getenv("SECOP_MIRROR_TVEC_WHERE", f"nit_entidad='{NIT_ENTIDAD_CALI}'"),
+        "keys": ("identificador_de_la_orden",),
+    },
+}
+
+
+class SecopMirror:
+    """Filas SECOP en SQLite con índice ``(dataset, campo, valor)``.
+
+    Cada hilo usa su propia conexión; el modo WAL permite consultar mientras
+    la sincronización escribe.
+    """
+
+    def __init__(self, path: str = SECOP_MIRROR_PATH):
+        self.path = path
+        self._local = threading.local()
+        con = self._conn()
+        with con:
+            con.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS mirror_rows (
+                    dataset TEXT NOT NULL,
+                    row_id TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at TEXT,
+                    sync_run TEXT,
+                    PRIMARY KEY (dataset, row_id)
+                );
+                CREATE TABLE IF NOT EXISTS mirror_keys (
+                    dataset TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    row_id TEXT NOT NULL,
+                    PRIMARY KEY (dataset, field, value, row_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_mirror_keys_row ON mirror_keys (dataset, row_id);
+                CREATE TABLE IF NOT EXISTS mirror_state (
+                    dataset TEXT PRIMARY KEY,
+                    last_updated_at TEXT,
+                    synced_at REAL,
+                    rows INTEGER,
+                    full_synced_at REAL
+                );
+                """
+            )
+            columns = {row[1] for row in con.execute("PRAGMA table_info(mirror_state)")}
+            if "full_synced_at" not in columns:
+                con.execute("ALTER TABLE mirror_state ADD COLUMN full_synced_at REAL")
+
+    def _conn(self) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            con.execute("PRAGMA journal_mode = WAL")
+            con.execute("PRAGMA synchronous = NORMAL")
+            self._local.con = con
+        return con
+
+    def upsert_rows(self, dataset: str, rows: Iterable[Dict[str, Any]], keys: Iterable[str], sync_run: str) -> int:
+        """Inserta o reemplaza filas con sus claves indexadas; devuelve cuántas escribió."""
+        keys = tuple(keys)
+        con = self._conn()
+        count = 0
+        with con:
+            for raw in rows:
+                row_id = raw.get(":id")
+                if not row_id:
+                    continue
+                updated_at = raw.get(":updated_at")
+                # Las columnas de sistema (:id, :updated_at...) no se exponen a los llamadores
+                data = {k: v for k, v in raw.items() if not k.startswith(":")}
+                con.execute(
+                    "INSERT OR REPLACE INTO mirror_rows (dataset, row_id, data, updated_at, sync_run) VALUES (?, ?, ?, ?, ?)",
+                    (dataset, row_id, json.dumps(data, ensure_ascii=False), updated_at, sync_run),
+                )
+                con.execute("DELETE FROM mirror_keys WHERE dataset = ? AND row_id = ?", (dataset, row_id))
+                con.executemany(
+                    "INSERT OR IGNORE INTO mirror_keys (dataset, field, value, row_id) VALUES (?, ?, ?, ?)",
+                    [(dataset, field, str(data[field]), row_id) for field in keys if data.get(field)],
+                )
+                count += 1
+        return count
+
+    def purge_other_runs(self, dataset: str, sync_run: str) -> int:
+        """Elimina las filas que no aparecieron en la recarga completa ``sync_run``."""
+        con = self._conn()
+        with con:
+            stale = [
+                row[0]
+                for row in con.execute(
+                    "SELECT row_id FROM mirror_rows WHERE dataset = ? AND (sync_run IS NULL OR sync_run != ?)",
+                    (dataset, sync_run),
+                )
+            ]
+            for row_id in stale:
+                con.execute("DELETE FROM mirror_rows WHERE dataset = ? AND row_id = ?", (dataset, row_id))
+                con.execute("DELETE FROM mirror_keys WHERE dataset = ? AND row_id = ?", (dataset, row_id))
+        return len(stale)
+
+    def get_state(self, dataset: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT last_updated_at, synced_at, rows, full_synced_at FROM mirror_state WHERE dataset = ?", (dataset,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {"last_updated_at": row[0], "synced_at": row[1], "rows": row[2], "full_synced_at": row[3]}
+
+    def set_state(self, dataset: str, last_updated_at: Optional[str], full: bool = False) -> None:
+        """Registra una sincronización; ``full`` si fue una recarga completa."""
+        con = self._conn()
+        now = time.time()
+        with con:
+            (rows,) = con.execute("SELECT COUNT(*) FROM mirror_rows WHERE dataset = ?", (dataset,)).fetchone()
+            previous = con.execute(
+                "SELECT full_synced_at FROM mirror_state WHERE dataset = ?", (dataset,)
+            ).fetchone()
+            full_synced_at = now if full else (previous[0] if previous else None)
+            con.execute(
+                "INSERT OR REPLACE INTO mirror_state (dataset, last_updated_at, synced_at, rows, full_synced_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (dataset, last_updated_at, now, rows, full_synced_at),
+            )
+
+    def lookup(
+        self,
+        dataset: str,
+        field: str,
+        value: str,
+        *,
+        contains: bool = False,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Filas cuyo ``field`` es ``value`` (o lo contiene, como ``LIKE '%value%'``)."""
+        if contains:
+            condition, param = "k.value LIKE ? ESCAPE '\\'", "%" + _escape_like(str(value)) + "%"
+        else:
+            condition, param = "k.value = ?", str(value)
+        sql = (
+            "SELECT r.data FROM mirror_keys k JOIN mirror_rows r "
+            "ON r.dataset = k.dataset AND r.row_id = k.row_id "
+            f"WHERE k.dataset = ? AND k.field = ? AND {condition} ORDER BY r.row_id"
+        )
+        params: List[Any] = [dataset, field, param]
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [json.loads(row[0]) for row in self._conn().execute(sql, params)]
+
+    def clear(self, dataset: Optional[str] = None) -> None:
+        con = self._conn()
+        with con:
+            for table in ("mirror_rows", "mirror_keys", "mirror_state"):
+                if dataset:
+                    con.execute(f"DELETE FROM {table} WHERE dataset = ?", (dataset,))
+                else:
+                    con.execute(f"DELETE FROM {table}")
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+_mirror: Optional[SecopMirror] = None
+_mirror_lock = threading.Lock()
+_sync_lock: Optional[asyncio.Lock] = None
+_stats = {"hits": 0, "misses": 0, "unavailable": 0}
+
+
+def get_secop_mirror() -> SecopMirror:
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = SecopMirror(SECOP_MIRROR_PATH)
+    return _mirror
+
+
+def set_secop_mirror(mirror: Optional[SecopMirror]) -> None:
+    """Reemplaza el mirror en uso (tests o cambio de ruta en caliente)."""
+    global _mirror
+    with _mirror_lock:
+        _mirror = mirror
+
+
+def lookup_secop_mirror(
+    dataset: str,
+    field: str,
+    value: Optional[str],
+    *,
+    nit_entidad: Optional[str] = None,
+    contains: bool = False,
+    limit: Optional[int] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Consultar filas del mirror local por un campo indexado.
+
+    Args:
+        dataset: Id del dataset (``p6dx-8zbt``, ``jbjy-vk9h``, ``rgxm-mmea``)
+        field: Campo indexado del dataset (ver ``MIRROR_DATASETS``)
+        value: Valor buscado
+        nit_entidad: Filtrar además por NIT de la entidad
+        contains: Buscar ``value`` como subcadena (equivalente a ``LIKE '%value%'``)
+        limit: Máximo de filas
+
+    Returns:
+        Lista de filas con la misma forma que devuelve la API, o ``None`` si el
+        mirror no puede responder y hay que consultar en vivo.
+    """
+    if not SECOP_MIRROR_ENABLED or not value or dataset not in MIRROR_DATASETS:
+        return None
+    try:
+        mirror = get_secop_mirror()
+        state = mirror.get_state(dataset)
+        if state is None or not state["synced_at"] or time.time() - state["synced_at"] > SECOP_MIRROR_MAX_AGE_SECONDS:
+            _stats["unavailable"] += 1
+            return None
+        rows = mirror.lookup(dataset, field, value, contains=contains, limit=None if nit_entidad else limit)
+    except Exception as exc:
+        logger.warning(f"⚠️ Mirror SECOP no disponible: {exc}")
+        _stats["unavailable"] += 1
+        return None
+
+    if nit_entidad:
+        rows = [row for row in rows if str(row.get("nit_entidad", "")) == str(nit_entidad)]
+        if limit:
+            rows = rows[:limit]
+    if rows:
+        _stats["hits"] += 1
+        return rows
+    _stats["misses"] += 1
+    return None if SECOP_MIRROR_LIVE_FALLBACK else []
+
+
+async def alookup_secop_mirror(
+    dataset: str,
+    field: str,
+    value: Optional[str],
+    *,
+    nit_entidad: Optional[str] = None,
+    contains: bool = False,
+    limit: Optional[int] = None,
+) -> Optional[List[Dict[str, Any]]]:
+    """``lookup_secop_mirror`` en un hilo, para no bloquear el event loop con SQLite."""
+    if not SECOP_MIRROR_ENABLED or not value or dataset not in MIRROR_DATASETS:
+        return None
+    return await asyncio.to_thread(
+        lookup_secop_mirror, dataset, field, value, nit_entidad=nit_entidad, contains=contains, limit=limit
+    )
+
+
+def _soql_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+async def _sincronizar_dataset(mirror: SecopMirror, dataset: str, full: bool, bucket: TokenBucket) -> Dict[str, Any]:
+    config = MIRROR_DATASETS[dataset]
+    state = None if full else mirror.get_state(dataset)
+    since = state["last_updated_at"] if state else None
+    where = config["where"]
+    if since:
+        where = f"{where} AND :updated_at > '{since}'"
+
+    sync_run = uuid.uuid4().hex
+    loop = asyncio.get_running_loop()
+    last_updated_at, escritas = since, 0
+    # Keyset: la página siguiente empieza después de la última (:updated_at, :id) vista
+    after: Optional[tuple] = None
+    while True:
+        page_where = where
+        if after is not None:
+            updated, row_id = (_soql_literal(v) for v in after)
+            page_where = f"{where} AND (:updated_at > {updated} OR (:updated_at = {updated} AND :id > {row_id}))"
+        page = await soql_get(
+            {
+                "$select": ":*, *",
+                "$where": page_where,
+                "$order": ":updated_at, :id",
+                "$limit": SECOP_PAGE_SIZE,
+            },
+            dataset=dataset,
+            bucket=bucket,
+        )
+        if page:
+            escritas += await loop.run_in_executor(None, mirror.upsert_rows, dataset, page, config["keys"], sync_run)
+            last_updated_at = max([last_updated_at or ""] + [row.get(":updated_at") or "" for row in page]) or None
+            after = (page[-1].get(":updated_at") or "", page[-1].get(":id") or "")
+        if len(page) < SECOP_PAGE_SIZE:
+            break
+
+    completa = full or not since
+    purgadas = await loop.run_in_executor(None, mirror.purge_other_runs, dataset, sync_run) if full else 0
+    await loop.run_in_executor(None, mirror.set_state, dataset, last_updated_at, completa)
+    return {
+        "dataset": dataset,
+        "nombre": config["nombre"],
+        "modo": "completa" if completa else "delta",
+        "filas_escritas": escritas,
+        "filas_purgadas": purgadas,
+        "last_updated_at": last_updated_at,
+    }
+
+
+async def sincronizar_mirror_secop(datasets: Optional[Iterable[str]] = None, full: bool = False) -> Dict[str, Any]:
+    """
+    Traer al mirror los cambios de SECOP/TVEC desde la última sincronización.
+
+    Args:
+        datasets: Ids a sincronizar (por defecto todos los de ``MIRROR_DATASETS``)
+        full: Recargar completo y purgar filas eliminadas en la fuente
+    """
+    global _sync_lock
+    if _sync_lock is None:
+        _sync_lock = asyncio.Lock()
+    if _sync_lock.locked():
+        return {"success": False, "error": "Ya hay una sincronización del mirror SECOP en curso"}
+
+    async with _sync_lock:
+        start_time = time.time()
+        mirror = get_secop_mirror()
+        bucket = TokenBucket(SECOP_RATE_PER_SECOND, SECOP_RATE_BURST)
+        resultados, errores = [], []
+        for dataset in datasets or MIRROR_DATASETS:
+            if dataset not in MIRROR_DATASETS:
+                errores.append(f"{dataset}: dataset no configurado en el mirror")
+                continue
+            try:
+                resultados.append(await _sincronizar_dataset(mirror, dataset, full, bucket))
+            except Exception as exc:
+                logger.error(f"❌ Error sincronizando mirror SECOP {dataset}: {exc}")
+                errores.append(f"{dataset}: {exc}")
+        tiempo = round(time.time() - start_time, 2)
+        logger.info(
+            f"🔄 Mirror SECOP sincronizado en {tiempo}s: "
+            + ", ".join(f"{r['nombre']}={r['filas_escritas']}" for r in resultados)
+        )
+        return {
+            "success": not errores,
+            "datasets": resultados,
+            "errores": errores,
+            "tiempo_procesamiento": f"{tiempo} segundos",
+        }
+
+
+def datasets_pendientes_de_recarga(now: Optional[float] = None) -> List[str]:
+    """Datasets sin recarga completa en los últimos ``SECOP_MIRROR_FULL_REFRESH_SECONDS``."""
+    now = now or time.time()
+    mirror = get_secop_mirror()
+    pendientes = []
+    for dataset in MIRROR_DATASETS:
+        state = mirror.get_state(dataset) or {}
+        full_synced_at = state.get("full_synced_at")
+        if not full_synced_at or now - full_synced_at >= SECOP_MIRROR_FULL_REFRESH_SECONDS:
+            pendientes.append(dataset)
+    return pendientes
+
+
+async def refrescar_mirror_periodicamente() -> None:
+    """
+    Sincronización cada ``SECOP_MIRROR_REFRESH_SECONDS`` (tarea de fondo): delta
+    para los datasets al día y recarga completa para los que la tienen vencida.
+    """
+    while True:
+        try:
+            completos = await asyncio.to_thread(datasets_pendientes_de_recarga)
+            if completos:
+                await sincronizar_mirror_secop(completos, full=True)
+            delta = [dataset for dataset in MIRROR_DATASETS if dataset not in completos]
+            if delta:
+                await sincronizar_mirror_secop(delta)
+        except Exception as exc:
+            logger.warning(f"⚠️ Refresco del mirror SECOP falló: {exc}")
+        await asyncio.sleep(SECOP_MIRROR_REFRESH_SECONDS)
+
+
+def get_secop_mirror_status() -> Dict[str, Any]:
+    """Estado de cada dataset del mirror y contadores de consultas."""
+    status: Dict[str, Any] = {
+        "enabled": SECOP_MIRROR_ENABLED,
+        "path": SECOP_MIRROR_PATH,
+        "live_fallback": SECOP_MIRROR_LIVE_FALLBACK,
+        "refresh_seconds": SECOP_MIRROR_REFRESH_SECONDS,
+        "full_refresh_seconds": SECOP_MIRROR_FULL_REFRESH_SECONDS,
+        "datasets": {},
+        **_stats,
+    }
+    if not SECOP_MIRROR_ENABLED:
+        return status
+    try:
+        mirror = get_secop_mirror()
+        for dataset, config in MIRROR_DATASETS.items():
+            status["datasets"][dataset] = {"nombre": config["nombre"], **(mirror.get_state(dataset) or {})}
+    except Exception as exc:
+        status["error"] = str(exc)
+    return status
@@ -0,0 +1,678 @@
+"""
+Motor de sincronización SECOP para procesos_emprestito
+Reemplaza el recorrido secuencial (una consulta Socrata y una escritura por
+proceso) de ``procesar_todos_procesos_emprestito_completo``:
+
+- Consultas por lotes: ``referencia_del_proceso IN (...)`` sobre muchas
+  referencias a la vez (primero con el NIT de Cali y, para las que falten,
+  sin filtro de NIT, igual que la búsqueda individual).
+- Una sola ``requests.Session`` con pool de conexiones para toda la corrida,
+  limitador token-bucket hacia la API de Socrata y reintentos con backoff
+  exponencial ante 429/5xx/errores de red.
+- Lotes procesados en paralelo (``SECOP_SYNC_CONCURRENCY``) y escrituras en
+  Firestore con ``batched_write``.
+- Progreso consultable con ``get_secop_sync_progress`` y checkpoint en
+  ``sync_checkpoints/secop_procesos_emprestito`` para reanudar una corrida
+  interrumpida (``resume=True``) sin volver a procesar lo ya escrito.
+- Una sola corrida a la vez entre todos los workers y hosts: la corrida toma
+  un lease (campo ``lease`` del checkpoint) en una transacción de Firestore,
+  lo renueva mientras corre y lo libera al terminar. Si el proceso muere, el
+  lease vence a los ``SECOP_SYNC_LEASE_SECONDS``.
+"""
+
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from api.core.config import int_from_env
+from api.core.metrics import track_outbound
+from database.firestore_repository import (
+    batched_write,
+    get_document,
+    run_blocking,
+    stream_collection,
+)
+
+try:
+    from google.cloud import firestore
+
+    FIRESTORE_AVAILABLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    FIRESTORE_AVAILABLE = False
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    REQUESTS_AVAILABLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    REQUESTS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+SECOP_DOMAIN = "www.datos.gov.co"
+SECOP_PROCESOS_DATASET = "p6dx-8zbt"
+NIT_ENTIDAD_CALI = "890399011"
+
+SECOP_SYNC_CONCURRENCY = int_from_env("SECOP_SYNC_CONCURRENCY", 4)
+SECOP_BATCH_SIZE = int_from_env("SECOP_BATCH_SIZE", 50)  # referencias por consulta IN (...)
+SECOP_PAGE_SIZE = int_from_env("SECOP_PAGE_SIZE", 1000)
+SECOP_RATE_PER_SECOND = float(os.getenv("SECOP_RATE_PER_SECOND", "5"))
+SECOP_RATE_BURST = int_from_env("SECOP_RATE_BURST", 10)
+SECOP_MAX_RETRIES = int_from_env("SECOP_MAX_RETRIES", 4)
+SECOP_BACKOFF_SECONDS = float(os.getenv("SECOP_BACKOFF_SECONDS", "1.0"))
+SECOP_HTTP_TIMEOUT = int_from_env("SECOP_HTTP_TIMEOUT", 30)
+# Menor que JOBS_STALE_SECONDS: cuando un trabajo huérfano vuelve a la cola,
+# el lease del proceso caído ya venció y el reintento puede tomarlo.
+SECOP_SYNC_LEASE_SECONDS = int_from_env("SECOP_SYNC_LEASE_SECONDS", 90)
+
+PROCESOS_COLLECTION = "procesos_emprestito"
+CHECKPOINT_COLLECTION = "sync_checkpoints"
+CHECKPOINT_DOC_ID = "secop_procesos_emprestito"
+
+_http_executor = ThreadPoolExecutor(max_workers=max(1, SECOP_SYNC_CONCURRENCY), thread_name_prefix="secop")
+_session: Optional["requests.Session"] = None
+
+_progress: Dict[str, Any] = {"status": "idle"}
+
+_LEASE_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class _RetryableHTTPError(Exception):
+    """Respuesta 429/5xx de Socrata: se reintenta con backoff."""
+
+
+class TokenBucket:
+    """Limitador token-bucket: ``rate`` peticiones/s con ráfagas de hasta ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# ---------------------------------------------------------------------------
+# Mapeo SECOP → procesos_emprestito
+# ---------------------------------------------------------------------------
+
+_CAMPOS_NUMERICOS = [
+    "proveedores_invitados", "proveedores_con_invitacion", "visualizaciones_proceso",
+    "proveedores_que_manifestaron", "numero_lotes", "respuestas_procedimiento",
+    "respuestas_externas", "conteo_respuestas_ofertas",
+]
+
+
+def mapear_proceso_secop_completo(proceso_raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Mapear un registro del dataset de procesos SECOP a los campos complementarios
+    de ``procesos_emprestito`` (nombres de variables en Firebase sin cambios).
+    """
+    # Determinar estado del proceso de manera inteligente
+    # Prioridad: estado_resumen > adjudicado > estado_del_procedimiento
+    adjudicado_raw = proceso_raw.get("adjudicado", "")
+    estado_resumen_raw = proceso_raw.get("estado_resumen", "")
+    estado_procedimiento_raw = proceso_raw.get("estado_del_procedimiento", "")
+
+    estado_proceso_final = estado_procedimiento_raw  # Default
+    if estado_resumen_raw and estado_resumen_raw.strip():
+        # Si hay estado_resumen, usarlo como estado principal
+        estado_proceso_final = estado_resumen_raw
+    elif adjudicado_raw and adjudicado_raw.lower() in ["sí", "si", "yes", "true"]:
+        # Si está marcado como adjudicado, el estado debe ser Adjudicado
+        estado_proceso_final = "Adjudicado"
+
+    proceso_datos_completos = {
+        # Campos básicos existentes
+        "adjudicado": adjudicado_raw,
+        "fase": proceso_raw.get("fase", ""),
+        "estado_proceso": estado_proceso_final,  # Estado determinado inteligentemente
+
+        # Campos adicionales solicitados con mapeo exacto
+        "fecha_publicacion_fase": proceso_raw.get("fecha_de_publicacion_del", ""),
+        "fecha_publicacion_fase_1": None,  # No disponible en SECOP
+        "fecha_publicacion_fase_2": None,  # No disponible en SECOP
+        "fecha_publicacion_fase_3": proceso_raw.get("fecha_de_publicacion_fase_3", ""),
+
+        "proveedores_invitados": proceso_raw.get("proveedores_invitados", 0),
+        "proveedores_con_invitacion": proceso_raw.get("proveedores_con_invitacion", 0),
+        "visualizaciones_proceso": proceso_raw.get("visualizaciones_del", 0),
+        "proveedores_que_manifestaron": proceso_raw.get("proveedores_que_manifestaron", 0),
+        "numero_lotes": proceso_raw.get("numero_de_lotes", 0),
+        "fecha_adjudicacion": None,  # No disponible directamente en SECOP
+        "estado_resumen": proceso_raw.get("estado_resumen", ""),
+        "fecha_recepcion_respuestas": None,  # No disponible en SECOP
+        "fecha_apertura_respuestas": None,  # No disponible en SECOP
+        "fecha_apertura_efectiva": None,  # No disponible en SECOP
+        "respuestas_procedimiento": proceso_raw.get("respuestas_al_procedimiento", 0),
+        "respuestas_externas": proceso_raw.get("respuestas_externas", 0),
+        "conteo_respuestas_ofertas": proceso_raw.get("conteo_de_respuestas_a_ofertas", 0),
+    }
+
+    # Convertir valores numéricos
+    for campo in _CAMPOS_NUMERICOS:
+        try:
+            valor = proceso_datos_completos.get(campo, 0)
+            if valor is not None and str(valor).strip() != "":
+                proceso_datos_completos[campo] = int(float(str(valor)))
+            else:
+                proceso_datos_completos[campo] = 0
+        except (ValueError, TypeError):
+            logger.warning(f"⚠️ Error convertiendo campo numérico {campo}: {proceso_datos_completos.get(campo)}")
+            proceso_datos_completos[campo] = 0
+
+    return proceso_datos_completos
+
+
+def calcular_cambios(doc_data: Dict[str, Any], datos_secop: Dict[str, Any]) -> Dict[str, Any]:
+    """Campos de ``datos_secop`` que no existen o difieren en el documento."""
+    return {campo: valor for campo, valor in datos_secop.items() if doc_data.get(campo) != valor}
+
+
+# ---------------------------------------------------------------------------
+# Cliente Socrata compartido
+# ---------------------------------------------------------------------------
+
+
+def _get_session() -> "requests.Session":
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, SECOP_SYNC_CONCURRENCY))
+        session.mount("https://", adapter)
+        token = os.environ.get("SOCRATA_APP_TOKEN")
+        if token:
+            # app_token elimina los límites de velocidad por IP de Socrata
+            session.headers["X-App-Token"] = token
+        _session = session
+    return _session
+
+
+def _soql_literal(value: str) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _build_where(referencias: List[str], nit_entidad: Optional[str]) -> str:
+    in_clause = f"referencia_del_proceso IN ({', '.join(_soql_literal(r) for r in referencias)})"
+    if nit_entidad:
+        return f"nit_entidad={_soql_literal(nit_entidad)} AND {in_clause}"
+    return in_clause
+
+
+def _soql_get(dataset: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    with track_outbound("secop", dataset):
+        response = _get_session().get(
+            f"https://{SECOP_DOMAIN}/resource/{dataset}.json",
+            params=params,
+            timeout=SECOP_HTTP_TIMEOUT,
+        )
+    if response.status_code == 429 or response.status_code >= 500:
+        raise _RetryableHTTPError(f"Socrata respondió {response.status_code}")
+    response.raise_for_status()
+    return response.json()
+
+
+async def soql_get(
+    params: Dict[str, Any],
+    dataset: str = SECOP_PROCESOS_DATASET,
+    bucket: Optional[TokenBucket] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Consulta SoQL sobre un dataset de datos.gov.co con la sesión compartida,
+    el limitador de velocidad y reintentos con backoff ante 429/5xx/red.
+    """
+    if not REQUESTS_AVAILABLE:
+        raise RuntimeError("requests no está disponible")
+    bucket = bucket or _default_bucket()
+    loop = asyncio.get_running_loop()
+    for attempt in range(SECOP_MAX_RETRIES + 1):
+        await bucket.acquire()
+        try:
+            return await loop.run_in_executor(_http_executor, _soql_get, dataset, params)
+        except (_RetryableHTTPError, requests.ConnectionError, requests.Timeout) as exc:
+            if attempt == SECOP_MAX_RETRIES:
+                raise
+            delay = SECOP_BACKOFF_SECONDS * (2 ** attempt) + random.uniform(0, SECOP_BACKOFF_SECONDS)
+            logger.warning(f"⚠️ SECOP: {exc}; reintento {attempt + 1}/{SECOP_MAX_RETRIES} en {delay:.1f}s")
+            await asyncio.sleep(delay)
+    return []
+
+
+_default_buckets: Dict[int, TokenBucket] = {}
+
+
+def _default_bucket() -> TokenBucket:
+    """Limitador compartido por las consultas sueltas del loop actual."""
+    loop_id = id(asyncio.get_running_loop())
+    bucket = _default_buckets.get(loop_id)
+    if bucket is None:
+        _default_buckets.clear()
+        bucket = _default_buckets[loop_id] = TokenBucket(SECOP_RATE_PER_SECOND, SECOP_RATE_BURST)
+    return bucket
+
+
+async def _buscar_lote(bucket: TokenBucket, referencias: List[str], nit_entidad: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Primer registro SECOP de cada referencia del lote (paginando si hace falta)."""
+    where = _build_where(referencias, nit_entidad)
+    encontrados: Dict[str, Dict[str, Any]] = {}
+    offset = 0
+    while True:
+        page = await soql_get(
+            {"$where": where, "$limit": SECOP_PAGE_SIZE, "$offset": offset, "$order": ":id"}, bucket=bucket
+        )
+        for row in page:
+            referencia = row.get("referencia_del_proceso")
+            if referencia:
+                encontrados.setdefault(referencia, row)
+        if len(page) < SECOP_PAGE_SIZE:
+            return encontrados
+        offset += SECOP_PAGE_SIZE
+
+
+async def buscar_procesos_secop(
+    referencias: Iterable[str],
+    nit_entidad: Optional[str] = NIT_ENTIDAD_CALI,
+    bucket: Optional[TokenBucket] = None,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Buscar muchas referencias en SECOP con consultas ``IN (...)``.
+
+    Primero se responde desde el mirror local (``secop_mirror``); las demás se
+    consultan en vivo y las que no aparecen con ``nit_entidad`` se buscan de
+    nuevo sin filtro de NIT, igual que ``obtener_datos_secop_completos``.
+
+    Returns:
+        ``{referencia: registro_secop_crudo}`` (solo las encontradas)
+    """
+    # Import diferido: secop_mirror depende de este módulo
+    from api.scripts.secop_mirror import lookup_secop_mirror
+
+    def _desde_mirror(unicas: List[str]):
+        encontrados: Dict[str, Dict[str, Any]] = {}
+        pendientes = []
+        for referencia in unicas:
+            rows = lookup_secop_mirror(
+                SECOP_PROCESOS_DATASET, "referencia_del_proceso", referencia, nit_entidad=nit_entidad, limit=1
+            )
+            if rows is None:
+                pendientes.append(referencia)
+            elif rows:
+                encontrados[referencia] = rows[0]
+        return encontrados, pendientes
+
+    bucket = bucket or TokenBucket(SECOP_RATE_PER_SECOND, SECOP_RATE_BURST)
+    # Las consultas SQLite del mirror corren en un hilo, fuera del event loop
+    encontrados, referencias = await asyncio.to_thread(
+        _desde_mirror, list(dict.fromkeys(r for r in referencias if r))
+    )
+    for start in range(0, len(referencias), SECOP_BATCH_SIZE):
+        encontrados.update(await _buscar_lote(bucket, referencias[start:start + SECOP_BATCH_SIZE], nit_entidad))
+
+    faltantes = [r for r in referencias if r not in encontrados]
+    if nit_entidad and faltantes:
+        logger.info(f"🔍 {len(faltantes)} referencias sin resultado con NIT {nit_entidad}, reintentando sin filtro de NIT")
+        for start in range(0, len(faltantes), SECOP_BATCH_SIZE):
+            encontrados.update(await _buscar_lote(bucket, faltantes[start:start + SECOP_BATCH_SIZE], None))
+    return encontrados
+
+
+# ---------------------------------------------------------------------------
+# Progreso y checkpoint
+# ---------------------------------------------------------------------------
+
+
+def get_secop_sync_progress() -> Dict[str, Any]:
+    """Estado de la sincronización en curso (o de la última) en este proceso."""
+    progress = dict(_progress)
+    started = progress.get("_started_monotonic")
+    progress.pop("_started_monotonic", None)
+    if started and progress.get("status") == "running":
+        elapsed = time.monotonic() - started
+        done = progress.get("procesados", 0)
+        pending = progress.get("total", 0) - done
+        progress["tiempo_transcurrido"] = round(elapsed, 1)
+        progress["eta_segundos"] = round(elapsed / done * pending, 1) if done else None
+    return progress
+
+
+async def _load_checkpoint(db) -> Dict[str, Any]:
+    snapshot = await get_document(CHECKPOINT_COLLECTION, CHECKPOINT_DOC_ID, db=db)
+    return (snapshot.to_dict() or {}) if snapshot.exists else {}
+
+
+async def _save_checkpoint(db, data: Dict[str, Any]) -> None:
+    ref = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOC_ID)
+    # merge: no pisar el lease de la corrida
+    await run_blocking(CHECKPOINT_COLLECTION, ref.set, data, merge=True)
+
+
+def _lease_transaction(db, decide: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]) -> bool:
+    """
+    Lee el lease del checkpoint y, si ``decide`` devuelve un valor, lo escribe
+    en la misma transacción de Firestore.
+
+    ``decide`` recibe el lease actual (``{}`` si no hay) y devuelve el nuevo
+    (``{"token": None}`` para liberarlo) o None si no se puede tomar.
+    """
+    if not FIRESTORE_AVAILABLE:
+        raise RuntimeError("google-cloud-firestore no está disponible")
+    ref = db.collection(CHECKPOINT_COLLECTION).document(CHECKPOINT_DOC_ID)
+
+    @firestore.transactional
+    def _run(transaction) -> bool:
+        snapshot = ref.get(transaction=transaction)
+        data = (snapshot.to_dict() or {}) if snapshot.exists else {}
+        lease = decide(data.get("lease") or {})
+        if lease is None:
+            return False
+        transaction.set(ref, {"lease": lease}, merge=True)
+        return True
+
+    return _run(db.transaction())
+
+
+def _decide_claim(token: str, renew: bool) -> Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    def decide(lease: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        held_by_other = lease.get("token") not in (None, token) and (lease.get("expires_at") or 0) > now
+        # Renovar exige seguir siendo el dueño (otro pudo tomarlo tras vencer)
+        if held_by_other or (renew and lease.get("token") != token):
+            return None
+        return {"token": token, "owner": _LEASE_OWNER, "expires_at": now + SECOP_SYNC_LEASE_SECONDS}
+
+    return decide
+
+
+def _decide_release(token: str) -> Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    def decide(lease: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return {"token": None} if lease.get("token") == token else None
+
+    return decide
+
+
+async def _claim_lease(db, token: str, renew: bool = False) -> bool:
+    return await run_blocking(CHECKPOINT_COLLECTION, _lease_transaction, db, _decide_claim(token, renew))
+
+
+async def _release_lease(db, token: str) -> None:
+    try:
+        await run_blocking(CHECKPOINT_COLLECTION, _lease_transaction, db, _decide_release(token))
+    except Exception as exc:
+        logger.warning(f"⚠️ SECOP: no se pudo liberar el lease (vence solo en {SECOP_SYNC_LEASE_SECONDS}s): {exc}")
+
+
+async def _keep_lease(db, token: str, lost: asyncio.Event) -> None:
+    """Renueva el lease cada tercio de su duración; marca ``lost`` si otro lo tomó."""
+    while True:
+        await asyncio.sleep(max(1.0, SECOP_SYNC_LEASE_SECONDS / 3))
+        try:
+            if not await _claim_lease(db, token, renew=True):
+                logger.error("❌ SECOP: se perdió el lease de la sincronización; se detiene tras el lote en curso")
+                lost.set()
+                return
+        except Exception as exc:
+            # Se reintenta en la siguiente vuelta; el lease aún no ha vencido
+            logger.warning(f"⚠️ SECOP: no se pudo renovar el lease: {exc}")
+
+
+# ---------------------------------------------------------------------------
+# Motor
+# ---------------------------------------------------------------------------
+
+
+async def sincronizar_procesos_emprestito(
+    db,
+    resume: bool = False,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+) -> Dict[str, Any]:
+    """
+    Actualizar todos los procesos de ``procesos_emprestito`` con datos completos
+    de SECOP (mismo resultado que el recorrido individual, en lotes paralelos).
+
+    Args:
+        db: Cliente de Firestore
+        resume: Si la última corrida quedó a medias, omitir los documentos que
+            ya completó
+        on_progress: Recibe ``get_secop_sync_progress()`` tras cada lote
+        should_stop: Si devuelve True no se inician más lotes; el checkpoint
+            queda abierto para reanudar con ``resume=True``. Perder el lease
+            tiene el mismo efecto.
+
+    Returns:
+        Resumen con el mismo formato de ``procesar_todos_procesos_emprestito_completo``
+    """
+    if _progress.get("status") == "running":
+        return {"success": False, "error": "Ya hay una sincronización SECOP en curso", "progreso": get_secop_sync_progress()}
+    if not REQUESTS_AVAILABLE:
+        return {"success": False, "error": "requests no está disponible"}
+
+    # Marcar la corrida en el mismo paso síncrono que la comprobación: dos
+    # llamadas concurrentes no pueden pasar ambas antes del primer await.
+    _progress.clear()
+    _progress.update(status="running", started_at=datetime.now().isoformat(), _started_monotonic=time.monotonic())
+    token = uuid.uuid4().hex
+    try:
+        # El guard de _progress solo excluye corridas de este proceso; el lease
+        # en Firestore las excluye entre workers y hosts.
+        if not await _claim_lease(db, token):
+            _progress.update(status="idle")
+            return {"success": False, "error": "Ya hay una sincronización SECOP en curso en otro worker"}
+    except BaseException:
+        _progress["status"] = "interrupted"
+        raise
+
+    lost = asyncio.Event()
+    keeper = asyncio.ensure_future(_keep_lease(db, token, lost))
+
+    def _stop() -> bool:
+        return lost.is_set() or (should_stop is not None and should_stop())
+
+    try:
+        return await _ejecutar_sincronizacion(db, resume, on_progress, _stop)
+    finally:
+        keeper.cancel()
+        if _progress.get("status") == "running":
+            _progress["status"] = "interrupted"
+        await _release_lease(db, token)
+
+
+async def _ejecutar_sincronizacion(
+    db,
+    resume: bool,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]],
+    should_stop: Callable[[], bool],
+) -> Dict[str, Any]:
+    start_time = time.time()
+    logger.info("🔍 Obteniendo todos los procesos de empréstito para actualización completa...")
+    docs = await stream_collection(PROCESOS_COLLECTION, db=db)
+    if not docs:
+        _progress.update(status="idle")
+        return {
+            "success": False,
+            "error": "No se encontraron procesos en la colección procesos_emprestito",
+            "total_procesos_encontrados": 0,
+        }
+
+    checkpoint = await _load_checkpoint(db) if resume else {}
+    completados = set(checkpoint.get("completed_doc_ids", [])) if checkpoint.get("status") == "running" else set()
+    run_id = checkpoint.get("run_id") if completados else uuid.uuid4().hex
+    total_procesos = len(docs)
+    omitidos = len(completados)
+
+    resultados_detallados: List[Dict[str, Any]] = []
+    errores_detallados: List[str] = []
+    contadores = {"procesados": 0, "actualizados": 0, "sin_cambios": 0, "errores": 0, "campos": 0}
+
+    pendientes = []
+    for doc in docs:
+        if doc.id in completados:
+            continue
+        doc_data = doc.to_dict() or {}
+        referencia = doc_data.get("referencia_proceso")
+        if not referencia:
+            error_msg = f"Proceso {doc.id} no tiene 'referencia_proceso'"
+            logger.warning(f"⚠️ {error_msg}")
+            errores_detallados.append(error_msg)
+            contadores["errores"] += 1
+            continue
+        pendientes.append((doc.id, referencia, doc_data))
+
+    _progress.update(
+        run_id=run_id,
+        reanudada=bool(completados),
+        total=total_procesos,
+        omitidos_por_checkpoint=omitidos,
+        procesados=0,
+        actualizados=0,
+        errores=contadores["errores"],
+    )
+    checkpoint_lock = asyncio.Lock()
+    await _save_checkpoint(db, {
+        "status": "running",
+        "run_id": run_id,
+        "started_at": checkpoint.get("started_at") if completados else datetime.now(),
+        "updated_at": datetime.now(),
+        "completed_doc_ids": sorted(completados),
+    })
+    logger.info(
+        f"📊 Sincronizando {len(pendientes)} de {total_procesos} procesos con SECOP "
+        f"(lotes de {SECOP_BATCH_SIZE}, concurrencia {SECOP_SYNC_CONCURRENCY})"
+    )
+
+    bucket = TokenBucket(SECOP_RATE_PER_SECOND, SECOP_RATE_BURST)
+    semaphore = asyncio.Semaphore(max(1, SECOP_SYNC_CONCURRENCY))
+
+    async def procesar_lote(lote):
+        async with semaphore:
+            if should_stop():
+                return
+            try:
+                encontrados = await buscar_procesos_secop((ref for _, ref, _ in lote), bucket=bucket)
+            except Exception as exc:
+                for _, referencia, _ in lote:
+                    contadores["errores"] += 1
+                    errores_detallados.append(f"{referencia}: Excepción - {exc}")
+                    resultados_detallados.append({"referencia_proceso": referencia, "success": False, "error": str(exc)})
+                _progress["errores"] = contadores["errores"]
+                return
+
+            operaciones = []
+            for doc_id, referencia, doc_data in lote:
+                contadores["procesados"] += 1
+                proceso_raw = encontrados.get(referencia)
+                if proceso_raw is None:
+                    error = f"No se encontró el proceso {referencia} en SECOP"
+                    contadores["errores"] += 1
+                    errores_detallados.append(f"{referencia}: Error obteniendo datos de SECOP: {error}")
+                    resultados_detallados.append({
+                        "referencia_proceso": referencia,
+                        "success": False,
+                        "error": f"Error obteniendo datos de SECOP: {error}",
+                    })
+                    continue
+
+                cambios = calcular_cambios(doc_data, mapear_proceso_secop_completo(proceso_raw))
+                resultado = {"referencia_proceso": referencia, "success": True}
+                if cambios:
+                    resumen = [f"{campo}: '{doc_data.get(campo)}' → '{valor}'" for campo, valor in cambios.items()]
+                    cambios["fecha_actualizacion_completa"] = datetime.now()
+                    operaciones.append(("update", doc_id, cambios))
+                    contadores["actualizados"] += 1
+                    contadores["campos"] += len(cambios)
+                    resultado.update(changes_count=len(cambios), changes_summary=resumen[:3])
+                else:
+                    contadores["sin_cambios"] += 1
+                    resultado.update(changes_count=0, changes_summary=[], message="Ya está actualizado")
+                resultados_detallados.append(resultado)
+
+            if operaciones:
+                await batched_write(PROCESOS_COLLECTION, operaciones, db=db)
+
+            async with checkpoint_lock:
+                completados.update(doc_id for doc_id, _, _ in lote)
+                await _save_checkpoint(db, {
+                    "status": "running",
+                    "run_id": run_id,
+                    "updated_at": datetime.now(),
+                    "completed_doc_ids": sorted(completados),
+                })
+            _progress.update(
+                procesados=contadores["procesados"] + omitidos,
+                actualizados=contadores["actualizados"],
+                errores=contadores["errores"],
+            )
+            logger.info(f"🔄 SECOP: {_progress['procesados']}/{total_procesos} procesos sincronizados")
+            if on_progress is not None:
+                on_progress(get_secop_sync_progress())
+
+    lotes = [pendientes[i:i + SECOP_BATCH_SIZE] for i in range(0, len(pendientes), SECOP_BATCH_SIZE)]
+    await asyncio.gather(*(procesar_lote(lote) for lote in lotes))
+
+    detenida = should_stop()
+    if not detenida:
+        await _save_checkpoint(db, {
+            "status": "completed",
+            "run_id": run_id,
+            "updated_at": datetime.now(),
+            "completed_doc_ids": [],
+        })
+    tiempo_procesamiento = round(time.time() - start_time, 2)
+    _progress.update(status="interrupted" if detenida else "completed", tiempo_procesamiento=tiempo_procesamiento)
+
+    procesos_procesados = contadores["procesados"]
+    procesos_con_errores = contadores["errores"]
+    mensaje_resumen = f"Se procesaron {procesos_procesados} procesos de empréstito exitosamente"
+    if procesos_con_errores > 0:
+        mensaje_resumen += f" ({procesos_con_errores} con errores)"
+    if detenida:
+        mensaje_resumen += " (detenida antes de terminar; reanudar con resume=true)"
+
+    resultado_final = {
+        "success": True,
+        "message": mensaje_resumen,
+        "resumen_procesamiento": {
+            "total_procesos_encontrados": total_procesos,
+            "procesos_procesados": procesos_procesados,
+            "procesos_actualizados": contadores["actualizados"],
+            "procesos_sin_cambios": contadores["sin_cambios"],
+            "procesos_con_errores": procesos_con_errores,
+            "procesos_omitidos_por_checkpoint": omitidos,
+        },
+        "resultados_detallados": resultados_detallados,
+        "estadisticas": {
+            "total_campos_actualizados": contadores["campos"],
+            "tiempo_procesamiento": f"{tiempo_procesamiento} segundos",
+        },
+        "run_id": run_id,
+        "timestamp": datetime.now().isoformat(),
+    }
+    if errores_detallados:
+        resultado_final["errores"] = errores_detallados[:10]  # Máximo 10 errores
+
+    logger.info(
+        f"✅ Sincronización SECOP finalizada: {procesos_procesados} procesados, "
+        f"{contadores['actualizados']} actualizados, {procesos_con_errores} con errores en {tiempo_procesamiento}s"
+    )
+    return resultado_final
+
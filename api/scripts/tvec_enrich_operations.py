@@ -8,7 +8,10 @@ from typing import Dict, List, Any, Optional
 from datetime import datetime
 import pandas as pd
 from sodapy import Socrata
+from api.core.serialization import LEGACY_DATETIME_FORMAT, to_jsonable
 from database.firebase_config import get_firestore_client
+from api.scripts.emprestito_referencia_index import invalidate_referencia_index
+from api.scripts.secop_mirror import TVEC_ORDENES_DATASET, alookup_secop_mirror
 
 # Configurar logging
 logger = logging.getLogger(__name__)
@@ -37,17 +40,8 @@ except ImportError as e:
 TVEC_ENRICH_OPERATIONS_AVAILABLE = FIRESTORE_AVAILABLE and SODAPY_AVAILABLE
 
 def serialize_datetime_objects(obj):
-    """Serializar objetos datetime para JSON"""
-    if isinstance(obj, dict):
-        return {key: serialize_datetime_objects(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [serialize_datetime_objects(item) for item in obj]
-    elif hasattr(obj, 'timestamp'):  # Firebase Timestamp
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(obj, datetime):
-        return obj.strftime('%Y-%m-%d %H:%M:%S')
-    else:
-        return obj
+    """Serializar objetos datetime para JSON (formato 'YYYY-MM-DD HH:MM:SS')"""
+    return to_jsonable(obj, LEGACY_DATETIME_FORMAT)
 
 
 async def obtener_ordenes_compra_tvec_enriquecidas(numero_orden: Optional[str] = None) -> Dict[str, Any]:
@@ -130,15 +124,22 @@ async def obtener_ordenes_compra_tvec_enriquecidas(numero_orden: Optional[str] =
         try:
             logger.info("🔍 Ejecutando snippet TVEC exacto del usuario...")
             # Implementación exacta del snippet proporcionado
-            client = Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN)
+            # El cliente en vivo solo se abre si alguna orden no está en el mirror local
+            client = None
             
             # Buscar cada número de orden específicamente
             for numero_orden in numeros_orden_firebase:
                 try:
                     # Buscar en el campo identificador_de_la_orden
-                    results = client.get("rgxm-mmea", 
-                                       where=f"identificador_de_la_orden='{numero_orden}'",
-                                       limit=10)
+                    results = await alookup_secop_mirror(
+                        TVEC_ORDENES_DATASET, "identificador_de_la_orden", numero_orden, limit=10
+                    )
+                    if results is None:
+                        if client is None:
+                            client = Socrata("www.datos.gov.co", SOCRATA_APP_TOKEN)
+                        results = client.get("rgxm-mmea", 
+                                           where=f"identificador_de_la_orden='{numero_orden}'",
+                                           limit=10)
                     
                     if results:
                         for registro in results:
@@ -152,7 +153,8 @@ async def obtener_ordenes_compra_tvec_enriquecidas(numero_orden: Optional[str] =
                     logger.warning(f"⚠️ Error buscando orden {numero_orden}: {str(e)}")
                     continue
             
-            client.close()
+            if client is not None:
+                client.close()
             
         except Exception as e:
             logger.error(f"❌ Error conectando a TVEC: {str(e)}")
@@ -319,6 +321,7 @@ async def obtener_ordenes_compra_tvec_enriquecidas(numero_orden: Optional[str] =
                 
                 # 5. Actualizar en Firebase
                 orden_doc.reference.update(datos_enriquecidos)
+                invalidate_referencia_index('ordenes_compra_emprestito', orden_doc.id)
                 
                 ordenes_enriquecidas += 1
                 
@@ -11,6 +11,14 @@ import unicodedata
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Union
 from database.firebase_config import get_firestore_client
+from api.scripts.unidades_proyecto_snapshot import (
+    get_intervenciones_snapshot,
+    get_unidades_snapshot,
+)
+from api.scripts.unidades_proyecto_index import (
+    SUPPORTED_FILTERS,
+    get_index,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +31,10 @@ AVANCE_MAX_EN_EJECUCION = 99.5
 # Estados manuales (imputados por el usuario) respetados tal cual, normalizados.
 ESTADOS_MANUALES_NORM = {"suspendido", "inaugurado"}
 
+# Filtros que apply_client_side_filters delega al índice columnar ("ano" solo
+# se usa como prefiltro de intervenciones en get_unidades_proyecto_geometry).
+CLIENT_SIDE_FILTERS = SUPPORTED_FILTERS - {"ano"}
+
 
 def _normalizar_estado(texto: str) -> str:
     """Normaliza un estado: sin acentos, sin espacios extremos y en minúsculas."""
@@ -33,11 +45,9 @@ def _normalizar_estado(texto: str) -> str:
     )
     return sin_acentos.strip().lower()
 
-# PROGRAMACION FUNCIONAL: Sin cache global que cause problemas de estado
-# Sin variables mutables globales que persistan datos entre requests
-# Cada request es independiente y sin efectos colaterales
-
-logger.debug("Modulo unidades_proyecto inicializado sin cache (programacion funcional)")
+# Los lectores consumen el snapshot compartido de unidades_proyecto_snapshot
+# (refresco incremental + invalidación en mutaciones). Los documentos del
+# snapshot son de solo lectura: cada request construye sus propios registros.
 
 
 def _convert_to_int(value) -> Optional[int]:
@@ -293,390 +303,15 @@ def apply_client_side_filters(
     - search: búsqueda de texto en campos principales
     - has_geometry: solo registros con/sin geometría
     - bbox: bounding box geográfico [min_lng, min_lat, max_lng, max_lat]
+
+    Los filtros se evalúan sobre un índice columnar (ver unidades_proyecto_index)
+    cacheado por lista: pasar siempre la lista base completa, no un slice.
     """
     if not filters or not data:
         return data
 
-    filtered_data = data.copy()
-
-    try:
-        # Filtro por UPID
-        if "upid" in filters and filters["upid"]:
-            upid_filter = filters["upid"]
-            if isinstance(upid_filter, list):
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if item.get("upid") in upid_filter
-                    or item.get("properties", {}).get("upid") in upid_filter
-                ]
-            else:
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if item.get("upid") == upid_filter
-                    or item.get("properties", {}).get("upid") == upid_filter
-                ]
-
-        # Filtro por estado (busca en intervenciones anidadas)
-        if "estado" in filters and filters["estado"]:
-            estado_value = filters["estado"]
-
-            def tiene_estado(item):
-                # Nivel directo (estructura antigua)
-                if (
-                    item.get("estado") == estado_value
-                    or item.get("properties", {}).get("estado") == estado_value
-                ):
-                    return True
-                # Nivel de intervenciones (estructura nueva)
-                intervenciones = item.get("intervenciones") or item.get(
-                    "properties", {}
-                ).get("intervenciones", [])
-                if isinstance(intervenciones, list):
-                    return any(
-                        interv.get("estado") == estado_value
-                        for interv in intervenciones
-                        if isinstance(interv, dict)
-                    )
-                return False
-
-            filtered_data = [item for item in filtered_data if tiene_estado(item)]
-
-        # Filtro por tipo de intervención (busca en intervenciones anidadas)
-        if "tipo_intervencion" in filters and filters["tipo_intervencion"]:
-            tipo_value = filters["tipo_intervencion"]
-
-            def tiene_tipo_intervencion(item):
-                # Nivel directo (estructura antigua)
-                if (
-                    item.get("tipo_intervencion") == tipo_value
-                    or item.get("properties", {}).get("tipo_intervencion") == tipo_value
-                ):
-                    return True
-                # Nivel de intervenciones (estructura nueva)
-                intervenciones = item.get("intervenciones") or item.get(
-                    "properties", {}
-                ).get("intervenciones", [])
-                if isinstance(intervenciones, list):
-                    return any(
-                        interv.get("tipo_intervencion") == tipo_value
-                        for interv in intervenciones
-                        if isinstance(interv, dict)
-                    )
-                return False
-
-            filtered_data = [
-                item for item in filtered_data if tiene_tipo_intervencion(item)
-            ]
-
-        # Filtro por clase_up (busca tanto clase_up como clase_obra para compatibilidad)
-        if "clase_up" in filters and filters["clase_up"]:
-            clase_value = filters["clase_up"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("clase_up") == clase_value
-                or item.get("clase_obra") == clase_value
-                or item.get("properties", {}).get("clase_up") == clase_value
-                or item.get("properties", {}).get("clase_obra") == clase_value
-            ]
-
-        # Filtro por tipo_equipamiento
-        if "tipo_equipamiento" in filters and filters["tipo_equipamiento"]:
-            tipo_equip_value = filters["tipo_equipamiento"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("tipo_equipamiento") == tipo_equip_value
-                or item.get("properties", {}).get("tipo_equipamiento")
-                == tipo_equip_value
-            ]
-
-        # Filtro por nombre_centro_gestor
-        if "nombre_centro_gestor" in filters and filters["nombre_centro_gestor"]:
-            centro_value = filters["nombre_centro_gestor"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("nombre_centro_gestor") == centro_value
-                or item.get("properties", {}).get("nombre_centro_gestor")
-                == centro_value
-            ]
-
-        # Filtro por departamento
-        if "departamento" in filters and filters["departamento"]:
-            dept_value = filters["departamento"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("departamento") == dept_value
-                or item.get("properties", {}).get("departamento") == dept_value
-            ]
-
-        # Filtro por municipio
-        if "municipio" in filters and filters["municipio"]:
-            mun_value = filters["municipio"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("municipio") == mun_value
-                or item.get("properties", {}).get("municipio") == mun_value
-            ]
-
-        # Filtro por comuna/corregimiento
-        if "comuna_corregimiento" in filters and filters["comuna_corregimiento"]:
-            comuna_value = filters["comuna_corregimiento"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("comuna_corregimiento") == comuna_value
-                or item.get("properties", {}).get("comuna_corregimiento")
-                == comuna_value
-            ]
-
-        # Filtro por barrio/vereda
-        if "barrio_vereda" in filters and filters["barrio_vereda"]:
-            barrio_value = filters["barrio_vereda"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if item.get("barrio_vereda") == barrio_value
-                or item.get("properties", {}).get("barrio_vereda") == barrio_value
-            ]
-
-        # Filtro por frente_activo (busca en intervenciones anidadas)
-        if "frente_activo" in filters and filters["frente_activo"]:
-            frente_value = filters["frente_activo"]
-
-            def tiene_frente_activo(item):
-                # Nivel directo (estructura antigua)
-                if (
-                    item.get("frente_activo") == frente_value
-                    or item.get("properties", {}).get("frente_activo") == frente_value
-                ):
-                    return True
-                # Nivel de intervenciones (estructura nueva)
-                intervenciones = item.get("intervenciones") or item.get(
-                    "properties", {}
-                ).get("intervenciones", [])
-                if isinstance(intervenciones, list):
-                    return any(
-                        interv.get("frente_activo") == frente_value
-                        for interv in intervenciones
-                        if isinstance(interv, dict)
-                    )
-                return False
-
-            filtered_data = [
-                item for item in filtered_data if tiene_frente_activo(item)
-            ]
-
-        # Filtro por presupuesto_base (rango numérico mínimo)
-        if "presupuesto_base" in filters and filters["presupuesto_base"]:
-            try:
-                min_presupuesto = float(filters["presupuesto_base"])
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if (
-                        item.get("presupuesto_base")
-                        and float(item["presupuesto_base"]) >= min_presupuesto
-                    )
-                    or (
-                        item.get("properties", {}).get("presupuesto_base")
-                        and float(item["properties"]["presupuesto_base"])
-                        >= min_presupuesto
-                    )
-                ]
-            except (ValueError, TypeError):
-                pass
-
-        # Filtro por avance_obra (porcentaje mínimo)
-        if "avance_obra" in filters and filters["avance_obra"]:
-            try:
-                min_avance = float(filters["avance_obra"])
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if (
-                        item.get("avance_obra")
-                        and float(item["avance_obra"]) >= min_avance
-                    )
-                    or (
-                        item.get("properties", {}).get("avance_obra")
-                        and float(item["properties"]["avance_obra"]) >= min_avance
-                    )
-                ]
-            except (ValueError, TypeError):
-                pass
-
-        # Filtro por búsqueda de texto
-        if "search" in filters and filters["search"]:
-            search_term = str(filters["search"]).lower()
-            filtered_data = [
-                item for item in filtered_data if search_in_record(item, search_term)
-            ]
-
-        # Filtro por presencia de geometría
-        if "has_geometry" in filters:
-            has_geom = bool(filters["has_geometry"])
-            geometry_fields = [
-                "geometry",
-                "coordinates",
-                "lat",
-                "lng",
-                "latitude",
-                "longitude",
-                "coordenadas",
-            ]
-
-            if has_geom:
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if any(item.get(field) is not None for field in geometry_fields)
-                ]
-            else:
-                filtered_data = [
-                    item
-                    for item in filtered_data
-                    if not any(item.get(field) is not None for field in geometry_fields)
-                ]
-
-        # Filtro por bounding box geográfico
-        if "bbox" in filters and filters["bbox"] and len(filters["bbox"]) == 4:
-            min_lng, min_lat, max_lng, max_lat = filters["bbox"]
-            filtered_data = [
-                item
-                for item in filtered_data
-                if is_point_in_bbox(item, min_lng, min_lat, max_lng, max_lat)
-            ]
-
-        # Filtros de fecha
-        if "fecha_desde" in filters and filters["fecha_desde"]:
-            # Implementación básica - buscar campos de fecha comunes
-            fecha_desde = str(filters["fecha_desde"])
-            filtered_data = [
-                item
-                for item in filtered_data
-                if check_date_filter(item, "desde", fecha_desde)
-            ]
-
-        if "fecha_hasta" in filters and filters["fecha_hasta"]:
-            fecha_hasta = str(filters["fecha_hasta"])
-            filtered_data = [
-                item
-                for item in filtered_data
-                if check_date_filter(item, "hasta", fecha_hasta)
-            ]
-
-        return filtered_data
-
-    except Exception as e:
-        logger.warning(f"Error aplicando filtros: {str(e)}")
-        return data  # Devolver datos originales si hay error en filtros
-
-
-def search_in_record(record: Dict[str, Any], search_term: str) -> bool:
-    """Buscar término en campos principales del registro"""
-    searchable_fields = [
-        "upid",
-        "nombre",
-        "descripcion",
-        "estado",
-        "tipo_intervencion",
-        "clase_up",
-        "clase_obra",
-        "departamento",
-        "municipio",
-        "comuna_corregimiento",
-        "barrio_vereda",
-        "nombre_proyecto",
-    ]
-
-    # Buscar en campos directos
-    for field in searchable_fields:
-        if (
-            field in record
-            and record[field]
-            and search_term in str(record[field]).lower()
-        ):
-            return True
-
-    # Buscar en properties
-    properties = record.get("properties", {})
-    for field in searchable_fields:
-        if (
-            field in properties
-            and properties[field]
-            and search_term in str(properties[field]).lower()
-        ):
-            return True
-
-    return False
-
-
-def is_point_in_bbox(
-    record: Dict[str, Any],
-    min_lng: float,
-    min_lat: float,
-    max_lng: float,
-    max_lat: float,
-) -> bool:
-    """Verificar si un punto está dentro del bounding box"""
-    try:
-        # Buscar coordenadas en diferentes campos posibles
-        lat = (
-            record.get("lat")
-            or record.get("latitude")
-            or record.get("properties", {}).get("lat")
-        )
-        lng = (
-            record.get("lng")
-            or record.get("longitude")
-            or record.get("properties", {}).get("lng")
-        )
-
-        # También buscar en coordenadas como array [lng, lat]
-        if not lat or not lng:
-            coords = record.get("coordinates") or record.get("coordenadas")
-            if coords and isinstance(coords, list) and len(coords) >= 2:
-                lng, lat = coords[0], coords[1]
-
-        if lat is not None and lng is not None:
-            return min_lat <= float(lat) <= max_lat and min_lng <= float(lng) <= max_lng
-
-        return False
-    except:
-        return False
-
-
-def check_date_filter(
-    record: Dict[str, Any], filter_type: str, date_value: str
-) -> bool:
-    """Verificar filtros de fecha básicos"""
-    try:
-        date_fields = [
-            "fecha",
-            "fecha_creacion",
-            "fecha_actualizacion",
-            "created_at",
-            "updated_at",
-        ]
-
-        for field in date_fields:
-            field_value = record.get(field) or record.get("properties", {}).get(field)
-            if field_value:
-                # Comparación básica de strings - mejorar según formato de fechas
-                if filter_type == "desde":
-                    return str(field_value) >= date_value
-                elif filter_type == "hasta":
-                    return str(field_value) <= date_value
-
-        return True  # Si no hay fechas, incluir el registro
-    except:
-        return True
+    index_filters = {k: v for k, v in filters.items() if k in CLIENT_SIDE_FILTERS}
+    return get_index(data).select(index_filters)
 
 
 async def get_all_unidades_proyecto_simple(
@@ -698,31 +333,18 @@ async def get_all_unidades_proyecto_simple(
                 "count": 0,
             }
 
-        # Obtener la colección
-        collection_ref = db.collection("unidades_proyecto")
+        # Leer desde el snapshot compartido (sin stream() por request)
+        docs = await get_unidades_snapshot().adocuments()
 
         # Aplicar límite solo si se especifica explícitamente
         if limit is not None and limit > 0:
             logger.debug(f"Aplicando limite de {limit} documentos")
-            query = collection_ref.limit(limit)
+            docs = docs[:limit]
         else:
             logger.debug("SIN LIMITE - obteniendo TODOS los documentos")
-            query = collection_ref  # Sin límite = todos los documentos
 
-        # Ejecutar consulta
-        docs = query.stream()
-        data = []
-        doc_count = 0
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-            # No agregamos ID redundante, upid es suficiente
-            data.append(doc_data)
-            doc_count += 1
-
-            # Log cada 100 documentos para mostrar progreso
-            if doc_count % 100 == 0:
-                logger.debug(f"Procesados {doc_count} documentos...")
+        # Copia superficial: los documentos del snapshot son compartidos
+        data = [dict(doc_data) for doc_data in docs]
 
         logger.debug(f"TOTAL procesados: {len(data)} documentos")
 
@@ -912,6 +534,188 @@ def extraer_geometria_exhaustiva(
     return None, False, "not_found"
 
 
+def _build_geometry_features(docs: List[tuple]) -> List[Dict[str, Any]]:
+    """
+    Construir las features GeoJSON (sin filtros) a partir de los pares
+    (doc_id, data) del snapshot. Se memoiza por versión del snapshot, por lo
+    que las features resultantes son compartidas: tratarlas como solo lectura.
+    """
+    geometry_data = []
+    total_docs_processed = 0
+
+    # Campos esenciales
+    geo_fields = ["upid", "coordenadas", "geometry", "coordinates", "lat", "lng"]
+    viz_fields = [
+        "nombre_up",
+        "comuna_corregimiento",
+        "barrio_vereda",
+        "estado",
+        "tipo_intervencion",
+        "clase_up",
+        "nombre_centro_gestor",
+        "centro_gestor",
+        "presupuesto_base",
+        "presupuesto_total_up",
+        "avance_obra",
+        "tipo_equipamiento",
+        "bpin",
+        "direccion",
+        "ano",
+        "fuente_financiacion",
+        "frente_activo",
+    ]
+
+    for doc_id, doc_data in docs:
+        total_docs_processed += 1
+        record = {}
+
+        # Debug info para los primeros 3 documentos
+        if total_docs_processed <= 3:
+            logger.debug(
+                f"Doc {total_docs_processed}: {doc_id} keys={list(doc_data.keys())[:10]}"
+            )
+
+        # Extraer campos geométricos y de visualización
+        for field in geo_fields + viz_fields:
+            if field in doc_data:
+                record[field] = doc_data[field]
+            elif field in doc_data.get("properties", {}):
+                record[field] = doc_data["properties"][field]
+
+        # ARREGLO INTELIGENTE: Buscar geometría usando función exhaustiva
+        upid_value = (
+            record.get("upid")
+            or doc_data.get("upid")
+            or doc_data.get("properties", {}).get("upid")
+        )
+
+        if upid_value:
+            # Usar función exhaustiva de extracción de geometría
+            # Activar debug solo para los primeros 3 documentos
+            debug_mode = total_docs_processed <= 3
+            geometry_data_obj, geometry_found, geometry_source = (
+                extraer_geometria_exhaustiva(doc_data, upid_value, debug=debug_mode)
+            )
+
+            # Si no se encontró geometría, crear placeholder
+            if not geometry_found or not geometry_data_obj:
+                geometry_data_obj = {
+                    "type": "Point",
+                    "coordinates": [0, 0],  # Coordenadas nulas
+                }
+                geometry_source = "placeholder"
+                if debug_mode:
+                    logger.debug(
+                        f"Usando coordenadas placeholder [0,0] para {upid_value}"
+                    )
+            elif debug_mode:
+                logger.debug(f"Geometria valida obtenida de: {geometry_source}")
+
+            # Función auxiliar para extraer valor de múltiples ubicaciones
+            def get_field_value(field_name):
+                """Buscar campo en: doc_data directo > properties > record"""
+                # 1. Nivel superior del documento (nuevo formato)
+                if field_name in doc_data and doc_data[field_name] is not None:
+                    return doc_data[field_name]
+                # 2. Dentro de properties (formato antiguo)
+                if isinstance(doc_data.get("properties"), dict):
+                    props = doc_data["properties"]
+                    if field_name in props and props[field_name] is not None:
+                        return props[field_name]
+                # 3. Dentro de record (fallback)
+                if field_name in record and record[field_name] is not None:
+                    return record[field_name]
+                return None
+
+            # 🔄 ESTRATEGIA HÍBRIDA: Detectar si ya tiene estructura con intervenciones
+            if "intervenciones" in doc_data and isinstance(
+                doc_data.get("intervenciones"), list
+            ):
+                # Ya tiene estructura nueva - parsear strings a diccionarios
+                import json
+
+                intervenciones_raw = doc_data.get("intervenciones", [])
+                intervenciones_parsed = []
+                for interv in intervenciones_raw:
+                    if isinstance(interv, str):
+                        # Es string - parsear JSON
+                        try:
+                            intervenciones_parsed.append(json.loads(interv))
+                        except json.JSONDecodeError:
+                            # Si falla el parsing JSON, intentar literal_eval
+                            # (fallback seguro, no ejecuta código arbitrario)
+                            try:
+                                intervenciones_parsed.append(
+                                    ast.literal_eval(interv)
+                                )
+                            except (ValueError, SyntaxError):
+                                logger.warning(
+                                    f"No se pudo parsear intervencion: {interv[:100]}"
+                                )
+                    elif isinstance(interv, dict):
+                        # Ya es diccionario
+                        intervenciones_parsed.append(interv)
+
+                clase_up_val = doc_data.get("clase_up") or doc_data.get(
+                    "clase_obra"
+                )
+                tipo_equipamiento_val = doc_data.get("tipo_equipamiento")
+                unidad_props_enrich = {
+                    "clase_up": clase_up_val,
+                    "tipo_equipamiento": tipo_equipamiento_val,
+                }
+
+                # Enriquecer cada intervención con estado calculado y frente_activo
+                intervenciones_parsed = [
+                    _enriquecer_intervencion(interv, unidad_props_enrich)
+                    for interv in intervenciones_parsed
+                ]
+
+                unidad_properties = {
+                    "upid": doc_data.get("upid"),
+                    "nombre_up": doc_data.get("nombre_up"),
+                    "nombre_up_detalle": doc_data.get("nombre_up_detalle"),
+                    "direccion": doc_data.get("direccion"),
+                    "barrio_vereda": doc_data.get("barrio_vereda"),
+                    "barrio_vereda_2": doc_data.get("barrio_vereda_2"),
+                    "comuna_corregimiento": doc_data.get("comuna_corregimiento"),
+                    "comuna_corregimiento_2": doc_data.get(
+                        "comuna_corregimiento_2"
+                    ),
+                    "tipo_equipamiento": tipo_equipamiento_val,
+                    "clase_up": clase_up_val,
+                    "nombre_centro_gestor": doc_data.get("nombre_centro_gestor"),
+                    "identificador": doc_data.get("identificador"),
+                    "has_valid_geometry": geometry_found,
+                    "geometry_source": geometry_source,
+                    "n_intervenciones": doc_data.get(
+                        "n_intervenciones", len(intervenciones_parsed)
+                    ),
+                    "intervenciones": intervenciones_parsed,
+                }
+            else:
+                # Estructura antigua - transformar
+                unidad_properties = (
+                    transformar_documento_a_unidad_con_intervenciones(doc_data)
+                )
+                unidad_properties["has_valid_geometry"] = geometry_found
+                unidad_properties["geometry_source"] = geometry_source  # 🆕 NUEVO
+
+            # Crear registro completo con estructura GeoJSON (con array intervenciones)
+            feature = {
+                "type": "Feature",
+                "geometry": geometry_data_obj,
+                "properties": unidad_properties,
+            }
+            geometry_data.append(feature)
+
+    logger.debug(
+        f"Procesados {total_docs_processed} docs, incluidos {len(geometry_data)} registros totales"
+    )
+
+    return geometry_data
+
+
 async def get_unidades_proyecto_geometry(
     filters: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
@@ -954,206 +758,13 @@ async def get_unidades_proyecto_geometry(
                 "count": 0,
             }
 
-        # Consulta simple
-        query = db.collection("unidades_proyecto")
-
-        # Procesar documentos
-        docs = query.stream()
-        geometry_data = []
-        total_docs_processed = 0
-
-        # Campos esenciales
-        geo_fields = ["upid", "coordenadas", "geometry", "coordinates", "lat", "lng"]
-        viz_fields = [
-            "nombre_up",
-            "comuna_corregimiento",
-            "barrio_vereda",
-            "estado",
-            "tipo_intervencion",
-            "clase_up",
-            "nombre_centro_gestor",
-            "centro_gestor",
-            "presupuesto_base",
-            "presupuesto_total_up",
-            "avance_obra",
-            "tipo_equipamiento",
-            "bpin",
-            "direccion",
-            "ano",
-            "fuente_financiacion",
-            "frente_activo",
-        ]
-
-        for doc in docs:
-            total_docs_processed += 1
-            doc_data = doc.to_dict()
-            record = {}
-
-            # Debug info para los primeros 3 documentos
-            if total_docs_processed <= 3:
-                logger.debug(
-                    f"Doc {total_docs_processed}: {doc.id} keys={list(doc_data.keys())[:10]}"
-                )
-
-            # Extraer campos geométricos y de visualización
-            for field in geo_fields + viz_fields:
-                if field in doc_data:
-                    record[field] = doc_data[field]
-                elif field in doc_data.get("properties", {}):
-                    record[field] = doc_data["properties"][field]
-
-            # ARREGLO INTELIGENTE: Buscar geometría usando función exhaustiva
-            upid_value = (
-                record.get("upid")
-                or doc_data.get("upid")
-                or doc_data.get("properties", {}).get("upid")
-            )
-
-            if upid_value:
-                # Usar función exhaustiva de extracción de geometría
-                # Activar debug solo para los primeros 3 documentos
-                debug_mode = total_docs_processed <= 3
-                geometry_data_obj, geometry_found, geometry_source = (
-                    extraer_geometria_exhaustiva(doc_data, upid_value, debug=debug_mode)
-                )
-
-                # Si no se encontró geometría, crear placeholder
-                if not geometry_found or not geometry_data_obj:
-                    geometry_data_obj = {
-                        "type": "Point",
-                        "coordinates": [0, 0],  # Coordenadas nulas
-                    }
-                    geometry_source = "placeholder"
-                    if debug_mode:
-                        logger.debug(
-                            f"Usando coordenadas placeholder [0,0] para {upid_value}"
-                        )
-                elif debug_mode:
-                    logger.debug(f"Geometria valida obtenida de: {geometry_source}")
-
-                # Función auxiliar para extraer valor de múltiples ubicaciones
-                def get_field_value(field_name):
-                    """Buscar campo en: doc_data directo > properties > record"""
-                    # 1. Nivel superior del documento (nuevo formato)
-                    if field_name in doc_data and doc_data[field_name] is not None:
-                        return doc_data[field_name]
-                    # 2. Dentro de properties (formato antiguo)
-                    if isinstance(doc_data.get("properties"), dict):
-                        props = doc_data["properties"]
-                        if field_name in props and props[field_name] is not None:
-                            return props[field_name]
-                    # 3. Dentro de record (fallback)
-                    if field_name in record and record[field_name] is not None:
-                        return record[field_name]
-                    return None
-
-                # 🔄 ESTRATEGIA HÍBRIDA: Detectar si ya tiene estructura con intervenciones
-                if "intervenciones" in doc_data and isinstance(
-                    doc_data.get("intervenciones"), list
-                ):
-                    # Ya tiene estructura nueva - parsear strings a diccionarios
-                    import json
-
-                    intervenciones_raw = doc_data.get("intervenciones", [])
-                    intervenciones_parsed = []
-                    for interv in intervenciones_raw:
-                        if isinstance(interv, str):
-                            # Es string - parsear JSON
-                            try:
-                                intervenciones_parsed.append(json.loads(interv))
-                            except json.JSONDecodeError:
-                                # Si falla el parsing JSON, intentar literal_eval
-                                # (fallback seguro, no ejecuta código arbitrario)
-                                try:
-                                    intervenciones_parsed.append(
-                                        ast.literal_eval(interv)
-                                    )
-                                except (ValueError, SyntaxError):
-                                    logger.warning(
-                                        f"No se pudo parsear intervencion: {interv[:100]}"
-                                    )
-                        elif isinstance(interv, dict):
-                            # Ya es diccionario
-                            intervenciones_parsed.append(interv)
-
-                    clase_up_val = doc_data.get("clase_up") or doc_data.get(
-                        "clase_obra"
-                    )
-                    tipo_equipamiento_val = doc_data.get("tipo_equipamiento")
-                    unidad_props_enrich = {
-                        "clase_up": clase_up_val,
-                        "tipo_equipamiento": tipo_equipamiento_val,
-                    }
-
-                    # Enriquecer cada intervención con estado calculado y frente_activo
-                    intervenciones_parsed = [
-                        _enriquecer_intervencion(interv, unidad_props_enrich)
-                        for interv in intervenciones_parsed
-                    ]
-
-                    unidad_properties = {
-                        "upid": doc_data.get("upid"),
-                        "nombre_up": doc_data.get("nombre_up"),
-                        "nombre_up_detalle": doc_data.get("nombre_up_detalle"),
-                        "direccion": doc_data.get("direccion"),
-                        "barrio_vereda": doc_data.get("barrio_vereda"),
-                        "barrio_vereda_2": doc_data.get("barrio_vereda_2"),
-                        "comuna_corregimiento": doc_data.get("comuna_corregimiento"),
-                        "comuna_corregimiento_2": doc_data.get(
-                            "comuna_corregimiento_2"
-                        ),
-                        "tipo_equipamiento": tipo_equipamiento_val,
-                        "clase_up": clase_up_val,
-                        "nombre_centro_gestor": doc_data.get("nombre_centro_gestor"),
-                        "identificador": doc_data.get("identificador"),
-                        "has_valid_geometry": geometry_found,
-                        "geometry_source": geometry_source,
-                        "n_intervenciones": doc_data.get(
-                            "n_intervenciones", len(intervenciones_parsed)
-                        ),
-                        "intervenciones": intervenciones_parsed,
-                    }
-                else:
-                    # Estructura antigua - transformar
-                    unidad_properties = (
-                        transformar_documento_a_unidad_con_intervenciones(doc_data)
-                    )
-                    unidad_properties["has_valid_geometry"] = geometry_found
-                    unidad_properties["geometry_source"] = geometry_source  # 🆕 NUEVO
-
-                # Crear registro completo con estructura GeoJSON (con array intervenciones)
-                feature = {
-                    "type": "Feature",
-                    "geometry": geometry_data_obj,
-                    "properties": unidad_properties,
-                }
-                geometry_data.append(feature)
-
-        logger.debug(
-            f"Procesados {total_docs_processed} docs, incluidos {len(geometry_data)} registros totales"
+        # Features base (sin filtros) memoizadas por versión del snapshot
+        geometry_data = await get_unidades_snapshot().aderived(
+            "geometry_features", _build_geometry_features
         )
 
         # Aplicar filtros client-side
         if filters:
-            # Filtro especial por upid (puede ser único o lista)
-            if "upid" in filters and filters["upid"]:
-                upid_filter = filters["upid"]
-                if isinstance(upid_filter, list):
-                    geometry_data = [
-                        item
-                        for item in geometry_data
-                        if item.get("properties", {}).get("upid") in upid_filter
-                    ]
-                else:
-                    geometry_data = [
-                        item
-                        for item in geometry_data
-                        if item.get("properties", {}).get("upid") == upid_filter
-                    ]
-                logger.debug(
-                    f"Filtro por upid aplicado: {len(geometry_data)} registros"
-                )
-
             # 🔄 NUEVO: Filtros de intervención (estado, tipo_intervencion, ano, frente_activo)
             filtros_intervencion = {}
             if "estado" in filters and filters["estado"]:
@@ -1165,18 +776,6 @@ async def get_unidades_proyecto_geometry(
             if "frente_activo" in filters and filters["frente_activo"]:
                 filtros_intervencion["frente_activo"] = filters["frente_activo"]
 
-            if filtros_intervencion:
-                geometry_data = aplicar_filtros_a_intervenciones(
-                    geometry_data,
-                    estado=filtros_intervencion.get("estado"),
-                    tipo_intervencion=filtros_intervencion.get("tipo_intervencion"),
-                    ano=filtros_intervencion.get("ano"),
-                    frente_activo=filtros_intervencion.get("frente_activo"),
-                )
-                logger.debug(
-                    f"Filtros de intervencion aplicados: {len(geometry_data)} registros"
-                )
-
             # Filtros de unidad (campos que no son de intervención)
             filtros_unidad = {
                 k: v
@@ -1190,10 +789,29 @@ async def get_unidades_proyecto_geometry(
                     "tipo_equipamiento",
                 ]
             }
-            if filtros_unidad:
-                geometry_data = apply_client_side_filters(geometry_data, filtros_unidad)
+
+            # Índice columnar (cacheado junto a las features base): upid y
+            # filtros de unidad exactos + prefiltro de features que tienen
+            # alguna intervención con cada valor pedido.
+            geometry_data = get_index(geometry_data).select(
+                {
+                    "upid": filters.get("upid"),
+                    **filtros_unidad,
+                    **filtros_intervencion,
+                }
+            )
+            logger.debug(f"Filtros indexados aplicados: {len(geometry_data)} registros")
+
+            if filtros_intervencion:
+                geometry_data = aplicar_filtros_a_intervenciones(
+                    geometry_data,
+                    estado=filtros_intervencion.get("estado"),
+                    tipo_intervencion=filtros_intervencion.get("tipo_intervencion"),
+                    ano=filtros_intervencion.get("ano"),
+                    frente_activo=filtros_intervencion.get("frente_activo"),
+                )
                 logger.debug(
-                    f"Filtros de unidad aplicados: {len(geometry_data)} registros"
+                    f"Filtros de intervencion aplicados: {len(geometry_data)} registros"
                 )
 
             # Aplicar límite
@@ -1205,18 +823,16 @@ async def get_unidades_proyecto_geometry(
                 except (ValueError, TypeError):
                     pass
 
-        # ✅ FUNCIONAL: Sin cache, datos siempre frescos
-
         # Respuesta en formato GeoJSON válido para NextJS
         geojson_response = {
             "type": "FeatureCollection",
-            "features": geometry_data,
+            "features": list(geometry_data),
             "properties": {
                 "success": True,
                 "count": len(geometry_data),
                 "filters_applied": filters or {},
                 "functional_approach": True,
-                "message": f"Geometrías cargadas desde Firestore (sin cache)",
+                "message": "Geometrías cargadas desde snapshot en memoria",
             },
         }
 
@@ -1237,6 +853,127 @@ async def get_unidades_proyecto_geometry(
         }
 
 
+def _build_attribute_records(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Construir los registros de atributos (sin geometría) de los documentos dados.
+    La lista completa se memoiza por versión del snapshot: los lectores deben
+    copiar los registros antes de mutarlos.
+    """
+    attributes_data = []
+    doc_count = 0
+
+    # Campos de geometría que queremos EXCLUIR
+    geometry_fields = {
+        "coordenadas",
+        "geometry",
+        "linestring",
+        "polygon",
+        "coordinates",
+        "lat",
+        "lng",
+        "latitude",
+        "longitude",
+        "geom",
+        "shape",
+        "location",
+    }
+
+    for doc_data in docs:
+        # Crear registro solo con atributos (sin geometría, sin ID redundante)
+        attributes_record = {}  # Sin ID redundante
+
+        for field, value in doc_data.items():
+            # Excluir campos de geometría pero incluir todo lo demás
+            if field not in geometry_fields:
+                # Aplicar conversiones de tipos específicas
+                if field == "presupuesto_base":
+                    attributes_record[field] = _convert_to_float(value)
+                elif field == "avance_obra":
+                    attributes_record[field] = _convert_to_float(value)
+                elif field == "bpin":
+                    attributes_record[field] = _convert_bpin_to_positive_int(value)
+                else:
+                    attributes_record[field] = value
+
+        # También verificar y convertir campos en properties si existen
+        if "properties" in doc_data and isinstance(doc_data["properties"], dict):
+            for field, value in doc_data["properties"].items():
+                if field not in geometry_fields and field not in attributes_record:
+                    # Aplicar conversiones de tipos específicas
+                    if field == "presupuesto_base":
+                        attributes_record[field] = _convert_to_float(value)
+                    elif field == "avance_obra":
+                        attributes_record[field] = _convert_to_float(value)
+                    elif field == "bpin":
+                        attributes_record[field] = _convert_bpin_to_positive_int(
+                            value
+                        )
+                    else:
+                        attributes_record[field] = value
+
+        # 🔄 TRANSFORMACIÓN: Parsear intervenciones si es string JSON
+        if "intervenciones" in attributes_record and isinstance(
+            attributes_record["intervenciones"], list
+        ):
+            import json
+
+            intervenciones_raw = attributes_record["intervenciones"]
+            intervenciones_parsed = []
+            for interv in intervenciones_raw:
+                if isinstance(interv, str):
+                    # Es string - parsear JSON
+                    try:
+                        intervenciones_parsed.append(json.loads(interv))
+                    except json.JSONDecodeError:
+                        # Si falla el parsing JSON, intentar literal_eval
+                        # (fallback seguro, no ejecuta código arbitrario)
+                        try:
+                            intervenciones_parsed.append(
+                                ast.literal_eval(interv)
+                            )
+                        except (ValueError, SyntaxError):
+                            pass  # Ignorar intervenciones no parseables
+                elif isinstance(interv, dict):
+                    # Ya es diccionario
+                    intervenciones_parsed.append(interv)
+
+            # Enriquecer cada intervención con estado calculado y frente_activo
+            clase_up_attr = attributes_record.get(
+                "clase_up"
+            ) or attributes_record.get("clase_obra")
+            tipo_equip_attr = attributes_record.get("tipo_equipamiento")
+            unidad_props_attr = {
+                "clase_up": clase_up_attr,
+                "tipo_equipamiento": tipo_equip_attr,
+            }
+            intervenciones_parsed = [
+                _enriquecer_intervencion(interv, unidad_props_attr)
+                for interv in intervenciones_parsed
+            ]
+
+            attributes_record["intervenciones"] = intervenciones_parsed
+
+        # 🔄 TRANSFORMACIÓN: Renombrar clase_obra a clase_up
+        if "clase_obra" in attributes_record:
+            attributes_record["clase_up"] = attributes_record.pop("clase_obra")
+            if doc_count <= 3:
+                logger.debug(
+                    f"Transformado clase_obra -> clase_up para {attributes_record.get('upid', 'unknown')}"
+                )
+
+        # Recalcular estado raíz (efímero) desde avance_obra — coherente con las
+        # intervenciones anidadas ya enriquecidas y con el contrato del frontend.
+        attributes_record["estado"] = _calcular_estado(attributes_record)
+
+        attributes_data.append(attributes_record)
+        doc_count += 1
+
+        if doc_count % 100 == 0:
+            logger.debug(f"Procesados {doc_count} registros de atributos...")
+
+    return attributes_data
+
+
 async def get_unidades_proyecto_attributes(
     filters: Optional[Dict[str, Any]] = None,
     limit: Optional[int] = None,
@@ -1262,17 +999,6 @@ async def get_unidades_proyecto_attributes(
     - barrio_vereda: barrio o vereda
     """
     try:
-        # ============================================
-        # SISTEMA DE CACHE (4 horas)
-        # ============================================
-        import hashlib
-        import json
-
-        # ✅ PROGRAMACIÓN FUNCIONAL: Sin cache, datos frescos siempre
-
-        # ============================================
-        # LÓGICA PRINCIPAL (si no hay cache)
-        # ============================================
         # ============================================
         # DETECCIÓN DE FILTROS
         # ============================================
@@ -1307,26 +1033,33 @@ async def get_unidades_proyecto_attributes(
                 "count": 0,
             }
 
-        collection_ref = db.collection("unidades_proyecto")
+        # Registros base desde el snapshot compartido, ordenados por ID de documento
+        # (mismo orden que order_by("__name__") en Firestore) y memoizados por versión.
+        snapshot = get_unidades_snapshot()
 
-        # ============================================
-        # OPTIMIZACIÓN: FILTROS SERVER-SIDE EN FIRESTORE
-        # ============================================
-        query = collection_ref
-
-        # Aplicar filtros server-side para reducir datos descargados
+        # Filtros aplicados antes de construir los registros
         server_side_filters_applied = []
 
-        # Filtro server-side por upid específico (solo si es un valor único)
+        # Filtro por upid específico (solo si es un valor único)
         if (
             filters
             and "upid" in filters
             and filters["upid"]
             and not isinstance(filters["upid"], list)
         ):
-            query = query.where("upid", "==", filters["upid"])
+            docs = [
+                d
+                for d in await snapshot.adocuments()
+                if d.get("upid") == filters["upid"]
+            ]
+            base_records = _build_attribute_records(docs)
             server_side_filters_applied.append(f"upid={filters['upid']}")
             logger.debug(f"SERVER-SIDE filtro por upid: {filters['upid']}")
+        else:
+            base_records = await snapshot.aderived(
+                "attribute_records",
+                lambda items: _build_attribute_records([d for _, d in items]),
+            )
 
         # ✅ FILTROS MOVIDOS A CLIENT-SIDE - Los campos están siendo procesados después de la descarga
         # Los filtros server-side de Firestore fallan porque los índices pueden no estar configurados
@@ -1337,9 +1070,6 @@ async def get_unidades_proyecto_attributes(
 
         logger.debug(f"Filtros SERVER-SIDE aplicados: {server_side_filters_applied}")
 
-        # Ordenar para paginación consistente
-        query = query.order_by("__name__")  # Ordenar por document ID
-
         # ✅ FIX: NO aplicar límite server-side cuando hay filtros client-side
         # El límite se aplicará DESPUÉS de los filtros client-side para consistencia
         # with geometry endpoint behavior
@@ -1350,131 +1080,10 @@ async def get_unidades_proyecto_attributes(
                 f"SERVER-SIDE limite pospuesto para aplicar despues de filtros: {limit}"
             )
 
-        # Aplicar offset si se especifica
-        if offset and offset > 0:
-            # Simular offset saltando documentos
-            docs_to_skip = list(query.limit(offset).stream())
-            if docs_to_skip:
-                last_doc = docs_to_skip[-1]
-                query = query.start_after(last_doc)
-            logger.debug(f"Aplicando offset de {offset} registros")
-
-        # Obtener documentos (YA OPTIMIZADOS por Firestore)
-        docs = query.stream()
-
-        attributes_data = []
-        doc_count = 0
-
-        # Campos de geometría que queremos EXCLUIR
-        geometry_fields = {
-            "coordenadas",
-            "geometry",
-            "linestring",
-            "polygon",
-            "coordinates",
-            "lat",
-            "lng",
-            "latitude",
-            "longitude",
-            "geom",
-            "shape",
-            "location",
-        }
-
-        for doc in docs:
-            doc_data = doc.to_dict()
-
-            # Crear registro solo con atributos (sin geometría, sin ID redundante)
-            attributes_record = {}  # Sin ID redundante
-
-            for field, value in doc_data.items():
-                # Excluir campos de geometría pero incluir todo lo demás
-                if field not in geometry_fields:
-                    # Aplicar conversiones de tipos específicas
-                    if field == "presupuesto_base":
-                        attributes_record[field] = _convert_to_float(value)
-                    elif field == "avance_obra":
-                        attributes_record[field] = _convert_to_float(value)
-                    elif field == "bpin":
-                        attributes_record[field] = _convert_bpin_to_positive_int(value)
-                    else:
-                        attributes_record[field] = value
-
-            # También verificar y convertir campos en properties si existen
-            if "properties" in doc_data and isinstance(doc_data["properties"], dict):
-                for field, value in doc_data["properties"].items():
-                    if field not in geometry_fields and field not in attributes_record:
-                        # Aplicar conversiones de tipos específicas
-                        if field == "presupuesto_base":
-                            attributes_record[field] = _convert_to_float(value)
-                        elif field == "avance_obra":
-                            attributes_record[field] = _convert_to_float(value)
-                        elif field == "bpin":
-                            attributes_record[field] = _convert_bpin_to_positive_int(
-                                value
-                            )
-                        else:
-                            attributes_record[field] = value
-
-            # 🔄 TRANSFORMACIÓN: Parsear intervenciones si es string JSON
-            if "intervenciones" in attributes_record and isinstance(
-                attributes_record["intervenciones"], list
-            ):
-                import json
-
-                intervenciones_raw = attributes_record["intervenciones"]
-                intervenciones_parsed = []
-                for interv in intervenciones_raw:
-                    if isinstance(interv, str):
-                        # Es string - parsear JSON
-                        try:
-                            intervenciones_parsed.append(json.loads(interv))
-                        except json.JSONDecodeError:
-                            # Si falla el parsing JSON, intentar literal_eval
-                            # (fallback seguro, no ejecuta código arbitrario)
-                            try:
-                                intervenciones_parsed.append(
-                                    ast.literal_eval(interv)
-                                )
-                            except (ValueError, SyntaxError):
-                                pass  # Ignorar intervenciones no parseables
-                    elif isinstance(interv, dict):
-                        # Ya es diccionario
-                        intervenciones_parsed.append(interv)
-
-                # Enriquecer cada intervención con estado calculado y frente_activo
-                clase_up_attr = attributes_record.get(
-                    "clase_up"
-                ) or attributes_record.get("clase_obra")
-                tipo_equip_attr = attributes_record.get("tipo_equipamiento")
-                unidad_props_attr = {
-                    "clase_up": clase_up_attr,
-                    "tipo_equipamiento": tipo_equip_attr,
-                }
-                intervenciones_parsed = [
-                    _enriquecer_intervencion(interv, unidad_props_attr)
-                    for interv in intervenciones_parsed
-                ]
-
-                attributes_record["intervenciones"] = intervenciones_parsed
-
-            # 🔄 TRANSFORMACIÓN: Renombrar clase_obra a clase_up
-            if "clase_obra" in attributes_record:
-                attributes_record["clase_up"] = attributes_record.pop("clase_obra")
-                if doc_count <= 3:
-                    logger.debug(
-                        f"Transformado clase_obra -> clase_up para {attributes_record.get('upid', 'unknown')}"
-                    )
-
-            # Recalcular estado raíz (efímero) desde avance_obra — coherente con las
-            # intervenciones anidadas ya enriquecidas y con el contrato del frontend.
-            attributes_record["estado"] = _calcular_estado(attributes_record)
-
-            attributes_data.append(attributes_record)
-            doc_count += 1
-
-            if doc_count % 100 == 0:
-                logger.debug(f"Procesados {doc_count} registros de atributos...")
+        # El offset se aplica después de los filtros: el índice columnar se
+        # cachea por la lista base completa y un slice lo reconstruiría
+        attributes_data = base_records
+        doc_count = len(attributes_data)
 
         total_docs = len(attributes_data)
         logger.debug(f"TOTAL atributos despues de filtros SERVER-SIDE: {total_docs}")
@@ -1547,17 +1156,20 @@ async def get_unidades_proyecto_attributes(
                     f"RESULTADO FINAL - Registros despues de filtros: {len(attributes_data)} de {total_docs} descargados"
                 )
 
+        # Aplicar offset
+        if offset and offset > 0:
+            attributes_data = attributes_data[offset:]
+            logger.debug(f"Aplicando offset de {offset} registros")
+
         # ✅ FIX: Aplicar límite después de filtros client-side (CONSISTENTE con geometry endpoint)
         original_count = len(attributes_data)
         if limit and limit > 0:
-            # Apply offset first (if any), then limit
-            if offset and offset > 0:
-                attributes_data = attributes_data[offset:]
-                logger.debug(f"Aplicando offset de {offset} registros")
-
             attributes_data = attributes_data[:limit]
             logger.debug(f"Limite aplicado despues de filtros: {limit} registros")
 
+        # Copia superficial: los registros base son compartidos entre requests
+        attributes_data = [dict(record) for record in attributes_data]
+
         optimization_info = (
             "Con filtros aplicados" if has_filters else "Sin filtros - Datos completos"
         )
@@ -1578,8 +1190,6 @@ async def get_unidades_proyecto_attributes(
             "message": f"Obtenidos {len(attributes_data)} registros de atributos ({optimization_info})",
         }
 
-        # ✅ FUNCIONAL: Sin cache, datos siempre frescos
-
         return result
 
     except Exception as e:
@@ -2448,8 +2058,7 @@ async def get_frentes_activos() -> Dict[str, Any]:
             }
 
         unidades_por_upid = {}
-        for doc in db.collection("unidades_proyecto").stream():
-            doc_data = doc.to_dict()
+        for doc_data in await get_unidades_snapshot().adocuments():
             props = (
                 doc_data.get("properties", {})
                 if isinstance(doc_data.get("properties"), dict)
@@ -2471,9 +2080,7 @@ async def get_frentes_activos() -> Dict[str, Any]:
         total_por_intervencion = {}
         unidades_con_frentes = set()
 
-        intervenciones_query = db.collection("intervenciones_unidades_proyecto")
-        for doc in intervenciones_query.stream():
-            doc_data = doc.to_dict()
+        for doc_data in await get_intervenciones_snapshot().adocuments():
             upid = doc_data.get("upid") or doc_data.get("properties", {}).get("upid")
             if not upid:
                 continue
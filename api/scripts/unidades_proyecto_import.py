@@ -0,0 +1,181 @@
+"""
+Pipeline de importación masiva de Unidades de Proyecto e intervenciones
+(``POST /unidades-proyecto/importar/ejecutar``).
+
+Etapas:
+1. Prefetch: UPs e intervenciones existentes de todos los upid del archivo en
+   consultas ``in`` por lotes (en lugar de dos consultas ``==`` por upid).
+2. Enriquecimiento geoespacial en una sola pasada (lo hace el router).
+3. Escritura: UPs, intervenciones y filas de auditoría en WriteBatches de
+   ``IMPORT_WRITE_CHUNK_SIZE`` operaciones; las escrituras de un mismo grupo
+   (UP + sus intervenciones) van en el mismo batch siempre que quepan.
+   Tras cada batch se reporta el progreso.
+"""
+
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from api.core.config import int_from_env
+from database.firestore_repository import query_in, run_blocking
+
+logger = logging.getLogger(__name__)
+
+
+# Firestore admite hasta 500 operaciones por WriteBatch
+IMPORT_WRITE_CHUNK_SIZE = max(1, min(int_from_env("IMPORT_WRITE_CHUNK_SIZE", 400), 500))
+
+UNIDADES_COLLECTION = "unidades_proyecto"
+INTERVENCIONES_COLLECTIONS = ("intervenciones_unidades_proyecto", "unidades_proyecto_intervenciones")
+AUDIT_COLLECTION = "cambios_implementados_unidades_proyecto"
+
+
+def _norm_str(v: Any) -> str:
+    return str(v).strip().lower() if v is not None else ""
+
+
+def _round_budget(v: Any) -> str:
+    try:
+        return str(round(float(v), -3))  # redondear a miles para tolerar diferencias menores
+    except (TypeError, ValueError):
+        return ""
+
+
+def intervencion_dedup_key(data: Dict[str, Any]) -> tuple:
+    """Clave natural de unicidad para una intervención."""
+    ref = _norm_str(data.get("referencia_contrato"))
+    tipo = _norm_str(data.get("tipo_intervencion"))
+    if ref:
+        return (tipo, ref)
+    return (tipo, _round_budget(data.get("presupuesto_base")), _norm_str(data.get("fecha_inicio")))
+
+
+async def prefetch_existing_upids(db, upids: Iterable[str]) -> Set[str]:
+    """Subconjunto de ``upids`` que ya existe en ``unidades_proyecto``."""
+    docs = await query_in(UNIDADES_COLLECTION, "upid", upids, select=["upid"], db=db)
+    return {str((doc.to_dict() or {}).get("upid")) for doc in docs}
+
+
+async def prefetch_intervenciones(db, upids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Intervenciones existentes de cada upid.
+
+    Returns:
+        ``{upid: {"keys": claves de dedup, "max": mayor N de UPID-INT-N}}``
+        para todos los ``upids`` pedidos (vacío si no tienen intervenciones).
+    """
+    wanted = list(dict.fromkeys(u for u in upids if u))
+    state: Dict[str, Dict[str, Any]] = {upid: {"keys": set(), "max": 0} for upid in wanted}
+    for collection in INTERVENCIONES_COLLECTIONS:
+        for doc in await query_in(collection, "upid", wanted, db=db):
+            data = doc.to_dict() or {}
+            entry = state.get(str(data.get("upid")))
+            if entry is None:
+                continue
+            entry["keys"].add(intervencion_dedup_key(data))
+            iid = str(data.get("intervencion_id", doc.id))
+            m = re.match(rf"^{re.escape(str(data.get('upid')))}-INT-(\d+)$", iid, re.IGNORECASE)
+            if m:
+                entry["max"] = max(entry["max"], int(m.group(1)))
+    return state
+
+
+class ImportWrite:
+    """Una escritura planificada: documento destino y feature de origen."""
+
+    __slots__ = ("collection", "doc_id", "data", "feature_index", "created_id")
+
+    def __init__(
+        self,
+        collection: str,
+        doc_id: Optional[str],
+        data: Dict[str, Any],
+        feature_index: Optional[int] = None,
+        created_id: Optional[str] = None,
+    ):
+        self.collection = collection
+        self.doc_id = doc_id  # None → id automático (auditoría)
+        self.data = data
+        self.feature_index = feature_index
+        self.created_id = created_id
+
+
+class ImportBatchWriter:
+    """
+    Confirma grupos de ``ImportWrite`` en WriteBatches de ``chunk_size``.
+
+    Un batch que falla marca todas sus escrituras como fallidas (``failed``) y
+    el resto continúa; ``committed`` conserva el orden de planificación.
+    """
+
+    def __init__(
+        self,
+        db,
+        chunk_size: int = IMPORT_WRITE_CHUNK_SIZE,
+        on_commit: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ):
+        self.db = db
+        self.chunk_size = max(1, min(chunk_size, 500))
+        self.on_commit = on_commit
+        self.committed: List[ImportWrite] = []
+        self.failed: List[Tuple[ImportWrite, str]] = []
+        self.batches = 0
+        self.total = 0
+
+    def _commit_sync(self, chunk: List[ImportWrite]) -> None:
+        batch = self.db.batch()
+        for write in chunk:
+            collection_ref = self.db.collection(write.collection)
+            ref = collection_ref.document(write.doc_id) if write.doc_id else collection_ref.document()
+            batch.set(ref, write.data)
+        batch.commit()
+
+    async def _commit(self, chunk: List[ImportWrite]) -> None:
+        try:
+            await run_blocking(UNIDADES_COLLECTION, self._commit_sync, chunk)
+            self.committed.extend(chunk)
+        except Exception as e:
+            logger.error("importar: fallo batch %d (%d escrituras): %s", self.batches + 1, len(chunk), e)
+            self.failed.extend((write, str(e)) for write in chunk)
+        self.batches += 1
+        if self.on_commit is not None:
+            self.on_commit(
+                {
+                    "batch": self.batches,
+                    "written": len(self.committed),
+                    "failed": len(self.failed),
+                    "total": self.total,
+                }
+            )
+
+    async def write_groups(self, groups: List[List[ImportWrite]]) -> None:
+        self.total = sum(len(group) for group in groups)
+        pending: List[ImportWrite] = []
+        for group in groups:
+            if pending and len(pending) + len(group) > self.chunk_size:
+                await self._commit(pending)
+                pending = []
+            pending.extend(group)
+            while len(pending) >= self.chunk_size:
+                await self._commit(pending[: self.chunk_size])
+                pending = pending[self.chunk_size :]
+        if pending:
+            await self._commit(pending)
+
+    def created_ids(self, collection: Optional[str] = None) -> List[str]:
+        return [
+            write.created_id
+            for write in self.committed
+            if write.created_id and (collection is None or write.collection == collection)
+        ]
+
+    def feature_errors(self) -> List[Dict[str, Any]]:
+        """Un error por feature cuyas escrituras fallaron."""
+        errors: Dict[int, str] = {}
+        for write, message in self.failed:
+            if write.feature_index is not None and write.feature_index not in errors:
+                errors[write.feature_index] = message
+        return [
+            {"feature_index": idx, "errors": [f"Error escribiendo feature {idx + 1}: {message}"]}
+            for idx, message in errors.items()
+        ]
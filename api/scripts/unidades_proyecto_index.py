@@ -0,0 +1,328 @@
+"""
+Índice columnar en memoria para filtrar registros de unidades de proyecto.
+
+Reemplaza los recorridos ``O(filtros × registros × intervenciones)`` de
+``apply_client_side_filters`` por una sola pasada de construcción:
+
+- Campos categóricos internados (valor → código) con posting lists
+  (``numpy.ndarray`` de posiciones) por valor. Un registro aporta valores
+  desde el nivel raíz, desde ``properties`` y, para los campos de
+  intervención, desde cada elemento de ``intervenciones``.
+- Arreglos ``float64`` para ``presupuesto_base``, ``avance_obra``, ``lat`` y
+  ``lng`` (NaN = sin dato), filtrados con máscaras vectorizadas.
+- Los filtros se combinan como intersección de máscaras booleanas.
+
+El índice se cachea por identidad de la lista de registros, de modo que las
+listas base cacheadas por snapshot (ver ``unidades_proyecto.py``) se indexan
+una sola vez por versión de datos.
+
+Uso:
+    from api.scripts.unidades_proyecto_index import get_index
+    filtrados = get_index(registros).select({"estado": "En ejecución"})
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+
+    NUMPY_AVAILABLE = True
+except ImportError:  # pragma: no cover - numpy llega como dependencia de pandas
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# filtro -> campos del registro que lo satisfacen (igualdad en cualquiera)
+CATEGORICAL_FIELDS: Dict[str, tuple] = {
+    "upid": ("upid",),
+    "estado": ("estado",),
+    "tipo_intervencion": ("tipo_intervencion",),
+    "clase_up": ("clase_up", "clase_obra"),
+    "tipo_equipamiento": ("tipo_equipamiento",),
+    "nombre_centro_gestor": ("nombre_centro_gestor",),
+    "departamento": ("departamento",),
+    "municipio": ("municipio",),
+    "comuna_corregimiento": ("comuna_corregimiento",),
+    "barrio_vereda": ("barrio_vereda",),
+    "frente_activo": ("frente_activo",),
+    "ano": ("ano",),
+}
+
+# Filtros que también se buscan dentro de ``intervenciones``
+NESTED_FIELDS = {"estado", "tipo_intervencion", "frente_activo", "ano"}
+
+NUMERIC_FIELDS = ("presupuesto_base", "avance_obra")
+
+SEARCHABLE_FIELDS = (
+    "upid",
+    "nombre",
+    "descripcion",
+    "estado",
+    "tipo_intervencion",
+    "clase_up",
+    "clase_obra",
+    "departamento",
+    "municipio",
+    "comuna_corregimiento",
+    "barrio_vereda",
+    "nombre_proyecto",
+)
+
+GEOMETRY_FIELDS = (
+    "geometry",
+    "coordinates",
+    "lat",
+    "lng",
+    "latitude",
+    "longitude",
+    "coordenadas",
+)
+
+DATE_FIELDS = (
+    "fecha",
+    "fecha_creacion",
+    "fecha_actualizacion",
+    "created_at",
+    "updated_at",
+)
+
+# Filtros que entiende ``ColumnarIndex.mask``
+SUPPORTED_FILTERS = (
+    set(CATEGORICAL_FIELDS)
+    | set(NUMERIC_FIELDS)
+    | {"search", "has_geometry", "bbox", "fecha_desde", "fecha_hasta"}
+)
+
+
+def _to_float(value: Any) -> float:
+    """float() tolerante; NaN para vacíos/falsy o no convertibles."""
+    if not value:
+        return float("nan")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _props(record: Dict[str, Any]) -> Dict[str, Any]:
+    props = record.get("properties")
+    return props if isinstance(props, dict) else {}
+
+
+def _intervenciones(record: Dict[str, Any], props: Dict[str, Any]) -> List[Dict[str, Any]]:
+    intervenciones = record.get("intervenciones") or props.get("intervenciones", [])
+    if not isinstance(intervenciones, list):
+        return []
+    return [i for i in intervenciones if isinstance(i, dict)]
+
+
+class ColumnarIndex:
+    """Representación columnar e índices invertidos de una lista de registros."""
+
+    def __init__(self, records: List[Dict[str, Any]]):
+        self.records = records
+        self.size = len(records)
+
+        # campo -> {valor: código}; campo -> [posting list por código]
+        self.vocabulary: Dict[str, Dict[Any, int]] = {f: {} for f in CATEGORICAL_FIELDS}
+        postings: Dict[str, List[List[int]]] = {f: [] for f in CATEGORICAL_FIELDS}
+
+        numeric_top = {f: np.full(self.size, np.nan) for f in NUMERIC_FIELDS}
+        numeric_props = {f: np.full(self.size, np.nan) for f in NUMERIC_FIELDS}
+        self.lat = np.full(self.size, np.nan)
+        self.lng = np.full(self.size, np.nan)
+        self.has_geometry = np.zeros(self.size, dtype=bool)
+        self.search_text: List[str] = [""] * self.size
+        self.first_date: List[Optional[str]] = [None] * self.size
+
+        for pos, record in enumerate(records):
+            props = _props(record)
+            intervenciones = _intervenciones(record, props)
+
+            for name, fields in CATEGORICAL_FIELDS.items():
+                values = set()
+                for field in fields:
+                    for source in (record, props):
+                        value = source.get(field)
+                        if value is not None:
+                            values.add(value)
+                if name in NESTED_FIELDS:
+                    for interv in intervenciones:
+                        value = interv.get(name)
+                        if value is not None:
+                            values.add(value)
+                vocab = self.vocabulary[name]
+                for value in values:
+                    try:
+                        code = vocab.get(value)
+                    except TypeError:  # valores no hashables (listas, dicts)
+                        continue
+                    if code is None:
+                        code = vocab[value] = len(vocab)
+                        postings[name].append([])
+                    postings[name][code].append(pos)
+
+            for field in NUMERIC_FIELDS:
+                numeric_top[field][pos] = _to_float(record.get(field))
+                numeric_props[field][pos] = _to_float(props.get(field))
+
+            self._index_coordinates(pos, record, props)
+            self.has_geometry[pos] = any(
+                record.get(field) is not None for field in GEOMETRY_FIELDS
+            )
+
+            texts = []
+            for source in (record, props):
+                for field in SEARCHABLE_FIELDS:
+                    value = source.get(field)
+                    if value:
+                        texts.append(str(value).lower())
+            self.search_text[pos] = "\x00".join(texts)
+
+            for field in DATE_FIELDS:
+                value = record.get(field) or props.get(field)
+                if value:
+                    self.first_date[pos] = str(value)
+                    break
+
+        self.postings: Dict[str, List["np.ndarray"]] = {
+            name: [np.asarray(p, dtype=np.int32) for p in lists]
+            for name, lists in postings.items()
+        }
+        # Un registro cumple el mínimo si lo cumple en raíz o en properties
+        self.numeric = {
+            f: np.fmax(numeric_top[f], numeric_props[f]) for f in NUMERIC_FIELDS
+        }
+
+    def _index_coordinates(self, pos: int, record: Dict[str, Any], props: Dict[str, Any]) -> None:
+        lat = record.get("lat") or record.get("latitude") or props.get("lat")
+        lng = record.get("lng") or record.get("longitude") or props.get("lng")
+        if not lat or not lng:
+            coords = record.get("coordinates") or record.get("coordenadas")
+            if coords and isinstance(coords, list) and len(coords) >= 2:
+                lng, lat = coords[0], coords[1]
+        try:
+            if lat is not None and lng is not None:
+                self.lat[pos] = float(lat)
+                self.lng[pos] = float(lng)
+        except (TypeError, ValueError):
+            pass
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    def _posting_mask(self, name: str, values: Iterable[Any]) -> "np.ndarray":
+        mask = np.zeros(self.size, dtype=bool)
+        vocab = self.vocabulary[name]
+        for value in values:
+            try:
+                code = vocab.get(value)
+            except TypeError:
+                continue
+            if code is not None:
+                mask[self.postings[name][code]] = True
+        return mask
+
+    def mask(self, filters: Dict[str, Any]) -> "np.ndarray":
+        """Máscara booleana de los registros que cumplen todos los filtros."""
+        result = np.ones(self.size, dtype=bool)
+
+        for name in CATEGORICAL_FIELDS:
+            value = filters.get(name)
+            if not value:
+                continue
+            values = value if name == "upid" and isinstance(value, list) else [value]
+            result &= self._posting_mask(name, values)
+
+        for field in NUMERIC_FIELDS:
+            if filters.get(field):
+                try:
+                    minimum = float(filters[field])
+                except (TypeError, ValueError):
+                    continue
+                with np.errstate(invalid="ignore"):
+                    result &= self.numeric[field] >= minimum
+
+        if filters.get("search"):
+            term = str(filters["search"]).lower()
+            result &= np.fromiter(
+                (term in text for text in self.search_text), dtype=bool, count=self.size
+            )
+
+        if "has_geometry" in filters:
+            if bool(filters["has_geometry"]):
+                result &= self.has_geometry
+            else:
+                result &= ~self.has_geometry
+
+        bbox = filters.get("bbox")
+        if bbox and len(bbox) == 4:
+            try:
+                min_lng, min_lat, max_lng, max_lat = (float(v) for v in bbox)
+            except (TypeError, ValueError):
+                # bbox mal formado: se ignora el filtro, no se corta la consulta
+                bbox = None
+            if bbox is not None:
+                with np.errstate(invalid="ignore"):
+                    result &= (
+                        (self.lat >= min_lat)
+                        & (self.lat <= max_lat)
+                        & (self.lng >= min_lng)
+                        & (self.lng <= max_lng)
+                    )
+
+        for key, op in (("fecha_desde", "desde"), ("fecha_hasta", "hasta")):
+            if filters.get(key):
+                limite = str(filters[key])
+                result &= np.fromiter(
+                    (
+                        d is None or (d >= limite if op == "desde" else d <= limite)
+                        for d in self.first_date
+                    ),
+                    dtype=bool,
+                    count=self.size,
+                )
+
+        return result
+
+    def select(self, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Registros (en el orden original) que cumplen todos los filtros."""
+        positions = np.flatnonzero(self.mask(filters))
+        records = self.records
+        return [records[i] for i in positions]
+
+
+# ---------------------------------------------------------------------------
+# Cache de índices por identidad de lista
+# ---------------------------------------------------------------------------
+
+_INDEX_CACHE_MAX = 8
+_index_cache: "OrderedDict[int, ColumnarIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_index(records: List[Dict[str, Any]]) -> ColumnarIndex:
+    """Índice para ``records``; reutiliza el existente si la lista es la misma.
+
+    El cache mantiene una referencia a la lista indexada, por lo que su ``id``
+    no puede reciclarse mientras la entrada viva. Las listas indexadas no deben
+    mutarse después de construir el índice.
+    """
+    key = id(records)
+    with _index_lock:
+        index = _index_cache.get(key)
+        if index is not None and index.records is records and index.size == len(records):
+            _index_cache.move_to_end(key)
+            return index
+
+    index = ColumnarIndex(records)
+    with _index_lock:
+        _index_cache[key] = index
+        while len(_index_cache) > _INDEX_CACHE_MAX:
+            _index_cache.popitem(last=False)
+    return index
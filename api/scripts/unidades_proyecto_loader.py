@@ -6,7 +6,7 @@ Permite importar masivamente unidades de proyecto desde archivos GeoJSON
 import json
 import uuid
 from typing import Dict, Any, List, Optional
-from datetime import datetime
+from datetime import datetime, timezone
 from database.firebase_config import get_firestore_client
 from api.models.unidades_proyecto_models import (
     UnidadProyectoFirestore,
@@ -261,7 +261,7 @@ def process_geojson_feature(
             'geometry_type': geometry_info['type'],
             'has_geometry': geometry_info['has_geometry'],
             'has_valid_geometry': geometry_info['is_valid'],
-            'updated_at': datetime.utcnow().isoformat(),
+            'updated_at': datetime.now(timezone.utc),
             'loaded_at': datetime.utcnow().isoformat(),
         }
         
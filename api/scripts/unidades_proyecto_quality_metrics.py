@@ -1,23 +1,49 @@
-"""Calidad de datos de Unidades de Proyecto con snapshots persistidos y detalle paginado."""
+"""Calidad de datos de Unidades de Proyecto con snapshots persistidos y detalle paginado.
 
+Los reportes son incrementales: cada registro guarda el hash del documento
+fuente y solo se reevalúan los documentos nuevos o modificados desde el último
+reporte. El detalle se persiste como un blob columnar comprimido con las
+diferencias respecto del reporte anterior (subcolección ``blobs``); los
+reportes del formato anterior (un documento por registro e issue) se siguen
+leyendo tal cual.
+"""
+
+from collections import OrderedDict
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
+import hashlib
+import json
+import logging
+import threading
 import uuid
+import zlib
 from typing import Any, Dict, List, Optional, Tuple
 
+from api.core.config import int_from_env
+from api.core.serialization import to_jsonable
+from api.scripts.quality_snapshot_index import QualitySnapshotIndex, get_quality_index, issue_filters, record_filters
 from api.scripts.unidades_proyecto import _convert_to_float
+from api.scripts.unidades_proyecto_snapshot import get_intervenciones_snapshot, get_unidades_snapshot
 from database.firebase_config import get_firestore_client
-from auth_system.centro_scoping import same_centro
+from database.firestore_repository import run_blocking
+
+logger = logging.getLogger(__name__)
 
 
 QUALITY_REPORTS_COLLECTION = "unidades_proyecto_quality_reports"
 QUALITY_LATEST_COLLECTION = "unidades_proyecto_quality_latest"
 QUALITY_RECORDS_SUBCOLLECTION = "records"
 QUALITY_ISSUES_SUBCOLLECTION = "issues"
-
-# Colecciones espejadas para consulta directa sin navegar subcolecciones
-QUALITY_UNIDADES_RECORDS_COLLECTION = "unidades_proyecto_quality_unidades_records"
-QUALITY_INTERV_RECORDS_COLLECTION = "unidades_proyecto_quality_intervenciones_records"
+# Blob columnar comprimido (zlib) con los registros que cambiaron en cada reporte
+QUALITY_BLOBS_SUBCOLLECTION = "blobs"
+QUALITY_STORAGE_FORMAT = "columnar-delta-v1"
+# Margen bajo el límite de 1 MiB por documento de Firestore
+QUALITY_BLOB_CHUNK_BYTES = 900_000
+# Cada cuántos reportes se guarda un snapshot completo (acota la cadena de diferencias)
+QUALITY_FULL_SNAPSHOT_EVERY = int_from_env("QUALITY_FULL_SNAPSHOT_EVERY", 20)
+QUALITY_MATERIALIZED_CACHE_SIZE = int_from_env("QUALITY_MATERIALIZED_CACHE_SIZE", 4)
+
+# Issues planos de reportes anteriores al formato columnar (solo lectura)
 QUALITY_ISSUES_COLLECTION = "unidades_proyecto_quality_issues"
 
 SEVERITY_DESCRIPTIONS = {
@@ -56,6 +82,14 @@ CORE_REQUIRED_INTERV_FIELDS = [
 
 FOCUS_FIELDS = ["presupuesto_base", "fecha_inicio", "fecha_fin", "geometry"]
 
+# Issues que dependen de otros documentos; se recalculan en cada reporte
+RELATIONAL_REASONS = {"duplicate_upid", "orphan_upid", "duplicate_intervencion_id"}
+
+SOURCE_COLLECTIONS = {
+    "unidad": "unidades_proyecto",
+    "intervencion": "intervenciones_unidades_proyecto",
+}
+
 
 def _normalize_str(value: Any) -> Optional[str]:
     if value is None:
@@ -365,11 +399,9 @@ def _report_summary_payload(report_id: str, generated_at: str, nombre_centro_ges
             "records_subcollection": QUALITY_RECORDS_SUBCOLLECTION,
             "issues_subcollection": QUALITY_ISSUES_SUBCOLLECTION,
             "latest_collection": QUALITY_LATEST_COLLECTION,
-            "records_by_type": {
-                "unidades": QUALITY_UNIDADES_RECORDS_COLLECTION,
-                "intervenciones": QUALITY_INTERV_RECORDS_COLLECTION,
-            },
-            "issues_flat_collection": QUALITY_ISSUES_COLLECTION,
+            # Registros e issues de cada reporte: blobs columnares (diferencias contra el anterior)
+            "blobs_subcollection": QUALITY_BLOBS_SUBCOLLECTION,
+            "storage_format": QUALITY_STORAGE_FORMAT,
         },
     }
 
@@ -397,122 +429,69 @@ def _new_center_group_entry() -> Dict[str, Any]:
     }
 
 
-def _persist_quality_snapshot(db, report_id: str, payload: Dict[str, Any], records: List[Dict[str, Any]]) -> None:
-    report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(report_id)
-    report_ref.set(payload)
-
-    db.collection(QUALITY_LATEST_COLLECTION).document("latest").set(
-        {
-            "report_id": report_id,
-            "generated_at": payload.get("generated_at"),
-            "filtro": payload.get("filtro", {}),
-        }
-    )
-
-    batch = db.batch()
-    writes = 0
-    issue_counter = 0
-
-    def _commit_batch_if_needed() -> None:
-        nonlocal batch, writes
-        if writes >= 400:
-            batch.commit()
-            batch = db.batch()
-            writes = 0
-
-    for item in records:
-        record_uid = item["record_uid"]
-        record_type = item.get("record_type")
-
-        # Registro dentro del snapshot
-        doc_ref = report_ref.collection(QUALITY_RECORDS_SUBCOLLECTION).document(record_uid)
-        batch.set(doc_ref, item)
-        writes += 1
-
-        # Registro espejo por tipo para consultas directas
-        flat_payload = {
-            **item,
-            "report_id": report_id,
-        }
-        if record_type == "unidad":
-            unit_ref = db.collection(QUALITY_UNIDADES_RECORDS_COLLECTION).document(f"{report_id}__{record_uid}")
-            batch.set(unit_ref, flat_payload)
-            writes += 1
-        elif record_type == "intervencion":
-            interv_ref = db.collection(QUALITY_INTERV_RECORDS_COLLECTION).document(f"{report_id}__{record_uid}")
-            batch.set(interv_ref, flat_payload)
-            writes += 1
-
-        # Persistir cada issue como documento individual
-        for issue in item.get("issues", []) or []:
-            issue_counter += 1
-            issue_id = f"{record_uid}__{issue_counter}"
-            issue_payload = {
-                "report_id": report_id,
-                "record_uid": record_uid,
-                "record_type": record_type,
-                "source_collection": item.get("source_collection"),
-                "source_doc_id": item.get("source_doc_id"),
-                "nombre_centro_gestor": item.get("nombre_centro_gestor"),
-                "upid": item.get("upid"),
-                "intervencion_id": item.get("intervencion_id"),
-                "generated_at": item.get("generated_at"),
-                "field": issue.get("field"),
-                "severity": issue.get("severity"),
-                "severity_label": issue.get("severity_label"),
-                "reason": issue.get("reason"),
-                "issue": issue,
-            }
+def _content_hash(data: Dict[str, Any]) -> str:
+    # Forma canónica (GeoPoint → lat/lng, DocumentReference → path): su repr
+    # incluye la dirección en memoria y cambiaría el hash en cada lectura
+    raw = json.dumps(to_jsonable(data), sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
 
-            # Dentro del snapshot
-            issue_ref = report_ref.collection(QUALITY_ISSUES_SUBCOLLECTION).document(issue_id)
-            batch.set(issue_ref, issue_payload)
-            writes += 1
 
-            # Colección plana global
-            flat_issue_ref = db.collection(QUALITY_ISSUES_COLLECTION).document(f"{report_id}__{issue_id}")
-            batch.set(flat_issue_ref, issue_payload)
-            writes += 1
+def _evaluate_document(data: Dict[str, Any], record_type: str) -> Dict[str, Any]:
+    """Evaluación que depende solo del documento (reutilizable mientras su hash no cambie)."""
+    required_fields = CORE_REQUIRED_UNIDAD_FIELDS if record_type == "unidad" else CORE_REQUIRED_INTERV_FIELDS
+    required_issues = _evaluate_required_fields(data, required_fields, record_type)
+    focus_assessment, focus_issues = _evaluate_focus_fields(data, record_type)
+    return {
+        "focus_fields": focus_assessment,
+        "issues": required_issues + focus_issues,
+    }
 
-        _commit_batch_if_needed()
 
-    if writes > 0:
-        batch.commit()
+def _evaluation_from_record(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Recupera la evaluación propia del documento desde un registro ya calculado."""
+    return {
+        "focus_fields": record.get("focus_fields", {}),
+        "issues": [issue for issue in record.get("issues") or [] if issue.get("reason") not in RELATIONAL_REASONS],
+    }
 
 
-async def generate_unidades_proyecto_quality_report(
-    nombre_centro_gestor: Optional[str] = None,
-    persist: bool = True,
+def _build_record(
+    record_type: str,
+    doc_id: str,
+    content_hash: str,
+    upid: Optional[str],
+    intervencion_id: Optional[str],
+    center: str,
+    center_source: Optional[str],
+    evaluation: Dict[str, Any],
+    relational_issues: List[Dict[str, Any]],
 ) -> Dict[str, Any]:
-    """Genera snapshot completo de calidad y guarda detalle por registro para lectura paginada."""
-    db = _get_db()
-    center_filter = _normalize_str(nombre_centro_gestor)
-
-    generated_at = _now_colombia_iso()
-    report_id = f"quality-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
-
-    unidades_docs = list(db.collection("unidades_proyecto").stream())
-    unidades_by_upid: Dict[str, int] = {}
-    upid_to_center: Dict[str, str] = {}
-
-    for doc in unidades_docs:
-        data = doc.to_dict() or {}
-        upid = _normalize_upid(_get_field_value(data, "upid"))
-        center, _ = _extract_nombre_centro_gestor(data)
-        if upid:
-            unidades_by_upid[upid] = unidades_by_upid.get(upid, 0) + 1
-            if center:
-                upid_to_center[upid] = center
+    issues = evaluation["issues"] + relational_issues
+    severity = _severity_from_issues(issues)
+    return {
+        "record_uid": f"{record_type}-{doc_id}",
+        "record_type": record_type,
+        "source_collection": SOURCE_COLLECTIONS[record_type],
+        "source_doc_id": doc_id,
+        "content_hash": content_hash,
+        "upid": upid,
+        "intervencion_id": intervencion_id,
+        "nombre_centro_gestor": center,
+        "nombre_centro_gestor_source": center_source or "not_found",
+        "focus_fields": evaluation["focus_fields"],
+        "issues": issues,
+        "issues_count": len(issues),
+        "has_issues": bool(issues),
+        "max_severity": severity,
+        "group_keys": {
+            "centro_gestor": center,
+            "record_type": record_type,
+        },
+    }
 
-    interv_docs = list(db.collection("intervenciones_unidades_proyecto").stream())
-    intervencion_id_counts: Dict[str, int] = {}
-    for doc in interv_docs:
-        data = doc.to_dict() or {}
-        intervencion_id = _normalize_str(_get_field_value(data, "intervencion_id")) or doc.id
-        intervencion_id_counts[intervencion_id] = intervencion_id_counts.get(intervencion_id, 0) + 1
 
-    records: List[Dict[str, Any]] = []
-    summary = {
+def _new_summary() -> Dict[str, Any]:
+    return {
         "total_records": 0,
         "records_with_issues": 0,
         "records_without_issues": 0,
@@ -536,187 +515,359 @@ async def generate_unidades_proyecto_quality_report(
         "grouped_by_centro_gestor": {},
     }
 
-    record_index = 0
 
-    for doc in unidades_docs:
-        data = doc.to_dict() or {}
-        upid = _normalize_upid(_get_field_value(data, "upid"))
-        center, center_source = _extract_nombre_centro_gestor(data)
-        center = center or "Sin centro gestor"
-        if not _matches_center_filter(center, center_filter):
-            continue
+def _accumulate_record(summary: Dict[str, Any], record: Dict[str, Any]) -> None:
+    record_type = record["record_type"]
+    section = summary["unidades"] if record_type == "unidad" else summary["intervenciones"]
+    issues = record.get("issues") or []
+    severity = record.get("max_severity")
+    has_issues = bool(record.get("has_issues"))
 
-        required_issues = _evaluate_required_fields(data, CORE_REQUIRED_UNIDAD_FIELDS, "unidad")
-        focus_assessment, focus_issues = _evaluate_focus_fields(data, "unidad")
-        issues = required_issues + focus_issues
+    summary["total_records"] += 1
+    section["total"] += 1
+    if has_issues:
+        summary["records_with_issues"] += 1
+        section["with_issues"] += 1
+        if severity:
+            summary["by_severity"][severity] += 1
+    else:
+        summary["records_without_issues"] += 1
+
+    section["missing_required_total"] += len([x for x in issues if x["reason"] == "missing_required"])
+    if record_type == "intervencion":
+        if any(x["reason"] == "orphan_upid" for x in issues):
+            section["orphan_upid"] += 1
+        if any(x["reason"] == "duplicate_intervencion_id" for x in issues):
+            section["duplicate_intervencion_id"] += 1
+
+    grouped = summary["grouped_by_centro_gestor"].setdefault(
+        record["nombre_centro_gestor"],
+        _new_center_group_entry(),
+    )
+    grouped["total_records"] += 1
+    grouped["unidades" if record_type == "unidad" else "intervenciones"] += 1
+    if has_issues:
+        grouped["with_issues"] += 1
+    if severity:
+        grouped["severity"][severity] += 1
+
+    focus_assessment = record.get("focus_fields") or {}
+    for field in FOCUS_FIELDS:
+        entry = focus_assessment.get(field, {})
+        if not entry.get("exists", False):
+            section["by_field"][field]["missing"] += 1
+            section["missing_focus_total"] += 1
+            grouped["focus_fields"][record_type][field]["missing"] += 1
+        elif not entry.get("is_valid", False):
+            section["by_field"][field]["invalid"] += 1
+            grouped["focus_fields"][record_type][field]["invalid"] += 1
+
+
+# ---------------------------------------------------------------------------
+# Almacenamiento columnar por diferencias
+# ---------------------------------------------------------------------------
+
+
+def _encode_columnar(records: List[Dict[str, Any]], removed: List[str]) -> bytes:
+    columns = sorted({key for record in records for key in record})
+    payload = {
+        "columns": {column: [record.get(column) for record in records] for column in columns},
+        "count": len(records),
+        "removed": removed,
+    }
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=str)
+    return zlib.compress(raw.encode("utf-8"), 6)
 
-        if upid and unidades_by_upid.get(upid, 0) > 1:
-            issues.append(_build_issue("upid", "S1", "duplicate_upid", "unidad"))
 
-        severity = _severity_from_issues(issues)
-        has_issues = bool(issues)
+def _decode_columnar(blob: bytes) -> Tuple[List[Dict[str, Any]], List[str]]:
+    payload = json.loads(zlib.decompress(blob).decode("utf-8"))
+    columns = payload.get("columns", {})
+    records = [
+        {column: values[i] for column, values in columns.items()}
+        for i in range(payload.get("count", 0))
+    ]
+    return records, payload.get("removed", [])
 
-        summary["total_records"] += 1
-        summary["unidades"]["total"] += 1
-        if has_issues:
-            summary["records_with_issues"] += 1
-            summary["unidades"]["with_issues"] += 1
-            if severity:
-                summary["by_severity"][severity] += 1
-        else:
-            summary["records_without_issues"] += 1
 
-        summary["unidades"]["missing_required_total"] += len([x for x in required_issues if x["reason"] == "missing_required"])
+def _storage_of(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Metadatos de almacenamiento columnar; None para reportes del formato anterior."""
+    storage = payload.get("storage") or {}
+    return storage if storage.get("format") == QUALITY_STORAGE_FORMAT else None
 
-        for field in FOCUS_FIELDS:
-            entry = focus_assessment.get(field, {})
-            if not entry.get("exists", False):
-                summary["unidades"]["by_field"][field]["missing"] += 1
-                summary["unidades"]["missing_focus_total"] += 1
-            elif not entry.get("is_valid", False):
-                summary["unidades"]["by_field"][field]["invalid"] += 1
 
-        grouped = summary["grouped_by_centro_gestor"].setdefault(
-            center,
-            _new_center_group_entry(),
-        )
-        grouped["total_records"] += 1
-        grouped["unidades"] += 1
-        if has_issues:
-            grouped["with_issues"] += 1
-        if severity:
-            grouped["severity"][severity] += 1
+def _state_doc_id(center_filter: Optional[str]) -> str:
+    if not center_filter:
+        return "state__all"
+    return f"state__{hashlib.sha1(center_filter.lower().encode('utf-8')).hexdigest()[:16]}"
 
-        for field in FOCUS_FIELDS:
-            entry = focus_assessment.get(field, {})
-            if not entry.get("exists", False):
-                grouped["focus_fields"]["unidad"][field]["missing"] += 1
-            elif not entry.get("is_valid", False):
-                grouped["focus_fields"]["unidad"][field]["invalid"] += 1
 
-        records.append(
-            {
-                "record_uid": f"unidad-{doc.id}",
-                "record_index": record_index,
-                "report_id": report_id,
-                "generated_at": generated_at,
-                "record_type": "unidad",
-                "source_collection": "unidades_proyecto",
-                "source_doc_id": doc.id,
-                "upid": upid,
-                "intervencion_id": None,
-                "nombre_centro_gestor": center,
-                "nombre_centro_gestor_source": center_source or "not_found",
-                "focus_fields": focus_assessment,
-                "issues": issues,
-                "issues_count": len(issues),
-                "has_issues": has_issues,
-                "max_severity": severity,
-                "group_keys": {
-                    "centro_gestor": center,
-                    "record_type": "unidad",
-                },
-            }
+def _read_blob(db, report_id: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(report_id)
+    chunks = sorted(report_ref.collection(QUALITY_BLOBS_SUBCOLLECTION).stream(), key=lambda doc: doc.id)
+    return _decode_columnar(b"".join(bytes((chunk.to_dict() or {}).get("data") or b"") for chunk in chunks))
+
+
+_materialized: "OrderedDict[str, Dict[str, Dict[str, Any]]]" = OrderedDict()
+_materialized_lock = threading.Lock()
+
+
+def _materialize_report_records(
+    db, report_id: str, payload: Optional[Dict[str, Any]] = None
+) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    Registros de un reporte columnar (``record_uid`` -> registro), aplicando la
+    cadena de diferencias desde el último snapshot completo. Bloqueante.
+
+    Returns:
+        None si el reporte es del formato anterior (subcolecciones por registro).
+        El resultado es compartido: solo lectura.
+    """
+    with _materialized_lock:
+        cached = _materialized.get(report_id)
+        if cached is not None:
+            _materialized.move_to_end(report_id)
+            return cached
+
+    chain: List[str] = []
+    records: Dict[str, Dict[str, Any]] = {}
+    current_id: Optional[str] = report_id
+    while current_id:
+        with _materialized_lock:
+            base = _materialized.get(current_id)
+        if base is not None:
+            records = dict(base)
+            break
+        if payload is None:
+            doc = db.collection(QUALITY_REPORTS_COLLECTION).document(current_id).get()
+            payload = (doc.to_dict() or {}) if doc.exists else {}
+        storage = _storage_of(payload)
+        if storage is None:
+            if not chain:
+                return None
+            raise RuntimeError(f"Cadena de snapshots de calidad incompleta: falta {current_id}")
+        chain.append(current_id)
+        current_id, payload = storage.get("base_report_id"), None
+
+    for chain_id in reversed(chain):
+        changed, removed = _read_blob(db, chain_id)
+        for record_uid in removed:
+            records.pop(record_uid, None)
+        for record in changed:
+            records[record["record_uid"]] = record
+
+    with _materialized_lock:
+        _materialized[report_id] = records
+        while len(_materialized) > max(1, QUALITY_MATERIALIZED_CACHE_SIZE):
+            _materialized.popitem(last=False)
+    return records
+
+
+def _ordered_report_records(
+    records: Dict[str, Dict[str, Any]], report_id: str, generated_at: Optional[str]
+) -> List[Dict[str, Any]]:
+    """Registros en el orden del reporte (unidades y luego intervenciones, por ID) con ``record_index``."""
+    ordered = sorted(records.values(), key=lambda r: (r.get("record_type") != "unidad", str(r.get("source_doc_id"))))
+    return [
+        {**record, "record_index": index, "report_id": report_id, "generated_at": generated_at}
+        for index, record in enumerate(ordered)
+    ]
+
+
+def _issue_payload(report_id: str, record: Dict[str, Any], issue: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "report_id": report_id,
+        "record_uid": record.get("record_uid"),
+        "record_type": record.get("record_type"),
+        "source_collection": record.get("source_collection"),
+        "source_doc_id": record.get("source_doc_id"),
+        "nombre_centro_gestor": record.get("nombre_centro_gestor"),
+        "upid": record.get("upid"),
+        "intervencion_id": record.get("intervencion_id"),
+        "generated_at": record.get("generated_at"),
+        "field": issue.get("field"),
+        "severity": issue.get("severity"),
+        "severity_label": issue.get("severity_label"),
+        "reason": issue.get("reason"),
+        "issue": issue,
+    }
+
+
+def _load_base_state(db, center_filter: Optional[str]) -> Tuple[Optional[str], int, Dict[str, Dict[str, Any]]]:
+    """Último reporte columnar con el mismo filtro: ``(report_id, profundidad, registros)``."""
+    state_doc = db.collection(QUALITY_LATEST_COLLECTION).document(_state_doc_id(center_filter)).get()
+    if not state_doc.exists:
+        return None, 0, {}
+    state = state_doc.to_dict() or {}
+    base_report_id = state.get("report_id")
+    try:
+        records = _materialize_report_records(db, base_report_id) if base_report_id else None
+    except Exception as e:
+        logger.warning(f"No se pudo cargar el snapshot de calidad base {base_report_id}: {e}")
+        records = None
+    if records is None:
+        return None, 0, {}
+    return base_report_id, int(state.get("chain_depth", 0) or 0), records
+
+
+def _persist_quality_snapshot(
+    db,
+    report_id: str,
+    payload: Dict[str, Any],
+    records: List[Dict[str, Any]],
+    base_report_id: Optional[str],
+    base_depth: int,
+    base_records: Dict[str, Dict[str, Any]],
+) -> Dict[str, Any]:
+    """
+    Guarda el reporte como blob columnar comprimido con solo los registros que
+    cambiaron respecto del reporte base (o completo cada
+    ``QUALITY_FULL_SNAPSHOT_EVERY`` reportes o si cambió más de la mitad).
+    """
+    current_uids = {record["record_uid"] for record in records}
+    changed = [record for record in records if base_records.get(record["record_uid"]) != record]
+    removed = sorted(uid for uid in base_records if uid not in current_uids)
+
+    full_snapshot = (
+        base_report_id is None
+        or base_depth + 1 >= QUALITY_FULL_SNAPSHOT_EVERY
+        or (len(changed) + len(removed)) * 2 > max(len(records), 1)
+    )
+    if full_snapshot:
+        changed, removed, base_report_id, depth = records, [], None, 0
+    else:
+        depth = base_depth + 1
+
+    blob = _encode_columnar(changed, removed)
+    chunks = [blob[i:i + QUALITY_BLOB_CHUNK_BYTES] for i in range(0, len(blob), QUALITY_BLOB_CHUNK_BYTES)] or [b""]
+    storage = {
+        "format": QUALITY_STORAGE_FORMAT,
+        "base_report_id": base_report_id,
+        "chain_depth": depth,
+        "records_total": len(records),
+        "records_stored": len(changed),
+        "records_removed": len(removed),
+        "chunks": len(chunks),
+        "bytes": len(blob),
+    }
+
+    report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(report_id)
+    batch = db.batch()
+    for index, chunk in enumerate(chunks):
+        batch.set(report_ref.collection(QUALITY_BLOBS_SUBCOLLECTION).document(f"{index:04d}"), {"data": chunk})
+    batch.commit()
+
+    # El documento del reporte va después de los blobs: un lector nunca ve un reporte sin datos
+    report_ref.set({**payload, "storage": storage})
+    latest = {
+        "report_id": report_id,
+        "generated_at": payload.get("generated_at"),
+        "filtro": payload.get("filtro", {}),
+    }
+    db.collection(QUALITY_LATEST_COLLECTION).document("latest").set(latest)
+    db.collection(QUALITY_LATEST_COLLECTION).document(_state_doc_id(payload["filtro"]["nombre_centro_gestor"])).set(
+        {**latest, "chain_depth": depth}
+    )
+
+    with _materialized_lock:
+        _materialized[report_id] = {record["record_uid"]: record for record in records}
+        while len(_materialized) > max(1, QUALITY_MATERIALIZED_CACHE_SIZE):
+            _materialized.popitem(last=False)
+    return storage
+
+
+async def generate_unidades_proyecto_quality_report(
+    nombre_centro_gestor: Optional[str] = None,
+    persist: bool = True,
+    full: bool = False,
+) -> Dict[str, Any]:
+    """
+    Genera snapshot de calidad y guarda detalle por registro para lectura paginada.
+
+    Incremental: solo se reevalúan los documentos nuevos o cuyo hash de
+    contenido cambió desde el último reporte con el mismo filtro, y solo esos
+    registros se persisten. ``full=True`` reevalúa todo y guarda un snapshot completo.
+    """
+    db = _get_db()
+    center_filter = _normalize_str(nombre_centro_gestor)
+
+    generated_at = _now_colombia_iso()
+    report_id = f"quality-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    base_report_id, base_depth, base_records = None, 0, {}
+    if not full:
+        base_report_id, base_depth, base_records = await run_blocking(
+            QUALITY_REPORTS_COLLECTION, _load_base_state, db, center_filter
         )
-        record_index += 1
 
-    for doc in interv_docs:
-        data = doc.to_dict() or {}
+    # Documentos fuente desde el snapshot compartido (refresco incremental por updated_at)
+    unidades_snapshot = get_unidades_snapshot()
+    intervenciones_snapshot = get_intervenciones_snapshot()
+    unidades_snapshot.invalidate()
+    intervenciones_snapshot.invalidate()
+    unidades_items = await unidades_snapshot.aitems()
+    interv_items = await intervenciones_snapshot.aitems()
+
+    # Índices de conteo para unicidad e integridad referencial (una sola pasada)
+    unidades_by_upid: Dict[str, int] = {}
+    upid_to_center: Dict[str, str] = {}
+    intervencion_id_counts: Dict[str, int] = {}
+    entries: List[Tuple[str, str, Dict[str, Any], Optional[str], Optional[str], Optional[str], Optional[str]]] = []
+
+    for doc_id, data in unidades_items:
+        data = data or {}
         upid = _normalize_upid(_get_field_value(data, "upid"))
         center, center_source = _extract_nombre_centro_gestor(data)
-        if center is None and upid is not None:
-            center = upid_to_center.get(upid)
-            if center is not None:
-                center_source = "unidad_por_upid"
-        center = center or "Sin centro gestor"
-        if not _matches_center_filter(center, center_filter):
-            continue
-
-        required_issues = _evaluate_required_fields(data, CORE_REQUIRED_INTERV_FIELDS, "intervencion")
-        focus_assessment, focus_issues = _evaluate_focus_fields(data, "intervencion")
-        issues = required_issues + focus_issues
+        if upid:
+            unidades_by_upid[upid] = unidades_by_upid.get(upid, 0) + 1
+            if center:
+                upid_to_center[upid] = center
+        entries.append(("unidad", doc_id, data, upid, None, center, center_source))
 
-        intervencion_id = _normalize_str(_get_field_value(data, "intervencion_id")) or doc.id
+    for doc_id, data in interv_items:
+        data = data or {}
+        upid = _normalize_upid(_get_field_value(data, "upid"))
+        intervencion_id = _normalize_str(_get_field_value(data, "intervencion_id")) or doc_id
+        intervencion_id_counts[intervencion_id] = intervencion_id_counts.get(intervencion_id, 0) + 1
+        center, center_source = _extract_nombre_centro_gestor(data)
+        entries.append(("intervencion", doc_id, data, upid, intervencion_id, center, center_source))
 
-        if upid is None or upid not in unidades_by_upid:
-            issues.append(_build_issue("upid", "S1", "orphan_upid", "intervencion"))
+    records: List[Dict[str, Any]] = []
+    summary = _new_summary()
+    reevaluated = 0
 
-        if intervencion_id_counts.get(intervencion_id, 0) > 1:
-            issues.append(_build_issue("intervencion_id", "S1", "duplicate_intervencion_id", "intervencion"))
+    for record_type, doc_id, data, upid, intervencion_id, center, center_source in entries:
+        relational_issues: List[Dict[str, Any]] = []
+        if record_type == "unidad":
+            if upid and unidades_by_upid.get(upid, 0) > 1:
+                relational_issues.append(_build_issue("upid", "S1", "duplicate_upid", "unidad"))
+        else:
+            if center is None and upid is not None:
+                center = upid_to_center.get(upid)
+                if center is not None:
+                    center_source = "unidad_por_upid"
+            if upid is None or upid not in unidades_by_upid:
+                relational_issues.append(_build_issue("upid", "S1", "orphan_upid", "intervencion"))
+            if intervencion_id_counts.get(intervencion_id, 0) > 1:
+                relational_issues.append(_build_issue("intervencion_id", "S1", "duplicate_intervencion_id", "intervencion"))
 
-        severity = _severity_from_issues(issues)
-        has_issues = bool(issues)
+        center = center or "Sin centro gestor"
+        if not _matches_center_filter(center, center_filter):
+            continue
 
-        summary["total_records"] += 1
-        summary["intervenciones"]["total"] += 1
-        if has_issues:
-            summary["records_with_issues"] += 1
-            summary["intervenciones"]["with_issues"] += 1
-            if severity:
-                summary["by_severity"][severity] += 1
+        content_hash = _content_hash(data)
+        previous = base_records.get(f"{record_type}-{doc_id}")
+        if previous is not None and previous.get("content_hash") == content_hash:
+            evaluation = _evaluation_from_record(previous)
         else:
-            summary["records_without_issues"] += 1
-
-        summary["intervenciones"]["missing_required_total"] += len([x for x in required_issues if x["reason"] == "missing_required"])
-
-        orphan = any(x["reason"] == "orphan_upid" for x in issues)
-        duplicate_interv = any(x["reason"] == "duplicate_intervencion_id" for x in issues)
-        if orphan:
-            summary["intervenciones"]["orphan_upid"] += 1
-        if duplicate_interv:
-            summary["intervenciones"]["duplicate_intervencion_id"] += 1
-
-        for field in FOCUS_FIELDS:
-            entry = focus_assessment.get(field, {})
-            if not entry.get("exists", False):
-                summary["intervenciones"]["by_field"][field]["missing"] += 1
-                summary["intervenciones"]["missing_focus_total"] += 1
-            elif not entry.get("is_valid", False):
-                summary["intervenciones"]["by_field"][field]["invalid"] += 1
-
-        grouped = summary["grouped_by_centro_gestor"].setdefault(
-            center,
-            _new_center_group_entry(),
-        )
-        grouped["total_records"] += 1
-        grouped["intervenciones"] += 1
-        if has_issues:
-            grouped["with_issues"] += 1
-        if severity:
-            grouped["severity"][severity] += 1
+            # Ida y vuelta por JSON: el registro queda igual al que se lee del blob
+            evaluation = json.loads(json.dumps(_evaluate_document(data, record_type), default=str))
+            reevaluated += 1
 
-        for field in FOCUS_FIELDS:
-            entry = focus_assessment.get(field, {})
-            if not entry.get("exists", False):
-                grouped["focus_fields"]["intervencion"][field]["missing"] += 1
-            elif not entry.get("is_valid", False):
-                grouped["focus_fields"]["intervencion"][field]["invalid"] += 1
-
-        records.append(
-            {
-                "record_uid": f"intervencion-{doc.id}",
-                "record_index": record_index,
-                "report_id": report_id,
-                "generated_at": generated_at,
-                "record_type": "intervencion",
-                "source_collection": "intervenciones_unidades_proyecto",
-                "source_doc_id": doc.id,
-                "upid": upid,
-                "intervencion_id": intervencion_id,
-                "nombre_centro_gestor": center,
-                "nombre_centro_gestor_source": center_source or "not_found",
-                "focus_fields": focus_assessment,
-                "issues": issues,
-                "issues_count": len(issues),
-                "has_issues": has_issues,
-                "max_severity": severity,
-                "group_keys": {
-                    "centro_gestor": center,
-                    "record_type": "intervencion",
-                },
-            }
+        record = _build_record(
+            record_type, doc_id, content_hash, upid, intervencion_id, center, center_source, evaluation, relational_issues
         )
-        record_index += 1
+        _accumulate_record(summary, record)
+        records.append(record)
 
     dqs = _compute_weighted_dqs(
         total_records=summary["total_records"],
@@ -734,8 +885,24 @@ async def generate_unidades_proyecto_quality_report(
         dqs=dqs,
     )
 
+    storage = None
     if persist:
-        _persist_quality_snapshot(db, report_id, report_payload, records)
+        storage = await run_blocking(
+            QUALITY_REPORTS_COLLECTION,
+            _persist_quality_snapshot,
+            db,
+            report_id,
+            report_payload,
+            records,
+            base_report_id,
+            base_depth,
+            base_records,
+        )
+
+    logger.info(
+        f"Reporte de calidad {report_id}: {len(records)} registros, {reevaluated} reevaluados"
+        + (f", {storage['records_stored']} persistidos" if storage else "")
+    )
 
     return {
         "success": True,
@@ -745,9 +912,17 @@ async def generate_unidades_proyecto_quality_report(
         "summary": summary,
         "dqs": dqs,
         "rules": rules,
+        "incremental": {
+            "base_report_id": base_report_id,
+            "records_reevaluated": reevaluated,
+            "records_reused": len(records) - reevaluated,
+            "storage": storage,
+        },
         "preview": {
             "records_total": len(records),
-            "first_records": records[:5],
+            "first_records": _ordered_report_records(
+                {record["record_uid"]: record for record in records[:5]}, report_id, generated_at
+            ),
         },
         "collections": report_payload["collections"],
     }
@@ -912,86 +1087,86 @@ async def get_unidades_proyecto_quality_centros_paginated(
     }
 
 
-def _record_matches_filters(
-    record: Dict[str, Any],
-    record_type: Optional[str],
-    has_issues: Optional[bool],
-    nombre_centro_gestor: Optional[str],
-) -> bool:
-    if record_type and (record.get("record_type") or "").lower() != record_type.lower():
-        return False
-    if has_issues is not None and bool(record.get("has_issues")) != has_issues:
-        return False
-    if nombre_centro_gestor:
-        if not same_centro(record.get("nombre_centro_gestor"), nombre_centro_gestor):
-            return False
-    return True
+def _issue_sort_key(item: Dict[str, Any]) -> Tuple[int, str, str]:
+    return (
+        -SEVERITY_RANK.get(item.get("severity"), 0),
+        str(item.get("record_uid") or ""),
+        str(item.get("field") or ""),
+    )
 
 
-async def get_unidades_proyecto_quality_records_paginated(
-    report_id: Optional[str] = None,
-    page_size: int = 50,
-    page_token: Optional[int] = None,
-    record_type: Optional[str] = None,
-    has_issues: Optional[bool] = None,
-    nombre_centro_gestor: Optional[str] = None,
-) -> Dict[str, Any]:
-    """Retorna detalle uno a uno de registros evaluados con paginacion por cursor numerico."""
-    db = _get_db()
-    selected_report_id = report_id or _read_latest_report_id(db)
+def _load_report_index(db, report_id: str, payload: Dict[str, Any]) -> QualitySnapshotIndex:
+    """Índice local del reporte (se construye una vez por report_id). Bloqueante."""
 
+    def loader():
+        materialized = _materialize_report_records(db, report_id, payload)
+        if materialized is not None:
+            records = _ordered_report_records(materialized, report_id, payload.get("generated_at"))
+            issues = [_issue_payload(report_id, record, issue) for record in records for issue in record.get("issues") or []]
+        else:
+            report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(report_id)
+            records = sorted(
+                (doc.to_dict() or {} for doc in report_ref.collection(QUALITY_RECORDS_SUBCOLLECTION).stream()),
+                key=lambda row: int(row.get("record_index", -1)),
+            )
+            issues = [
+                doc.to_dict() or {}
+                for doc in db.collection(QUALITY_ISSUES_COLLECTION).where("report_id", "==", report_id).stream()
+            ]
+        issues.sort(key=_issue_sort_key)
+        return records, issues
+
+    return get_quality_index("unidades", report_id, loader)
+
+
+async def _report_index_or_error(db, report_id: Optional[str]) -> Tuple[Optional[str], Optional[QualitySnapshotIndex], Optional[Dict[str, Any]]]:
+    selected_report_id = report_id or _read_latest_report_id(db)
     if selected_report_id is None:
-        return {
+        return None, None, {
             "success": False,
             "error": "No existe snapshot de calidad. Ejecuta POST /unidades-proyecto/calidad-datos/analizar.",
         }
 
-    report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(selected_report_id)
-    report_doc = report_ref.get()
+    report_doc = db.collection(QUALITY_REPORTS_COLLECTION).document(selected_report_id).get()
     if not report_doc.exists:
-        return {
+        return selected_report_id, None, {
             "success": False,
             "error": f"No se encontro report_id: {selected_report_id}",
         }
 
-    sanitized_page_size = max(1, min(page_size, 200))
-    token = page_token if isinstance(page_token, int) else -1
-
-    results: List[Dict[str, Any]] = []
-    scanned = 0
-    has_more = False
-    last_scanned_index = token
-    guard = 0
-
-    while len(results) < sanitized_page_size and guard < 6:
-        guard += 1
-        chunk_size = min(max(sanitized_page_size * 4, 50), 500)
-        query = report_ref.collection(QUALITY_RECORDS_SUBCOLLECTION).where("record_index", ">", last_scanned_index).order_by("record_index").limit(chunk_size)
-        docs = list(query.stream())
-
-        if not docs:
-            has_more = False
-            break
+    index = await run_blocking(
+        QUALITY_REPORTS_COLLECTION, _load_report_index, db, selected_report_id, report_doc.to_dict() or {}
+    )
+    return selected_report_id, index, None
 
-        scanned += len(docs)
 
-        for doc in docs:
-            row = doc.to_dict() or {}
-            idx = int(row.get("record_index", -1))
-            if idx > last_scanned_index:
-                last_scanned_index = idx
-            if _record_matches_filters(row, record_type, has_issues, _normalize_str(nombre_centro_gestor)):
-                results.append(row)
-                if len(results) >= sanitized_page_size:
-                    break
+async def get_unidades_proyecto_quality_records_paginated(
+    report_id: Optional[str] = None,
+    page_size: int = 50,
+    page_token: Optional[int] = None,
+    record_type: Optional[str] = None,
+    has_issues: Optional[bool] = None,
+    nombre_centro_gestor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Retorna detalle uno a uno de registros evaluados con paginacion por cursor numerico."""
+    db = _get_db()
+    selected_report_id, index, error = await _report_index_or_error(db, report_id)
+    if error is not None:
+        return error
 
-        if len(docs) < chunk_size:
-            has_more = len(results) >= sanitized_page_size and last_scanned_index >= 0
-            break
+    sanitized_page_size = max(1, min(page_size, 200))
+    token = page_token if isinstance(page_token, int) else -1
+    where = record_filters(
+        record_type=record_type,
+        has_issues=has_issues,
+        centro=_normalize_str(nombre_centro_gestor),
+    )
 
-        has_more = True
+    def _read():
+        rows, cursor = index.seek("records", where, after=token, limit=sanitized_page_size)
+        return rows, cursor, index.count("records", where)
 
-    next_page_token = last_scanned_index if has_more else None
+    results, next_page_token, total = await run_blocking(QUALITY_REPORTS_COLLECTION, _read)
 
     return {
         "success": True,
@@ -999,8 +1174,9 @@ async def get_unidades_proyecto_quality_records_paginated(
         "page_size": sanitized_page_size,
         "page_token": token if token >= 0 else None,
         "next_page_token": next_page_token,
-        "has_more": bool(has_more),
-        "scanned_records": scanned,
+        "has_more": next_page_token is not None,
+        "scanned_records": len(results),
+        "total_records": total,
         "filters": {
             "record_type": record_type,
             "has_issues": has_issues,
@@ -1020,49 +1196,33 @@ async def get_unidades_proyecto_quality_issues_paginated(
     field: Optional[str] = None,
     nombre_centro_gestor: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Retorna issues individuales persistidos con paginacion por offset."""
-    db = _get_db()
-    selected_report_id = report_id or _read_latest_report_id(db)
-
-    if selected_report_id is None:
-        return {
-            "success": False,
-            "error": "No existe snapshot de calidad. Ejecuta POST /unidades-proyecto/calidad-datos/analizar.",
-        }
+    """
+    Retorna issues individuales persistidos, de mayor a menor severidad.
 
+    ``page_token`` es la posición del issue en el snapshot: sin filtros equivale
+    al desplazamiento; con filtros es un cursor estable.
+    """
     if severity is not None and severity not in {"S1", "S2", "S3", "S4"}:
         return {
             "success": False,
             "error": "severity debe ser S1, S2, S3 o S4",
         }
 
-    issues_docs = list(db.collection(QUALITY_ISSUES_COLLECTION).where("report_id", "==", selected_report_id).stream())
-    rows: List[Dict[str, Any]] = []
-    for doc in issues_docs:
-        row = doc.to_dict() or {}
-        if record_type and (row.get("record_type") or "").lower() != record_type.lower():
-            continue
-        if severity and row.get("severity") != severity:
-            continue
-        if field and (row.get("field") or "").lower() != field.lower():
-            continue
-        if nombre_centro_gestor:
-            if not same_centro(row.get("nombre_centro_gestor"), nombre_centro_gestor):
-                continue
-        rows.append(row)
-
-    rows.sort(
-        key=lambda item: (
-            -SEVERITY_RANK.get(item.get("severity"), 0),
-            str(item.get("record_uid") or ""),
-            str(item.get("field") or ""),
-        )
-    )
+    db = _get_db()
+    selected_report_id, index, error = await _report_index_or_error(db, report_id)
+    if error is not None:
+        return error
 
     size = max(1, min(page_size, 200))
     offset = max(0, page_token or 0)
-    paged = rows[offset: offset + size]
-    next_token = offset + size if offset + size < len(rows) else None
+    where = issue_filters(record_type=record_type, severity=severity, field=field, centro=nombre_centro_gestor)
+
+    def _read():
+        rows, cursor = index.seek("issues", where, after=offset - 1, limit=size)
+        return rows, cursor, index.count("issues", where)
+
+    paged, cursor, total = await run_blocking(QUALITY_REPORTS_COLLECTION, _read)
+    next_token = cursor + 1 if cursor is not None else None
 
     return {
         "success": True,
@@ -1074,7 +1234,7 @@ async def get_unidades_proyecto_quality_issues_paginated(
             "nombre_centro_gestor": nombre_centro_gestor,
         },
         "count": len(paged),
-        "total_issues": len(rows),
+        "total_issues": total,
         "page_size": size,
         "page_token": offset,
         "next_page_token": next_token,
@@ -1091,68 +1251,50 @@ async def get_unidades_proyecto_quality_missing_centros_paginated(
 ) -> Dict[str, Any]:
     """Lista candidatos de corrección donde nombre_centro_gestor no fue encontrado."""
     db = _get_db()
-    selected_report_id = report_id or _read_latest_report_id(db)
-
-    if selected_report_id is None:
-        return {
-            "success": False,
-            "error": "No existe snapshot de calidad. Ejecuta POST /unidades-proyecto/calidad-datos/analizar.",
-        }
-
-    report_ref = db.collection(QUALITY_REPORTS_COLLECTION).document(selected_report_id)
-    report_doc = report_ref.get()
-    if not report_doc.exists:
-        return {
-            "success": False,
-            "error": f"No se encontro report_id: {selected_report_id}",
-        }
-
-    docs = list(report_ref.collection(QUALITY_RECORDS_SUBCOLLECTION).stream())
-    rows: List[Dict[str, Any]] = []
-    for doc in docs:
-        row = doc.to_dict() or {}
-        if row.get("nombre_centro_gestor_source") != "not_found":
-            continue
-
-        if record_type and (row.get("record_type") or "").lower() != record_type.lower():
-            continue
-
-        rows.append(
-            {
-                "report_id": selected_report_id,
-                "record_uid": row.get("record_uid"),
-                "record_type": row.get("record_type"),
-                "source_collection": row.get("source_collection"),
-                "source_doc_id": row.get("source_doc_id"),
-                "upid": row.get("upid"),
-                "intervencion_id": row.get("intervencion_id"),
-                "nombre_centro_gestor": row.get("nombre_centro_gestor"),
-                "nombre_centro_gestor_source": row.get("nombre_centro_gestor_source"),
-                "issues_count": row.get("issues_count", 0),
-                "max_severity": row.get("max_severity"),
-                "focus_fields": row.get("focus_fields", {}),
-                "suggested_fix": "Agregar campo nombre_centro_gestor en documento fuente",
-            }
-        )
-
-    rows.sort(key=lambda item: (str(item.get("record_type") or ""), str(item.get("source_doc_id") or "")))
+    selected_report_id, index, error = await _report_index_or_error(db, report_id)
+    if error is not None:
+        return error
 
     size = max(1, min(page_size, 200))
     offset = max(0, page_token or 0)
-    paged = rows[offset: offset + size]
-    next_token = offset + size if offset + size < len(rows) else None
+    where = record_filters(record_type=record_type, centro_source="not_found")
+
+    def _read():
+        rows = index.select("records", where, order_by=("record_type", "source_doc_id"), offset=offset, limit=size)
+        by_type = {
+            kind: index.count("records", {**where, "record_type": kind})
+            for kind in ("unidad", "intervencion")
+            if not record_type or record_type.lower() == kind
+        }
+        return rows, index.count("records", where), by_type
 
-    by_type = {
-        "unidad": len([r for r in rows if r.get("record_type") == "unidad"]),
-        "intervencion": len([r for r in rows if r.get("record_type") == "intervencion"]),
-    }
+    rows, total, by_type = await run_blocking(QUALITY_REPORTS_COLLECTION, _read)
+    paged = [
+        {
+            "report_id": selected_report_id,
+            "record_uid": row.get("record_uid"),
+            "record_type": row.get("record_type"),
+            "source_collection": row.get("source_collection"),
+            "source_doc_id": row.get("source_doc_id"),
+            "upid": row.get("upid"),
+            "intervencion_id": row.get("intervencion_id"),
+            "nombre_centro_gestor": row.get("nombre_centro_gestor"),
+            "nombre_centro_gestor_source": row.get("nombre_centro_gestor_source"),
+            "issues_count": row.get("issues_count", 0),
+            "max_severity": row.get("max_severity"),
+            "focus_fields": row.get("focus_fields", {}),
+            "suggested_fix": "Agregar campo nombre_centro_gestor en documento fuente",
+        }
+        for row in rows
+    ]
+    next_token = offset + size if offset + size < total else None
 
     return {
         "success": True,
         "report_id": selected_report_id,
         "count": len(paged),
-        "total_candidates": len(rows),
-        "by_type": by_type,
+        "total_candidates": total,
+        "by_type": {"unidad": by_type.get("unidad", 0), "intervencion": by_type.get("intervencion", 0)},
         "filters": {
             "record_type": record_type,
             "source": "nombre_centro_gestor_source=not_found",
@@ -0,0 +1,348 @@
+"""
+Snapshot en memoria de las colecciones ``unidades_proyecto`` e
+``intervenciones_unidades_proyecto``.
+
+Los lectores (geometry, attributes, frentes activos, filtros, init-360,
+exportar, export-xlsx) comparten una única copia por proceso en lugar de
+hacer un ``stream()`` completo por request:
+
+- Carga completa en el primer acceso (o en el arranque vía ``warm_unidades_snapshots``).
+- Refresco incremental por marca de agua ``updated_at`` cada
+  ``UP_SNAPSHOT_REFRESH_SECONDS`` (solo lee los documentos modificados).
+  ``updated_at`` se escribe como ``datetime`` UTC (timestamp de Firestore) y la
+  marca de agua se compara como tal; un documento con el valor antiguo en
+  texto no entra en el delta y se recoge en la recarga completa.
+- Recarga completa cada ``UP_SNAPSHOT_FULL_RELOAD_SECONDS`` para reflejar
+  eliminaciones hechas por otros procesos.
+- Invalidación explícita desde los endpoints de mutación
+  (``_invalidate_unidades_cache`` en el router).
+
+Los documentos devueltos son compartidos entre requests: los lectores deben
+tratarlos como de solo lectura y copiar antes de mutar.
+
+Uso:
+    from api.scripts.unidades_proyecto_snapshot import get_unidades_snapshot
+    docs = await get_unidades_snapshot().adocuments()
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from api.core.config import bool_from_env, int_from_env
+from database.firebase_config import get_firestore_client
+from database.firestore_repository import run_blocking
+
+logger = logging.getLogger(__name__)
+
+UNIDADES_COLLECTION = "unidades_proyecto"
+INTERVENCIONES_COLLECTION = "intervenciones_unidades_proyecto"
+
+
+SNAPSHOT_ENABLED = bool_from_env("UP_SNAPSHOT_ENABLED", True)
+SNAPSHOT_REFRESH_SECONDS = int_from_env("UP_SNAPSHOT_REFRESH_SECONDS", 60)
+SNAPSHOT_FULL_RELOAD_SECONDS = int_from_env("UP_SNAPSHOT_FULL_RELOAD_SECONDS", 900)
+
+
+def _as_utc(value: Any) -> Optional[datetime]:
+    """``updated_at`` como ``datetime`` UTC.
+
+    Acepta timestamps de Firestore y los textos ISO que quedan de escrituras
+    antiguas (sin zona: hora UTC del servidor; con zona: ``-05:00``).
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class CollectionSnapshot:
+    """Copia en memoria de una colección Firestore con refresco incremental.
+
+    El estado (``_docs``) se reemplaza de forma atómica en cada refresco
+    (copy-on-write), por lo que los lectores nunca observan un dict a medio
+    actualizar y no necesitan tomar el lock.
+    """
+
+    def __init__(
+        self,
+        collection_name: str,
+        watermark_field: str = "updated_at",
+        refresh_seconds: int = SNAPSHOT_REFRESH_SECONDS,
+        full_reload_seconds: int = SNAPSHOT_FULL_RELOAD_SECONDS,
+    ):
+        self.collection_name = collection_name
+        self.watermark_field = watermark_field
+        self.refresh_seconds = refresh_seconds
+        self.full_reload_seconds = full_reload_seconds
+
+        self._lock = threading.Lock()
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._watermark: Optional[datetime] = None
+        self._loaded = False
+        self._needs_full_reload = True
+        self._stale = True
+        self._loaded_at = 0.0  # time.monotonic() de la última carga completa
+        self._refreshed_at = 0.0  # time.monotonic() del último refresco (completo o incremental)
+        self._version = 0
+        self._derived: Dict[str, Tuple[int, Any]] = {}
+        self._stats = {"full_loads": 0, "incremental_refreshes": 0, "docs_read": 0}
+
+    # ------------------------------------------------------------------
+    # Estado
+    # ------------------------------------------------------------------
+
+    @property
+    def version(self) -> int:
+        """Contador que aumenta cada vez que cambia el contenido del snapshot."""
+        return self._version
+
+    def invalidate(self, full: bool = False) -> None:
+        """Marca el snapshot como desactualizado.
+
+        ``full=False`` fuerza un refresco incremental en el próximo acceso
+        (suficiente para altas y modificaciones, que actualizan ``updated_at``).
+        ``full=True`` fuerza una recarga completa (necesario tras eliminaciones).
+        """
+        with self._lock:
+            self._stale = True
+            if full:
+                self._needs_full_reload = True
+
+    def _due(self) -> Tuple[bool, bool]:
+        """Retorna (requiere_refresco, requiere_recarga_completa)."""
+        if not SNAPSHOT_ENABLED:
+            return True, True
+        now = time.monotonic()
+        full = (
+            not self._loaded
+            or self._needs_full_reload
+            or now - self._loaded_at >= self.full_reload_seconds
+        )
+        refresh = full or self._stale or now - self._refreshed_at >= self.refresh_seconds
+        return refresh, full
+
+    def is_fresh(self) -> bool:
+        refresh, _ = self._due()
+        return not refresh
+
+    # ------------------------------------------------------------------
+    # Carga / refresco (bloqueante — ejecutar fuera del event loop)
+    # ------------------------------------------------------------------
+
+    def _track_watermark(self, current: Optional[datetime], data: Dict[str, Any]) -> Optional[datetime]:
+        value = _as_utc(data.get(self.watermark_field))
+        if value is None:
+            return current
+        if current is None or value > current:
+            return value
+        return current
+
+    def _full_load(self, db) -> None:
+        docs: Dict[str, Dict[str, Any]] = {}
+        watermark: Optional[datetime] = None
+        for doc in db.collection(self.collection_name).stream():
+            data = doc.to_dict() or {}
+            docs[doc.id] = data
+            watermark = self._track_watermark(watermark, data)
+
+        now = time.monotonic()
+        self._docs = docs
+        self._watermark = watermark
+        self._loaded = True
+        self._needs_full_reload = False
+        self._stale = False
+        self._loaded_at = now
+        self._refreshed_at = now
+        self._version += 1
+        self._stats["full_loads"] += 1
+        self._stats["docs_read"] += len(docs)
+        logger.info(
+            "Snapshot %s: carga completa (%d documentos)",
+            self.collection_name,
+            len(docs),
+        )
+
+    def _incremental_refresh(self, db) -> None:
+        if self._watermark is None:
+            # Sin marca de agua no se puede pedir el delta: recargar todo.
+            self._full_load(db)
+            return
+
+        query = db.collection(self.collection_name).where(
+            self.watermark_field, ">", self._watermark
+        )
+        changed = [(doc.id, doc.to_dict() or {}) for doc in query.stream()]
+
+        if changed:
+            docs = dict(self._docs)
+            watermark = self._watermark
+            new_ids = False
+            for doc_id, data in changed:
+                new_ids = new_ids or doc_id not in docs
+                docs[doc_id] = data
+                watermark = self._track_watermark(watermark, data)
+            if new_ids:
+                # Mantener el orden por ID de documento (mismo orden que stream()).
+                docs = dict(sorted(docs.items()))
+            self._docs = docs
+            self._watermark = watermark
+            self._version += 1
+
+        self._stale = False
+        self._refreshed_at = time.monotonic()
+        self._stats["incremental_refreshes"] += 1
+        self._stats["docs_read"] += len(changed)
+        if changed:
+            logger.debug(
+                "Snapshot %s: refresco incremental (%d documentos)",
+                self.collection_name,
+                len(changed),
+            )
+
+    def ensure_fresh(self) -> None:
+        """Carga o refresca el snapshot si corresponde. Bloqueante."""
+        refresh, _ = self._due()
+        if not refresh:
+            return
+
+        with self._lock:
+            # Otro hilo pudo haber refrescado mientras se esperaba el lock.
+            refresh, full = self._due()
+            if not refresh:
+                return
+
+            db = get_firestore_client()
+            if db is None:
+                raise RuntimeError("No se pudo conectar a Firestore")
+
+            if full:
+                self._full_load(db)
+                return
+            try:
+                self._incremental_refresh(db)
+            except Exception as e:
+                # p. ej. índice faltante para el filtro por updated_at
+                logger.warning(
+                    "Snapshot %s: refresco incremental falló (%s), recargando completo",
+                    self.collection_name,
+                    e,
+                )
+                self._full_load(db)
+
+    # ------------------------------------------------------------------
+    # Lectura
+    # ------------------------------------------------------------------
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Pares (doc_id, data) ordenados por ID de documento. Bloqueante si hay que refrescar."""
+        self.ensure_fresh()
+        return list(self._docs.items())
+
+    def documents(self) -> List[Dict[str, Any]]:
+        """Lista de documentos (solo lectura). Bloqueante si hay que refrescar."""
+        self.ensure_fresh()
+        return list(self._docs.values())
+
+    async def aitems(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """Versión async de ``items``: solo sale del event loop si hay que leer Firestore."""
+        if self.is_fresh():
+            return list(self._docs.items())
+        return await run_blocking(self.collection_name, self.items)
+
+    async def adocuments(self) -> List[Dict[str, Any]]:
+        """Versión async de ``documents``."""
+        if self.is_fresh():
+            return list(self._docs.values())
+        return await run_blocking(self.collection_name, self.documents)
+
+    def derived(self, name: str, builder: Callable[[List[Tuple[str, Dict[str, Any]]]], Any]) -> Any:
+        """Valor derivado de los documentos, memoizado por versión del snapshot.
+
+        ``builder`` recibe los pares (doc_id, data) y se vuelve a ejecutar solo
+        cuando el contenido cambia. El resultado es compartido: solo lectura.
+        """
+        self.ensure_fresh()
+        # Leer la versión antes que los documentos: si un refresco ocurre en
+        # medio, el valor queda asociado a la versión anterior y se reconstruye.
+        version = self._version
+        cached = self._derived.get(name)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        value = builder(list(self._docs.items()))
+        self._derived[name] = (version, value)
+        return value
+
+    async def aderived(self, name: str, builder: Callable[[List[Tuple[str, Dict[str, Any]]]], Any]) -> Any:
+        """Versión async de ``derived``: construye fuera del event loop si hace falta."""
+        if self.is_fresh():
+            cached = self._derived.get(name)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+        return await asyncio.to_thread(self.derived, name, builder)
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "collection": self.collection_name,
+            "enabled": SNAPSHOT_ENABLED,
+            "loaded": self._loaded,
+            "documents": len(self._docs),
+            "version": self._version,
+            "watermark": self._watermark.isoformat() if self._watermark else None,
+            "stale": self._stale,
+            "age_seconds": round(now - self._loaded_at, 1) if self._loaded else None,
+            "since_refresh_seconds": round(now - self._refreshed_at, 1)
+            if self._loaded
+            else None,
+            **self._stats,
+        }
+
+
+# ---------------------------------------------------------------------------
+# Instancias compartidas por proceso
+# ---------------------------------------------------------------------------
+
+_unidades_snapshot = CollectionSnapshot(UNIDADES_COLLECTION)
+_intervenciones_snapshot = CollectionSnapshot(INTERVENCIONES_COLLECTION)
+
+
+def get_unidades_snapshot() -> CollectionSnapshot:
+    return _unidades_snapshot
+
+
+def get_intervenciones_snapshot() -> CollectionSnapshot:
+    return _intervenciones_snapshot
+
+
+def invalidate_unidades_snapshots(full: bool = False) -> None:
+    """Invalida ambos snapshots. Llamar tras cualquier mutación de UP o intervenciones."""
+    _unidades_snapshot.invalidate(full=full)
+    _intervenciones_snapshot.invalidate(full=full)
+
+
+def warm_unidades_snapshots() -> None:
+    """Carga ambos snapshots (pensado para el arranque). Bloqueante; no lanza."""
+    for snapshot in (_unidades_snapshot, _intervenciones_snapshot):
+        try:
+            snapshot.ensure_fresh()
+        except Exception as e:
+            logger.warning(
+                "No se pudo precargar snapshot %s: %s", snapshot.collection_name, e
+            )
+
+
+def get_unidades_snapshot_stats() -> Dict[str, Any]:
+    return {
+        "unidades_proyecto": _unidades_snapshot.get_stats(),
+        "intervenciones_unidades_proyecto": _intervenciones_snapshot.get_stats(),
+    }
@@ -16,6 +16,7 @@ import re
 import unicodedata
 from firebase_admin import auth, exceptions as firebase_exceptions
 from database.firebase_config import get_firestore_client, get_auth_client
+from auth_system.user_directory import get_user_directory, invalidate_user_directory
 
 logger = logging.getLogger(__name__)
 
@@ -431,6 +432,7 @@ async def create_user_account(
             }
             
             firestore_client.collection('users').document(user_record.uid).set(user_data)
+            invalidate_user_directory(user_record.uid)
             
             # Generar enlace de verificación de email si se solicita
             verification_link = None
@@ -562,6 +564,7 @@ async def delete_user_account(uid: str, soft_delete: bool = True) -> Dict[str, A
                 "deleted_at": datetime.now(),
                 "updated_at": datetime.now()
             })
+            invalidate_user_directory(uid)
             
             return {
                 "success": True,
@@ -573,6 +576,7 @@ async def delete_user_account(uid: str, soft_delete: bool = True) -> Dict[str, A
             # Hard delete: eliminar completamente
             auth_client.delete_user(uid)
             firestore_client.collection('users').document(uid).delete()
+            invalidate_user_directory(uid)
             
             return {
                 "success": True,
@@ -702,7 +706,7 @@ async def list_users(
     """
     try:
         auth_client = get_auth_client()
-        firestore_client = get_firestore_client()
+        directory = get_user_directory()
         
         # Obtener usuarios de Firebase Auth
         page = auth_client.list_users(max_results=limit, page_token=page_token)
@@ -713,9 +717,8 @@ async def list_users(
             if not include_disabled and user.disabled:
                 continue
             
-            # Obtener datos adicionales de Firestore
-            user_doc = firestore_client.collection('users').document(user.uid).get()
-            firestore_data = user_doc.to_dict() if user_doc.exists else {}
+            # Datos adicionales de Firestore desde el directorio de usuarios
+            firestore_data = directory.get(user.uid) or {}
             
             # Aplicar filtros
             user_role = user.custom_claims.get('role') if user.custom_claims else 'unknown'
@@ -792,11 +795,8 @@ async def get_user_statistics() -> Dict[str, Any]:
     Obtener estadísticas de usuarios del sistema
     """
     try:
-        firestore_client = get_firestore_client()
-        
-        # Obtener todos los usuarios de Firestore
-        users_ref = firestore_client.collection('users')
-        users_query = users_ref.get()
+        # Todos los usuarios desde el directorio en memoria
+        users = get_user_directory().find()
         
         total_users = 0
         active_users = 0
@@ -805,30 +805,28 @@ async def get_user_statistics() -> Dict[str, Any]:
         email_verified_count = 0
         google_auth_enabled = 0
         
-        for user_doc in users_query:
-            if user_doc.exists:
-                user_data = user_doc.to_dict()
-                total_users += 1
-                
-                # Contar usuarios activos
-                if user_data.get('is_active', True):
-                    active_users += 1
-                
-                # Contar por rol (usar custom claims en lugar de user_range)
-                role = 'unknown'  # Por defecto
-                users_by_role[role] = users_by_role.get(role, 0) + 1
-                
-                # Contar por centro gestor
-                centro = user_data.get('nombre_centro_gestor', 'unknown')
-                users_by_centro[centro] = users_by_centro.get(centro, 0) + 1
-                
-                # Contar emails verificados
-                if user_data.get('email_verified', False):
-                    email_verified_count += 1
-                
-                # Contar usuarios con Google Auth habilitado
-                if user_data.get('can_use_google_auth', False):
-                    google_auth_enabled += 1
+        for user_data in users:
+            total_users += 1
+            
+            # Contar usuarios activos
+            if user_data.get('is_active', True):
+                active_users += 1
+            
+            # Contar por rol (usar custom claims en lugar de user_range)
+            role = 'unknown'  # Por defecto
+            users_by_role[role] = users_by_role.get(role, 0) + 1
+            
+            # Contar por centro gestor
+            centro = user_data.get('nombre_centro_gestor', 'unknown')
+            users_by_centro[centro] = users_by_centro.get(centro, 0) + 1
+            
+            # Contar emails verificados
+            if user_data.get('email_verified', False):
+                email_verified_count += 1
+            
+            # Contar usuarios con Google Auth habilitado
+            if user_data.get('can_use_google_auth', False):
+                google_auth_enabled += 1
         
         return {
             "success": True,
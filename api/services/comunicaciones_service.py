@@ -17,7 +17,11 @@ Características:
 - **Cuota diaria** configurable con alertas (default 200 envíos/24h, alerta al
   80 %, bloqueo al 95 %).
 - **Adjuntos arbitrarios** (multipart MIME).
-- **Log de cada envío** en Firestore (``notifications_log``).
+- **Log de cada envío** en Firestore (``notifications_log``); los broadcasts
+  los escriben por lotes.
+- **Broadcast concurrente**: pool acotado de hilos, cada uno con su sesión
+  SMTP/Gmail API reutilizada entre mensajes, ritmo limitado por token bucket y
+  cuota diaria descontada localmente durante el envío.
 - Tolerante a fallos: si Firestore no está disponible, los logs y el control
   de cuota se degradan en lugar de romper el envío.
 
@@ -47,6 +51,11 @@ Control de cuota / alertas:
     EMAIL_QUOTA_BLOCK   — default 0.95
     ADMIN_ALERT_EMAIL   — destino opcional para alertas de cuota
     FRONTEND_URL        — URL del frontend (CTA por defecto)
+
+Broadcast:
+
+    EMAIL_BROADCAST_WORKERS — hilos de envío concurrentes (default 4)
+    EMAIL_SEND_RATE         — envíos por segundo entre todos los hilos (default 5)
 """
 
 from __future__ import annotations
@@ -59,8 +68,10 @@ import re
 import smtplib
 import socket
 import ssl
-import unicodedata
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from email.mime.application import MIMEApplication
@@ -71,6 +82,9 @@ from email.utils import formataddr
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
+from api.core.metrics import track_outbound
+from database.audit_sink import get_log_sink
+
 logger = logging.getLogger(__name__)
 
 
@@ -96,6 +110,9 @@ QUOTA_BLOCK_THRESHOLD = float(os.getenv("EMAIL_QUOTA_BLOCK", "0.95") or "0.95")
 ADMIN_ALERT_EMAIL = os.getenv("ADMIN_ALERT_EMAIL", "")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "")
 
+EMAIL_BROADCAST_WORKERS = int(os.getenv("EMAIL_BROADCAST_WORKERS", "4") or "4")
+EMAIL_SEND_RATE = float(os.getenv("EMAIL_SEND_RATE", "5") or "5")
+
 SMTP_CONFIGURED = bool(SMTP_HOST and SMTP_USER and SMTP_PASSWORD)
 GMAIL_API_CONFIGURED = bool(
     GMAIL_CLIENT_ID and GMAIL_CLIENT_SECRET and GMAIL_REFRESH_TOKEN
@@ -159,6 +176,27 @@ _LOG_COLLECTION = "notifications_log"
 _ALERTS_COLLECTION = "notifications_alerts"
 
 
+def _log_record(
+    to: str,
+    subject: str,
+    template: str,
+    status: str,
+    error: str = "",
+    channel: str = "",
+    sent_by: str = "",
+) -> Dict[str, Any]:
+    return {
+        "to": to,
+        "subject": subject[:200],
+        "template": template,
+        "status": status,
+        "error": error[:500] if error else "",
+        "channel": channel,
+        "sent_by": sent_by,
+        "sent_at": datetime.now(timezone.utc),
+    }
+
+
 def _log_notification(
     to: str,
     subject: str,
@@ -168,36 +206,38 @@ def _log_notification(
     channel: str = "",
     sent_by: str = "",
 ) -> None:
-    """Registra el resultado del envío en Firestore (best effort)."""
-    db = _get_db()
-    if db is None:
-        return
+    """Registra el resultado del envío en Firestore (best effort).
+
+    Va al sink compartido del proceso (``database.audit_sink``), que escribe
+    por lotes y guarda en el spool local lo que Firestore no acepta.
+    """
+    record = _log_record(to, subject, template, status, error, channel, sent_by)
     try:
-        db.collection(_LOG_COLLECTION).add(
-            {
-                "to": to,
-                "subject": subject[:200],
-                "template": template,
-                "status": status,
-                "error": error[:500] if error else "",
-                "channel": channel,
-                "sent_by": sent_by,
-                "sent_at": datetime.now(timezone.utc),
-            }
-        )
+        get_log_sink(_LOG_COLLECTION).add(record)
     except Exception as exc:  # pragma: no cover
         logger.warning("No se pudo registrar log de notificación: %s", exc)
 
 
 _count_cache: dict = {"value": 0, "expires": 0.0}
+_count_lock = threading.Lock()
 
 
-def _count_sent_last_24h() -> int:
-    """Cuenta correos enviados en las últimas 24 h (best effort, cache 5 min)."""
-    import time
+def _record_sent(n: int = 1) -> None:
+    """Suma envíos exitosos al conteo cacheado (los logs pueden ir por lotes)."""
+    with _count_lock:
+        _count_cache["value"] += n
+
+
+def _count_query(query) -> int:
+    """Conteo con la agregación ``count()`` del servidor, sin leer documentos."""
+    result = query.count().get()
+    return int(result[0][0].value) if result else 0
 
+
+def _count_sent_last_24h(fresh: bool = False) -> int:
+    """Cuenta correos enviados en las últimas 24 h (best effort, cache 5 min)."""
     now = time.monotonic()
-    if now < _count_cache["expires"]:
+    if not fresh and now < _count_cache["expires"]:
         return _count_cache["value"]
 
     db = _get_db()
@@ -212,9 +252,10 @@ def _count_sent_last_24h() -> int:
             .where(filter=FieldFilter("status", "==", "sent"))
             .where(filter=FieldFilter("sent_at", ">=", since))
         )
-        result = sum(1 for _ in query.stream())
-        _count_cache["value"] = result
-        _count_cache["expires"] = now + 300  # cache 5 minutos
+        result = _count_query(query)
+        with _count_lock:
+            _count_cache["value"] = result
+            _count_cache["expires"] = now + 300  # cache 5 minutos
         return result
     except Exception as exc:
         logger.warning("No se pudo contar envíos en 24h: %s", exc)
@@ -382,13 +423,17 @@ def _get_gmail_service():
         return None
 
 
-def _send_via_gmail_api(msg: MIMEMultipart, to: str) -> Tuple[bool, str]:
-    service = _get_gmail_service()
+def _send_via_gmail_api(
+    msg: MIMEMultipart, to: str, service: Any = None
+) -> Tuple[bool, str]:
+    if service is None:
+        service = _get_gmail_service()
     if service is None:
         return False, "Gmail API no inicializada"
     try:
         raw = base64.urlsafe_b64encode(msg.as_bytes()).decode("utf-8")
-        service.users().messages().send(userId="me", body={"raw": raw}).execute()
+        with track_outbound("gmail", "api_send"):
+            service.users().messages().send(userId="me", body={"raw": raw}).execute()
         return True, ""
     except Exception as exc:
         logger.error("Error enviando vía Gmail API a %s: %s", to, exc)
@@ -400,42 +445,101 @@ def _send_via_gmail_api(msg: MIMEMultipart, to: str) -> Tuple[bool, str]:
 # ---------------------------------------------------------------------------
 
 
-def _send_via_smtp(msg: MIMEMultipart, to: str) -> Tuple[bool, str]:
-    if not SMTP_CONFIGURED:
-        return False, "SMTP no configurado"
+def _open_smtp() -> smtplib.SMTP:
+    """Abre una conexión SMTP autenticada lista para ``sendmail``."""
+    context = ssl.create_default_context()
     try:
-        context = ssl.create_default_context()
+        host_ipv4 = socket.getaddrinfo(SMTP_HOST, SMTP_PORT, socket.AF_INET)[0][4][0]
+    except Exception:
+        host_ipv4 = SMTP_HOST
+
+    if SMTP_USE_TLS:
+        server = smtplib.SMTP(host_ipv4, SMTP_PORT, timeout=20)
         try:
-            host_ipv4 = socket.getaddrinfo(SMTP_HOST, SMTP_PORT, socket.AF_INET)[0][4][
-                0
-            ]
+            # Restore hostname so starttls() uses it as SNI server_hostname.
+            # Connecting via raw IPv4 sets server._host to the IP, which
+            # causes "IP address mismatch" during certificate verification.
+            server._host = SMTP_HOST
+            server.ehlo(SMTP_HOST)
+            server.starttls(context=context)
+            server.ehlo(SMTP_HOST)
+            server.login(SMTP_USER, SMTP_PASSWORD)
         except Exception:
-            host_ipv4 = SMTP_HOST
-
-        if SMTP_USE_TLS:
-            with smtplib.SMTP(host_ipv4, SMTP_PORT, timeout=20) as server:
-                # Restore hostname so starttls() uses it as SNI server_hostname.
-                # Connecting via raw IPv4 sets server._host to the IP, which
-                # causes "IP address mismatch" during certificate verification.
-                server._host = SMTP_HOST
-                server.ehlo(SMTP_HOST)
-                server.starttls(context=context)
-                server.ehlo(SMTP_HOST)
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.sendmail(SMTP_USER, to, msg.as_string())
-        else:
-            # SSL directo (puerto 465): construir socket IPv4 con SNI correcto
-            raw_sock = socket.create_connection((host_ipv4, SMTP_PORT), timeout=20)
-            ssl_sock = context.wrap_socket(raw_sock, server_hostname=SMTP_HOST)
-            with smtplib.SMTP(timeout=20) as server:
-                server.sock = ssl_sock
-                server._host = SMTP_HOST
-                code, msg_ = server.getreply()  # leer saludo del servidor
-                if code != 220:
-                    raise smtplib.SMTPConnectError(code, msg_)
-                server.ehlo(SMTP_HOST)
-                server.login(SMTP_USER, SMTP_PASSWORD)
-                server.sendmail(SMTP_USER, to, msg.as_string())
+            _close_smtp(server)
+            raise
+        return server
+
+    # SSL directo (puerto 465): construir socket IPv4 con SNI correcto
+    raw_sock = socket.create_connection((host_ipv4, SMTP_PORT), timeout=20)
+    ssl_sock = context.wrap_socket(raw_sock, server_hostname=SMTP_HOST)
+    server = smtplib.SMTP(timeout=20)
+    try:
+        server.sock = ssl_sock
+        server._host = SMTP_HOST
+        code, msg_ = server.getreply()  # leer saludo del servidor
+        if code != 220:
+            raise smtplib.SMTPConnectError(code, msg_)
+        server.ehlo(SMTP_HOST)
+        server.login(SMTP_USER, SMTP_PASSWORD)
+    except Exception:
+        _close_smtp(server)
+        raise
+    return server
+
+
+def _close_smtp(server: smtplib.SMTP) -> None:
+    try:
+        server.quit()
+    except smtplib.SMTPServerDisconnected:
+        pass
+    except Exception as exc:
+        logger.debug("Error cerrando sesión SMTP: %s", exc)
+    finally:
+        server.close()
+
+
+class _SmtpSession:
+    """Conexión SMTP reutilizada entre mensajes; se reabre si el servidor la cierra.
+
+    No es thread-safe: cada hilo de envío usa la suya.
+    """
+
+    def __init__(self):
+        self._server: Optional[smtplib.SMTP] = None
+
+    def sendmail(self, to: str, payload: str) -> None:
+        for attempt in (1, 2):
+            if self._server is None:
+                self._server = _open_smtp()
+            try:
+                self._server.sendmail(SMTP_USER, to, payload)
+                return
+            except smtplib.SMTPServerDisconnected:
+                self._server = None
+                if attempt == 2:
+                    raise
+
+    def close(self) -> None:
+        if self._server is not None:
+            _close_smtp(self._server)
+            self._server = None
+
+
+def _send_via_smtp(
+    msg: MIMEMultipart, to: str, session: Optional[_SmtpSession] = None
+) -> Tuple[bool, str]:
+    if not SMTP_CONFIGURED:
+        return False, "SMTP no configurado"
+    try:
+        with track_outbound("gmail", "smtp_send"):
+            if session is not None:
+                session.sendmail(to, msg.as_string())
+            else:
+                server = _open_smtp()
+                try:
+                    server.sendmail(SMTP_USER, to, msg.as_string())
+                finally:
+                    _close_smtp(server)
         return True, ""
     except smtplib.SMTPAuthenticationError as exc:
         logger.error("SMTP auth error: %s", exc)
@@ -450,6 +554,22 @@ def _send_via_smtp(msg: MIMEMultipart, to: str) -> Tuple[bool, str]:
 # ---------------------------------------------------------------------------
 
 
+class _ChannelSession:
+    """Sesiones de canal de un hilo de envío: conexión SMTP y cliente Gmail API."""
+
+    def __init__(self):
+        self.smtp = _SmtpSession()
+        self._gmail_service: Any = None
+
+    def gmail_service(self) -> Any:
+        if self._gmail_service is None:
+            self._gmail_service = _get_gmail_service()
+        return self._gmail_service
+
+    def close(self) -> None:
+        self.smtp.close()
+
+
 def get_active_channel() -> str:
     """Devuelve el canal de envío activo: gmail_api / smtp / none."""
     if SMTP_CONFIGURED:
@@ -467,8 +587,12 @@ def _send_raw_email(
     template: str = "",
     text_body: Optional[str] = None,
     sent_by: str = "",
+    session: Optional[_ChannelSession] = None,
 ) -> Tuple[bool, str, str]:
-    """Envío directo sin control de cuota. Devuelve (ok, channel, error)."""
+    """Envío directo sin control de cuota. Devuelve (ok, channel, error).
+
+    ``session`` reutiliza las conexiones del canal entre envíos.
+    """
     sender_email = SMTP_USER or GMAIL_SENDER
     sender_name = SMTP_FROM_NAME
 
@@ -492,15 +616,20 @@ def _send_raw_email(
     channel = ""
     last_error = ""
 
+    smtp_session = session.smtp if session is not None else None
     if SMTP_CONFIGURED:
-        ok, last_error = _send_via_smtp(mime, to)
+        ok, last_error = _send_via_smtp(mime, to, smtp_session)
         channel = "smtp" if ok else channel
         if not ok and GMAIL_API_CONFIGURED:
             logger.warning("SMTP falló para %s, intentando Gmail API…", to)
-            ok, last_error = _send_via_gmail_api(mime, to)
+            ok, last_error = _send_via_gmail_api(
+                mime, to, session.gmail_service() if session is not None else None
+            )
             channel = "gmail_api" if ok else channel
     elif GMAIL_API_CONFIGURED:
-        ok, last_error = _send_via_gmail_api(mime, to)
+        ok, last_error = _send_via_gmail_api(
+            mime, to, session.gmail_service() if session is not None else None
+        )
         channel = "gmail_api" if ok else channel
     else:
         last_error = "Ningún canal de envío configurado"
@@ -515,6 +644,8 @@ def _send_raw_email(
         channel=channel,
         sent_by=sent_by,
     )
+    if ok:
+        _record_sent()
     return ok, channel, last_error
 
 
@@ -647,26 +778,6 @@ def send_test_email(to: str, sent_by: str = "") -> Tuple[bool, str, str]:
 # ---------------------------------------------------------------------------
 
 
-def _normalize_text(value: Any) -> str:
-    if value is None:
-        return ""
-    text = str(value).strip().lower()
-    text = unicodedata.normalize("NFKD", text)
-    text = "".join(c for c in text if not unicodedata.combining(c))
-    text = re.sub(r"[\s_\-]+", " ", text)
-    return text.strip()
-
-
-def _normalize_roles(value: Any) -> List[str]:
-    if value is None:
-        return []
-    if isinstance(value, str):
-        return [value.strip()] if value.strip() else []
-    if isinstance(value, (list, tuple, set)):
-        return [str(v).strip() for v in value if str(v).strip()]
-    return [str(value).strip()] if str(value).strip() else []
-
-
 def _extract_email(user_data: Dict[str, Any]) -> str:
     email = (
         user_data.get("email")
@@ -689,13 +800,16 @@ def _extract_name(user_data: Dict[str, Any]) -> str:
     )
 
 
-def _extract_user_centro(user_data: Dict[str, Any]) -> str:
-    return (
-        user_data.get("nombre_centro_gestor")
-        or user_data.get("centro_gestor_assigned")
-        or user_data.get("centro_gestor")
-        or ""
-    )
+def _collect_recipients(users: Iterable[Dict[str, Any]]) -> List[Tuple[str, str]]:
+    """``[(email, nombre)]`` sin emails repetidos, en el orden de ``users``."""
+    out: List[Tuple[str, str]] = []
+    seen: set[str] = set()
+    for ud in users:
+        email = _extract_email(ud)
+        if email and email.lower() not in seen:
+            seen.add(email.lower())
+            out.append((email, _extract_name(ud)))
+    return out
 
 
 def resolve_audience(audience: str) -> List[Tuple[str, str]]:
@@ -709,6 +823,9 @@ def resolve_audience(audience: str) -> List[Tuple[str, str]]:
     - ``roles:r1,r2,...``
     - ``uids:uid1,uid2,...``
     - ``emails:a@b.com,c@d.com``
+
+    Las audiencias sobre ``users`` se resuelven con los índices del
+    directorio de usuarios (``auth_system.user_directory``).
     """
     audience = (audience or "").strip()
     if not audience:
@@ -731,90 +848,46 @@ def resolve_audience(audience: str) -> List[Tuple[str, str]]:
     if db is None:
         raise RuntimeError("Firestore no disponible para resolver audiencia")
 
+    from auth_system.user_directory import get_user_directory
+
+    directory = get_user_directory()
+
     # ------------------------------------------------------------------
     if audience.lower() in ("all", "todos"):
-        out = []
-        seen = set()
-        for udoc in db.collection("users").stream():
-            ud = udoc.to_dict() or {}
-            email = _extract_email(ud)
-            if email and email.lower() not in seen:
-                seen.add(email.lower())
-                out.append((email, _extract_name(ud)))
-        return out
+        return _collect_recipients(directory.find(db=db))
 
     if audience.lower() in ("activos", "active"):
-        out = []
-        seen = set()
-        for udoc in db.collection("users").stream():
-            ud = udoc.to_dict() or {}
-            if ud.get("is_active") is False:
-                continue
-            email = _extract_email(ud)
-            if email and email.lower() not in seen:
-                seen.add(email.lower())
-                out.append((email, _extract_name(ud)))
-        return out
+        return _collect_recipients(directory.find(active=True, db=db))
 
     if audience.lower().startswith(("centro_gestor:", "centros_gestores:")):
         raw = audience.split(":", 1)[1]
-        target_names = {
-            _normalize_text(n) for n in re.split(r"[|;]+", raw) if n.strip()
-        }
+        target_names = [n for n in re.split(r"[|;]+", raw) if n.strip()]
         if not target_names:
             return []
-        out = []
-        seen = set()
-        for udoc in db.collection("users").stream():
-            ud = udoc.to_dict() or {}
-            centro = _normalize_text(_extract_user_centro(ud))
-            if centro and centro in target_names:
-                email = _extract_email(ud)
-                if email and email.lower() not in seen:
-                    seen.add(email.lower())
-                    out.append((email, _extract_name(ud)))
-        return out
+        return _collect_recipients(directory.find(centros=target_names, db=db))
 
     if audience.lower().startswith(("role:", "roles:")):
         raw = audience.split(":", 1)[1]
-        target_roles = {
-            r.strip().lower() for r in re.split(r"[,;|]+", raw) if r.strip()
-        }
+        target_roles = [r for r in re.split(r"[,;|]+", raw) if r.strip()]
         if not target_roles:
             return []
-        out = []
-        seen = set()
-        for udoc in db.collection("users").stream():
-            ud = udoc.to_dict() or {}
-            user_roles = {r.lower() for r in _normalize_roles(ud.get("roles"))}
-            single_role = str(ud.get("role") or ud.get("rol") or "").strip().lower()
-            if single_role:
-                user_roles.add(single_role)
-            if user_roles & target_roles:
-                email = _extract_email(ud)
-                if email and email.lower() not in seen:
-                    seen.add(email.lower())
-                    out.append((email, _extract_name(ud)))
-        return out
+        return _collect_recipients(directory.find(roles=target_roles, db=db))
 
     if audience.lower().startswith(("uid:", "uids:")):
         raw = audience.split(":", 1)[1]
-        uids = [u.strip() for u in re.split(r"[,;|\s]+", raw) if u.strip()]
-        out = []
-        seen = set()
+        uids = list(
+            dict.fromkeys(u.strip() for u in re.split(r"[,;|\s]+", raw) if u.strip())
+        )
+        users = []
         for uid in uids:
             try:
-                udoc = db.collection("users").document(uid).get()
-            except Exception:
-                continue
-            if not udoc.exists:
+                user = directory.get(uid, db)
+            except Exception as exc:
+                logger.warning("No se pudo leer el usuario %s: %s", uid, exc)
                 continue
-            ud = udoc.to_dict() or {}
-            email = _extract_email(ud)
-            if email and email.lower() not in seen:
-                seen.add(email.lower())
-                out.append((email, _extract_name(ud)))
-        return out
+            if user is not None:
+                users.append(user)
+        return _collect_recipients(users)
 
     raise ValueError(f"Formato de audiencia inválido: {audience}")
 
@@ -824,6 +897,49 @@ def resolve_audience(audience: str) -> List[Tuple[str, str]]:
 # ---------------------------------------------------------------------------
 
 
+class _TokenBucket:
+    """Token bucket thread-safe: ``rate`` tokens por segundo hasta ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float,
+        tokens: Optional[float] = None,
+        clock=time.monotonic,
+    ):
+        self.rate = max(0.0, rate)
+        self.capacity = max(0.0, capacity)
+        self.tokens = self.capacity if tokens is None else min(max(0.0, tokens), self.capacity)
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Toma un token si hay; no bloquea."""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+    def acquire(self) -> None:
+        """Toma un token esperando a que se reponga si hace falta."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.rate else 1.0
+            time.sleep(wait)
+
+
 def deliver_broadcast(
     recipients: Iterable[Tuple[str, str]],
     subject: str,
@@ -833,14 +949,18 @@ def deliver_broadcast(
     cta_label: str = "",
     attachments: Optional[Sequence[EmailAttachment]] = None,
     sent_by: str = "",
+    workers: Optional[int] = None,
 ) -> Dict[str, Any]:
     """Envía el broadcast a todos los destinatarios. Diseñado para ejecutarse
-    como BackgroundTask (síncrono)."""
-    sent = 0
-    failed = 0
-    blocked = 0
-    errors: List[Dict[str, str]] = []
-
+    como BackgroundTask (síncrono).
+
+    Los envíos se reparten en ``EMAIL_BROADCAST_WORKERS`` hilos; cada hilo
+    reutiliza su sesión SMTP/Gmail API entre mensajes. El ritmo global lo
+    limita un token bucket de ``EMAIL_SEND_RATE`` envíos/s y la cuota otro
+    sembrado con lo que queda de ``DAILY_EMAIL_QUOTA`` en las últimas 24 h
+    (un único conteo al inicio). Los logs van al sink compartido de
+    ``notifications_log``, que se vacía al terminar.
+    """
     html = render_announcement_html(
         subject=subject,
         message_html=message_html,
@@ -848,27 +968,87 @@ def deliver_broadcast(
         cta_url=cta_url,
         cta_label=cta_label,
     )
+    targets = [email for email, _name in recipients if email]
 
-    for email, _name in recipients:
-        if not email:
-            continue
-        ok, _channel, err = _send_email(
+    sent_24h = _count_sent_last_24h(fresh=True)
+    block_at = int(DAILY_EMAIL_QUOTA * QUOTA_BLOCK_THRESHOLD)
+    quota = _TokenBucket(
+        rate=DAILY_EMAIL_QUOTA / 86400.0,
+        capacity=block_at,
+        tokens=block_at - sent_24h,
+    )
+    throttle = _TokenBucket(rate=EMAIL_SEND_RATE, capacity=max(1.0, EMAIL_SEND_RATE))
+
+    local = threading.local()
+    sessions: List[_ChannelSession] = []
+    sessions_lock = threading.Lock()
+
+    def _session() -> _ChannelSession:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = _ChannelSession()
+            with sessions_lock:
+                sessions.append(session)
+        return session
+
+    def _deliver(email: str) -> Tuple[str, str]:
+        if not quota.try_acquire():
+            _log_notification(
+                email,
+                subject,
+                "broadcast",
+                "blocked_quota",
+                error=f"Cuota diaria alcanzada ({block_at}/{DAILY_EMAIL_QUOTA})",
+                sent_by=sent_by,
+            )
+            return "blocked", "Cuota diaria de correo alcanzada"
+        throttle.acquire()
+        ok, _channel, err = _send_raw_email(
             to=email,
             subject=subject,
             html_body=html,
             attachments=attachments,
             template="broadcast",
             sent_by=sent_by,
+            session=_session(),
         )
-        if ok:
+        return ("sent" if ok else "failed"), err
+
+    pool_size = max(1, min(workers or EMAIL_BROADCAST_WORKERS, len(targets) or 1))
+    try:
+        with ThreadPoolExecutor(
+            max_workers=pool_size, thread_name_prefix="broadcast"
+        ) as pool:
+            outcomes = list(pool.map(_deliver, targets))
+    finally:
+        for session in sessions:
+            session.close()
+        try:
+            # Lo que Firestore no acepte queda en el spool del sink
+            get_log_sink(_LOG_COLLECTION).flush()
+        except Exception as exc:  # pragma: no cover
+            logger.warning("No se pudieron vaciar los logs del broadcast: %s", exc)
+
+    sent = failed = blocked = 0
+    errors: List[Dict[str, str]] = []
+    for email, (status, err) in zip(targets, outcomes):
+        if status == "sent":
             sent += 1
-        elif err and "cuota" in err.lower():
+            continue
+        if status == "blocked":
             blocked += 1
-            errors.append({"to": email, "error": err})
         else:
             failed += 1
-            errors.append({"to": email, "error": err})
-
+        errors.append({"to": email, "error": err})
+
+    _maybe_alert_quota(sent_24h + sent)
+    logger.info(
+        "Broadcast '%s': %d enviados, %d fallidos, %d bloqueados por cuota",
+        subject[:80],
+        sent,
+        failed,
+        blocked,
+    )
     return {
         "sent": sent,
         "failed": failed,
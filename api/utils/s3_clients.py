@@ -0,0 +1,297 @@
+"""
+Registro de clientes S3 del proceso y firmador de presigned URLs por lotes.
+
+- Credenciales: mismas fuentes que ``S3DocumentManager`` (archivo indicado,
+  ``credentials/``, ``context/``, variables de entorno); los archivos se leen
+  una vez por ruta y se releen solo si cambia su ``mtime``.
+- Clientes: uno por (credenciales, región), compartido entre hilos (los
+  clientes de boto3 son thread-safe; la creación se serializa).
+- Región real de cada bucket: se descubre una vez con ``get_bucket_location``
+  (``head_bucket`` de respaldo) y se cachea ``S3_REGION_CACHE_TTL_SECONDS``.
+- Firmas: ``PresignedUrlSigner.sign_many`` firma lotes de claves localmente con
+  el cliente compartido y reutiliza cada URL hasta
+  ``S3_PRESIGN_REFRESH_MARGIN_SECONDS`` antes de que venza.
+
+Uso:
+    signer = get_presigned_url_signer(credentials_path)
+    urls = signer.sign_many([(bucket, key), ...])   # {(bucket, key): url | None}
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from api.core.config import int_from_env
+
+logger = logging.getLogger(__name__)
+
+try:
+    import boto3
+    from botocore.config import Config
+
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+
+S3_REGION_CACHE_TTL_SECONDS = int_from_env("S3_REGION_CACHE_TTL_SECONDS", 86400)
+S3_PRESIGN_CACHE_SIZE = int_from_env("S3_PRESIGN_CACHE_SIZE", 20000)
+S3_PRESIGN_REFRESH_MARGIN_SECONDS = int_from_env("S3_PRESIGN_REFRESH_MARGIN_SECONDS", 300)
+
+# Si la región no se pudo descubrir, no reintentar en cada petición
+_REGION_FAILURE_TTL_SECONDS = 300
+
+_CREDENTIALS_SEARCH_PATHS = (
+    "credentials/aws_credentials.json",  # Ubicación actual
+    "context/aws_credentials.json",  # Legacy
+)
+
+_lock = threading.Lock()
+_credentials_files: Dict[str, Tuple[float, Dict[str, str]]] = {}
+_clients: Dict[Tuple[str, str], Any] = {}
+_regions: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_signers: Dict[str, "PresignedUrlSigner"] = {}
+_stats = {"clients_created": 0, "region_lookups": 0, "signatures": 0, "signature_hits": 0}
+
+
+def _read_credentials_file(path: str) -> Dict[str, str]:
+    mtime = os.path.getmtime(path)
+    with _lock:
+        cached = _credentials_files.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, "r") as f:
+        creds = json.load(f)
+    logger.info(f"✅ Credenciales cargadas desde: {path}")
+    with _lock:
+        _credentials_files[path] = (mtime, creds)
+    return creds
+
+
+def load_aws_credentials(credentials_path: Optional[str] = None) -> Dict[str, str]:
+    """
+    Cargar credenciales desde archivo JSON o variables de entorno
+
+    Busca credenciales en el siguiente orden:
+    1. Archivo especificado en credentials_path
+    2. credentials/aws_credentials.json (ubicación actual)
+    3. context/aws_credentials.json (ubicación legacy)
+    4. Variables de entorno (producción)
+    """
+    for path in ((credentials_path,) if credentials_path else ()) + _CREDENTIALS_SEARCH_PATHS:
+        if os.path.exists(path):
+            return _read_credentials_file(path)
+
+    env_creds = {
+        "aws_access_key_id": os.getenv("AWS_ACCESS_KEY_ID", ""),
+        "aws_secret_access_key": os.getenv("AWS_SECRET_ACCESS_KEY", ""),
+        "aws_session_token": os.getenv("AWS_SESSION_TOKEN", ""),
+        "aws_region": os.getenv("AWS_REGION", "us-east-1"),
+        "region": os.getenv("AWS_REGION", "us-east-1"),
+        "bucket_name_emprestito": os.getenv("S3_BUCKET_EMPRESTITO", "contratos-emprestito"),
+        "bucket_name": os.getenv("S3_BUCKET_NAME", "unidades-proyecto-documents"),
+    }
+    if not env_creds["aws_access_key_id"] or not env_creds["aws_secret_access_key"]:
+        raise ValueError(
+            "No se encontraron credenciales AWS. "
+            "Proporciona un archivo JSON o configura las variables de entorno: "
+            "AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET_EMPRESTITO"
+        )
+    return env_creds
+
+
+def default_region(credentials: Dict[str, str]) -> str:
+    return credentials.get("aws_region", credentials.get("region", "us-east-1")) or "us-east-1"
+
+
+def credentials_key(credentials: Dict[str, str]) -> str:
+    """Identidad de unas credenciales para las claves de caché (sin el secreto en claro)."""
+    material = "\0".join(
+        str(credentials.get(k) or "")
+        for k in ("aws_access_key_id", "aws_secret_access_key", "aws_session_token")
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:32]
+
+
+def _create_client(credentials: Dict[str, str], region: str):
+    """Crea cliente S3 forzando firma SigV4."""
+    _stats["clients_created"] += 1
+    return boto3.client(
+        "s3",
+        aws_access_key_id=credentials.get("aws_access_key_id"),
+        aws_secret_access_key=credentials.get("aws_secret_access_key"),
+        aws_session_token=credentials.get("aws_session_token") or None,
+        region_name=region,
+        config=Config(signature_version="s3v4"),
+    )
+
+
+def _discover_bucket_region(client, bucket: str, fallback: str) -> str:
+    """Obtiene región real del bucket para evitar mismatch en presigned URLs."""
+    try:
+        response = client.get_bucket_location(Bucket=bucket)
+        # AWS devuelve None para us-east-1
+        return response.get("LocationConstraint") or "us-east-1"
+    except Exception:
+        # Fallback con head_bucket (x-amz-bucket-region)
+        response = client.head_bucket(Bucket=bucket)
+        headers = response.get("ResponseMetadata", {}).get("HTTPHeaders", {})
+        return headers.get("x-amz-bucket-region", fallback)
+
+
+def get_s3_client(credentials: Dict[str, str], region: Optional[str] = None):
+    """Cliente compartido para (credenciales, región)."""
+    if not BOTO3_AVAILABLE:
+        raise ImportError("boto3 no está instalado. Instalar con: pip install boto3")
+    region = region or default_region(credentials)
+    key = (credentials_key(credentials), region)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = _create_client(credentials, region)
+        return client
+
+
+def bucket_region(credentials: Dict[str, str], bucket: str) -> str:
+    """Región real de ``bucket`` (descubierta una vez por credenciales y bucket)."""
+    fallback = default_region(credentials)
+    key = (credentials_key(credentials), bucket)
+    now = time.monotonic()
+    with _lock:
+        cached = _regions.get(key)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    _stats["region_lookups"] += 1
+    try:
+        region = _discover_bucket_region(get_s3_client(credentials, fallback), bucket, fallback)
+        expires_at = now + S3_REGION_CACHE_TTL_SECONDS
+        if region != fallback:
+            logger.info(f"🔄 Región S3 de {bucket}: {region} (configurada {fallback})")
+    except Exception as e:
+        logger.warning(f"No se pudo detectar región real del bucket {bucket}: {e}")
+        region, expires_at = fallback, now + _REGION_FAILURE_TTL_SECONDS
+    with _lock:
+        _regions[key] = (region, expires_at)
+    return region
+
+
+def get_bucket_client(credentials: Dict[str, str], bucket: str):
+    """Cliente compartido en la región real de ``bucket``."""
+    return get_s3_client(credentials, bucket_region(credentials, bucket))
+
+
+class PresignedUrlSigner:
+    """Firma URLs ``get_object`` con clientes compartidos y cachea cada firma hasta poco antes de vencer."""
+
+    def __init__(
+        self,
+        credentials: Dict[str, str],
+        expires_in: int = 3600,
+        refresh_margin: int = S3_PRESIGN_REFRESH_MARGIN_SECONDS,
+        max_size: int = S3_PRESIGN_CACHE_SIZE,
+    ):
+        self.credentials = credentials
+        self.expires_in = expires_in
+        self.refresh_margin = min(refresh_margin, expires_in // 2)
+        self.max_size = max_size
+        self._cache: "OrderedDict[Tuple[str, str, int], Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def sign(self, bucket: str, key: str, expires_in: Optional[int] = None) -> Optional[str]:
+        return self.sign_many([(bucket, key)], expires_in).get((bucket, key))
+
+    def sign_many(
+        self, pairs: Iterable[Tuple[str, str]], expires_in: Optional[int] = None
+    ) -> Dict[Tuple[str, str], Optional[str]]:
+        """
+        Firma cada ``(bucket, key)``; los pares vacíos o que fallan quedan en None.
+        """
+        expires_in = expires_in or self.expires_in
+        now = time.time()
+        result: Dict[Tuple[str, str], Optional[str]] = {}
+        missing = []
+        with self._lock:
+            for bucket, key in pairs:
+                if (bucket, key) in result:
+                    continue
+                if not bucket or not key:
+                    result[(bucket, key)] = None
+                    continue
+                cached = self._cache.get((bucket, key, expires_in))
+                if cached is not None and cached[1] - self.refresh_margin > now:
+                    self._cache.move_to_end((bucket, key, expires_in))
+                    result[(bucket, key)] = cached[0]
+                    _stats["signature_hits"] += 1
+                else:
+                    result[(bucket, key)] = None
+                    missing.append((bucket, key))
+
+        signed = []
+        clients: Dict[str, Any] = {}
+        for bucket, key in missing:
+            try:
+                client = clients.get(bucket)
+                if client is None:
+                    client = clients[bucket] = get_bucket_client(self.credentials, bucket)
+                url = client.generate_presigned_url(
+                    "get_object", Params={"Bucket": bucket, "Key": key}, ExpiresIn=expires_in
+                )
+            except Exception as e:
+                logger.warning(f"No se pudo generar presigned URL para s3://{bucket}/{key}: {e}")
+                continue
+            result[(bucket, key)] = url
+            signed.append(((bucket, key, expires_in), (url, now + expires_in)))
+        _stats["signatures"] += len(signed)
+
+        if signed:
+            with self._lock:
+                for cache_key, entry in signed:
+                    self._cache[cache_key] = entry
+                    self._cache.move_to_end(cache_key)
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        return result
+
+
+def get_presigned_url_signer(
+    credentials_path: Optional[str] = None, expires_in: int = 3600
+) -> Optional[PresignedUrlSigner]:
+    """Firmador compartido para las credenciales de ``credentials_path``; None si S3 no está disponible."""
+    if not BOTO3_AVAILABLE:
+        return None
+    try:
+        credentials = load_aws_credentials(credentials_path or None)
+    except Exception as e:
+        logger.warning(f"S3 no disponible para firmar URLs: {e}")
+        return None
+    key = f"{credentials_key(credentials)}:{expires_in}"
+    with _lock:
+        signer = _signers.get(key)
+        if signer is None:
+            signer = _signers[key] = PresignedUrlSigner(credentials, expires_in=expires_in)
+        return signer
+
+
+def get_s3_registry_stats() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "clients": len(_clients),
+            "buckets": len(_regions),
+            "signers": len(_signers),
+            **_stats,
+        }
+
+
+def clear_s3_registry() -> None:
+    """Descarta clientes, regiones, firmas y credenciales cacheadas."""
+    with _lock:
+        _credentials_files.clear()
+        _clients.clear()
+        _regions.clear()
+        _signers.clear()
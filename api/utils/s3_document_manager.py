@@ -17,13 +17,15 @@ logger = logging.getLogger(__name__)
 # Intentar importar boto3
 try:
     import boto3
-    from botocore.config import Config
     from botocore.exceptions import ClientError, NoCredentialsError
     BOTO3_AVAILABLE = True
 except ImportError:
     BOTO3_AVAILABLE = False
     logger.warning("boto3 no está instalado. Funcionalidad S3 no disponible.")
 
+from api.utils.s3_clients import bucket_region, get_s3_client, load_aws_credentials
+from api.utils.s3_uploads import S3UploadService, UploadRequest
+
 
 class S3DocumentManager:
     """
@@ -52,47 +54,14 @@ class S3DocumentManager:
         
         self.credentials = self._load_credentials(credentials_path)
         self.bucket_name = self.credentials.get('bucket_name_emprestito', 'contratos-emprestito')
-        self.region = self.credentials.get('aws_region', self.credentials.get('region', 'us-east-1'))
-
-        # Inicializar cliente S3 (siempre SigV4)
-        self.s3_client = self._create_s3_client(self.region)
 
-        # Ajustar región al bucket real para evitar presigned inválidos por región incorrecta
-        try:
-            bucket_region = self._detect_bucket_region(self.bucket_name)
-            if bucket_region and bucket_region != self.region:
-                logger.info(f"🔄 Ajustando región S3 de {self.region} a {bucket_region} para bucket {self.bucket_name}")
-                self.region = bucket_region
-                self.s3_client = self._create_s3_client(self.region)
-        except Exception as region_error:
-            logger.warning(f"No se pudo detectar región real del bucket {self.bucket_name}: {region_error}")
+        # Cliente compartido del proceso (SigV4) en la región real del bucket;
+        # la región se descubre una vez y evita presigned inválidos por región incorrecta
+        self.region = bucket_region(self.credentials, self.bucket_name)
+        self.s3_client = get_s3_client(self.credentials, self.region)
         
         logger.info(f"✅ S3DocumentManager inicializado - Bucket: {self.bucket_name}")
 
-    def _create_s3_client(self, region_name: str):
-        """Crea cliente S3 forzando firma SigV4."""
-        return boto3.client(
-            's3',
-            aws_access_key_id=self.credentials.get('aws_access_key_id'),
-            aws_secret_access_key=self.credentials.get('aws_secret_access_key'),
-            aws_session_token=self.credentials.get('aws_session_token') or None,
-            region_name=region_name,
-            config=Config(signature_version='s3v4')
-        )
-
-    def _detect_bucket_region(self, bucket_name: str) -> str:
-        """Obtiene región real del bucket para evitar mismatch en presigned URLs."""
-        try:
-            response = self.s3_client.get_bucket_location(Bucket=bucket_name)
-            location = response.get('LocationConstraint')
-            # AWS devuelve None para us-east-1
-            return location or 'us-east-1'
-        except Exception:
-            # Fallback con head_bucket (x-amz-bucket-region)
-            response = self.s3_client.head_bucket(Bucket=bucket_name)
-            headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
-            return headers.get('x-amz-bucket-region', self.region)
-    
     def _load_credentials(self, credentials_path: str = None) -> Dict[str, str]:
         """
         Cargar credenciales desde archivo JSON o variables de entorno
@@ -104,49 +73,7 @@ class S3DocumentManager:
         4. Variables de entorno (producción)
         """
         try:
-            # Si se especificó una ruta, intentar cargarla
-            if credentials_path and os.path.exists(credentials_path):
-                with open(credentials_path, 'r') as f:
-                    creds = json.load(f)
-                    logger.info(f"✅ Credenciales cargadas desde: {credentials_path}")
-                    return creds
-            
-            # Buscar en ubicaciones conocidas
-            possible_paths = [
-                "credentials/aws_credentials.json",  # Ubicación actual
-                "context/aws_credentials.json",       # Legacy
-            ]
-            
-            for path in possible_paths:
-                if os.path.exists(path):
-                    with open(path, 'r') as f:
-                        creds = json.load(f)
-                        logger.info(f"✅ Credenciales cargadas desde: {path}")
-                        return creds
-            
-            # Si no se encuentra archivo, usar variables de entorno (producción)
-            logger.warning("Archivo de credenciales no encontrado, usando variables de entorno")
-            env_creds = {
-                'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID', ''),
-                'aws_secret_access_key': os.getenv('AWS_SECRET_ACCESS_KEY', ''),
-                'aws_session_token': os.getenv('AWS_SESSION_TOKEN', ''),
-                'aws_region': os.getenv('AWS_REGION', 'us-east-1'),
-                'region': os.getenv('AWS_REGION', 'us-east-1'),
-                'bucket_name_emprestito': os.getenv('S3_BUCKET_EMPRESTITO', 'contratos-emprestito'),
-                'bucket_name': os.getenv('S3_BUCKET_NAME', 'unidades-proyecto-documents')
-            }
-            
-            # Verificar que las credenciales están presentes
-            if not env_creds['aws_access_key_id'] or not env_creds['aws_secret_access_key']:
-                raise ValueError(
-                    "No se encontraron credenciales AWS. "
-                    "Proporciona un archivo JSON o configura las variables de entorno: "
-                    "AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, S3_BUCKET_EMPRESTITO"
-                )
-            
-            logger.info("✅ Credenciales cargadas desde variables de entorno")
-            return env_creds
-            
+            return load_aws_credentials(credentials_path)
         except Exception as e:
             logger.error(f"Error cargando credenciales: {e}")
             raise
@@ -188,6 +115,96 @@ class S3DocumentManager:
             # RPC: 2 niveles - referencia_contrato/filename
             return f"{folder}/{safe_referencia}/{final_filename}"
     
+    def _build_upload_request(
+        self,
+        file_content: bytes,
+        filename: str,
+        referencia_contrato: str,
+        document_type: str,
+        numero_rpc: str = None,
+        content_type: str = 'application/pdf',
+        metadata: Optional[Dict[str, str]] = None,
+        use_timestamp: bool = False
+    ) -> UploadRequest:
+        """Clave S3 y metadatos ASCII de un documento (ver ``upload_document``)."""
+        # Determinar carpeta según tipo de documento
+        folder = 'contratos-rpc-docs' if document_type == 'rpc' else 'contratos-pagos-docs'
+        
+        # Validar que numero_rpc esté presente para pagos
+        if document_type == 'pago' and not numero_rpc:
+            raise ValueError("numero_rpc es requerido para documentos de tipo 'pago'")
+        
+        # Generar clave S3
+        s3_key = self._generate_s3_key(folder, referencia_contrato, filename, numero_rpc, use_timestamp)
+        
+        # Preparar metadatos (S3 solo acepta ASCII en metadata)
+        def encode_metadata_value(value: str) -> str:
+            """Codificar valores a ASCII seguro"""
+            try:
+                # Intentar mantener ASCII válido
+                return value.encode('ascii', errors='ignore').decode('ascii')
+            except:
+                return value
+        
+        s3_metadata = {
+            'referencia_contrato': encode_metadata_value(referencia_contrato),
+            'document_type': document_type,
+            'original_filename': encode_metadata_value(filename),
+            'upload_date': datetime.now().isoformat()
+        }
+        
+        if metadata:
+            # Codificar todos los valores del metadata adicional
+            encoded_metadata = {
+                key: encode_metadata_value(str(value)) if value else ''
+                for key, value in metadata.items()
+            }
+            s3_metadata.update(encoded_metadata)
+        
+        return UploadRequest(
+            bucket=self.bucket_name,
+            key=s3_key,
+            body=file_content,
+            content_type=content_type,
+            metadata=s3_metadata
+        )
+
+    def _upload_result(self, filename: str, uploaded: Dict[str, Any]) -> Dict[str, Any]:
+        # Generar URL del archivo
+        file_url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{uploaded['key']}"
+        
+        logger.info(f"✅ Documento subido a S3: {uploaded['key']}")
+        
+        return {
+            'success': True,
+            'filename': filename,
+            's3_key': uploaded['key'],
+            's3_url': file_url,
+            'bucket': self.bucket_name,
+            'size': uploaded['size'],
+            'content_type': uploaded['content_type'],
+            'sha256': uploaded['sha256'],
+            'deduplicated': uploaded['deduplicated'],
+            'upload_date': datetime.now().isoformat()
+        }
+
+    @staticmethod
+    def _upload_error(filename: str, error: Exception) -> Dict[str, Any]:
+        if isinstance(error, NoCredentialsError):
+            logger.error("❌ Credenciales AWS no configuradas")
+            message = 'Credenciales AWS no configuradas'
+        elif isinstance(error, ClientError):
+            logger.error(f"❌ Error de cliente S3: {error}")
+            message = str(error)
+        else:
+            logger.error(f"❌ Error subiendo documento: {error}")
+            message = str(error)
+        return {
+            'success': False,
+            'error': message,
+            'filename': filename
+        }
+
     def upload_document(
         self,
         file_content: bytes,
@@ -219,86 +236,15 @@ class S3DocumentManager:
             Diccionario con información del archivo subido
         """
         try:
-            # Determinar carpeta según tipo de documento
-            folder = 'contratos-rpc-docs' if document_type == 'rpc' else 'contratos-pagos-docs'
-            
-            # Validar que numero_rpc esté presente para pagos
-            if document_type == 'pago' and not numero_rpc:
-                raise ValueError("numero_rpc es requerido para documentos de tipo 'pago'")
-            
-            # Generar clave S3
-            s3_key = self._generate_s3_key(folder, referencia_contrato, filename, numero_rpc, use_timestamp)
-            
-            # Preparar metadatos (S3 solo acepta ASCII en metadata)
-            def encode_metadata_value(value: str) -> str:
-                """Codificar valores a ASCII seguro"""
-                try:
-                    # Intentar mantener ASCII válido
-                    return value.encode('ascii', errors='ignore').decode('ascii')
-                except:
-                    return value
-            
-            s3_metadata = {
-                'referencia_contrato': encode_metadata_value(referencia_contrato),
-                'document_type': document_type,
-                'original_filename': encode_metadata_value(filename),
-                'upload_date': datetime.now().isoformat()
-            }
-            
-            if metadata:
-                # Codificar todos los valores del metadata adicional
-                encoded_metadata = {
-                    key: encode_metadata_value(str(value)) if value else ''
-                    for key, value in metadata.items()
-                }
-                s3_metadata.update(encoded_metadata)
-            
-            # Subir archivo a S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=content_type,
-                Metadata=s3_metadata
+            request = self._build_upload_request(
+                file_content, filename, referencia_contrato, document_type,
+                numero_rpc, content_type, metadata, use_timestamp
             )
-            
-            # Generar URL del archivo
-            file_url = f"https://{self.bucket_name}.s3.{self.region}.amazonaws.com/{s3_key}"
-            
-            logger.info(f"✅ Documento subido a S3: {s3_key}")
-            
-            return {
-                'success': True,
-                'filename': filename,
-                's3_key': s3_key,
-                's3_url': file_url,
-                'bucket': self.bucket_name,
-                'size': len(file_content),
-                'content_type': content_type,
-                'upload_date': datetime.now().isoformat()
-            }
-            
-        except NoCredentialsError:
-            logger.error("❌ Credenciales AWS no configuradas")
-            return {
-                'success': False,
-                'error': 'Credenciales AWS no configuradas',
-                'filename': filename
-            }
-        except ClientError as e:
-            logger.error(f"❌ Error de cliente S3: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'filename': filename
-            }
+            # Subir archivo a S3 (multipart automático si es grande)
+            uploaded = S3UploadService(self.s3_client).upload(request)
+            return self._upload_result(filename, uploaded)
         except Exception as e:
-            logger.error(f"❌ Error subiendo documento: {e}")
-            return {
-                'success': False,
-                'error': str(e),
-                'filename': filename
-            }
+            return self._upload_error(filename, e)
     
     def upload_multiple_documents(
         self,
@@ -309,7 +255,10 @@ class S3DocumentManager:
         use_timestamp: bool = False
     ) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
         """
-        Subir múltiples documentos a S3
+        Subir múltiples documentos a S3 en paralelo
+        
+        Sin ``use_timestamp`` las claves son fijas: un archivo que ya está en S3
+        con el mismo contenido (hash SHA-256) no se vuelve a subir.
         
         Args:
             files: Lista de diccionarios con información de archivos
@@ -325,9 +274,10 @@ class S3DocumentManager:
         successful_uploads = []
         failed_uploads = []
         
+        requests = []
         for file_info in files:
             try:
-                result = self.upload_document(
+                requests.append((file_info, self._build_upload_request(
                     file_content=file_info['content'],
                     filename=file_info['filename'],
                     referencia_contrato=referencia_contrato,
@@ -339,13 +289,7 @@ class S3DocumentManager:
                         'centro_gestor': file_info.get('centro_gestor', '')
                     },
                     use_timestamp=use_timestamp
-                )
-                
-                if result['success']:
-                    successful_uploads.append(result)
-                else:
-                    failed_uploads.append(result)
-                    
+                )))
             except Exception as e:
                 logger.error(f"❌ Error procesando archivo {file_info.get('filename', 'unknown')}: {e}")
                 failed_uploads.append({
@@ -354,6 +298,15 @@ class S3DocumentManager:
                     'error': str(e)
                 })
         
+        results = S3UploadService(self.s3_client).upload_many(
+            [request for _, request in requests], skip_if_unchanged=not use_timestamp
+        )
+        for (file_info, _), uploaded in zip(requests, results):
+            if isinstance(uploaded, Exception):
+                failed_uploads.append(self._upload_error(file_info['filename'], uploaded))
+            else:
+                successful_uploads.append(self._upload_result(file_info['filename'], uploaded))
+        
         logger.info(f"📊 Subida completa - Exitosos: {len(successful_uploads)}, Fallidos: {len(failed_uploads)}")
         
         return successful_uploads, failed_uploads
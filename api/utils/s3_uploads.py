@@ -0,0 +1,271 @@
+"""
+Servicio compartido de subida a S3 y normalización de imágenes previa a la subida.
+
+- ``S3UploadService.upload_many`` sube en paralelo (``S3_UPLOAD_WORKERS`` hilos,
+  cliente compartido de ``s3_clients``) y conserva el orden de entrada.
+- Archivos desde ``S3_MULTIPART_THRESHOLD_MB`` se suben con
+  ``upload_fileobj`` (multipart automático, partes de ``S3_MULTIPART_CHUNK_MB``);
+  los menores con un único ``put_object``.
+- Cada objeto guarda su SHA-256 en el metadato ``content-sha256``:
+  dentro de un lote, cuerpos idénticos hacia el mismo bucket se suben una vez
+  (los repetidos reciben la clave del primero) y, con ``skip_if_unchanged``,
+  una clave que ya tiene ese mismo hash no se vuelve a subir.
+- ``normalize_images`` redimensiona y recodifica a JPEG en un pool de procesos
+  (``IMAGE_PROCESS_WORKERS``; 0 = en hilos) para no competir por el GIL con
+  las peticiones.
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from api.core.config import int_from_env
+from api.core.metrics import track_outbound
+
+logger = logging.getLogger(__name__)
+
+try:
+    from boto3.s3.transfer import TransferConfig
+
+    BOTO3_AVAILABLE = True
+except ImportError:
+    BOTO3_AVAILABLE = False
+
+try:
+    from PIL import Image, UnidentifiedImageError
+
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+
+S3_UPLOAD_WORKERS = max(1, int_from_env("S3_UPLOAD_WORKERS", 8))
+S3_MULTIPART_THRESHOLD_MB = max(5, int_from_env("S3_MULTIPART_THRESHOLD_MB", 8))
+S3_MULTIPART_CHUNK_MB = max(5, int_from_env("S3_MULTIPART_CHUNK_MB", 8))
+IMAGE_PROCESS_WORKERS = max(0, int_from_env("IMAGE_PROCESS_WORKERS", min(4, os.cpu_count() or 1)))
+
+_MB = 1024 * 1024
+SHA256_METADATA_KEY = "content-sha256"
+
+
+def content_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadRequest:
+    """Un objeto a subir; ``metadata`` debe ser ASCII (restricción de S3)."""
+
+    __slots__ = ("bucket", "key", "body", "content_type", "content_disposition", "metadata", "sha256")
+
+    def __init__(
+        self,
+        bucket: str,
+        key: str,
+        body: bytes,
+        content_type: str = "application/octet-stream",
+        content_disposition: Optional[str] = None,
+        metadata: Optional[Dict[str, str]] = None,
+    ):
+        self.bucket = bucket
+        self.key = key
+        self.body = body
+        self.content_type = content_type
+        self.content_disposition = content_disposition
+        self.metadata = dict(metadata or {})
+        self.sha256 = content_sha256(body)
+
+
+class S3UploadService:
+    """Subidas concurrentes con un cliente S3 compartido."""
+
+    def __init__(
+        self,
+        s3_client,
+        workers: int = S3_UPLOAD_WORKERS,
+        multipart_threshold: int = S3_MULTIPART_THRESHOLD_MB * _MB,
+        multipart_chunksize: int = S3_MULTIPART_CHUNK_MB * _MB,
+    ):
+        self.s3_client = s3_client
+        self.workers = max(1, workers)
+        self.multipart_threshold = multipart_threshold
+        self.multipart_chunksize = multipart_chunksize
+
+    def _extra_args(self, request: UploadRequest) -> Dict[str, Any]:
+        extra = {
+            "ContentType": request.content_type,
+            "Metadata": {**request.metadata, SHA256_METADATA_KEY: request.sha256},
+        }
+        if request.content_disposition:
+            extra["ContentDisposition"] = request.content_disposition
+        return extra
+
+    def _unchanged(self, request: UploadRequest) -> bool:
+        try:
+            head = self.s3_client.head_object(Bucket=request.bucket, Key=request.key)
+        except Exception:
+            return False
+        return (head.get("Metadata") or {}).get(SHA256_METADATA_KEY) == request.sha256
+
+    def upload(self, request: UploadRequest, skip_if_unchanged: bool = False) -> Dict[str, Any]:
+        """Sube un objeto; lanza la excepción de S3 si falla."""
+        result = {
+            "bucket": request.bucket,
+            "key": request.key,
+            "size": len(request.body),
+            "sha256": request.sha256,
+            "content_type": request.content_type,
+            "multipart": False,
+            "deduplicated": False,
+        }
+        if skip_if_unchanged and self._unchanged(request):
+            result["deduplicated"] = True
+            return result
+
+        extra = self._extra_args(request)
+        if len(request.body) >= self.multipart_threshold and BOTO3_AVAILABLE:
+            with track_outbound("s3", "upload_multipart"):
+                self._upload_multipart(request, extra)
+            result["multipart"] = True
+        else:
+            with track_outbound("s3", "put_object"):
+                self.s3_client.put_object(Bucket=request.bucket, Key=request.key, Body=request.body, **extra)
+        return result
+
+    def _upload_multipart(self, request: UploadRequest, extra: Dict[str, Any]) -> None:
+        self.s3_client.upload_fileobj(
+            io.BytesIO(request.body),
+            request.bucket,
+            request.key,
+            ExtraArgs=extra,
+            Config=TransferConfig(
+                multipart_threshold=self.multipart_threshold,
+                multipart_chunksize=self.multipart_chunksize,
+                max_concurrency=self.workers,
+                use_threads=True,
+            ),
+        )
+
+    def upload_many(
+        self, requests: Sequence[UploadRequest], skip_if_unchanged: bool = False
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        """
+        Sube ``requests`` en paralelo; cada posición trae el resultado o la excepción.
+
+        Varias peticiones al mismo objeto (bucket y key) se suben una sola vez:
+        se sube la última, como si se hubieran escrito en orden, y las demás
+        reciben su resultado con ``deduplicated=True``. Cuerpos iguales con
+        keys distintas se suben cada uno a su key.
+        """
+        results: List[Union[Dict[str, Any], Exception, None]] = [None] * len(requests)
+        last_by_key: Dict[Tuple[str, str], int] = {}
+        for i, request in enumerate(requests):
+            last_by_key[(request.bucket, request.key)] = i
+        unique = sorted(last_by_key.values())
+        duplicates = {
+            i: last_by_key[(request.bucket, request.key)]
+            for i, request in enumerate(requests)
+            if last_by_key[(request.bucket, request.key)] != i
+        }
+
+        def _run(i: int) -> None:
+            try:
+                results[i] = self.upload(requests[i], skip_if_unchanged=skip_if_unchanged)
+            except Exception as e:
+                logger.error(f"❌ Error subiendo s3://{requests[i].bucket}/{requests[i].key}: {e}")
+                results[i] = e
+
+        if len(unique) == 1:
+            _run(unique[0])
+        elif unique:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(unique))) as pool:
+                list(pool.map(_run, unique))
+
+        for i, origin in duplicates.items():
+            original = results[origin]
+            results[i] = original if isinstance(original, Exception) else {**original, "deduplicated": True}
+        return results  # type: ignore[return-value]
+
+    async def upload_many_async(
+        self, requests: Sequence[UploadRequest], skip_if_unchanged: bool = False
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        return await asyncio.to_thread(self.upload_many, requests, skip_if_unchanged)
+
+
+# ---------------------------------------------------------------------------
+# Normalización de imágenes
+# ---------------------------------------------------------------------------
+
+
+def normalize_image(data: bytes, max_size: int = 1280, quality: int = 72) -> bytes:
+    """Miniatura (lado mayor ``max_size``) en JPEG progresivo; ValueError si no es una imagen."""
+    if not PIL_AVAILABLE:
+        raise ImportError("Pillow no está instalado. Instalar con: pip install Pillow")
+    try:
+        image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        raise ValueError("No se reconoce como imagen válida")
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=quality, optimize=True, progressive=True, subsampling=2)
+    return buf.getvalue()
+
+
+_image_pool: Optional[ProcessPoolExecutor] = None
+_image_pool_lock = threading.Lock()
+
+
+def _get_image_pool() -> Optional[ProcessPoolExecutor]:
+    global _image_pool
+    if IMAGE_PROCESS_WORKERS <= 0:
+        return None
+    with _image_pool_lock:
+        if _image_pool is None:
+            _image_pool = ProcessPoolExecutor(max_workers=IMAGE_PROCESS_WORKERS)
+        return _image_pool
+
+
+def shutdown_image_pool() -> None:
+    global _image_pool
+    with _image_pool_lock:
+        if _image_pool is not None:
+            _image_pool.shutdown(wait=False, cancel_futures=True)
+            _image_pool = None
+
+
+async def _normalize_one(data: bytes, max_size: int, quality: int) -> bytes:
+    global _image_pool
+    pool = _get_image_pool()
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, normalize_image, data, max_size, quality)
+        except BrokenProcessPool:
+            logger.warning("Pool de imágenes caído; se procesa en hilo y se recrea en la próxima llamada")
+            with _image_pool_lock:
+                if _image_pool is pool:
+                    _image_pool = None
+    return await asyncio.to_thread(normalize_image, data, max_size, quality)
+
+
+async def normalize_images(
+    images: Sequence[bytes], max_size: int = 1280, quality: int = 72
+) -> List[Union[bytes, Exception]]:
+    """Normaliza en paralelo; imágenes idénticas se procesan una sola vez."""
+    tasks: Dict[str, "asyncio.Future"] = {}
+    keys = []
+    for data in images:
+        key = content_sha256(data)
+        keys.append(key)
+        if key not in tasks:
+            tasks[key] = asyncio.ensure_future(_normalize_one(data, max_size, quality))
+    done = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
+    return [done[key] for key in keys]
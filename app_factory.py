@@ -15,10 +15,10 @@ import asyncio
 import logging
 import os
 
-import anyio
 from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 from datetime import datetime
+from typing import List, Optional
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
@@ -27,6 +27,17 @@ from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from api.core.config import CORS_ORIGINS, CORS_ORIGIN_REGEX
+from api.core.metrics import MetricsStage
+from api.core.pipeline import (
+    BodySizeLimitStage,
+    CharsetStage,
+    RequestPipeline,
+    RouteTable,
+    Stage,
+    TimeoutStage,
+    TimingStage,
+)
+from api.core.serialization import FirestoreJSONResponse
 from api.core.security import (
     SLOWAPI_AVAILABLE,
     RateLimitExceeded,
@@ -153,18 +164,93 @@ except Exception as exc:
     logger.warning(f"notifications router not available: {exc}")
     _NOTIFICATIONS_AVAILABLE = False
 
+try:
+    from api.routers.jobs import router as jobs_router
+
+    _JOBS_AVAILABLE = True
+except Exception as exc:
+    logger.warning(f"jobs router not available: {exc}")
+    _JOBS_AVAILABLE = False
+
 
 # ---------------------------------------------------------------------------
 # Lifespan (startup / shutdown)
 # ---------------------------------------------------------------------------
 
 
+def _warm_snapshots_in_background() -> None:
+    """Precarga los snapshots de unidades/intervenciones sin bloquear el arranque."""
+    try:
+        from api.scripts.unidades_proyecto_snapshot import warm_unidades_snapshots
+
+        asyncio.get_running_loop().run_in_executor(None, warm_unidades_snapshots)
+    except Exception as exc:
+        logger.warning(f"Snapshot warm-up not started: {exc}")
+
+
+def _warm_basemaps_in_background() -> None:
+    """Precarga los índices espaciales de basemaps (STRtree) sin bloquear el arranque."""
+    try:
+        from api.scripts.basemap_engine import warm_basemaps
+
+        asyncio.get_running_loop().run_in_executor(None, warm_basemaps)
+    except Exception as exc:
+        logger.warning(f"Basemap warm-up not started: {exc}")
+
+
+def _instrument_firestore() -> None:
+    """Cuenta lecturas/escrituras de Firestore por colección y ruta en /metrics."""
+    try:
+        from api.core.metrics import instrument_firestore
+
+        instrument_firestore()
+    except Exception as exc:
+        logger.warning(f"Firestore metrics not enabled: {exc}")
+
+
+def _start_audit_sink() -> None:
+    """Arranca el sink de audit_logs: reproduce el spool que dejó el proceso anterior."""
+    try:
+        from auth_system.constants import FIREBASE_COLLECTIONS
+        from database.audit_sink import get_log_sink
+
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).start()
+    except Exception as exc:
+        logger.warning(f"Audit sink not started: {exc}")
+
+
+def _start_secop_mirror_refresh() -> Optional[asyncio.Task]:
+    """Lanza el refresco delta periódico del mirror SECOP/TVEC."""
+    try:
+        from api.scripts.secop_mirror import (
+            SECOP_MIRROR_ENABLED,
+            SECOP_MIRROR_REFRESH_SECONDS,
+            refrescar_mirror_periodicamente,
+        )
+
+        if SECOP_MIRROR_ENABLED and SECOP_MIRROR_REFRESH_SECONDS > 0:
+            return asyncio.get_running_loop().create_task(refrescar_mirror_periodicamente())
+    except Exception as exc:
+        logger.warning(f"SECOP mirror refresh not started: {exc}")
+    return None
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestionar ciclo de vida: inicializar Firebase al arrancar, cerrar executor al parar."""
     logger.info(
         f"API starting — port={os.getenv('PORT', '8000')} env={os.getenv('ENVIRONMENT', 'development')}"
     )
+    mirror_task = None
+
+    # Workers de trabajos en segundo plano (no dependen de Firebase para arrancar)
+    from api.core.jobs import JobWorkerPool
+
+    job_workers = JobWorkerPool()
+    try:
+        job_workers.start()
+    except Exception as exc:
+        logger.error(f"Job workers not started: {exc}")
 
     try:
         from database.firebase_config import (
@@ -176,6 +262,11 @@ async def lifespan(app: FastAPI):
             initialized, status = configure_firebase()
             if initialized:
                 logger.info("Firebase initialized successfully")
+                _instrument_firestore()
+                _start_audit_sink()
+                _warm_snapshots_in_background()
+                _warm_basemaps_in_background()
+                mirror_task = _start_secop_mirror_refresh()
             else:
                 error_msg = status.get("error", "Unknown error")
                 logger.error(f"Firebase init failed: {error_msg}")
@@ -197,7 +288,28 @@ async def lifespan(app: FastAPI):
     yield
 
     logger.info("API shutting down — cleaning up thread pools")
+    if mirror_task is not None:
+        mirror_task.cancel()
+    await job_workers.stop()
+    try:
+        from database.audit_sink import shutdown_log_sinks
+
+        await asyncio.to_thread(shutdown_log_sinks)
+    except Exception as exc:
+        logger.warning(f"Audit sink shutdown failed: {exc}")
     _ROUTE_AUTH_EXECUTOR.shutdown(wait=False)
+    try:
+        from api.core.metrics import mark_process_dead
+
+        mark_process_dead()
+    except Exception as exc:
+        logger.warning(f"Metrics cleanup failed: {exc}")
+    try:
+        from api.utils.s3_uploads import shutdown_image_pool
+
+        shutdown_image_pool()
+    except Exception as exc:
+        logger.warning(f"Image pool shutdown failed: {exc}")
 
 
 # ---------------------------------------------------------------------------
@@ -228,100 +340,71 @@ async def global_exception_handler(request: Request, exc: Exception):
 # ---------------------------------------------------------------------------
 
 
-async def _utf8_middleware(request: Request, call_next):
-    response = await call_next(request)
-    if response.headers.get("content-type", "").startswith("application/json"):
-        response.headers["content-type"] = "application/json; charset=utf-8"
-    return response
-
-
 MAX_REQUEST_BODY_SIZE = 50 * 1024 * 1024  # 50 MB
 
+# Timeout por endpoint (segundos hasta el inicio de la respuesta).
+# Las sincronizaciones SECOP y el análisis de calidad corren como trabajos
+# en segundo plano (api.core.jobs): sus endpoints responden 202 al instante.
+REQUEST_TIMEOUTS = RouteTable(
+    [
+        ("/calidad-datos/", 120.0),
+        ("/unidades-proyecto/importar/", 90.0),
+    ],
+    default=30.0,
+)
 
-async def _body_size_limit(request: Request, call_next):
-    content_length = request.headers.get("content-length")
-    if content_length and int(content_length) > MAX_REQUEST_BODY_SIZE:
-        return JSONResponse(
-            status_code=413,
-            content={
-                "success": False,
-                "error": "Request body too large",
-                "message": f"Tamano maximo permitido: {MAX_REQUEST_BODY_SIZE // (1024 * 1024)} MB",
-                "code": "PAYLOAD_TOO_LARGE",
-            },
-        )
-    return await call_next(request)
-
-
-import time as _time
-
-
-async def _performance_middleware(request: Request, call_next):
-    start = _time.time()
-    response = await call_next(request)
-    elapsed = _time.time() - start
-    response.headers["X-Process-Time"] = f"{elapsed:.3f}"
-    response.headers["X-Content-Type-Options"] = "nosniff"
-
-    # Cache hint para endpoints de lectura estables
-    _cacheable_paths = [
-        "/centros-gestores/",
-        "/firebase/collections",
-        "/proyectos-presupuestales/",
-        "/unidades-proyecto/filters",
+# Cache hint para endpoints de lectura estables (GET 200)
+CACHE_CONTROL_ROUTES = RouteTable(
+    [
+        ("/centros-gestores/", "public, max-age=300"),
+        ("/firebase/collections", "public, max-age=300"),
+        ("/proyectos-presupuestales/", "public, max-age=300"),
+        ("/unidades-proyecto/filters", "public, max-age=300"),
     ]
-    if request.method == "GET" and response.status_code == 200:
-        if any(p in request.url.path for p in _cacheable_paths):
-            response.headers["Cache-Control"] = "public, max-age=300"
-    return response
-
-
-async def _timeout_middleware(request: Request, call_next):
-    """Timeout por endpoint — evita colgadas indefinidas."""
-    path = request.url.path
-    if path == "/emprestito/obtener-procesos-secop":
-        timeout = 300.0
-    elif path in ("/emprestito/obtener-contratos-secop",):
-        timeout = 120.0
-    elif path == "/unidades-proyecto/calidad-datos/analizar":
-        timeout = 600.0
-    elif "/intervenciones/sincronizar" in path:
-        timeout = 600.0
-    elif "/calidad-datos/" in path:
-        timeout = 120.0
-    elif "/unidades-proyecto/importar/" in path:
-        timeout = 90.0
-    else:
-        timeout = 30.0
+)
 
+AUTH_PUBLIC_PATHS = [
+    "/",
+    "/docs",
+    "/openapi.json",
+    "/redoc",
+    "/ping",
+    "/health",
+    "/cors-test",
+    "/test/utf8",
+    "/debug/railway",
+    "/metrics",
+    "/auth/login",
+    "/auth/register",
+    "/auth/google",
+    "/auth/config",
+    "/auth/validate-session",
+    "/auth/forgot-password",
+    "/auth/workload-identity/status",
+    "/centros-gestores",
+    "/unidades-proyecto/captura-estado-360",
+]
+
+
+def _pipeline_stages() -> List[Stage]:
+    """Etapas del pipeline de peticiones, en orden de ejecución."""
+    stages: List[Stage] = [MetricsStage(), BodySizeLimitStage(MAX_REQUEST_BODY_SIZE)]
     try:
-        with anyio.fail_after(timeout):
-            return await call_next(request)
-    except TimeoutError:
-        return JSONResponse(
-            status_code=504,
-            content={
-                "error": "Request timeout",
-                "message": f"La peticion tardó mas de {timeout}s",
-                "endpoint": path,
-                "timestamp": datetime.now().isoformat(),
-            },
-        )
-    except Exception as _exc:
-        logger.error(
-            "_timeout_middleware caught exception for %s %s: %s",
-            request.method,
-            path,
-            _exc,
-            exc_info=True,
-        )
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": "Internal server error",
-                "timestamp": datetime.now().isoformat(),
-            },
-        )
+        from auth_system.middleware import AuthorizationMiddleware, AuditLogMiddleware
+
+        stages.append(AuthorizationMiddleware(public_paths=AUTH_PUBLIC_PATHS))
+        stages.append(AuditLogMiddleware(enable_logging=True))
+        logger.info("Authorization middleware enabled")
+    except Exception as exc:
+        logger.warning(f"Auth middleware not available: {exc}")
+    stages.extend(
+        [
+            TimeoutStage(REQUEST_TIMEOUTS),
+            TimingStage(CACHE_CONTROL_ROUTES),
+            CharsetStage(),
+        ]
+    )
+    return stages
 
 
 # ---------------------------------------------------------------------------
@@ -333,10 +416,12 @@ def create_app() -> FastAPI:
     """
     Crea y configura la instancia FastAPI completa.
 
-    - Middlewares: UTF-8, body-size, performance, timeout, CORS, GZip, Auth
+    - Middlewares: GZip, CORS y el pipeline de peticiones (body-size, auth,
+      auditoría, timeout, tiempos/cache, UTF-8)
     - Exception handlers: global, rate-limit
     - Routers: core, general, proyectos, auth_routes, unidades_proyecto,
-                interoperabilidad, emprestito, auth_admin, emprestito_quality, captura_360
+                interoperabilidad, emprestito, auth_admin, emprestito_quality, captura_360,
+                jobs
     - Static files: /static (si existe)
 
     Returns:
@@ -347,6 +432,7 @@ def create_app() -> FastAPI:
         description="API para gestion de proyectos con Firebase/Firestore — UTF-8 completo",
         version="2.0.0",
         lifespan=lifespan,
+        default_response_class=FirestoreJSONResponse,
         swagger_ui_parameters={
             "defaultModelsExpandDepth": 1,
             "displayRequestDuration": True,
@@ -364,11 +450,10 @@ def create_app() -> FastAPI:
     # -- Global exception handler --
     app.add_exception_handler(Exception, global_exception_handler)
 
-    # -- Middlewares (order matters — outermost first) --
-    app.middleware("http")(_timeout_middleware)
-    app.middleware("http")(_performance_middleware)
-    app.middleware("http")(_body_size_limit)
-    app.middleware("http")(_utf8_middleware)
+    # -- Middlewares (add_middleware: el último agregado queda más afuera) --
+    # Un solo pipeline ASGI (tamaño, auth, auditoría, timeout, cabeceras)
+    # dentro de CORS, para que los 401/413 también lleven cabeceras CORS.
+    app.add_middleware(RequestPipeline, stages=_pipeline_stages())
 
     # CORS
     app.add_middleware(
@@ -398,37 +483,6 @@ def create_app() -> FastAPI:
     # GZip
     app.add_middleware(GZipMiddleware, minimum_size=1000)
 
-    # Auth middleware
-    try:
-        from auth_system.middleware import AuthorizationMiddleware, AuditLogMiddleware
-
-        public_paths = [
-            "/",
-            "/docs",
-            "/openapi.json",
-            "/redoc",
-            "/ping",
-            "/health",
-            "/cors-test",
-            "/test/utf8",
-            "/debug/railway",
-            "/metrics",
-            "/auth/login",
-            "/auth/register",
-            "/auth/google",
-            "/auth/config",
-            "/auth/validate-session",
-            "/auth/forgot-password",
-            "/auth/workload-identity/status",
-            "/centros-gestores",
-            "/unidades-proyecto/captura-estado-360",
-        ]
-        app.add_middleware(AuthorizationMiddleware, public_paths=public_paths)
-        app.add_middleware(AuditLogMiddleware, enable_logging=True)
-        logger.info("Authorization middleware enabled")
-    except Exception as exc:
-        logger.warning(f"Auth middleware not available: {exc}")
-
     # -- Routers —  order: specific prefixed routers first --
     if _PROYECTOS_AVAILABLE:
         app.include_router(proyectos_router)
@@ -478,6 +532,10 @@ def create_app() -> FastAPI:
         app.include_router(notifications_router)
         logger.info("Router included: notifications")
 
+    if _JOBS_AVAILABLE:
+        app.include_router(jobs_router)
+        logger.info("Router included: jobs")
+
     # -- Static files --
     static_path = os.path.join(os.path.dirname(__file__), "static")
     if os.path.isdir(static_path):
@@ -32,6 +32,18 @@ from .decorators import (
     get_current_user
 )
 
+from .auth_cache import (
+    verify_id_token_cached,
+    invalidate_user_cache,
+    get_auth_cache_stats
+)
+
+from .user_directory import (
+    UserDirectory,
+    get_user_directory,
+    invalidate_user_directory
+)
+
 from .middleware import (
     AuthorizationMiddleware,
     AuditLogMiddleware
@@ -62,6 +74,16 @@ __all__ = [
     "require_role",
     "get_current_user",
     
+    # Caché de autenticación
+    "verify_id_token_cached",
+    "invalidate_user_cache",
+    "get_auth_cache_stats",
+    
+    # Directorio de usuarios
+    "UserDirectory",
+    "get_user_directory",
+    "invalidate_user_directory",
+    
     # Middleware
     "AuthorizationMiddleware",
     "AuditLogMiddleware"
@@ -0,0 +1,324 @@
+"""
+Caché de Autenticación
+Verificación de ID tokens de Firebase con certificados cacheados localmente y
+cachés TTL para tokens ya verificados y para usuario+permisos.
+
+- Tokens: la clave es el SHA-256 del token (nunca el token en claro) y cada
+  entrada vence en el ``exp`` del propio token, así que un token expirado
+  nunca se sirve desde caché.
+- Firma: con PyJWT se verifica el RS256 localmente contra los certificados
+  públicos de ``securetoken`` (cacheados según su ``Cache-Control``). Si la
+  verificación local no es concluyente se delega en ``auth.verify_id_token``,
+  que sigue siendo la fuente de los errores ``InvalidIdTokenError``.
+- Usuarios: documento ``users/{uid}`` + permisos efectivos por
+  ``AUTH_USER_CACHE_TTL_SECONDS`` (acotado además por el vencimiento del
+  próximo permiso temporal). ``invalidate_user_cache`` lo descarta cuando
+  ``auth_admin`` cambia roles, centro gestor o permisos (y marca el usuario
+  en el directorio de ``user_directory``); en despliegues con
+  varios workers el TTL acota la ventana de inconsistencia entre procesos.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+from api.core.config import bool_from_env, int_from_env
+
+from .constants import FIREBASE_COLLECTIONS
+from .permissions import get_user_permissions
+from .user_directory import invalidate_user_directory
+
+try:
+    import jwt
+    import requests
+    from cryptography.x509 import load_pem_x509_certificate
+
+    LOCAL_JWT_AVAILABLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    LOCAL_JWT_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+AUTH_CACHE_ENABLED = bool_from_env("AUTH_CACHE_ENABLED", True)
+AUTH_TOKEN_CACHE_MAX_SIZE = int_from_env("AUTH_TOKEN_CACHE_MAX_SIZE", 10000)
+AUTH_USER_CACHE_TTL_SECONDS = int_from_env("AUTH_USER_CACHE_TTL_SECONDS", 60)
+AUTH_USER_CACHE_MAX_SIZE = int_from_env("AUTH_USER_CACHE_MAX_SIZE", 5000)
+
+# Certificados X.509 con los que Firebase Auth firma los ID tokens
+FIREBASE_CERTS_URL = (
+    "https://www.googleapis.com/robot/v1/metadata/x509/"
+    "securetoken@system.gserviceaccount.com"
+)
+_CERTS_DEFAULT_TTL_SECONDS = 3600
+_CERTS_FETCH_TIMEOUT_SECONDS = 5
+
+
+class _ExpiringLRU:
+    """LRU acotado cuyas entradas vencen en un instante absoluto (``time.time()``)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        with self.lock:
+            self.entries[key] = (value, expires_at)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def pop(self, key: str) -> bool:
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+_token_cache = _ExpiringLRU(AUTH_TOKEN_CACHE_MAX_SIZE)
+_user_cache = _ExpiringLRU(AUTH_USER_CACHE_MAX_SIZE)
+# Generación por uid: una lectura que empezó antes de una invalidación no
+# puede volver a guardar el documento viejo.
+_user_generations: Dict[str, int] = {}
+_generations_lock = threading.Lock()
+
+_certs_lock = threading.Lock()
+_certs: Dict[str, Any] = {"keys": {}, "expires_at": 0.0}
+
+_stats = {"token_hits": 0, "token_misses": 0, "local_verifications": 0, "user_hits": 0, "user_misses": 0}
+
+
+# ---------------------------------------------------------------------------
+# Verificación de tokens
+# ---------------------------------------------------------------------------
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return int(match.group(1)) if match else _CERTS_DEFAULT_TTL_SECONDS
+
+
+def _public_keys() -> Dict[str, Any]:
+    """Llaves públicas por ``kid``; se descargan de nuevo al vencer su ``max-age``."""
+    with _certs_lock:
+        if _certs["expires_at"] > time.time():
+            return _certs["keys"]
+        response = requests.get(FIREBASE_CERTS_URL, timeout=_CERTS_FETCH_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        _certs["keys"] = {
+            kid: load_pem_x509_certificate(pem.encode("utf-8")).public_key()
+            for kid, pem in response.json().items()
+        }
+        _certs["expires_at"] = time.time() + _max_age(response.headers.get("Cache-Control", ""))
+        return _certs["keys"]
+
+
+def _project_id() -> Optional[str]:
+    project_id = os.getenv("FIREBASE_PROJECT_ID")
+    if project_id:
+        return project_id
+    try:
+        from database.firebase_config import PROJECT_ID
+
+        return PROJECT_ID
+    except Exception:
+        return None
+
+
+def _verify_locally(token: str) -> Optional[Dict[str, Any]]:
+    """Verifica firma y claims como ``auth.verify_id_token``; None si no es concluyente."""
+    if not LOCAL_JWT_AVAILABLE or os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+        return None
+    project_id = _project_id()
+    if not project_id:
+        return None
+    try:
+        header = jwt.get_unverified_header(token)
+        if header.get("alg") != "RS256":
+            return None
+        key = _public_keys().get(header.get("kid"))
+        if key is None:
+            return None
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=["RS256"],
+            audience=project_id,
+            issuer=f"https://securetoken.google.com/{project_id}",
+            options={"require": ["exp", "iat", "sub"]},
+        )
+    except Exception as exc:
+        logger.debug("Verificación local de token no concluyente: %s", exc)
+        return None
+
+    subject = claims.get("sub")
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        return None
+    claims["uid"] = subject
+    _stats["local_verifications"] += 1
+    return claims
+
+
+def get_cached_token(token: str) -> Optional[Dict[str, Any]]:
+    """Claims de un token ya verificado y aún vigente, sin bloquear (None si no está)."""
+    if not AUTH_CACHE_ENABLED:
+        return None
+    decoded = _token_cache.get(_token_key(token))
+    if decoded is None:
+        return None
+    _stats["token_hits"] += 1
+    return dict(decoded)
+
+
+def verify_id_token_cached(token: str) -> Dict[str, Any]:
+    """
+    Equivalente cacheado de ``firebase_admin.auth.verify_id_token``.
+
+    Es síncrono (puede descargar certificados): llamarlo desde un executor.
+
+    Raises:
+        auth.InvalidIdTokenError: Igual que ``verify_id_token``.
+    """
+    cached = get_cached_token(token)
+    if cached is not None:
+        return cached
+    _stats["token_misses"] += 1
+
+    decoded = _verify_locally(token)
+    if decoded is None:
+        from firebase_admin import auth
+
+        decoded = auth.verify_id_token(token)
+
+    exp = decoded.get("exp")
+    if AUTH_CACHE_ENABLED and isinstance(exp, (int, float)) and exp > time.time():
+        _token_cache.set(_token_key(token), dict(decoded), float(exp))
+    return dict(decoded)
+
+
+# ---------------------------------------------------------------------------
+# Usuario + permisos
+# ---------------------------------------------------------------------------
+
+
+def _user_expiry(user_data: Dict[str, Any]) -> float:
+    """TTL del usuario, recortado al vencimiento del próximo permiso temporal."""
+    expires_at = time.time() + AUTH_USER_CACHE_TTL_SECONDS
+    now = datetime.now(timezone.utc)
+    for temp_perm in user_data.get("temporary_permissions") or []:
+        perm_expiry = temp_perm.get("expires_at") if isinstance(temp_perm, dict) else None
+        if isinstance(perm_expiry, datetime) and perm_expiry.tzinfo and perm_expiry > now:
+            expires_at = min(expires_at, perm_expiry.timestamp())
+    return expires_at
+
+
+def _copy_user(user_data: Dict[str, Any]) -> Dict[str, Any]:
+    copy = dict(user_data)
+    copy["permissions"] = list(user_data.get("permissions", []))
+    return copy
+
+
+def get_cached_user(user_uid: str, db_client=None) -> Optional[Dict[str, Any]]:
+    """
+    Documento ``users/{uid}`` con ``uid`` y ``permissions`` agregados.
+
+    Args:
+        user_uid: UID del usuario
+        db_client: Cliente de Firestore (opcional)
+
+    Returns:
+        Copia mutable del usuario, ``{}`` si el documento está vacío o
+        ``None`` si no existe. Solo se cachean documentos no vacíos.
+    """
+    if AUTH_CACHE_ENABLED:
+        cached = _user_cache.get(user_uid)
+        if cached is not None:
+            _stats["user_hits"] += 1
+            return _copy_user(cached)
+    _stats["user_misses"] += 1
+
+    with _generations_lock:
+        generation = _user_generations.get(user_uid, 0)
+
+    if db_client is None:
+        from database.firebase_config import get_firestore_client
+
+        db_client = get_firestore_client()
+
+    user_doc = db_client.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
+    if not user_doc.exists:
+        return None
+    user_data = user_doc.to_dict()
+    if not user_data:
+        return {}
+
+    user_data["uid"] = user_uid
+    # Se pasa user_data ya cargado para no releer el mismo documento
+    user_data["permissions"] = get_user_permissions(user_uid, db_client, user_data=user_data)
+
+    if AUTH_CACHE_ENABLED:
+        with _generations_lock:
+            if _user_generations.get(user_uid, 0) == generation:
+                _user_cache.set(user_uid, _copy_user(user_data), _user_expiry(user_data))
+    return user_data
+
+
+def invalidate_user_cache(user_uid: str) -> None:
+    """Descarta el usuario cacheado (llamar tras cambiar roles, permisos o estado)."""
+    with _generations_lock:
+        _user_generations[user_uid] = _user_generations.get(user_uid, 0) + 1
+        _user_cache.pop(user_uid)
+    invalidate_user_directory(user_uid)
+    logger.debug("Caché de usuario invalidada: %s", user_uid)
+
+
+def clear_auth_cache() -> None:
+    """Vacía tokens, usuarios y certificados cacheados."""
+    _token_cache.clear()
+    with _generations_lock:
+        for uid in list(_user_cache.entries):
+            _user_generations[uid] = _user_generations.get(uid, 0) + 1
+        _user_cache.clear()
+    with _certs_lock:
+        _certs["keys"] = {}
+        _certs["expires_at"] = 0.0
+
+
+def get_auth_cache_stats() -> Dict[str, Any]:
+    """Tamaños y contadores de las cachés de autenticación."""
+    return {
+        "enabled": AUTH_CACHE_ENABLED,
+        "local_jwt_available": LOCAL_JWT_AVAILABLE,
+        "tokens": len(_token_cache),
+        "users": len(_user_cache),
+        "user_ttl_seconds": AUTH_USER_CACHE_TTL_SECONDS,
+        **_stats,
+    }
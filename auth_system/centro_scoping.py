@@ -33,6 +33,12 @@ def _match_key(value: Any) -> str:
     return normalize_centro(canonicalize_centro(value) or value)
 
 
+def centro_match_key(value: Any) -> str:
+    """Clave canónica de ``value`` para indexar por centro (``same_centro(a, b)``
+    equivale a ``centro_match_key(a) == centro_match_key(b)``)."""
+    return _match_key(value)
+
+
 def same_centro(a: Any, b: Any) -> bool:
     """True si ``a`` y ``b`` refieren al mismo centro gestor (comparación canónica).
 
@@ -8,12 +8,12 @@ from functools import wraps
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List, Optional, Tuple
+from .auth_cache import get_cached_user, verify_id_token_cached
 from .permissions import (
     get_user_permissions,
     validate_permission,
     has_role as check_has_role,
 )
-from .constants import FIREBASE_COLLECTIONS
 from .centros_catalog import canonicalize_centro, normalize_centro
 
 import logging
@@ -71,27 +71,24 @@ async def get_current_user(
             token = credentials.credentials
             loop = asyncio.get_event_loop()
             decoded_token = await loop.run_in_executor(
-                None, auth.verify_id_token, token
+                None, verify_id_token_cached, token
             )
             user_uid = decoded_token["uid"]
 
-        # Obtener datos completos del usuario desde Firestore
-        db = get_firestore_client()
-        user_doc = db.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
+        # Documento del usuario + permisos (caché TTL, ver auth_cache)
+        user_data = get_cached_user(user_uid, get_firestore_client())
 
-        if not user_doc.exists:
+        if user_data is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado en la base de datos",
             )
 
-        user_data = user_doc.to_dict()
         if not user_data:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Documento de usuario inválido o vacío",
             )
-        user_data["uid"] = user_uid
 
         # Verificar que el usuario esté activo
         if not user_data.get("is_active", True):
@@ -99,13 +96,6 @@ async def get_current_user(
                 status_code=status.HTTP_403_FORBIDDEN, detail="Usuario inactivo"
             )
 
-        # Agregar permisos al objeto de usuario.
-        # Pasamos user_data ya cargado para evitar que get_user_permissions
-        # haga una segunda lectura del mismo documento.
-        user_data["permissions"] = get_user_permissions(
-            user_uid, db, user_data=user_data
-        )
-
         return user_data
 
     except auth.InvalidIdTokenError:
@@ -220,23 +210,18 @@ def optional_auth():
 
             token = auth_header.split(" ")[1]
 
-            from firebase_admin import auth
             from database.firebase_config import get_firestore_client
 
-            decoded_token = auth.verify_id_token(token)
+            decoded_token = verify_id_token_cached(token)
             user_uid = decoded_token["uid"]
 
             db = get_firestore_client()
-            user_doc = (
-                db.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
-            )
+            user_data = get_cached_user(user_uid, db)
 
-            if not user_doc.exists:
+            if user_data is None:
                 return None
-
-            user_data = user_doc.to_dict()
-            user_data["uid"] = user_uid
-            user_data["permissions"] = get_user_permissions(user_uid, db)
+            if not user_data:
+                user_data = {"uid": user_uid, "permissions": get_user_permissions(user_uid, db)}
 
             return user_data
 
@@ -268,15 +253,14 @@ async def get_user_with_permissions(request: Request) -> dict:
         from database.firebase_config import get_firestore_client
 
         db = get_firestore_client()
-        user_doc = db.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
-        if not user_doc.exists:
+        user_data = get_cached_user(user_uid, db)
+        if user_data is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Usuario no encontrado",
             )
-        user_data = user_doc.to_dict() or {}
-        user_data["uid"] = user_uid
-        user_data["permissions"] = get_user_permissions(user_uid, db)
+        if not user_data:
+            user_data = {"uid": user_uid, "permissions": get_user_permissions(user_uid, db)}
         return user_data
     except HTTPException:
         raise
@@ -1,41 +1,44 @@
 """
 Middlewares de Autenticación y Auditoría
-Middlewares para verificación de tokens y logging de acciones
+Etapas del pipeline ASGI (api.core.pipeline) para verificación de tokens y
+logging de acciones.
+
+La autorización corre antes que la auditoría, de modo que el UID verificado
+ya está en ``request.state`` cuando se registra la acción.
 """
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
 from starlette.responses import Response, JSONResponse
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timezone
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
 import logging
-import time
 
+from api.core.pipeline import RequestContext, Stage
+from database.audit_sink import get_log_sink
+from .auth_cache import get_cached_token, verify_id_token_cached
 from .constants import PUBLIC_PATHS, FIREBASE_COLLECTIONS
 
 logger = logging.getLogger(__name__)
 
 # Dedicated thread pool for middleware Firebase calls.
 # Keeps gRPC zombie threads (300s retries on 429) isolated from
-# the default asyncio executor so call_next / other I/O stays healthy.
+# the default asyncio executor so the app / other I/O stays healthy.
 _middleware_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="mw-fb")
 
 
-class AuthorizationMiddleware(BaseHTTPMiddleware):
+class AuthorizationMiddleware(Stage):
     """
-    Middleware para verificación de autenticación en todas las rutas
+    Etapa de verificación de autenticación en todas las rutas
     excepto las rutas públicas definidas
     """
 
-    def __init__(self, app, public_paths: List[str] = None):
-        super().__init__(app)
+    def __init__(self, public_paths: List[str] = None):
         self.public_paths = public_paths or PUBLIC_PATHS
 
-    async def dispatch(self, request: Request, call_next):
+    async def before(self, ctx: RequestContext) -> Optional[Response]:
         # Verificar si la ruta es pública
-        path = request.url.path
+        path = ctx.path
 
         # Permitir acceso a rutas públicas.
         # IMPORTANTE: para "/" exigimos coincidencia exacta; para el resto,
@@ -55,10 +58,10 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
         is_public = _is_public(path)
 
         if is_public:
-            return await call_next(request)
+            return None
 
         # Verificar presencia de token de autorización
-        auth_header = request.headers.get("Authorization")
+        auth_header = ctx.headers.get("Authorization")
 
         if not auth_header or not auth_header.startswith("Bearer "):
             return JSONResponse(
@@ -73,20 +76,23 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
             # Extraer token
             token = auth_header.split(" ")[1]
 
-            # Verificar token en DEDICATED thread pool + asyncio.wait_for.
+            # Token ya verificado y vigente: se resuelve sin salir del event loop.
+            # En un miss se verifica en DEDICATED thread pool + asyncio.wait_for.
             # run_in_executor(dedicated_pool) keeps gRPC retries off the
             # default executor.  await + wait_for yields to the event loop
             # so /ping and other requests are not blocked.
             from firebase_admin import auth
 
             try:
-                loop = asyncio.get_running_loop()
-                decoded_token = await asyncio.wait_for(
-                    loop.run_in_executor(
-                        _middleware_executor, auth.verify_id_token, token
-                    ),
-                    timeout=15.0,
-                )
+                decoded_token = get_cached_token(token)
+                if decoded_token is None:
+                    loop = asyncio.get_running_loop()
+                    decoded_token = await asyncio.wait_for(
+                        loop.run_in_executor(
+                            _middleware_executor, verify_id_token_cached, token
+                        ),
+                        timeout=15.0,
+                    )
             except asyncio.TimeoutError:
                 logger.warning("middleware: verify_id_token timed out for %s", path)
                 return JSONResponse(
@@ -98,12 +104,9 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
                 )
 
             # Agregar UID del usuario al request state para uso posterior
-            request.state.user_uid = decoded_token["uid"]
-            request.state.user_email = decoded_token.get("email")
-
-            # Continuar con el request
-            response = await call_next(request)
-            return response
+            ctx.state["user_uid"] = decoded_token["uid"]
+            ctx.state["user_email"] = decoded_token.get("email")
+            return None
 
         except auth.InvalidIdTokenError:
             return JSONResponse(
@@ -124,13 +127,12 @@ class AuthorizationMiddleware(BaseHTTPMiddleware):
             )
 
 
-class AuditLogMiddleware(BaseHTTPMiddleware):
+class AuditLogMiddleware(Stage):
     """
-    Middleware para registrar todas las acciones importantes en audit_logs
+    Etapa para registrar todas las acciones importantes en audit_logs
     """
 
-    def __init__(self, app, enable_logging: bool = True):
-        super().__init__(app)
+    def __init__(self, enable_logging: bool = True):
         self.enable_logging = enable_logging
 
         # Métodos que queremos auditar
@@ -139,74 +141,52 @@ class AuditLogMiddleware(BaseHTTPMiddleware):
         # Rutas que no queremos auditar (demasiado frecuentes)
         self.skip_paths = ["/health", "/ping", "/metrics", "/docs", "/openapi.json"]
 
-    async def dispatch(self, request: Request, call_next):
+    async def after(self, ctx: RequestContext) -> None:
         # Si el logging está deshabilitado, saltar
         if not self.enable_logging:
-            return await call_next(request)
+            return
 
         # Verificar si debemos auditar este request
-        should_audit = request.method in self.audit_methods and not any(
-            request.url.path.startswith(skip) for skip in self.skip_paths
+        should_audit = ctx.method in self.audit_methods and not any(
+            ctx.path.startswith(skip) for skip in self.skip_paths
         )
-
         if not should_audit:
-            return await call_next(request)
-
-        # Datos del request
-        start_time = time.time()
-        user_uid = getattr(request.state, "user_uid", None)
-        user_email = getattr(request.state, "user_email", None)
-
-        # Procesar request
-        response = await call_next(request)
-
-        # Calcular tiempo de procesamiento
-        process_time = time.time() - start_time
+            return
 
         # Registrar en audit_logs si el usuario está autenticado
-        if user_uid:
-            try:
-                from database.firebase_config import get_firestore_client
-
-                db = get_firestore_client()
-
-                # Crear entrada de log
-                log_entry = {
-                    "timestamp": datetime.now(timezone.utc),
-                    "user_uid": user_uid,
-                    "user_email": user_email,
-                    "method": request.method,
-                    "endpoint": request.url.path,
-                    "query_params": dict(request.query_params),
-                    "status_code": response.status_code,
-                    "process_time_seconds": round(process_time, 3),
-                    "client_host": request.client.host if request.client else None,
-                    "user_agent": request.headers.get("user-agent", "")[:200],
-                }
-
-                # Agregar detalles de la acción basados en el endpoint
-                log_entry["action"] = self._infer_action(
-                    request.method, request.url.path
-                )
-
-                # Fire-and-forget en dedicated thread pool — NO bloquea event loop
-                def _write_log():
-                    db.collection(FIREBASE_COLLECTIONS["audit_logs"]).add(log_entry)
+        user_uid = ctx.state.get("user_uid")
+        if not user_uid:
+            return
 
-                def _on_log_done(future):
-                    exc = future.exception()
-                    if exc:
-                        logger.error(
-                            "Error escribiendo audit log en Firestore: %s", exc
-                        )
-
-                _middleware_executor.submit(_write_log).add_done_callback(_on_log_done)
+        try:
+            request = ctx.request
+
+            # Crear entrada de log
+            log_entry = {
+                "timestamp": datetime.now(timezone.utc),
+                "user_uid": user_uid,
+                "user_email": ctx.state.get("user_email"),
+                "method": ctx.method,
+                "endpoint": ctx.path,
+                "query_params": dict(request.query_params),
+                "status_code": ctx.status_code,
+                "process_time_seconds": round(ctx.elapsed, 3),
+                "client_host": request.client.host if request.client else None,
+                "user_agent": ctx.headers.get("user-agent", "")[:200],
+            }
+
+            # Agregar detalles de la acción basados en el endpoint
+            log_entry["action"] = self._infer_action(ctx.method, ctx.path)
+
+            self._submit(log_entry)
 
-            except Exception as e:
-                # No fallar el request si falla el logging
-                logger.warning("Error registrando audit log: %s", e)
+        except Exception as e:
+            # No fallar el request si falla el logging
+            logger.warning("Error registrando audit log: %s", e)
 
-        return response
+    def _submit(self, log_entry: dict) -> None:
+        """Encola en el sink por lotes — NO bloquea event loop ni ocupa executors"""
+        get_log_sink(FIREBASE_COLLECTIONS["audit_logs"]).add(log_entry)
 
     def _infer_action(self, method: str, path: str) -> str:
         """Inferir la acción basándose en el método y ruta"""
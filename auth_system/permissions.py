@@ -6,6 +6,7 @@ Funciones para gestión y verificación de permisos de usuarios
 from typing import List, Dict, Optional
 from datetime import datetime, timezone
 from .constants import ROLES, ROLE_HIERARCHY, FIREBASE_COLLECTIONS
+from .user_directory import get_user_directory
 
 
 def _normalize_roles(raw_roles) -> List[str]:
@@ -214,20 +215,12 @@ def has_role(user_uid: str, role: str, db_client=None) -> bool:
     Returns:
         True si tiene el rol, False en caso contrario
     """
-    if db_client is None:
-        from database.firebase_config import get_firestore_client
-
-        db_client = get_firestore_client()
-
     try:
-        user_doc = (
-            db_client.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
-        )
+        user_data = get_user_directory().get(user_uid, db_client)
 
-        if not user_doc.exists:
+        if user_data is None:
             return False
 
-        user_data = user_doc.to_dict()
         user_roles = user_data.get("roles", [])
 
         return role in user_roles
@@ -275,20 +268,12 @@ def get_user_role_level(user_uid: str, db_client=None) -> int:
     Returns:
         Nivel jerárquico (0 = máximo, 6 = mínimo)
     """
-    if db_client is None:
-        from database.firebase_config import get_firestore_client
-
-        db_client = get_firestore_client()
-
     try:
-        user_doc = (
-            db_client.collection(FIREBASE_COLLECTIONS["users"]).document(user_uid).get()
-        )
+        user_data = get_user_directory().get(user_uid, db_client)
 
-        if not user_doc.exists:
+        if user_data is None:
             return 999  # Sin rol
 
-        user_data = user_doc.to_dict()
         user_roles = user_data.get("roles", [])
 
         if not user_roles:
@@ -0,0 +1,312 @@
+"""
+Directorio de Usuarios
+Copia en memoria de la colección ``users`` con índices por uid, email en
+minúsculas, centro gestor normalizado y rol, para que la resolución de
+audiencias, los listados administrativos y los helpers RBAC no recorran
+``users`` en cada petición.
+
+- Se carga una vez y se mantiene fresco con un ``on_snapshot`` sobre ``users``
+  (``USER_DIRECTORY_LISTENER``) o, sin listener, recargando cuando pasan
+  ``USER_DIRECTORY_TTL_SECONDS``.
+- ``invalidate(uid)`` (lo llama ``invalidate_user_cache``) marca un usuario
+  para releerlo en la próxima consulta; un uid que no está en el directorio se
+  lee directamente, así un usuario recién creado nunca queda "invisible".
+- Centro gestor: clave ``normalize_centro`` del nombre canónico (o del valor
+  crudo si no está en el catálogo), tomada de ``nombre_centro_gestor``,
+  ``centro_gestor_assigned`` o ``centro_gestor``.
+- Roles: ``roles`` (lista o string) más ``role``/``rol``, en minúsculas.
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from api.core.config import bool_from_env, int_from_env
+
+from .centros_catalog import canonicalize_centro, normalize_centro
+from .constants import FIREBASE_COLLECTIONS
+
+logger = logging.getLogger(__name__)
+
+
+USER_DIRECTORY_TTL_SECONDS = int_from_env("USER_DIRECTORY_TTL_SECONDS", 120)
+USER_DIRECTORY_LISTENER = bool_from_env("USER_DIRECTORY_LISTENER", False)
+
+_GET_ALL_CHUNK_SIZE = 100
+
+
+def user_centro(user_data: Dict[str, Any]) -> str:
+    """Centro gestor del usuario, del primer campo que lo traiga."""
+    return (
+        user_data.get("nombre_centro_gestor")
+        or user_data.get("centro_gestor_assigned")
+        or user_data.get("centro_gestor")
+        or ""
+    )
+
+
+def centro_key(value: Any) -> str:
+    """Clave de índice de un centro gestor (alias y tildes unificados)."""
+    return normalize_centro(canonicalize_centro(value) or value)
+
+
+def user_roles(user_data: Dict[str, Any]) -> Set[str]:
+    """Roles del usuario en minúsculas (``roles`` + ``role``/``rol``)."""
+    raw = user_data.get("roles")
+    if isinstance(raw, str):
+        raw = [raw]
+    roles = {str(r).strip().lower() for r in raw or [] if str(r).strip()}
+    single = str(user_data.get("role") or user_data.get("rol") or "").strip().lower()
+    if single:
+        roles.add(single)
+    return roles
+
+
+def _email_key(user_data: Dict[str, Any]) -> str:
+    email = user_data.get("email") or user_data.get("correo") or user_data.get("Email") or ""
+    return email.strip().lower() if isinstance(email, str) else ""
+
+
+class UserDirectory:
+    """Índices en memoria de ``users``; las lecturas devuelven copias."""
+
+    def __init__(
+        self,
+        db_getter: Optional[Callable[[], Any]] = None,
+        ttl_seconds: int = USER_DIRECTORY_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._db_getter = db_getter
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = threading.RLock()
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._by_email: Dict[str, str] = {}
+        self._by_centro: Dict[str, Set[str]] = {}
+        self._by_role: Dict[str, Set[str]] = {}
+        self._loaded_at: Optional[float] = None
+        self._dirty: Set[str] = set()
+        self._listener = None
+        self._stats = {"loads": 0, "point_reads": 0}
+
+    # ------------------------------------------------------------------
+    # Carga e índices
+    # ------------------------------------------------------------------
+
+    def _db(self, db=None):
+        if db is not None:
+            return db
+        if self._db_getter is not None:
+            return self._db_getter()
+        from database.firebase_config import get_firestore_client
+
+        return get_firestore_client()
+
+    def _unindex(self, uid: str) -> None:
+        old = self._users.pop(uid, None)
+        if old is None:
+            return
+        email = _email_key(old)
+        if self._by_email.get(email) == uid:
+            del self._by_email[email]
+        for index, keys in ((self._by_centro, {centro_key(user_centro(old))}), (self._by_role, user_roles(old))):
+            for key in keys:
+                uids = index.get(key)
+                if uids is not None:
+                    uids.discard(uid)
+                    if not uids:
+                        del index[key]
+
+    def _index(self, uid: str, user_data: Dict[str, Any]) -> None:
+        self._unindex(uid)
+        self._users[uid] = user_data
+        email = _email_key(user_data)
+        if email:
+            self._by_email.setdefault(email, uid)
+        key = centro_key(user_centro(user_data))
+        if key:
+            self._by_centro.setdefault(key, set()).add(uid)
+        for role in user_roles(user_data):
+            self._by_role.setdefault(role, set()).add(uid)
+
+    def _replace_all(self, docs: Iterable[Any]) -> None:
+        with self._lock:
+            self._users, self._by_email, self._by_centro, self._by_role = {}, {}, {}, {}
+            for doc in docs:
+                self._index(doc.id, doc.to_dict() or {})
+            self._loaded_at = self._clock()
+            self._dirty.clear()
+            self._stats["loads"] += 1
+
+    def _read_docs(self, db, uids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        users_ref = db.collection(FIREBASE_COLLECTIONS["users"])
+        found: Dict[str, Optional[Dict[str, Any]]] = {uid: None for uid in uids}
+        for i in range(0, len(uids), _GET_ALL_CHUNK_SIZE):
+            refs = [users_ref.document(uid) for uid in uids[i : i + _GET_ALL_CHUNK_SIZE]]
+            for doc in db.get_all(refs):
+                if doc.exists:
+                    found[doc.id] = doc.to_dict() or {}
+        self._stats["point_reads"] += len(uids)
+        return found
+
+    def _apply(self, found: Dict[str, Optional[Dict[str, Any]]]) -> None:
+        with self._lock:
+            for uid, data in found.items():
+                if data is None:
+                    self._unindex(uid)
+                else:
+                    self._index(uid, data)
+                self._dirty.discard(uid)
+
+    def _is_stale(self) -> bool:
+        if self._loaded_at is None:
+            return True
+        if self._listener is not None:
+            return False
+        return self._clock() - self._loaded_at >= self.ttl_seconds
+
+    def refresh(self, db=None, force: bool = False) -> None:
+        """Recarga el directorio si venció (o siempre con ``force``) y relee los uid invalidados."""
+        with self._lock:
+            if force or self._is_stale():
+                db = self._db(db)
+                self._replace_all(db.collection(FIREBASE_COLLECTIONS["users"]).stream())
+                logger.debug("Directorio de usuarios cargado: %d usuarios", len(self._users))
+                return
+            dirty = sorted(self._dirty)
+        if dirty:
+            self._apply(self._read_docs(self._db(db), dirty))
+
+    def invalidate(self, uid: Optional[str] = None) -> None:
+        """Marca un usuario (o todo el directorio si ``uid`` es None) para releerlo."""
+        with self._lock:
+            if uid is None:
+                self._loaded_at = None
+            else:
+                self._dirty.add(uid)
+
+    def start_listener(self, db=None) -> bool:
+        """Mantiene el directorio con ``on_snapshot`` en lugar del TTL."""
+        with self._lock:
+            if self._listener is not None:
+                return True
+            try:
+                query = self._db(db).collection(FIREBASE_COLLECTIONS["users"])
+                self._listener = query.on_snapshot(
+                    lambda docs, changes, read_time: self._replace_all(docs)
+                )
+                return True
+            except Exception as e:
+                logger.warning(f"No se pudo iniciar el listener de usuarios, se usa TTL: {e}")
+                return False
+
+    def stop_listener(self) -> None:
+        with self._lock:
+            if self._listener is not None:
+                self._listener.unsubscribe()
+                self._listener = None
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _entry(uid: str, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return {**user_data, "uid": uid}
+
+    def get(self, uid: str, db=None) -> Optional[Dict[str, Any]]:
+        """Usuario por uid (con ``uid`` agregado) o None si no existe."""
+        self.refresh(db)
+        with self._lock:
+            user_data = self._users.get(uid)
+        if user_data is None:
+            found = self._read_docs(self._db(db), [uid])
+            self._apply(found)
+            user_data = found[uid]
+        return self._entry(uid, user_data) if user_data is not None else None
+
+    def get_by_email(self, email: str, db=None) -> Optional[Dict[str, Any]]:
+        self.refresh(db)
+        with self._lock:
+            uid = self._by_email.get((email or "").strip().lower())
+            user_data = self._users.get(uid) if uid else None
+        return self._entry(uid, user_data) if user_data is not None else None
+
+    def find(
+        self,
+        centros: Optional[Union[str, Iterable[str]]] = None,
+        roles: Optional[Union[str, Iterable[str]]] = None,
+        active: Optional[bool] = None,
+        db=None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Usuarios que cumplen todos los filtros, ordenados por uid.
+
+        Args:
+            centros: Centro(s) gestor(es); basta con pertenecer a uno
+            roles: Rol(es); basta con tener uno
+            active: True excluye ``is_active == False``; False deja solo esos
+        """
+        self.refresh(db)
+        with self._lock:
+            candidates: Optional[Set[str]] = None
+            for index, values, normalize in (
+                (self._by_centro, centros, centro_key),
+                (self._by_role, roles, lambda v: str(v).strip().lower()),
+            ):
+                if values is None:
+                    continue
+                if isinstance(values, str):
+                    values = [values]
+                matched: Set[str] = set()
+                for value in values:
+                    matched |= index.get(normalize(value), set())
+                candidates = matched if candidates is None else candidates & matched
+            uids = sorted(self._users if candidates is None else candidates)
+            result = []
+            for uid in uids:
+                user_data = self._users[uid]
+                if active is not None and (user_data.get("is_active") is not False) != active:
+                    continue
+                result.append(self._entry(uid, user_data))
+        return result
+
+    def page(
+        self, offset: int = 0, limit: int = 100, **filters: Any
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Página de ``find(**filters)``: ``(usuarios, total)``."""
+        users = self.find(**filters)
+        return users[offset : offset + limit], len(users)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "centros": len(self._by_centro),
+                "roles": len(self._by_role),
+                "listener": self._listener is not None,
+                "ttl_seconds": self.ttl_seconds,
+                **self._stats,
+            }
+
+
+_directory: Optional[UserDirectory] = None
+_directory_lock = threading.Lock()
+
+
+def get_user_directory() -> UserDirectory:
+    """Directorio compartido del proceso (con listener si ``USER_DIRECTORY_LISTENER``)."""
+    global _directory
+    with _directory_lock:
+        if _directory is None:
+            _directory = UserDirectory()
+            if USER_DIRECTORY_LISTENER:
+                _directory.start_listener()
+        return _directory
+
+
+def invalidate_user_directory(uid: Optional[str] = None) -> None:
+    """Marca un usuario (o todo el directorio) para releerlo; no carga nada si aún no se usó."""
+    if _directory is not None:
+        _directory.invalidate(uid)
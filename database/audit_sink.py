@@ -0,0 +1,342 @@
+"""
+Escritura por lotes de registros de auditoría en Firestore
+Un ``add()`` por evento genera cientos de RPCs pequeños con tráfico de
+escritura en ráfagas y ocupa los executors compartidos. ``BufferedLogSink``
+acumula los registros en memoria y un hilo propio los escribe en WriteBatches.
+
+- Vacía el buffer al llegar a ``AUDIT_BATCH_SIZE`` registros o cada
+  ``AUDIT_FLUSH_SECONDS``.
+- Si un commit falla o tarda más de ``AUDIT_COMMIT_TIMEOUT`` segundos, los
+  registros van a un archivo local de solo-anexar (JSON por línea) en
+  ``AUDIT_SPOOL_DIR`` y se reintenta pasados ``AUDIT_RETRY_SECONDS``.
+- Memoria acotada: por encima de ``AUDIT_BUFFER_MAX`` registros pendientes
+  (Firestore lento) el excedente se envía al spool en vez de crecer. El
+  ``fsync`` del spool nunca corre en el hilo que llama a ``add()`` (el event
+  loop): lo hace el hilo de escritura entre commits.
+- ``AUDIT_SPOOL_DIR`` debe sobrevivir a reinicios del contenedor; por defecto
+  es ``logs/audit_spool`` dentro de la app (``/app/logs/audit_spool`` en la
+  imagen Docker, montar un volumen en ``/app/logs``).
+- El spool se reproduce al arrancar y tras volver a escribir con éxito. Cada
+  registro lleva un id de documento fijo, así que reproducirlo dos veces no
+  lo duplica.
+- ``shutdown_log_sinks()`` (lifespan) vacía los buffers antes de salir; lo
+  que no se pueda escribir queda en el spool para el próximo arranque.
+
+Uso:
+    from database.audit_sink import get_log_sink
+    get_log_sink("audit_logs").add({"action": "...", "timestamp": datetime.now(timezone.utc)})
+"""
+
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from database.firestore_repository import int_from_env
+
+logger = logging.getLogger(__name__)
+
+
+AUDIT_BATCH_SIZE = max(1, min(int_from_env("AUDIT_BATCH_SIZE", 200), 500))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "2.0"))
+AUDIT_BUFFER_MAX = max(1, int_from_env("AUDIT_BUFFER_MAX", 5000))
+AUDIT_COMMIT_TIMEOUT = float(os.getenv("AUDIT_COMMIT_TIMEOUT", "10.0"))
+AUDIT_RETRY_SECONDS = int_from_env("AUDIT_RETRY_SECONDS", 60)
+# No usar el directorio temporal: se pierde al reiniciar el contenedor
+AUDIT_SPOOL_DIR = os.getenv(
+    "AUDIT_SPOOL_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "logs", "audit_spool"),
+)
+
+Entry = Tuple[str, Dict[str, Any]]
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return str(value)
+
+
+def _decode(value: Dict[str, Any]) -> Any:
+    if set(value) == {"$dt"}:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class BufferedLogSink:
+    """Buffer de registros para una colección, escrito por lotes desde un hilo propio."""
+
+    def __init__(
+        self,
+        collection: str,
+        *,
+        batch_size: int = AUDIT_BATCH_SIZE,
+        flush_seconds: float = AUDIT_FLUSH_SECONDS,
+        max_buffer: int = AUDIT_BUFFER_MAX,
+        spool_dir: str = AUDIT_SPOOL_DIR,
+        retry_seconds: float = AUDIT_RETRY_SECONDS,
+        db=None,
+    ):
+        self.collection = collection
+        self.batch_size = max(1, min(batch_size, 500))
+        self.flush_seconds = flush_seconds
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self.spool_dir = spool_dir
+        self.retry_seconds = retry_seconds
+        self._db = db
+        self._pending: List[Entry] = []
+        # Excedente del buffer, a la espera de que el hilo de escritura lo pase al spool
+        self._overflow: List[Entry] = []
+        self._cond = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Firestore falló: hasta este instante todo va directo al spool
+        self._down_until = 0.0
+        self._next_replay = 0.0
+        self.stats = {"written": 0, "commits": 0, "spooled": 0, "replayed": 0}
+
+    # -- API ---------------------------------------------------------------
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """Encola ``record``; nunca bloquea por Firestore ni por el disco."""
+        entry = (uuid.uuid4().hex, record)
+        with self._cond:
+            closed = self._closed
+            if closed:
+                self._overflow.append(entry)
+            else:
+                self._pending.append(entry)
+                if len(self._pending) >= self.max_buffer:
+                    self._overflow.extend(self._pending)
+                    self._pending = []
+                    self._cond.notify()
+                elif len(self._pending) >= self.batch_size:
+                    self._cond.notify()
+        if closed:
+            # Sin hilo de escritura tras close(): un hilo corto lo lleva al spool
+            # (no daemon, para que termine antes de salir del intérprete)
+            threading.Thread(target=self._spool_overflow, name=f"log-spool-{self.collection}").start()
+        else:
+            self.start()
+
+    def start(self) -> None:
+        """Arranca el hilo de escritura (idempotente)."""
+        with self._cond:
+            if self._thread is not None or self._closed:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name=f"log-sink-{self.collection}", daemon=True
+            )
+            self._thread.start()
+
+    def flush(self) -> int:
+        """Escribe lo pendiente; devuelve registros escritos (el resto queda en el spool)."""
+        with self._cond:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+        with self._flush_lock:
+            if time.monotonic() < self._down_until:
+                self._spool(pending)
+                return 0
+            written = self._write(pending)
+            if written < len(pending):
+                self._spool(pending[written:])
+            return written
+
+    def replay_spool(self) -> int:
+        """Reescribe en Firestore los registros del spool; devuelve cuántos."""
+        with self._flush_lock:
+            if time.monotonic() < self._down_until:
+                return 0
+            self._claim_spool_files()
+            replayed = 0
+            for path in sorted(glob.glob(self._spool_pattern("replay"))):
+                entries = self._read_spool(path)
+                written = self._write(entries)
+                replayed += written
+                if written < len(entries):
+                    break
+                os.remove(path)
+            if replayed:
+                self.stats["replayed"] += replayed
+                logger.info("Spool de %s: %d registros reescritos", self.collection, replayed)
+            return replayed
+
+    def close(self, timeout: float = AUDIT_COMMIT_TIMEOUT) -> None:
+        """Detiene el hilo y vacía el buffer; lo que no se escriba queda en el spool."""
+        with self._cond:
+            self._closed = True
+            thread = self._thread
+            self._cond.notify()
+        if thread is not None:
+            thread.join(timeout)
+        if thread is None or not thread.is_alive():
+            self._spool_overflow()
+            self.flush()
+        else:
+            # El hilo sigue en un commit lento: lo pendiente se guarda en disco
+            with self._cond:
+                pending, self._pending = self._overflow + self._pending, []
+                self._overflow = []
+            if pending:
+                self._spool(pending)
+
+    # -- Hilo de escritura -------------------------------------------------
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                if not self._closed and not self._overflow and len(self._pending) < self.batch_size:
+                    self._cond.wait(self.flush_seconds)
+                closed = self._closed
+            try:
+                self._spool_overflow()
+                self.flush()
+                if not closed and time.monotonic() >= self._next_replay:
+                    self._next_replay = time.monotonic() + self.retry_seconds
+                    self.replay_spool()
+            except Exception as exc:  # pragma: no cover
+                logger.error("Error en el sink de %s: %s", self.collection, exc)
+            if closed:
+                return
+
+    def _client(self):
+        if self._db is not None:
+            return self._db
+        from database.firebase_config import get_firestore_client
+
+        return get_firestore_client()
+
+    def _write(self, entries: List[Entry]) -> int:
+        """Commits de ``batch_size``; se detiene en el primer fallo."""
+        written = 0
+        try:
+            client = self._client()
+            collection_ref = client.collection(self.collection)
+            for start in range(0, len(entries), self.batch_size):
+                batch = client.batch()
+                for doc_id, record in entries[start : start + self.batch_size]:
+                    batch.set(collection_ref.document(doc_id), record)
+                batch.commit(timeout=AUDIT_COMMIT_TIMEOUT)
+                written += len(entries[start : start + self.batch_size])
+                self.stats["commits"] += 1
+                # Entre commits lentos, el excedente acumulado no espera en memoria
+                self._spool_overflow()
+        except Exception as exc:
+            self._down_until = time.monotonic() + self.retry_seconds
+            self._next_replay = self._down_until
+            logger.warning(
+                "No se pudieron escribir %d registros en %s: %s",
+                len(entries) - written,
+                self.collection,
+                exc,
+            )
+        self.stats["written"] += written
+        return written
+
+    # -- Spool -------------------------------------------------------------
+
+    def _spool_pattern(self, suffix: str) -> str:
+        return os.path.join(self.spool_dir, f"{self.collection}.*.{suffix}")
+
+    def _spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"{self.collection}.{os.getpid()}.jsonl")
+
+    def _spool_overflow(self) -> None:
+        with self._cond:
+            overflow, self._overflow = self._overflow, []
+        if overflow:
+            self._spool(overflow)
+
+    def _spool(self, entries: List[Entry]) -> None:
+        lines = "".join(
+            json.dumps({"id": doc_id, "data": record}, ensure_ascii=False, default=_encode) + "\n"
+            for doc_id, record in entries
+        )
+        try:
+            with self._spool_lock:
+                os.makedirs(self.spool_dir, exist_ok=True)
+                with open(self._spool_path(), "a", encoding="utf-8") as fh:
+                    fh.write(lines)
+                    fh.flush()
+                    os.fsync(fh.fileno())
+            self.stats["spooled"] += len(entries)
+        except OSError as exc:
+            logger.error(
+                "No se pudo escribir el spool de %s; %d registros perdidos: %s",
+                self.collection,
+                len(entries),
+                exc,
+            )
+
+    def _claim_spool_files(self) -> None:
+        """Pasa a ``.replay`` el spool propio y los de procesos que ya no existen."""
+        with self._spool_lock:
+            for path in glob.glob(self._spool_pattern("jsonl")):
+                try:
+                    pid = int(os.path.basename(path)[len(self.collection) + 1 :].split(".")[0])
+                except ValueError:
+                    continue
+                if pid != os.getpid() and _pid_alive(pid):
+                    continue
+                try:
+                    os.replace(path, f"{path[:-len('.jsonl')]}.{uuid.uuid4().hex[:8]}.replay")
+                except OSError:
+                    continue
+
+    def _read_spool(self, path: str) -> List[Entry]:
+        entries: List[Entry] = []
+        with open(path, encoding="utf-8") as fh:
+            for line in fh:
+                try:
+                    item = json.loads(line, object_hook=_decode)
+                    entries.append((item["id"], item["data"]))
+                except (ValueError, KeyError, TypeError):
+                    # Línea truncada por una caída a mitad de escritura
+                    logger.warning("Línea inválida en el spool %s", path)
+        return entries
+
+
+_sinks: Dict[str, BufferedLogSink] = {}
+_sinks_lock = threading.Lock()
+
+
+def get_log_sink(collection: str) -> BufferedLogSink:
+    """Sink compartido del proceso para ``collection``."""
+    sink = _sinks.get(collection)
+    if sink is None:
+        with _sinks_lock:
+            sink = _sinks.get(collection)
+            if sink is None:
+                sink = _sinks[collection] = BufferedLogSink(collection)
+    return sink
+
+
+def shutdown_log_sinks() -> None:
+    """Vacía y detiene todos los sinks (apagado ordenado desde el lifespan)."""
+    with _sinks_lock:
+        sinks = list(_sinks.values())
+        _sinks.clear()
+    for sink in sinks:
+        try:
+            sink.close()
+        except Exception as exc:
+            logger.warning("Error cerrando el sink de %s: %s", sink.collection, exc)
@@ -0,0 +1,579 @@
+"""
+Capa de acceso asíncrono a Firestore
+Fachada sobre el cliente síncrono de ``firebase_config`` que ejecuta cada
+operación bloqueante en un ThreadPoolExecutor dedicado y acotado, para que un
+escaneo completo no congele el event loop (``/ping`` y el resto de requests
+del worker siguen respondiendo).
+
+- Un solo cliente (el de ``get_firestore_client``) y un solo pool
+  (``FIRESTORE_MAX_WORKERS`` hilos) para toda la API.
+- Límite de concurrencia por colección (``FIRESTORE_COLLECTION_CONCURRENCY``,
+  ajustable con ``configure_collection_limit``) para que una colección con
+  escaneos pesados no acapare el pool.
+- Métricas por colección (operaciones, documentos, errores, latencias) en
+  ``get_repository_stats``; las operaciones lentas se registran en el log.
+
+Helpers:
+    stream_collection  — lista de documentos (con where/select/order_by/limit)
+    paginated          — páginas por cursor ``__name__`` (async iterator)
+    get_all_paginated  — todas las páginas concatenadas
+    fetch_page         — una página con ``next_cursor`` firmado (keyset, ver ``database.pagination``)
+    get_document       — un documento por id
+    get_many           — varios documentos por id en lotes de ``get_all``
+    query_in           — documentos cuyo campo está en una lista (consultas ``in`` por lotes)
+    batched_write      — set/update/delete en batches de hasta 450 operaciones
+    diff_upsert        — escribe solo los documentos que cambiaron (merge/append/replace)
+    run_blocking       — cualquier otra llamada síncrona bajo las mismas reglas
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from database.pagination import OrderBy, decode_cursor, encode_cursor, normalize_order, query_fingerprint
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+Where = Sequence[Tuple[str, str, Any]]
+
+
+# Igual que api.core.config.int_from_env. La capa database no importa ``api``:
+# api/__init__ importa api.scripts, que a su vez importa este módulo.
+def int_from_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+FIRESTORE_MAX_WORKERS = int_from_env("FIRESTORE_MAX_WORKERS", 16)
+FIRESTORE_COLLECTION_CONCURRENCY = int_from_env("FIRESTORE_COLLECTION_CONCURRENCY", 4)
+FIRESTORE_SLOW_OPERATION_SECONDS = float(os.getenv("FIRESTORE_SLOW_OPERATION_SECONDS", "2.0"))
+# Límite de operaciones por WriteBatch de Firestore es 500; se deja margen
+MAX_BATCH_OPERATIONS = 450
+# ``get_all`` acepta muchas referencias, pero lotes moderados reparten mejor la carga
+GET_MANY_CHUNK_SIZE = 300
+# Máximo de valores por filtro ``in`` en Firestore
+IN_QUERY_MAX_VALUES = 30
+
+_executor = ThreadPoolExecutor(max_workers=FIRESTORE_MAX_WORKERS, thread_name_prefix="firestore")
+
+_collection_limits: Dict[str, int] = {}
+# Semáforos por event loop (asyncio.Semaphore queda ligado al loop donde se usa)
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, Any]] = {}
+
+
+def configure_collection_limit(collection: str, limit: int) -> None:
+    """Fija cuántas operaciones simultáneas admite ``collection`` (mínimo 1)."""
+    _collection_limits[collection] = max(1, int(limit))
+    for per_loop in list(_semaphores.values()):
+        per_loop.pop(collection, None)
+
+
+def _semaphore(collection: str) -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    per_loop = _semaphores.setdefault(loop, {})
+    semaphore = per_loop.get(collection)
+    if semaphore is None:
+        limit = _collection_limits.get(collection, FIRESTORE_COLLECTION_CONCURRENCY)
+        semaphore = per_loop[collection] = asyncio.Semaphore(limit)
+    return semaphore
+
+
+def _collection_stats(collection: str) -> Dict[str, Any]:
+    stats = _stats.get(collection)
+    if stats is None:
+        stats = _stats[collection] = {
+            "operations": 0,
+            "documents": 0,
+            "errors": 0,
+            "in_flight": 0,
+            "waiting": 0,
+            "total_seconds": 0.0,
+            "max_seconds": 0.0,
+        }
+    return stats
+
+
+def _result_size(result: Any) -> int:
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 0
+
+
+async def run_blocking(collection: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta ``fn(*args, **kwargs)`` en el pool de Firestore respetando el
+    límite de concurrencia de ``collection``.
+
+    Args:
+        collection: Colección a la que se atribuye la operación (límite y métricas)
+        fn: Función síncrona que usa el cliente de Firestore
+
+    Returns:
+        El resultado de ``fn``
+    """
+    with _stats_lock:
+        _collection_stats(collection)["waiting"] += 1
+    semaphore = _semaphore(collection)
+    try:
+        await semaphore.acquire()
+    finally:
+        with _stats_lock:
+            _collection_stats(collection)["waiting"] -= 1
+
+    start = time.perf_counter()
+    failed = False
+    result = None
+    try:
+        with _stats_lock:
+            _collection_stats(collection)["in_flight"] += 1
+        loop = asyncio.get_running_loop()
+        # copy_context: el hilo ve el contexto de la petición (p. ej. métricas por ruta)
+        result = await loop.run_in_executor(
+            _executor, contextvars.copy_context().run, partial(fn, *args, **kwargs)
+        )
+        return result
+    except Exception:
+        failed = True
+        raise
+    finally:
+        semaphore.release()
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            stats = _collection_stats(collection)
+            stats["in_flight"] -= 1
+            stats["operations"] += 1
+            stats["errors"] += int(failed)
+            stats["documents"] += _result_size(result)
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+        if elapsed >= FIRESTORE_SLOW_OPERATION_SECONDS:
+            logger.warning(
+                "Operación Firestore lenta en %s: %s tardó %.2fs",
+                collection,
+                getattr(fn, "__name__", "fn"),
+                elapsed,
+            )
+
+
+def _client(db=None):
+    if db is not None:
+        return db
+    from database.firebase_config import get_firestore_client
+
+    client = get_firestore_client()
+    if client is None:
+        raise RuntimeError("No se pudo conectar a Firestore")
+    return client
+
+
+def _build_query(
+    db,
+    collection: str,
+    where: Where = (),
+    select: Optional[Sequence[str]] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+):
+    query = db.collection(collection)
+    for field, op, value in where:
+        query = query.where(field, op, value)
+    if select is not None:
+        query = query.select(list(select))
+    if order_by:
+        query = query.order_by(order_by)
+    if limit:
+        query = query.limit(limit)
+    return query
+
+
+async def stream_collection(
+    collection: str,
+    *,
+    where: Where = (),
+    select: Optional[Sequence[str]] = None,
+    order_by: Optional[str] = None,
+    limit: Optional[int] = None,
+    db=None,
+) -> List[Any]:
+    """
+    Documentos de ``collection`` (``DocumentSnapshot``) sin bloquear el event loop.
+
+    Args:
+        collection: Nombre de la colección
+        where: Filtros ``(campo, operador, valor)`` encadenados con ``where``
+        select: Proyección de campos (reduce el payload de escaneos grandes);
+            ``[]`` lee solo las referencias
+        order_by: Campo de orden
+        limit: Máximo de documentos
+        db: Cliente de Firestore (por defecto el compartido)
+    """
+    client = _client(db)
+
+    def _stream() -> List[Any]:
+        return list(_build_query(client, collection, where, select, order_by, limit).stream())
+
+    return await run_blocking(collection, _stream)
+
+
+async def paginated(
+    collection: str,
+    page_size: int = 500,
+    *,
+    where: Where = (),
+    select: Optional[Sequence[str]] = None,
+    db=None,
+) -> AsyncIterator[List[Any]]:
+    """
+    Recorre ``collection`` por páginas con cursor sobre ``__name__``.
+
+    Cada página es una operación independiente en el pool: entre páginas el
+    event loop y el límite de la colección quedan libres para otros requests.
+    """
+    client = _client(db)
+    base_query = _build_query(client, collection, where, select).order_by("__name__")
+    last_doc = None
+
+    while True:
+        query = base_query.limit(page_size)
+        if last_doc is not None:
+            query = query.start_after(last_doc)
+        page = await run_blocking(collection, query.get)
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        last_doc = page[-1]
+
+
+async def get_all_paginated(
+    collection: str,
+    page_size: int = 500,
+    *,
+    where: Where = (),
+    select: Optional[Sequence[str]] = None,
+    db=None,
+) -> List[Any]:
+    """Todos los documentos de ``collection`` leídos con ``paginated``."""
+    docs: List[Any] = []
+    async for page in paginated(collection, page_size, where=where, select=select, db=db):
+        docs.extend(page)
+    return docs
+
+
+def _doc_path(doc) -> str:
+    reference = getattr(doc, "reference", None)
+    path = getattr(reference, "path", None)
+    return path or doc.id
+
+
+def _order_value(data: Dict[str, Any], field: str) -> Any:
+    value: Any = data
+    for part in field.split("."):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+async def fetch_page(
+    collection: str,
+    *,
+    limit: int,
+    where: Where = (),
+    select: Optional[Sequence[str]] = None,
+    order_by: OrderBy = (),
+    cursor: Optional[str] = None,
+    offset: int = 0,
+    db=None,
+) -> Dict[str, Any]:
+    """
+    Una página de ``collection`` con cursor para la siguiente.
+
+    Args:
+        limit: Documentos por página
+        where: Filtros ``(campo, operador, valor)``
+        select: Proyección; se le agregan los campos de orden
+        order_by: Campos o ``(campo, "ASCENDING"|"DESCENDING")``
+        cursor: ``next_cursor`` de la página anterior
+        offset: Solo sin cursor (compatibilidad con clientes existentes)
+
+    Returns:
+        ``{"docs", "next_cursor", "has_more"}``; ``next_cursor`` es None en la
+        última página
+
+    Raises:
+        InvalidCursorError: cursor alterado o de otra consulta
+    """
+    limit = max(1, int(limit))
+    client = _client(db)
+    order = normalize_order(order_by)
+    fingerprint = query_fingerprint(collection, where, order)
+
+    if select is not None:
+        select = list(dict.fromkeys([*select, *(f for f, _ in order if f != "__name__")]))
+    query = _build_query(client, collection, where, select)
+    for field, direction in order:
+        query = query.order_by(field, direction=direction)
+
+    if cursor:
+        values, doc_path = decode_cursor(cursor, fingerprint)
+        doc_id = doc_path.rsplit("/", 1)[-1]
+        query = query.start_after({**{f: v for (f, _), v in zip(order, values)}, "__name__": doc_id})
+    elif offset:
+        query = query.offset(offset)
+
+    # Un documento de más indica si hay otra página sin una segunda consulta
+    docs = await run_blocking(collection, query.limit(limit + 1).get)
+    has_more = len(docs) > limit
+    docs = list(docs[:limit])
+
+    next_cursor = None
+    if has_more and docs:
+        last = docs[-1]
+        data = last.to_dict() or {}
+        next_cursor = encode_cursor(
+            fingerprint,
+            [_order_value(data, field) for field, _ in order if field != "__name__"],
+            _doc_path(last),
+        )
+    return {"docs": docs, "next_cursor": next_cursor, "has_more": has_more}
+
+
+async def get_document(collection: str, doc_id: str, *, db=None) -> Any:
+    """``DocumentSnapshot`` de ``collection/doc_id`` (revisar ``.exists``)."""
+    client = _client(db)
+    return await run_blocking(collection, client.collection(collection).document(doc_id).get)
+
+
+async def get_many(
+    collection: str,
+    doc_ids: Iterable[str],
+    *,
+    field_paths: Optional[Sequence[str]] = None,
+    db=None,
+) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Lee varios documentos por id con ``get_all`` (una ida y vuelta por lote).
+
+    Returns:
+        ``{doc_id: datos}``; los documentos inexistentes quedan en ``None``.
+    """
+    client = _client(db)
+    ids = list(dict.fromkeys(str(doc_id) for doc_id in doc_ids if doc_id))
+    collection_ref = client.collection(collection)
+
+    def _get_chunk(chunk: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        refs = [collection_ref.document(doc_id) for doc_id in chunk]
+        found = {
+            snapshot.id: (snapshot.to_dict() if snapshot.exists else None)
+            for snapshot in client.get_all(refs, field_paths=field_paths)
+        }
+        return {doc_id: found.get(doc_id) for doc_id in chunk}
+
+    chunks = [ids[i : i + GET_MANY_CHUNK_SIZE] for i in range(0, len(ids), GET_MANY_CHUNK_SIZE)]
+    results = await asyncio.gather(*(run_blocking(collection, _get_chunk, chunk) for chunk in chunks))
+    merged: Dict[str, Optional[Dict[str, Any]]] = {}
+    for partial_result in results:
+        merged.update(partial_result)
+    return merged
+
+
+async def query_in(
+    collection: str,
+    field: str,
+    values: Iterable[Any],
+    *,
+    select: Optional[Sequence[str]] = None,
+    db=None,
+) -> List[Any]:
+    """
+    Documentos de ``collection`` con ``field`` en ``values``.
+
+    Divide ``values`` en consultas ``in`` de hasta ``IN_QUERY_MAX_VALUES``
+    valores que corren en paralelo en el pool (una ida y vuelta por lote en
+    lugar de una consulta ``==`` por valor).
+    """
+    unique = list(dict.fromkeys(value for value in values if value not in (None, "")))
+    chunks = [unique[i : i + IN_QUERY_MAX_VALUES] for i in range(0, len(unique), IN_QUERY_MAX_VALUES)]
+    results = await asyncio.gather(
+        *(stream_collection(collection, where=[(field, "in", chunk)], select=select, db=db) for chunk in chunks)
+    )
+    return [doc for partial_result in results for doc in partial_result]
+
+
+async def batched_write(
+    collection: str,
+    operations: Iterable[Tuple[str, Optional[str], Optional[Dict[str, Any]]]],
+    *,
+    batch_size: int = MAX_BATCH_OPERATIONS,
+    merge: bool = False,
+    db=None,
+) -> int:
+    """
+    Aplica ``operations`` en WriteBatches de hasta ``batch_size`` operaciones.
+
+    Args:
+        collection: Colección destino
+        operations: Tuplas ``(op, doc_id, data)`` con ``op`` en
+            ``"set"``/``"update"``/``"delete"``; ``doc_id=None`` en un ``set``
+            crea un documento con id automático
+        merge: ``merge=True`` para los ``set``
+
+    Returns:
+        Número de operaciones escritas
+    """
+    client = _client(db)
+    collection_ref = client.collection(collection)
+    batch_size = max(1, min(batch_size, 500))
+
+    def _commit(chunk: List[Tuple[str, Optional[str], Optional[Dict[str, Any]]]]) -> int:
+        batch = client.batch()
+        for op, doc_id, data in chunk:
+            ref = collection_ref.document(doc_id) if doc_id else collection_ref.document()
+            if op == "set":
+                batch.set(ref, data or {}, merge=merge)
+            elif op == "update":
+                batch.update(ref, data or {})
+            elif op == "delete":
+                batch.delete(ref)
+            else:
+                raise ValueError(f"Operación de batch no soportada: {op}")
+        batch.commit()
+        return len(chunk)
+
+    written = 0
+    chunk: List[Tuple[str, Optional[str], Optional[Dict[str, Any]]]] = []
+    for operation in operations:
+        chunk.append(operation)
+        if len(chunk) >= batch_size:
+            written += await run_blocking(collection, _commit, chunk)
+            chunk = []
+    if chunk:
+        written += await run_blocking(collection, _commit, chunk)
+    return written
+
+
+def record_hash(data: Mapping[str, Any], fields: Optional[Iterable[str]] = None, ignore: Iterable[str] = ()) -> str:
+    """
+    Hash estable de ``data`` (o solo de ``fields``) sin los campos de ``ignore``.
+
+    Un campo ausente y uno en ``None`` se consideran iguales.
+    """
+    ignored = set(ignore)
+    keys = sorted(set(data if fields is None else fields) - ignored)
+    payload = json.dumps([(k, data.get(k)) for k in keys], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def diff_upsert(
+    collection: str,
+    records: Mapping[str, Dict[str, Any]],
+    *,
+    mode: str = "merge",
+    ignore_fields: Iterable[str] = (),
+    batch_size: int = MAX_BATCH_OPERATIONS,
+    db=None,
+) -> Dict[str, int]:
+    """
+    Sincroniza ``records`` (``{doc_id: datos}``) escribiendo solo lo que cambió.
+
+    Los documentos existentes se leen en lotes de ``get_all`` (``replace``:
+    un escaneo paginado de la colección) y se comparan por hash de campos;
+    ``ignore_fields`` (p. ej. marcas de tiempo) no cuentan como cambio pero
+    se escriben junto con los documentos que sí cambiaron.
+
+    Modos:
+        merge   — crea los nuevos y hace ``set(merge=True)`` de los que
+                  difieren en alguno de los campos del registro
+        append  — solo crea los que no existen
+        replace — la colección queda igual a ``records``: ``set`` completo de
+                  los que difieren y borrado de los que ya no están
+
+    Returns:
+        Conteos ``created``, ``updated``, ``unchanged``, ``skipped`` (append
+        sobre existentes), ``deleted`` y ``written``
+    """
+    if mode not in ("merge", "append", "replace"):
+        raise ValueError(f"Modo de upsert no soportado: {mode}")
+    ignore = tuple(ignore_fields)
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "skipped": 0, "deleted": 0}
+
+    if mode == "replace":
+        existing = {doc.id: doc.to_dict() or {} for doc in await get_all_paginated(collection, db=db)}
+    else:
+        existing = await get_many(collection, records.keys(), db=db)
+
+    operations: List[Tuple[str, Optional[str], Optional[Dict[str, Any]]]] = []
+    for doc_id, data in records.items():
+        current = existing.get(doc_id)
+        if current is None:
+            counts["created"] += 1
+        elif mode == "append":
+            counts["skipped"] += 1
+            continue
+        else:
+            # merge solo compara los campos del registro; replace, el documento completo
+            fields = set(data) if mode == "merge" else set(data) | set(current)
+            if record_hash(data, fields, ignore) == record_hash(current, fields, ignore):
+                counts["unchanged"] += 1
+                continue
+            counts["updated"] += 1
+        operations.append(("set", doc_id, data))
+
+    if mode == "replace":
+        stale = [doc_id for doc_id in existing if doc_id not in records]
+        operations.extend(("delete", doc_id, None) for doc_id in stale)
+        counts["deleted"] = len(stale)
+
+    counts["written"] = await batched_write(
+        collection, operations, batch_size=batch_size, merge=(mode == "merge"), db=db
+    )
+    return counts
+
+
+def get_repository_stats() -> Dict[str, Any]:
+    """Métricas por colección de la capa de acceso."""
+    with _stats_lock:
+        collections = {
+            name: {
+                **stats,
+                "avg_seconds": round(stats["total_seconds"] / stats["operations"], 4)
+                if stats["operations"]
+                else None,
+            }
+            for name, stats in _stats.items()
+        }
+    return {
+        "max_workers": FIRESTORE_MAX_WORKERS,
+        "default_collection_concurrency": FIRESTORE_COLLECTION_CONCURRENCY,
+        "collection_limits": dict(_collection_limits),
+        "collections": collections,
+    }
@@ -0,0 +1,165 @@
+"""
+Cursores de paginación (keyset) para Firestore
+``offset`` hace que Firestore lea (y cobre) cada documento saltado: recorrer
+una colección completa página a página cuesta O(n²) lecturas.
+``fetch_page`` (``database.firestore_repository``) continúa con
+``start_after`` desde los valores de orden del último documento entregado,
+que viajan al cliente en un ``next_cursor`` opaco y firmado.
+
+- El cursor lleva los valores de ``order_by``, la ruta del último documento y
+  una huella de la consulta (colección, filtros y orden); se firma con HMAC
+  (``PAGINATION_CURSOR_SECRET``) y un cursor alterado o de otra consulta
+  produce ``InvalidCursorError``.
+- El orden siempre termina en ``__name__`` para que el cursor sea único aunque
+  haya empates en los campos de orden.
+- Compatibilidad: sin cursor, ``offset`` sigue funcionando como antes (con su
+  costo) y la respuesta ya trae ``next_cursor`` para continuar sin él.
+
+Uso:
+    from database.firestore_repository import fetch_page
+    page = await fetch_page("unidades_proyecto", limit=500, where=[...], cursor=cursor)
+    page["docs"], page["next_cursor"], page["has_more"]
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+ASCENDING = "ASCENDING"
+DESCENDING = "DESCENDING"
+
+OrderBy = Sequence[Union[str, Tuple[str, str]]]
+Where = Sequence[Tuple[str, str, Any]]
+
+
+class InvalidCursorError(ValueError):
+    """Cursor mal formado, con firma inválida o emitido para otra consulta."""
+
+
+@lru_cache(maxsize=1)
+def _cursor_secret() -> bytes:
+    secret = os.getenv("PAGINATION_CURSOR_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    # Sin secreto explícito se deriva de la credencial de servicio, que
+    # comparten todos los workers; como último recurso, uno por proceso.
+    material = os.getenv("FIREBASE_SERVICE_ACCOUNT_KEY") or os.getenv("GOOGLE_APPLICATION_CREDENTIALS_JSON")
+    if material:
+        return hashlib.sha256(b"pagination-cursor:" + material.encode("utf-8")).digest()
+    logger.warning("PAGINATION_CURSOR_SECRET no configurado: los cursores solo valen en este proceso")
+    return secrets.token_bytes(32)
+
+
+def normalize_order(order_by: OrderBy = ()) -> List[Tuple[str, str]]:
+    """``[(campo, dirección), ...]`` terminando en ``__name__``."""
+    order: List[Tuple[str, str]] = []
+    for item in order_by:
+        field, direction = (item, ASCENDING) if isinstance(item, str) else item
+        direction = DESCENDING if str(direction).upper().startswith("DESC") else ASCENDING
+        if field != "__name__":
+            order.append((field, direction))
+    # __name__ en la misma dirección que el último campo: no exige índice extra
+    order.append(("__name__", order[-1][1] if order else ASCENDING))
+    return order
+
+
+def query_fingerprint(collection: str, where: Where, order: Sequence[Tuple[str, str]]) -> str:
+    payload = json.dumps(
+        [collection, [list(w) for w in where], [list(o) for o in order]],
+        sort_keys=True,
+        default=str,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict) and set(value) == {"$dt"}:
+        return datetime.fromisoformat(value["$dt"])
+    return value
+
+
+def _sign(body: bytes) -> bytes:
+    return hmac.new(_cursor_secret(), body, hashlib.sha256).digest()[:16]
+
+
+def encode_cursor(fingerprint: str, values: Sequence[Any], doc_path: str) -> str:
+    """Token opaco ``base64url(json).base64url(firma)``."""
+    body = json.dumps(
+        {"q": fingerprint, "v": [_encode_value(v) for v in values], "p": doc_path},
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str,
+    ).encode("utf-8")
+    sig = _sign(body)
+    return (
+        base64.urlsafe_b64encode(body).rstrip(b"=").decode("ascii")
+        + "."
+        + base64.urlsafe_b64encode(sig).rstrip(b"=").decode("ascii")
+    )
+
+
+def _b64decode(part: str) -> bytes:
+    return base64.urlsafe_b64decode(part + "=" * (-len(part) % 4))
+
+
+def decode_cursor(token: str, fingerprint: str) -> Tuple[List[Any], str]:
+    """``(valores de orden, ruta del documento)`` de un cursor de esta consulta."""
+    try:
+        body_part, sig_part = token.split(".", 1)
+        body, sig = _b64decode(body_part), _b64decode(sig_part)
+    except (ValueError, AttributeError):
+        raise InvalidCursorError("Cursor mal formado")
+    if not hmac.compare_digest(sig, _sign(body)):
+        raise InvalidCursorError("Cursor con firma inválida")
+    try:
+        data = json.loads(body)
+        values, doc_path, query = data["v"], data["p"], data["q"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError("Cursor mal formado")
+    if query != fingerprint:
+        raise InvalidCursorError("El cursor corresponde a otra consulta (filtros u orden distintos)")
+    return [_decode_value(v) for v in values], doc_path
+
+
+def cursor_matches(token: Optional[str], collection: str, where: Where, order_by: OrderBy = ()) -> bool:
+    """
+    True si ``token`` es un cursor válido de esa consulta. Permite elegir entre
+    variantes de una misma consulta (p. ej. con y sin orden) según el cursor.
+    """
+    if not token:
+        return False
+    try:
+        decode_cursor(token, query_fingerprint(collection, where, normalize_order(order_by)))
+    except InvalidCursorError:
+        return False
+    return True
+
+
+def pagination_block(
+    limit: int, offset: int, returned: int, page: Dict[str, Any], cursor: Optional[str] = None
+) -> Dict[str, Any]:
+    """Bloque ``pagination`` de las respuestas de listado."""
+    return {
+        "limit": limit,
+        "offset": 0 if cursor else offset or 0,
+        "returned": returned,
+        "cursor": cursor,
+        "next_cursor": page["next_cursor"],
+        "has_more": page["has_more"],
+    }
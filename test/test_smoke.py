@@ -146,13 +146,13 @@ class TestCacheThreadSafety:
             _cache_timestamps,
         )
         from api.core.cache import _cache_lock
-        from datetime import datetime, timedelta
+        import time
 
         key = get_cache_key("test_expiry", "arg")
         set_in_cache(key, "old_value")
-        # Fake the timestamp to be old
+        # Fake the timestamp to be old (monotonic clock)
         with _cache_lock:
-            _cache_timestamps[key] = datetime.now() - timedelta(seconds=600)
+            _cache_timestamps[key] = time.monotonic() - 600
 
         value, hit = get_from_cache(key, max_age_seconds=300)
         assert hit is False
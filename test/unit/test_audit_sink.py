@@ -0,0 +1,129 @@
+"""
+Tests del sink de auditoría por lotes con spool local (database/audit_sink.py).
+"""
+
+import os
+import threading
+from datetime import datetime, timezone
+
+from database.audit_sink import BufferedLogSink
+
+from .test_firestore_repository import FakeDB
+
+STAMP = datetime(2025, 7, 1, 8, 30, tzinfo=timezone.utc)
+
+
+class FailingBatchDB(FakeDB):
+    """FakeDB cuyos commits fallan mientras ``down`` sea True."""
+
+    down = True
+
+    def batch(self):
+        batch = super().batch()
+        commit = batch.commit
+
+        def _commit(retry=None, timeout=None):
+            if self.down:
+                raise TimeoutError("Firestore lento")
+            commit()
+
+        batch.commit = _commit
+        return batch
+
+
+def _records(n):
+    return [{"action": f"a{i}", "timestamp": STAMP} for i in range(n)]
+
+
+def test_flush_writes_in_batches_and_close_drains(tmp_path):
+    db = FakeDB({})
+    sink = BufferedLogSink("audit_logs", batch_size=4, flush_seconds=60, spool_dir=str(tmp_path), db=db)
+    for record in _records(10):
+        sink._pending.append(("id-" + record["action"], record))
+
+    assert sink.flush() == 10
+    assert db.commits == [4, 4, 2]
+    assert {doc_id for _, doc_id, _ in db.writes} == {f"id-a{i}" for i in range(10)}
+
+    # close() vacía lo que quede aunque no se haya llegado al tamaño de lote
+    for record in _records(3):
+        sink.add(record)
+    sink.close()
+    assert db.commits[-1] == 3
+    assert sink.stats["spooled"] == 0 and not os.listdir(tmp_path)
+
+
+def test_failed_commit_spools_and_replays_without_duplicates(tmp_path):
+    db = FailingBatchDB({})
+    sink = BufferedLogSink(
+        "audit_logs", batch_size=5, flush_seconds=60, retry_seconds=0, spool_dir=str(tmp_path), db=db
+    )
+    for record in _records(7):
+        sink._pending.append((record["action"], record))
+
+    assert sink.flush() == 0
+    assert sink.stats["spooled"] == 7 and db.writes == []
+    assert sink.replay_spool() == 0  # Firestore sigue caído: el spool se conserva
+
+    db.down = False
+    assert sink.replay_spool() == 7
+    assert sorted(doc_id for _, doc_id, _ in db.writes) == sorted(f"a{i}" for i in range(7))
+    # Los datetimes sobreviven al paso por disco
+    assert all(data["timestamp"] == STAMP for _, _, data in db.writes)
+    assert not os.listdir(tmp_path)
+    assert sink.replay_spool() == 0
+
+
+def test_buffer_overflow_goes_to_spool_and_new_process_replays_it(tmp_path):
+    db = FakeDB({})
+    slow = BufferedLogSink("audit_logs", batch_size=2, max_buffer=4, spool_dir=str(tmp_path), db=db)
+    slow.start = lambda: None  # sin hilo: simula un flush atascado
+    for record in _records(9):
+        slow.add(record)
+
+    # Memoria acotada: 8 registros como excedente, 1 pendiente; add() no toca el disco
+    assert len(slow._overflow) == 8 and len(slow._pending) == 1
+    assert slow.stats["spooled"] == 0
+    slow._spool_overflow()  # lo que hace el hilo de escritura
+    assert slow.stats["spooled"] == 8
+    assert db.writes == []
+
+    # Spool de un proceso anterior (pid inexistente): el nuevo sink lo reclama
+    os.rename(slow._spool_path(), os.path.join(str(tmp_path), "audit_logs.999999999.jsonl"))
+    fresh = BufferedLogSink("audit_logs", batch_size=2, spool_dir=str(tmp_path), db=db)
+    assert fresh.replay_spool() == 8
+    assert db.commits == [2, 2, 2, 2]
+
+
+def test_overflow_is_spooled_by_the_writer_thread(tmp_path):
+    release = threading.Event()
+
+    class SlowDB(FakeDB):
+        def batch(self):
+            batch = super().batch()
+            commit = batch.commit
+
+            def _commit(retry=None, timeout=None):
+                release.wait(5)
+                commit()
+
+            batch.commit = _commit
+            return batch
+
+    db = SlowDB({})
+    sink = BufferedLogSink("audit_logs", batch_size=2, max_buffer=4, flush_seconds=60, spool_dir=str(tmp_path), db=db)
+    spool_threads = []
+    spool = sink._spool
+    sink._spool = lambda entries: (spool_threads.append(threading.current_thread()), spool(entries))
+
+    for record in _records(12):
+        sink.add(record)
+    release.set()
+    sink.close()
+    sink.add({"action": "tarde", "timestamp": STAMP})
+    for thread in threading.enumerate():
+        if thread.name.startswith("log-spool-"):
+            thread.join(5)
+
+    assert spool_threads and threading.main_thread() not in spool_threads
+    assert sink.stats["written"] + sink.stats["spooled"] == 13
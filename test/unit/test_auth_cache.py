@@ -0,0 +1,106 @@
+"""
+Tests de la caché de autenticación (auth_system/auth_cache.py).
+"""
+
+import time
+from unittest.mock import MagicMock, patch
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from auth_system import auth_cache
+
+PROJECT = "demo-project"
+
+
+@pytest.fixture(autouse=True)
+def _clean_cache(monkeypatch):
+    monkeypatch.setenv("FIREBASE_PROJECT_ID", PROJECT)
+    monkeypatch.delenv("FIREBASE_AUTH_EMULATOR_HOST", raising=False)
+    auth_cache.clear_auth_cache()
+    yield
+    auth_cache.clear_auth_cache()
+
+
+@pytest.fixture
+def signing_key(monkeypatch):
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    monkeypatch.setattr(auth_cache, "_public_keys", lambda: {"kid-1": key.public_key()})
+    return key
+
+
+def _token(key, **overrides):
+    now = int(time.time())
+    claims = {
+        "iss": f"https://securetoken.google.com/{PROJECT}",
+        "aud": PROJECT,
+        "sub": "uid-1",
+        "iat": now,
+        "exp": now + 3600,
+        "email": "a@cali.gov.co",
+        **overrides,
+    }
+    return jwt.encode(claims, key, algorithm="RS256", headers={"kid": "kid-1"})
+
+
+def test_valid_token_verified_locally_and_cached(signing_key):
+    token = _token(signing_key)
+    with patch("firebase_admin.auth.verify_id_token") as remote:
+        first = auth_cache.verify_id_token_cached(token)
+        second = auth_cache.verify_id_token_cached(token)
+    remote.assert_not_called()
+    assert first["uid"] == second["uid"] == "uid-1"
+    assert auth_cache.get_cached_token(token)["email"] == "a@cali.gov.co"
+
+
+def test_foreign_audience_falls_back_to_firebase(signing_key):
+    token = _token(signing_key, aud="otro-proyecto")
+    with patch("firebase_admin.auth.verify_id_token", side_effect=ValueError("aud")) as remote:
+        with pytest.raises(ValueError):
+            auth_cache.verify_id_token_cached(token)
+    remote.assert_called_once_with(token)
+    assert auth_cache.get_cached_token(token) is None
+
+
+def test_cache_entry_expires_with_token(signing_key):
+    token = _token(signing_key, exp=int(time.time()) + 1)
+    auth_cache.verify_id_token_cached(token)
+    assert auth_cache.get_cached_token(token) is not None
+    entry_value, _ = auth_cache._token_cache.entries[auth_cache._token_key(token)]
+    auth_cache._token_cache.entries[auth_cache._token_key(token)] = (entry_value, time.time() - 1)
+    assert auth_cache.get_cached_token(token) is None
+
+
+def _fake_db(user_doc):
+    db = MagicMock()
+    doc = MagicMock(exists=True)
+    doc.to_dict.side_effect = lambda: dict(user_doc)
+    db.collection.return_value.document.return_value.get.return_value = doc
+    db.collection.return_value.where.return_value.stream.return_value = iter([])
+    return db
+
+
+def test_user_cache_avoids_reads_until_invalidated():
+    user_doc = {"roles": ["super_admin"], "is_active": True}
+    db = _fake_db(user_doc)
+    get = db.collection.return_value.document.return_value.get
+
+    first = auth_cache.get_cached_user("uid-1", db)
+    first["permissions"].append("mutado")  # las copias no contaminan la caché
+    second = auth_cache.get_cached_user("uid-1", db)
+    assert second["permissions"] == ["*"] and second["uid"] == "uid-1"
+    assert get.call_count == 1
+
+    user_doc["roles"] = ["visualizador"]
+    auth_cache.invalidate_user_cache("uid-1")
+    third = auth_cache.get_cached_user("uid-1", db)
+    assert third["roles"] == ["visualizador"] and "*" not in third["permissions"]
+    assert get.call_count > 1
+
+
+def test_missing_user_is_not_cached():
+    db = MagicMock()
+    db.collection.return_value.document.return_value.get.return_value = MagicMock(exists=False)
+    assert auth_cache.get_cached_user("nadie", db) is None
+    assert len(auth_cache._user_cache) == 0
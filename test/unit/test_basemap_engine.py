@@ -0,0 +1,117 @@
+"""
+Tests del motor de basemaps (STRtree) usado para enriquecer geometrías de UP.
+"""
+
+import json
+
+import pytest
+
+from api.scripts import basemap_engine
+from api.scripts.basemap_engine import (
+    enrich_geometries,
+    get_layer,
+    lookup_containing,
+    lookup_proyectos_estrategicos,
+)
+
+pytestmark = pytest.mark.skipif(
+    not basemap_engine.SHAPELY_AVAILABLE, reason="shapely 2 no disponible"
+)
+
+
+def _square(x0, y0, size=1.0):
+    return {
+        "type": "Polygon",
+        "coordinates": [
+            [[x0, y0], [x0 + size, y0], [x0 + size, y0 + size], [x0, y0 + size], [x0, y0]]
+        ],
+    }
+
+
+@pytest.fixture
+def layers(tmp_path):
+    basemap_engine.clear_layers()
+    comunas = tmp_path / "comunas.geojson"
+    comunas.write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "properties": {"comuna": "A"}, "geometry": _square(0, 0, 2)},
+                    # Se solapa con A: debe ganar el primero en orden de archivo
+                    {"type": "Feature", "properties": {"comuna": "B"}, "geometry": _square(1, 1, 2)},
+                    {"type": "Feature", "properties": {"comuna": "C"}, "geometry": _square(10, 10)},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    estrategicos = tmp_path / "estrategicos"
+    estrategicos.mkdir()
+    (estrategicos / "b.geojson").write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "properties": {"Name": "Pulmón"}, "geometry": _square(0, 0)},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    (estrategicos / "a.geojson").write_text(
+        json.dumps(
+            {
+                "type": "FeatureCollection",
+                "features": [
+                    {"type": "Feature", "properties": {"Name": "Micro"}, "geometry": _square(0, 0, 3)},
+                    {"type": "Feature", "properties": {"Name": "Micro"}, "geometry": _square(0, 0, 4)},
+                ],
+            }
+        ),
+        encoding="utf-8",
+    )
+    yield str(comunas), str(estrategicos)
+    basemap_engine.clear_layers()
+
+
+def test_containing_uses_first_polygon_and_centroid(layers):
+    comunas, _ = layers
+    line = {"type": "LineString", "coordinates": [[10.1, 10.5], [10.9, 10.5]]}
+    results = lookup_containing(
+        comunas,
+        "comuna",
+        [
+            [1.5, 1.5],  # en A y B
+            {"type": "Point", "coordinates": "[2.5, 2.5]"},  # solo B; coords como string
+            line,  # centroide dentro de C
+            [50, 50],
+            None,
+        ],
+    )
+    assert results == ["A", "B", "C", None, None]
+
+
+def test_intersecting_names_unique_in_file_order(layers):
+    _, estrategicos = layers
+    results = lookup_proyectos_estrategicos(
+        [[0.5, 0.5], [3.5, 3.5], [20, 20]], estrategicos
+    )
+    assert results == [["Micro", "Pulmón"], ["Micro"], []]
+
+
+def test_layer_loaded_once(layers):
+    comunas, _ = layers
+    assert get_layer(comunas) is get_layer(comunas)
+
+
+def test_enrich_geometries_without_layers(monkeypatch, tmp_path):
+    basemap_engine.clear_layers()
+    monkeypatch.setattr(basemap_engine, "COMUNAS_GEOJSON", str(tmp_path / "no.geojson"))
+    monkeypatch.setattr(basemap_engine, "BARRIOS_GEOJSON", str(tmp_path / "no2.geojson"))
+    monkeypatch.setattr(basemap_engine, "PROYECTOS_ESTRATEGICOS_DIR", str(tmp_path))
+    result = enrich_geometries([{"type": "Point", "coordinates": [1, 1]}])
+    basemap_engine.clear_layers()
+    assert result == [
+        {"comuna_corregimiento": None, "barrio_vereda": None, "proyectos_estrategicos": []}
+    ]
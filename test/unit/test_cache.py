@@ -0,0 +1,185 @@
+"""
+Tests del caché unificado (api/core/cache.py) y su adaptador de empréstito.
+"""
+
+import asyncio
+
+import pytest
+
+from api.core import cache
+from api.core.cache import (
+    FrozenDict,
+    MemoryBackend,
+    SQLiteBackend,
+    get_cache_key,
+    get_from_cache,
+    invalidate_tags,
+    set_in_cache,
+    thaw,
+)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        instance = MemoryBackend(max_size=100)
+    else:
+        instance = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+    previous = cache.get_cache_backend()
+    cache.set_cache_backend(instance)
+    yield instance
+    cache.set_cache_backend(previous)
+
+
+def test_hits_are_frozen_and_not_copied(backend):
+    key = get_cache_key("frozen_ns", 1)
+    original = {"data": [{"a": 1}]}
+    set_in_cache(key, original)
+    original["data"].append({"b": 2})  # el caché guardó su propia copia
+
+    first, hit = get_from_cache(key)
+    assert hit and first == {"data": [{"a": 1}]}
+    assert isinstance(first, FrozenDict)
+    with pytest.raises(TypeError):
+        first["data"].append(3)
+    with pytest.raises(TypeError):
+        first["x"] = 1
+
+    mutable = thaw(first)
+    mutable["data"].append(3)
+    if isinstance(backend, MemoryBackend):
+        second, _ = get_from_cache(key)
+        assert second is first
+
+
+def test_tag_invalidation(backend):
+    dash = get_cache_key("up_dashboard", "a")
+    init = get_cache_key("init_360", "b")
+    other = get_cache_key("otro", "c")
+    set_in_cache(dash, 1, tags=("unidades",))
+    set_in_cache(init, 2, tags=("unidades",))
+    set_in_cache(other, 3)
+
+    assert invalidate_tags("unidades") == 2
+    assert get_from_cache(dash) == (None, False)
+    assert get_from_cache(init) == (None, False)
+    assert get_from_cache(other) == (3, True)
+    # El namespace también es un tag
+    assert invalidate_tags("otro") == 1
+
+
+def test_namespace_ttl_expires_entries(backend):
+    cache.configure_namespace("ttl_ns", 0)
+    try:
+        key = get_cache_key("ttl_ns", 1)
+        set_in_cache(key, "v")
+        assert get_from_cache(key, max_age_seconds=None) == (None, False)
+    finally:
+        cache._namespace_ttls.pop("ttl_ns", None)
+
+
+def test_lfu_evicts_least_used():
+    lfu = MemoryBackend(max_size=2, policy="lfu")
+    lfu.set("a", 1, None, frozenset())
+    lfu.set("b", 2, None, frozenset())
+    lfu.get("a")
+    lfu.get("a")
+    lfu.get("b")
+    lfu.set("c", 3, None, frozenset())
+    assert set(lfu.keys()) == {"a", "c"}
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    worker_a = SQLiteBackend(path)
+    worker_b = SQLiteBackend(path)
+    worker_a.set("ns:k", cache.freeze({"v": [1, 2]}), 60, frozenset({"ns"}))
+
+    value, _age = worker_b.get("ns:k")
+    assert value == {"v": [1, 2]} and isinstance(value, FrozenDict)
+    assert worker_b.invalidate_tags(["ns"]) == 1
+    assert worker_a.get("ns:k") is None
+
+
+def test_emprestito_with_cache_uses_unified_cache(backend):
+    from api.scripts import emprestito_cache
+
+    calls = []
+
+    @emprestito_cache.with_cache(ttl_seconds=60)
+    async def get_contratos_demo(centro=None):
+        calls.append(centro)
+        return {"success": True, "data": [centro]}
+
+    async def run():
+        first = await get_contratos_demo(centro="X")
+        second = await get_contratos_demo(centro="X")
+        await emprestito_cache.invalidate_contratos_cache()
+        third = await get_contratos_demo(centro="X")
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == second == third == {"success": True, "data": ["X"]}
+    assert calls == ["X", "X"]
+    assert emprestito_cache.get_cache_stats()["total_entries"] == 1
+
+
+def test_concurrent_misses_share_one_computation(backend):
+    calls = []
+
+    @cache.async_cache(ttl_seconds=60)
+    async def slow_dashboard(centro):
+        calls.append(centro)
+        await asyncio.sleep(0.05)
+        return {"centro": centro}
+
+    async def run():
+        return await asyncio.gather(*(slow_dashboard("A") for _ in range(20)))
+
+    results = asyncio.run(run())
+    assert calls == ["A"]
+    assert all(r == {"centro": "A"} for r in results)
+    assert cache._inflight == {}
+
+
+def test_stale_value_served_while_single_refresh_runs(backend):
+    key = get_cache_key("swr_ns", 1)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return {"version": len(calls)}
+
+    async def run():
+        first = await cache.get_or_compute(key, compute, ttl_seconds=0, stale_seconds=60)
+        # Vencido (TTL 0) pero dentro de la ventana stale: se sirve sin esperar
+        stale = await asyncio.gather(
+            *(cache.get_or_compute(key, compute, ttl_seconds=0, stale_seconds=60) for _ in range(5))
+        )
+        await asyncio.gather(*cache._background_tasks)
+        return first, stale
+
+    first, stale = asyncio.run(run())
+    assert first == {"version": 1}
+    assert all(v == {"version": 1} for v in stale)
+    assert len(calls) == 2  # un solo refresco en segundo plano
+    assert get_from_cache(key, max_age_seconds=None)[0] == {"version": 2}
+
+
+def test_failed_computation_is_not_cached_and_propagates(backend):
+    key = get_cache_key("fail_ns", 1)
+
+    async def boom():
+        raise RuntimeError("firestore caído")
+
+    async def run():
+        results = await asyncio.gather(
+            *(cache.get_or_compute(key, boom) for _ in range(3)), return_exceptions=True
+        )
+        return results
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert get_from_cache(key, max_age_seconds=None) == (None, False)
+    assert cache._inflight == {}
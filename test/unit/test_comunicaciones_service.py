@@ -0,0 +1,99 @@
+"""
+Tests del motor de envío de comunicaciones (api/services/comunicaciones_service.py).
+"""
+
+import smtplib
+import threading
+
+import pytest
+
+from api.services import comunicaciones_service as svc
+from database.audit_sink import BufferedLogSink
+
+from .test_firestore_repository import FakeDB
+
+
+class FakeSMTP:
+    opened = 0
+
+    def __init__(self, fail_for=()):
+        FakeSMTP.opened += 1
+        self.fail_for = fail_for
+        self.sent = []
+        self.closed = False
+
+    def sendmail(self, sender, to, payload):
+        if to in self.fail_for:
+            raise smtplib.SMTPRecipientsRefused({to: (550, b"no existe")})
+        self.sent.append(to)
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def smtp(monkeypatch, tmp_path):
+    servers = []
+    lock = threading.Lock()
+
+    def _open():
+        server = FakeSMTP(fail_for={"malo@cali.gov.co"})
+        with lock:
+            servers.append(server)
+        return server
+
+    db = FakeDB({})
+    FakeSMTP.opened = 0
+    monkeypatch.setattr(svc, "SMTP_CONFIGURED", True)
+    monkeypatch.setattr(svc, "GMAIL_API_CONFIGURED", False)
+    monkeypatch.setattr(svc, "SMTP_USER", "calitrack@cali.gov.co")
+    monkeypatch.setattr(svc, "EMAIL_SEND_RATE", 1000.0)
+    monkeypatch.setattr(svc, "_open_smtp", _open)
+    monkeypatch.setattr(svc, "_get_db", lambda: db)
+    sink = BufferedLogSink(
+        svc._LOG_COLLECTION, batch_size=200, flush_seconds=60, spool_dir=str(tmp_path), db=db
+    )
+    monkeypatch.setattr(svc, "get_log_sink", lambda collection: sink)
+    monkeypatch.setattr(svc, "_maybe_alert_quota", lambda count: None)
+    return servers, db
+
+
+def test_token_bucket_refills_over_time():
+    now = [0.0]
+    bucket = svc._TokenBucket(rate=2, capacity=3, tokens=1, clock=lambda: now[0])
+    assert bucket.try_acquire() and not bucket.try_acquire()
+    now[0] = 10.0
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+
+def test_broadcast_reuses_sessions_and_batches_logs(smtp, monkeypatch):
+    servers, db = smtp
+    monkeypatch.setattr(svc, "_count_sent_last_24h", lambda fresh=False: 0)
+    recipients = [(f"u{i}@cali.gov.co", "") for i in range(30)] + [("malo@cali.gov.co", ""), ("", "")]
+
+    result = svc.deliver_broadcast(recipients, "Aviso", "<p>Hola</p>", workers=3)
+
+    assert result["sent"] == 30 and result["failed"] == 1 and result["blocked"] == 0
+    assert result["errors"][0]["to"] == "malo@cali.gov.co"
+    # Una conexión por hilo, cerrada al terminar
+    assert 1 <= FakeSMTP.opened <= 3
+    assert sum(len(s.sent) for s in servers) == 30 and all(s.closed for s in servers)
+    # 31 logs por lotes del sink compartido, escritos al terminar
+    assert db.commits == [31]
+
+
+def test_broadcast_stops_at_daily_quota(smtp, monkeypatch):
+    servers, db = smtp
+    monkeypatch.setattr(svc, "DAILY_EMAIL_QUOTA", 20)
+    monkeypatch.setattr(svc, "_count_sent_last_24h", lambda fresh=False: 15)
+    recipients = [(f"u{i}@cali.gov.co", "") for i in range(10)]
+
+    result = svc.deliver_broadcast(recipients, "Aviso", "<p>Hola</p>", workers=2)
+
+    # Bloqueo al 95 % de 20 → 19; quedan 4 envíos
+    assert result["sent"] == 4 and result["blocked"] == 6
+    statuses = [data["status"] for _, _, data in db.writes]
+    assert statuses.count("blocked_quota") == 6 and statuses.count("sent") == 4
@@ -0,0 +1,63 @@
+"""
+Tests de las cargas con upsert por diferencias (database/firestore_repository.diff_upsert).
+"""
+
+import asyncio
+
+from api.scripts import flujo_caja_operations as flujo
+from database import firestore_repository as repo
+
+from .test_firestore_repository import FakeDB
+
+
+def test_merge_writes_only_new_and_changed_records():
+    db = FakeDB({"c": {"a": {"x": 1, "ts": "t0", "extra": "se conserva"}, "b": {"x": 2, "ts": "t0"}}})
+    records = {
+        "a": {"x": 1, "ts": "t1"},  # solo cambia el campo ignorado
+        "b": {"x": 3, "ts": "t1"},
+        "c": {"x": 4, "ts": "t1"},
+    }
+
+    counts = asyncio.run(repo.diff_upsert("c", records, ignore_fields=("ts",), db=db))
+
+    assert counts == {"created": 1, "updated": 1, "unchanged": 1, "skipped": 0, "deleted": 0, "written": 2}
+    assert sorted(doc_id for _, doc_id, _ in db.writes) == ["b", "c"]
+    assert db.commits == [2] and db.queries == []  # existentes leídos con get_all
+
+    assert repo.record_hash({"x": 1, "ts": "t1"}, ignore=("ts",)) == repo.record_hash({"ts": "t0", "x": 1}, ignore=("ts",))
+
+
+def test_replace_pages_the_collection_and_deletes_stale_docs():
+    existing = {f"d{i:04d}": {"v": i} for i in range(1200)}
+    db = FakeDB({"c": existing})
+    records = {f"d{i:04d}": {"v": i if i % 100 else -i} for i in range(0, 1300, 2)}
+
+    counts = asyncio.run(repo.diff_upsert("c", records, mode="replace", batch_size=300, db=db))
+
+    assert counts["deleted"] == 600 and counts["created"] == 50
+    assert counts["updated"] == 11 and counts["unchanged"] == 589  # d0000 no cambia (-0 == 0)
+    assert len(db.queries) >= 3 and max(db.commits) <= 300
+    assert sum(db.commits) == counts["written"] == 600 + 50 + 11
+
+    counts = asyncio.run(repo.diff_upsert("c", {"n": {"v": 1}}, mode="append", db=FakeDB({"c": {"n": {"v": 0}}})))
+    assert counts["skipped"] == 1 and counts["written"] == 0
+
+
+def test_flujo_caja_reload_skips_unchanged_rows(monkeypatch):
+    db = FakeDB({})
+    monkeypatch.setattr(flujo, "get_firestore_client", lambda: db)
+    rows = [
+        {"id_registro": "BP1_BID_jul-25", "desembolso": 10.0, "fecha_procesamiento": "t0"},
+        {"id_registro": "BP2_BID_jul-25", "desembolso": 5.0, "fecha_procesamiento": "t0"},
+        {"desembolso": 1.0},
+    ]
+    first = asyncio.run(flujo.save_flujo_caja_to_firebase(rows))
+    assert first["summary"]["guardados_exitosamente"] == 2 and first["summary"]["errores"] == 1
+    db.collections["flujo_caja_emprestito"] = {doc_id: data for _, doc_id, data in db.writes}
+
+    rows[0] = {**rows[0], "desembolso": 12.0, "fecha_procesamiento": "t1"}
+    rows[1] = {**rows[1], "fecha_procesamiento": "t1"}
+    second = asyncio.run(flujo.save_flujo_caja_to_firebase(rows[:2]))
+
+    assert second["summary"]["actualizados"] == 1 and second["summary"]["sin_cambios"] == 1
+    assert second["summary"]["escrituras"] == 1
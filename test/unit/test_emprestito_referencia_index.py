@@ -0,0 +1,94 @@
+"""
+Tests del índice de referencias de empréstito (api/scripts/emprestito_referencia_index.py).
+"""
+
+import asyncio
+
+import pytest
+
+from api.scripts import emprestito_referencia_index as ref_index
+from api.scripts import reportes_contratos_operations as reportes
+from api.scripts.emprestito_referencia_index import ReferenciaIndex, invalidate_referencia_index
+
+from .test_firestore_repository import FakeDB
+
+DAGMA = "DAGMA"
+
+
+def _collections():
+    return {
+        "contratos_emprestito": {
+            "c1": {"referencia_contrato": "CT-1", "nombre_centro_gestor": DAGMA, "bp": "BP1",
+                   "referencia_proceso": "PR-1", "estado_contrato": "En ejecución"},
+            "c2": {"referencia_contrato": "CT-2", "nombre_centro_gestor": "", "bp": ""},
+        },
+        "ordenes_compra_emprestito": {
+            "o1": {"numero_orden": "OC-1", "nombre_centro_gestor": DAGMA, "bp": "BP2"},
+            "o2": {"numero_orden": "CT-1", "nombre_centro_gestor": "Salud", "bp": "BPX"},
+        },
+        "convenios_transferencias_emprestito": {
+            "v1": {"referencia_contrato": "CT-2", "nombre_centro_gestor": "Cultura", "bp": "BP3"},
+        },
+        "reportes_contratos": {
+            "r1": {"referencia_contrato": "OC-1", "nombre_centro_gestor": ""},
+            "r2": {"referencia_contrato": "CT-1", "nombre_centro_gestor": DAGMA},
+            "r3": {"referencia_contrato": "CT-2"},
+        },
+    }
+
+
+@pytest.fixture
+def index(monkeypatch):
+    now = [0.0]
+    db = FakeDB(_collections())
+    index = ReferenciaIndex(db_getter=lambda: db, ttl_seconds=60, clock=lambda: now[0])
+    monkeypatch.setattr(ref_index, "_index", index)
+    monkeypatch.setattr(reportes, "get_firestore_client", lambda: db)
+    return index, db, now
+
+
+def test_resolution_priority_and_centro_lookup(index):
+    index, db, _ = index
+
+    assert index.lookup("CT-1")["bp"] == "BP1"  # contratos antes que órdenes
+    assert index.lookup("CT-2")["nombre_centro_gestor"] == "Cultura"  # contrato vacío → convenio
+    assert index.lookup("CT-1")["referencia_proceso"] == "PR-1"
+    assert index.lookup("NO-EXISTE") is None
+    assert index.referencias_by_centro(" DAGMA ") == {"CT-1", "OC-1"}
+    assert [e["referencia"] for e in index.entries("contratos_emprestito")] == ["CT-1", "CT-2"]
+    assert len(db.queries) == 3  # una lectura por colección
+
+
+def test_invalidation_rereads_only_what_changed(index):
+    index, db, now = index
+    index.lookup("OC-1")
+
+    db.collections["ordenes_compra_emprestito"]["o1"]["bp"] = "BP9"
+    db.collections["convenios_transferencias_emprestito"]["v2"] = {"referencia_contrato": "CV-2", "bp": "BP4"}
+    del db.collections["contratos_emprestito"]["c1"]
+    invalidate_referencia_index("ordenes_compra_emprestito", "o1")
+    invalidate_referencia_index("contratos_emprestito", "c1")
+    invalidate_referencia_index("convenios_transferencias_emprestito")
+    invalidate_referencia_index("rpc_contratos_emprestito", "x")  # colección no indexada: se ignora
+
+    assert index.lookup("OC-1")["bp"] == "BP9"
+    assert index.lookup("CT-1")["nombre_centro_gestor"] == "Salud"
+    assert index.lookup("CV-2")["bp"] == "BP4"
+    assert index.stats()["loads"] == 1 and len(db.queries) == 4
+
+    now[0] = 61
+    index.lookup("OC-1")
+    assert index.stats()["loads"] == 2
+
+
+def test_reportes_readers_use_the_index(index):
+    index, db, _ = index
+
+    mapa = asyncio.run(reportes.get_all_centros_gestores_map())
+    assert mapa["OC-1"] == {"nombre_centro_gestor": DAGMA, "bp": "BP2"}
+    assert asyncio.run(reportes.get_data_from_emprestito("CT-2"))["bp"] == "BP3"
+
+    result = asyncio.run(reportes.get_reportes_by_centro_gestor(DAGMA))
+    assert sorted(r["id"] for r in result["data"]) == ["r1", "r2"]
+    assert next(r for r in result["data"] if r["id"] == "r1")["nombre_centro_gestor_source"] == "emprestito_collections"
+    assert index.stats()["loads"] == 1
@@ -0,0 +1,83 @@
+"""
+Tests de los serializadores por fragmentos de api/exportar_geo.
+"""
+
+import io
+import json
+import sqlite3
+import zipfile
+
+import pytest
+
+from api import exportar_geo
+from api.exportar_geo import iter_export, iter_flat_features
+
+UPS = [
+    {"upid": "UNP-1", "nombre_up": "Parque <Ñ>", "geometry": {"type": "Point", "coordinates": [-76.5, 3.4]}},
+    {
+        "upid": "UNP-2",
+        "nombre_up": "Vía",
+        "geometry": {"type": "LineString", "coordinates": "[[-76.5, 3.4], [-76.4, 3.5]]"},
+    },
+    {"upid": "UNP-3", "nombre_up": "Sin geometría"},
+]
+INTERVENCIONES = {
+    "UNP-1": [
+        {"intervencion_id": "UNP-1-INT-1", "presupuesto_base": 10},
+        {"intervencion_id": "UNP-1-INT-2", "presupuesto_base": 20},
+    ]
+}
+
+
+def _features():
+    return iter_flat_features(iter(UPS), INTERVENCIONES)
+
+
+def test_flat_features_are_lazy_and_do_not_mutate_inputs():
+    gen = _features()
+    first = next(gen)
+    assert first["properties"]["intervencion_id"] == "UNP-1-INT-1"
+    assert len([first, *gen]) == 4
+    assert "intervencion_id" not in UPS[0]
+
+
+def test_geojson_stream_matches_single_dump():
+    chunks = list(iter_export(_features(), "geojson", "b"))
+    payload = b"".join(chunks)
+    assert payload == exportar_geo.to_geojson(list(_features()))
+    fc = json.loads(payload)
+    assert [f["properties"]["upid"] for f in fc["features"]] == ["UNP-1", "UNP-1", "UNP-2", "UNP-3"]
+    assert fc["features"][2]["geometry"]["coordinates"] == [[-76.5, 3.4], [-76.4, 3.5]]
+
+
+@pytest.mark.parametrize("formato", ["kmz", "shp"])
+def test_streamed_zip_is_readable(formato):
+    payload = b"".join(iter_export(_features(), formato, "up"))
+    with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+        assert zf.testzip() is None
+        names = zf.namelist()
+    if formato == "kmz":
+        assert names == ["doc.kml"]
+    else:
+        assert "up_atributos.csv" in names
+        assert {"up_point.shp", "up_line.dbf", "up_none.shx"} <= set(names)
+
+
+def test_geopackage_spooled_to_temp_file_and_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportar_geo.tempfile, "tempdir", str(tmp_path))
+    payload = b"".join(iter_export(_features(), "gpkg", "up"))
+    assert list(tmp_path.iterdir()) == []
+
+    out = tmp_path / "out.gpkg"
+    out.write_bytes(payload)
+    con = sqlite3.connect(out)
+    try:
+        assert con.execute('SELECT COUNT(*) FROM "up"').fetchone() == (4,)
+    finally:
+        con.close()
+
+
+def test_csv_has_bom_and_all_rows():
+    payload = b"".join(iter_export(_features(), "csv", "up"))
+    assert payload.startswith(b"\xef\xbb\xbf")
+    assert len(payload.decode("utf-8-sig").strip().splitlines()) == 5
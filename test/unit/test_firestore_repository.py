@@ -0,0 +1,184 @@
+"""
+Tests de la capa de acceso asíncrono a Firestore (database/firestore_repository.py).
+"""
+
+import asyncio
+import threading
+import time
+
+from database import firestore_repository as repo
+
+
+class FakeDoc:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class FakeQuery:
+    def __init__(self, db, name, docs, ops=()):
+        self.db, self.name, self.docs, self.ops = db, name, docs, list(ops)
+
+    def _with(self, op):
+        return FakeQuery(self.db, self.name, self.docs, [*self.ops, op])
+
+    def where(self, field, op, value):
+        return self._with(("where", field, op, value))
+
+    def select(self, fields):
+        return self._with(("select", tuple(fields)))
+
+    def order_by(self, field, direction="ASCENDING"):
+        return self._with(("order_by", field, direction))
+
+    def limit(self, n):
+        return self._with(("limit", n))
+
+    def offset(self, n):
+        return self._with(("offset", n))
+
+    def start_after(self, doc):
+        return self._with(("start_after", doc if isinstance(doc, dict) else {"__name__": doc.id}))
+
+    def _run(self):
+        self.db.threads.add(threading.current_thread().name)
+        self.db.queries.append(self.ops)
+        docs = sorted(self.docs.items())
+        for op in self.ops:
+            if op[0] == "where" and op[2] == "in":
+                docs = [(k, v) for k, v in docs if v.get(op[1]) in op[3]]
+            elif op[0] == "where":
+                docs = [(k, v) for k, v in docs if v.get(op[1]) == op[3]]
+
+        orders = [(op[1], op[2]) for op in self.ops if op[0] == "order_by"] or [("__name__", "ASCENDING")]
+
+        def value(item, field):
+            return item[0] if field == "__name__" else item[1].get(field)
+
+        for field, direction in reversed(orders):
+            docs.sort(key=lambda item: value(item, field), reverse=direction == "DESCENDING")
+
+        def after(item, cursor):
+            for field, direction in orders:
+                a, b = value(item, field), cursor[field]
+                if a != b:
+                    return a > b if direction == "ASCENDING" else a < b
+            return False
+
+        # Como en Firestore: cursor, luego offset y por último el límite
+        for op in self.ops:
+            if op[0] == "start_after":
+                docs = [item for item in docs if after(item, op[1])]
+        for op in self.ops:
+            if op[0] == "offset":
+                docs = docs[op[1] :]
+        for op in self.ops:
+            if op[0] == "limit":
+                docs = docs[: op[1]]
+        return [FakeDoc(k, v) for k, v in docs]
+
+    def stream(self):
+        return iter(self._run())
+
+    def get(self):
+        return self._run()
+
+    def document(self, doc_id=None):
+        return ("ref", self.name, doc_id or f"auto-{len(self.db.writes)}")
+
+
+class FakeBatch:
+    def __init__(self, db):
+        self.db, self.ops = db, []
+
+    def set(self, ref, data, merge=False):
+        self.ops.append(("set", ref[2], data))
+
+    def update(self, ref, data):
+        self.ops.append(("update", ref[2], data))
+
+    def delete(self, ref):
+        self.ops.append(("delete", ref[2], None))
+
+    def commit(self, retry=None, timeout=None):
+        self.db.commits.append(len(self.ops))
+        self.db.writes.extend(self.ops)
+
+
+class FakeDB:
+    def __init__(self, collections):
+        self.collections = collections
+        self.threads, self.queries, self.commits, self.writes = set(), [], [], []
+
+    def collection(self, name):
+        return FakeQuery(self, name, self.collections.setdefault(name, {}))
+
+    def batch(self):
+        return FakeBatch(self)
+
+    def get_all(self, refs, field_paths=None):
+        for _, name, doc_id in refs:
+            yield FakeDoc(doc_id, self.collections[name].get(doc_id))
+
+
+DB = FakeDB({"procesos": {f"p{i:03d}": {"n": i, "bp": "B" if i % 2 else "A"} for i in range(25)}})
+
+
+def test_stream_collection_runs_in_firestore_pool():
+    docs = asyncio.run(
+        repo.stream_collection("procesos", where=[("bp", "==", "A")], select=["n"], limit=3, db=DB)
+    )
+    assert [d.id for d in docs] == ["p000", "p002", "p004"]
+    assert DB.queries[-1] == [("where", "bp", "==", "A"), ("select", ("n",)), ("limit", 3)]
+    assert all(name.startswith("firestore") for name in DB.threads)
+    stats = repo.get_repository_stats()["collections"]["procesos"]
+    assert stats["operations"] >= 1 and stats["documents"] >= 3
+
+
+def test_paginated_uses_name_cursor():
+    async def run():
+        return [len(page) async for page in repo.paginated("procesos", 10, db=DB)]
+
+    assert asyncio.run(run()) == [10, 10, 5]
+    docs = asyncio.run(repo.get_all_paginated("procesos", 10, db=DB))
+    assert len({d.id for d in docs}) == 25
+
+
+def test_collection_limit_bounds_concurrency():
+    repo.configure_collection_limit("lenta", 2)
+    active = {"now": 0, "max": 0}
+    lock = threading.Lock()
+
+    def slow():
+        with lock:
+            active["now"] += 1
+            active["max"] = max(active["max"], active["now"])
+        time.sleep(0.03)
+        with lock:
+            active["now"] -= 1
+
+    async def run():
+        await asyncio.gather(*(repo.run_blocking("lenta", slow) for _ in range(6)))
+
+    asyncio.run(run())
+    assert active["max"] == 2
+
+
+def test_batched_write_and_get_many():
+    db = FakeDB({"destino": {"a": {"v": 1}}})
+    written = asyncio.run(
+        repo.batched_write(
+            "destino",
+            [("set", f"d{i}", {"v": i}) for i in range(7)] + [("delete", "a", None)],
+            batch_size=3,
+            db=db,
+        )
+    )
+    assert written == 8 and db.commits == [3, 3, 2]
+
+    found = asyncio.run(repo.get_many("destino", ["a", "x", "a"], db=FakeDB({"destino": {"a": {"v": 1}}})))
+    assert found == {"a": {"v": 1}, "x": None}
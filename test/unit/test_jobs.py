@@ -0,0 +1,143 @@
+"""
+Tests de la cola de trabajos en segundo plano (api/core/jobs.py).
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from api.core import jobs
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = jobs.JobStore(str(tmp_path / "jobs.sqlite3"))
+    monkeypatch.setattr(jobs, "_handlers", {})
+    jobs.set_job_store(store)
+    yield store
+    jobs.set_job_store(None)
+
+
+def test_submit_dedupes_active_jobs(store):
+    @jobs.job_handler("demo")
+    async def _demo(ctx, n=0):
+        return n
+
+    first, created = jobs.submit_job("demo", {"n": 1}, created_by="u1")
+    again, created_again = jobs.submit_job("demo", {"n": 1}, created_by="u1")
+    other, _ = jobs.submit_job("demo", {"n": 2}, created_by="u1")
+
+    assert created and not created_again
+    assert again["id"] == first["id"] and other["id"] != first["id"]
+    with pytest.raises(ValueError):
+        jobs.submit_job("no-registrado")
+
+    response = jobs.job_accepted_response(again, created_again)
+    assert response.status_code == 202
+    assert response.headers["location"] == f"/jobs/{first['id']}"
+
+
+def test_dedupe_is_per_user_and_each_user_can_read_their_job(store):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from api.routers.jobs import router
+    from auth_system.decorators import get_current_user
+
+    @jobs.job_handler("demo")
+    async def _demo(ctx, n=0):
+        return n
+
+    usuario = {"uid": "u1", "permissions": []}
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_current_user] = lambda: usuario
+    client = TestClient(app)
+
+    first, _ = jobs.submit_job("demo", {"n": 1}, created_by="u1")
+    second, created = jobs.submit_job("demo", {"n": 1}, created_by="u2")
+
+    assert created and second["id"] != first["id"]
+    assert client.get(f"/jobs/{first['id']}").status_code == 200
+    usuario["uid"] = "u2"
+    assert client.get(f"/jobs/{second['id']}").status_code == 200
+    assert client.get(f"/jobs/{first['id']}").status_code == 404
+
+
+def test_run_job_reports_progress_and_result(store):
+    @jobs.job_handler("demo")
+    async def _demo(ctx, n=0):
+        ctx.report(progress={"procesados": n}, partial=[1])
+        return {"total": n}
+
+    job, _ = jobs.submit_job("demo", {"n": 3})
+    claimed = store.claim(["demo"])
+    assert claimed["id"] == job["id"] and claimed["status"] == jobs.RUNNING
+    asyncio.run(jobs.run_job(store, claimed))
+
+    done = jobs.get_job(job["id"])
+    assert done["status"] == jobs.SUCCEEDED
+    assert done["result"] == {"total": 3}
+    assert done["progress"] == {"procesados": 3} and done["partial_result"] == [1]
+    # Terminado, una petición idéntica crea un trabajo nuevo
+    assert jobs.submit_job("demo", {"n": 3})[1] is True
+
+
+def test_run_job_failure_keeps_detail(store):
+    @jobs.job_handler("demo")
+    async def _demo(ctx):
+        raise jobs.JobFailed({"success": False, "error": "sin procesos"})
+
+    jobs.submit_job("demo")
+    asyncio.run(jobs.run_job(store, store.claim(["demo"])))
+    (job,) = jobs.list_jobs()
+    assert job["status"] == jobs.FAILED
+    assert job["error"] == {"success": False, "error": "sin procesos"}
+
+
+def test_cancel_queued_and_running(store):
+    lotes = []
+
+    @jobs.job_handler("demo")
+    async def _demo(ctx, n=0):
+        for i in range(5):
+            if i == 2:
+                jobs.cancel_job(ctx.job_id)
+            await ctx.areport(progress={"lote": i})
+            if ctx.cancelled:
+                break
+            lotes.append(i)
+        return {"lotes": lotes}
+
+    queued, _ = jobs.submit_job("demo", {"n": 1})
+    assert jobs.cancel_job(queued["id"])["status"] == jobs.CANCELLED
+    assert store.claim(["demo"]) is None
+
+    running, _ = jobs.submit_job("demo", {"n": 2})
+    asyncio.run(jobs.run_job(store, store.claim(["demo"])))
+    job = jobs.get_job(running["id"])
+    assert job["status"] == jobs.CANCELLED
+    assert job["result"] == {"lotes": [0, 1]}
+
+
+def test_orphaned_job_is_requeued_then_failed(store, monkeypatch):
+    monkeypatch.setattr(jobs, "JOBS_MAX_ATTEMPTS", 2)
+
+    @jobs.job_handler("demo")
+    async def _demo(ctx):
+        return None
+
+    job, _ = jobs.submit_job("demo")
+
+    def _orphan():
+        claimed = store.claim(["demo"])
+        store._conn().execute(
+            "UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - jobs.JOBS_STALE_SECONDS - 1, job["id"])
+        )
+        return claimed
+
+    assert _orphan()["attempts"] == 1
+    assert _orphan()["attempts"] == 2  # volvió a la cola y se tomó de nuevo
+    assert store.claim(["demo"]) is None
+    assert jobs.get_job(job["id"])["status"] == jobs.FAILED
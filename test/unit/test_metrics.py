@@ -0,0 +1,135 @@
+"""
+Tests de las métricas Prometheus (api/core/metrics.py).
+"""
+
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.auth.credentials import AnonymousCredentials
+from google.cloud.firestore_v1.client import Client
+from google.cloud.firestore_v1.types import document, firestore, write
+from prometheus_client import REGISTRY
+
+from api.core import cache, metrics
+from api.core.pipeline import RequestPipeline
+from api.routers.core_routes import router as core_router
+
+
+def _sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_route_latency_histogram_and_exposition():
+    app = FastAPI()
+    app.include_router(core_router)
+
+    @app.get("/obras/{obra_id}")
+    async def obra(obra_id: str):
+        return {"id": obra_id}
+
+    app.add_middleware(RequestPipeline, stages=[metrics.MetricsStage()])
+    client = TestClient(app)
+    labels = {"method": "GET", "route": "/obras/{obra_id}", "status": "2xx"}
+    before = _sample("http_request_duration_seconds_count", labels)
+
+    client.get("/obras/1")
+    client.get("/obras/2")
+    client.get("/no-existe")
+
+    # Plantilla de la ruta como etiqueta, no la URL concreta
+    assert _sample("http_request_duration_seconds_count", labels) == before + 2
+    assert _sample("http_request_duration_seconds_count", {"method": "GET", "route": "unmatched", "status": "4xx"}) >= 1
+    assert _sample("http_requests_in_flight", {"method": "GET"}) == 0
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{le="0.005",method="GET",route="/obras/{obra_id}",status="2xx"}' in response.text
+
+
+def test_cache_hits_and_misses_per_namespace():
+    key = cache.get_cache_key("metricas_prueba", 1)
+    namespace = key.split(":", 1)[0]
+    hits = _sample("cache_requests_total", {"namespace": namespace, "result": "hit"})
+    misses = _sample("cache_requests_total", {"namespace": namespace, "result": "miss"})
+
+    assert cache.get_from_cache(key) == (None, False)
+    cache.set_in_cache(key, {"valor": 1})
+    assert cache.get_from_cache(key)[1] is True
+
+    assert _sample("cache_requests_total", {"namespace": namespace, "result": "miss"}) == misses + 1
+    assert _sample("cache_requests_total", {"namespace": namespace, "result": "hit"}) == hits + 1
+
+
+def test_firestore_reads_and_writes_per_collection():
+    assert metrics.instrument_firestore() is True
+    client = Client(project="p", credentials=AnonymousCredentials())
+    api = mock.MagicMock()
+    client._firestore_api_internal = api
+    prefix = "projects/p/databases/(default)/documents/obras_metricas"
+    api.run_query.return_value = iter(
+        [firestore.RunQueryResponse(document=document.Document(name=f"{prefix}/d{i}")) for i in range(3)]
+    )
+    api.commit.return_value = firestore.CommitResponse(write_results=[write.WriteResult(), write.WriteResult()])
+    read = {"collection": "obras_metricas", "route": "background"}
+    written = {"collection": "logs_metricas", "route": "background"}
+    reads_before = _sample("firestore_documents_read_total", read)
+    writes_before = _sample("firestore_documents_written_total", written)
+
+    assert len(list(client.collection("obras_metricas").stream())) == 3
+    batch = client.batch()
+    batch.set(client.collection("logs_metricas").document("a"), {"x": 1})
+    batch.delete(client.collection("logs_metricas").document("b"))
+    batch.commit()
+
+    assert _sample("firestore_documents_read_total", read) == reads_before + 3
+    assert _sample("firestore_documents_written_total", written) == writes_before + 2
+
+
+def test_firestore_internals_used_by_instrumentation_exist():
+    """Falla si una versión de google-cloud-firestore cambia lo que instrument_firestore parchea."""
+    import inspect
+
+    from google.cloud.firestore_v1.batch import WriteBatch
+    from google.cloud.firestore_v1.document import DocumentReference
+    from google.cloud.firestore_v1.query import Query
+
+    assert metrics.instrument_firestore() is True
+    for owner, name in ((Query, "_make_stream"), (DocumentReference, "get"), (Client, "get_all"), (WriteBatch, "commit")):
+        assert callable(getattr(owner, name, None)), f"{owner.__name__}.{name} ya no existe"
+    assert inspect.isgeneratorfunction(Query._make_stream)
+
+    client = Client(project="p", credentials=AnonymousCredentials())
+    api = mock.MagicMock()
+    client._firestore_api_internal = api
+    prefix = "projects/p/databases/(default)/documents/obras_internas"
+    api.run_query.return_value = iter(
+        [firestore.RunQueryResponse(document=document.Document(name=f"{prefix}/d{i}")) for i in range(2)]
+    )
+    api.batch_get_documents.side_effect = lambda **kwargs: iter(
+        [firestore.BatchGetDocumentsResponse(found=document.Document(name=name)) for name in kwargs["request"]["documents"]]
+    )
+    labels = {"collection": "obras_internas", "route": "background"}
+    before = _sample("firestore_documents_read_total", labels)
+
+    # Atributos privados que leen los wrappers para saber la colección
+    assert client.collection("obras_internas").limit(1)._parent.id == "obras_internas"
+    assert client.collection("obras_internas").document("d0")._path == ("obras_internas", "d0")
+
+    # Query.get pasa por _make_stream
+    assert len(client.collection("obras_internas").get()) == 2
+    assert _sample("firestore_documents_read_total", labels) == before + 2
+    # DocumentReference.get usa batch_get_documents directamente, no Client.get_all
+    # (si lo hiciera, cada lectura se contaría dos veces)
+    client.collection("obras_internas").document("d0").get()
+    assert api.batch_get_documents.call_count == 1
+    assert _sample("firestore_documents_read_total", labels) == before + 3
+    refs = [client.collection("obras_internas").document(f"d{i}") for i in range(3)]
+    assert len(list(client.get_all(refs))) == 3
+    assert _sample("firestore_documents_read_total", labels) == before + 6
+
+    # WriteBatch.commit lee _write_pbs para contar escrituras
+    batch = client.batch()
+    batch.set(client.collection("obras_internas").document("x"), {"a": 1})
+    assert len(batch._write_pbs) == 1
@@ -0,0 +1,134 @@
+"""
+Tests de la paginación por cursor (database/pagination.py y fetch_page).
+"""
+
+import asyncio
+
+import pytest
+
+from api.scripts import firebase_operations
+from database import firestore_repository as repo
+from database.pagination import InvalidCursorError
+
+from .test_firestore_repository import FakeDB, FakeQuery
+
+
+def _db():
+    return FakeDB(
+        {
+            "solicitudes": {
+                f"s{i:03d}": {"upid": "UNP-1" if i % 3 else "UNP-2", "created_at": i // 4}
+                for i in range(50)
+            }
+        }
+    )
+
+
+def _all_pages(db, **kwargs):
+    cursor, ids, pages = None, [], 0
+    while True:
+        page = asyncio.run(repo.fetch_page("solicitudes", limit=7, cursor=cursor, db=db, **kwargs))
+        ids += [doc.id for doc in page["docs"]]
+        pages += 1
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            assert cursor is None
+            return ids, pages
+
+
+def test_cursor_pages_cover_the_query_once_with_ties():
+    db = _db()
+    ids, pages = _all_pages(
+        db, where=[("upid", "==", "UNP-1")], order_by=[("created_at", "DESCENDING")]
+    )
+
+    expected = sorted(
+        (k for k, v in db.collections["solicitudes"].items() if v["upid"] == "UNP-1"),
+        key=lambda k: (db.collections["solicitudes"][k]["created_at"], k),
+        reverse=True,
+    )
+    assert ids == expected and pages == 5
+    assert not any(op[0] == "offset" for query in db.queries for op in query)
+    # Cada consulta pide una página y un documento de más
+    assert all(("limit", 8) in query for query in db.queries)
+
+
+def test_invalid_cursors_and_offset_compat():
+    db = _db()
+    first = asyncio.run(repo.fetch_page("solicitudes", limit=10, where=[("upid", "==", "UNP-1")], db=db))
+    token = first["next_cursor"]
+
+    with pytest.raises(InvalidCursorError):
+        asyncio.run(repo.fetch_page("solicitudes", limit=10, cursor=token, db=db))  # otros filtros
+    with pytest.raises(InvalidCursorError):
+        body, sig = token.split(".")
+        asyncio.run(repo.fetch_page("solicitudes", limit=10, where=[("upid", "==", "UNP-1")],
+                                    cursor=body[:-2] + "xx." + sig, db=db))
+
+    legacy = asyncio.run(repo.fetch_page("solicitudes", limit=10, offset=40, db=db))
+    assert [d.id for d in legacy["docs"]] == [f"s{i:03d}" for i in range(40, 50)]
+    assert legacy["next_cursor"] is None and not legacy["has_more"]
+
+
+def test_proyectos_presupuestales_follow_next_cursor(monkeypatch):
+    db = FakeDB({"ejecucion_presupuestal": {f"e{i:02d}": {"bp": f"BP{i}"} for i in range(5)}})
+    monkeypatch.setattr(firebase_operations, "get_firestore_client", lambda: db)
+
+    first = asyncio.run(firebase_operations.get_proyectos_presupuestales(limit=3))
+    second = asyncio.run(
+        firebase_operations.get_proyectos_presupuestales(limit=3, cursor=first["pagination"]["next_cursor"])
+    )
+    assert [p["id"] for p in first["data"] + second["data"]] == [f"e{i:02d}" for i in range(5)]
+    assert second["pagination"]["has_more"] is False
+
+    bad = asyncio.run(firebase_operations.get_proyectos_presupuestales(limit=3, cursor="no-es-un-cursor"))
+    assert bad["status_code"] == 400 and not bad["success"]
+
+
+class NoIndexQuery(FakeQuery):
+    """Consulta sin índice compuesto: ordenar por un campo falla como en Firestore."""
+
+    def _with(self, op):
+        return NoIndexQuery(self.db, self.name, self.docs, [*self.ops, op])
+
+    def get(self):
+        if any(op[0] == "order_by" and op[1] != "__name__" for op in self.ops):
+            raise RuntimeError("400 FAILED_PRECONDITION: The query requires an index")
+        return super().get()
+
+
+class NoIndexDB(FakeDB):
+    def collection(self, name):
+        return NoIndexQuery(self, name, self.collections.setdefault(name, {}))
+
+
+def test_unordered_fallback_pages_follow_their_own_cursor():
+    from api.routers.unidades_proyecto import _fetch_page_newest_first
+
+    db = NoIndexDB(_db().collections)
+    where = [("upid", "==", "UNP-1")]
+    cursor, ids = None, []
+    while True:
+        page, ordered = asyncio.run(_fetch_page_newest_first(
+            "solicitudes", dict(limit=10, where=where, cursor=cursor, offset=0, db=db)
+        ))
+        assert ordered is False
+        ids += [doc.id for doc in page["docs"]]
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+
+    # La página 2 y siguientes se leen con el cursor de la variante sin orden
+    assert ids == sorted(k for k, v in db.collections["solicitudes"].items() if v["upid"] == "UNP-1")
+    assert len(ids) > 10
+
+    # Con índice, el cursor de la variante ordenada sigue usando el orden por fecha
+    ordered_db = FakeDB(db.collections)
+    first, ordered = asyncio.run(_fetch_page_newest_first(
+        "solicitudes", dict(limit=10, where=where, cursor=None, offset=0, db=ordered_db)
+    ))
+    second, ordered_again = asyncio.run(_fetch_page_newest_first(
+        "solicitudes", dict(limit=10, where=where, cursor=first["next_cursor"], offset=0, db=ordered_db)
+    ))
+    assert ordered and ordered_again
+    assert not {d.id for d in first["docs"]} & {d.id for d in second["docs"]}
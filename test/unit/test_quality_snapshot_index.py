@@ -0,0 +1,139 @@
+"""
+Tests del índice local de snapshots de calidad (api/scripts/quality_snapshot_index.py).
+"""
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import pytest
+
+from api.scripts import emprestito_quality_metrics, quality_snapshot_index
+from api.scripts.quality_snapshot_index import get_quality_index, record_filters
+
+from .test_firestore_repository import FakeDB, FakeDoc
+
+
+class DocRef:
+    def __init__(self, docs, doc_id):
+        self.docs, self.doc_id = docs, doc_id
+
+    def get(self):
+        return FakeDoc(self.doc_id, self.docs.get(self.doc_id))
+
+
+class ReportsDB(FakeDB):
+    """FakeDB con lectura de documentos por id."""
+
+    def collection(self, name):
+        query = super().collection(name)
+        query.document = lambda doc_id: DocRef(query.docs, doc_id)
+        return query
+
+
+@pytest.fixture(autouse=True)
+def _index_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(quality_snapshot_index, "QUALITY_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(quality_snapshot_index, "_indexes", OrderedDict())
+
+
+def _record(i, record_type, centro):
+    return {
+        "record_index": i,
+        "record_uid": f"{record_type}-{i}",
+        "record_type": record_type,
+        "nombre_centro_gestor": centro,
+        "has_issues": i % 3 == 0,
+        "report_id": "r1",
+    }
+
+
+def test_seek_counts_and_builds_once():
+    records = [_record(i, "contrato" if i % 2 else "pago", "Secretaría de Salud" if i < 50 else "DAGMA") for i in range(100)]
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return records, []
+
+    index = get_quality_index("emprestito", "r1", loader)
+    where = record_filters(record_type="contrato", centro="secretaria de salud")
+    assert index.count("records", where) == 25
+
+    rows, cursor = index.seek("records", where, after=-1, limit=10)
+    assert [r["record_index"] for r in rows] == list(range(1, 20, 2))
+    rows, cursor = index.seek("records", where, after=cursor, limit=20)
+    assert len(rows) == 15 and cursor is None
+
+    # Cacheado en el proceso y reutilizable desde disco en otro proceso
+    assert get_quality_index("emprestito", "r1", loader) is index
+    quality_snapshot_index._indexes.clear()
+    assert get_quality_index("emprestito", "r1", loader).count("records", {}) == 100
+    assert len(calls) == 1
+
+
+def test_emprestito_records_use_index(monkeypatch):
+    records = {f"r1__{i}": _record(i, "pago", "DAGMA") for i in range(7)}
+    records.update({f"r0__{i}": {**_record(i, "pago", "DAGMA"), "report_id": "r0"} for i in range(3)})
+    db = ReportsDB({
+        emprestito_quality_metrics.EMPRESTITO_QUALITY_RECORDS: records,
+        emprestito_quality_metrics.EMPRESTITO_QUALITY_REPORTS: {"r1": {"report_id": "r1"}},
+    })
+    monkeypatch.setattr(emprestito_quality_metrics, "_get_db", lambda: db)
+
+    result = asyncio.run(emprestito_quality_metrics.get_emprestito_quality_records(
+        report_id="r1", page=2, limit=5, centro_gestor="dagma",
+    ))
+
+    assert result["total_records"] == 7 and result["total_pages"] == 2
+    assert [r["record_index"] for r in result["records"]] == [5, 6]
+    assert not result["has_more"]
+
+
+def test_slow_build_does_not_block_other_reports():
+    started, release = threading.Event(), threading.Event()
+
+    def slow_loader():
+        started.set()
+        release.wait(5)
+        return [_record(0, "pago", "DAGMA")], []
+
+    builder = threading.Thread(target=get_quality_index, args=("emprestito", "lento", slow_loader))
+    builder.start()
+    assert started.wait(5)
+    try:
+        # Otro reporte se construye mientras el primero sigue en el loader
+        index = get_quality_index("emprestito", "rapido", lambda: ([_record(0, "pago", "DAGMA")], []))
+        assert index.count("records", {}) == 1
+    finally:
+        release.set()
+        builder.join(5)
+    assert get_quality_index("emprestito", "lento", lambda: pytest.fail("ya construido")).count("records", {}) == 1
+
+
+def test_eviction_closes_connections_of_all_threads_and_prunes_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(quality_snapshot_index, "QUALITY_INDEX_CACHE_SIZE", 1)
+    monkeypatch.setattr(quality_snapshot_index, "QUALITY_INDEX_MAX_FILES", 2)
+    loader = lambda: ([_record(0, "pago", "DAGMA")], [])  # noqa: E731
+
+    first = get_quality_index("emprestito", "r1", loader)
+    worker = threading.Thread(target=first.count, args=("records", {}))
+    worker.start()
+    worker.join(5)
+    first.count("records", {})
+    connections = list(first._connections)
+    assert len(connections) == 2
+
+    time.sleep(0.01)
+    get_quality_index("emprestito", "r2", loader)
+    with pytest.raises(sqlite3.ProgrammingError):
+        connections[0].execute("SELECT 1")
+    # Cerrado, el índice vuelve a abrir conexión si alguien lo sigue usando
+    assert first.count("records", {}) == 1
+
+    time.sleep(0.01)
+    get_quality_index("emprestito", "r3", loader)
+    assert sorted(os.listdir(tmp_path)) == ["emprestito__r2.sqlite3", "emprestito__r3.sqlite3"]
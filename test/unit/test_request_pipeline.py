@@ -0,0 +1,123 @@
+"""
+Tests del pipeline ASGI de peticiones (api/core/pipeline.py) y de las etapas
+de autorización/auditoría (auth_system/middleware.py).
+"""
+
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from api.core.pipeline import (
+    BodySizeLimitStage,
+    CharsetStage,
+    RequestPipeline,
+    RouteTable,
+    TimeoutStage,
+    TimingStage,
+)
+from auth_system import middleware as auth_middleware
+from auth_system.middleware import AuditLogMiddleware, AuthorizationMiddleware
+
+
+def _app(stages):
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/lento")
+    async def lento():
+        await asyncio.sleep(1)
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                await asyncio.sleep(0.05)
+                yield f"parte-{i};".encode()
+
+        return StreamingResponse(chunks(), media_type="text/plain")
+
+    @app.post("/proyectos/{pid}")
+    async def actualizar(pid: str, request: Request):
+        return {"uid": request.state.user_uid}
+
+    app.add_middleware(RequestPipeline, stages=stages)
+    return app
+
+
+def test_headers_timeout_and_streaming_with_route_table():
+    stages = [
+        BodySizeLimitStage(10),
+        TimeoutStage(RouteTable([("/lento", 0.05), ("/stream", 0.05)], default=5.0)),
+        TimingStage(RouteTable([("/ping", "public, max-age=300")])),
+        CharsetStage(),
+    ]
+    client = TestClient(_app(stages))
+
+    ping = client.get("/ping")
+    assert ping.status_code == 200
+    assert ping.headers["content-type"] == "application/json; charset=utf-8"
+    assert ping.headers["cache-control"] == "public, max-age=300"
+    assert ping.headers["x-content-type-options"] == "nosniff"
+    assert float(ping.headers["x-process-time"]) >= 0
+
+    lento = client.get("/lento")
+    assert lento.status_code == 504
+    assert lento.json()["endpoint"] == "/lento"
+    assert "x-process-time" in lento.headers
+
+    # El plazo solo cubre hasta el inicio de la respuesta
+    stream = client.get("/stream")
+    assert stream.status_code == 200
+    assert stream.text == "parte-0;parte-1;parte-2;"
+
+    grande = client.post("/proyectos/1", content=b"x" * 20)
+    assert grande.status_code == 413
+    assert grande.json()["code"] == "PAYLOAD_TOO_LARGE"
+
+
+def test_authorization_stage_public_paths_and_tokens(monkeypatch):
+    monkeypatch.setattr(
+        auth_middleware, "get_cached_token", lambda token: {"uid": "u1"} if token == "bueno" else None
+    )
+
+    def _verify(token):
+        raise RuntimeError("token desconocido")
+
+    monkeypatch.setattr(auth_middleware, "verify_id_token_cached", _verify)
+    client = TestClient(_app([AuthorizationMiddleware(public_paths=["/", "/ping"])]))
+
+    assert client.get("/ping").status_code == 200
+    sin_token = client.post("/proyectos/1")
+    assert sin_token.status_code == 401
+    assert sin_token.json()["error"] == "missing_token"
+    assert client.post("/proyectos/1", headers={"Authorization": "Bearer malo"}).status_code == 500
+
+    ok = client.post("/proyectos/1", headers={"Authorization": "Bearer bueno"})
+    assert ok.status_code == 200
+    assert ok.json() == {"uid": "u1"}
+
+
+def test_audit_stage_sees_authenticated_user(monkeypatch):
+    monkeypatch.setattr(auth_middleware, "get_cached_token", lambda token: {"uid": "u1", "email": "a@b.co"})
+    entries = []
+    monkeypatch.setattr(AuditLogMiddleware, "_submit", lambda self, entry: entries.append(entry))
+    stages = [AuthorizationMiddleware(public_paths=["/ping"]), AuditLogMiddleware()]
+    client = TestClient(_app(stages))
+
+    client.get("/ping")
+    client.post("/proyectos/7?origen=web", headers={"Authorization": "Bearer t"})
+
+    assert len(entries) == 1
+    entry = entries[0]
+    assert entry["user_uid"] == "u1"
+    assert entry["user_email"] == "a@b.co"
+    assert entry["status_code"] == 200
+    assert entry["endpoint"] == "/proyectos/7"
+    assert entry["query_params"] == {"origen": "web"}
+    assert entry["action"] == "create_proyecto"
@@ -0,0 +1,107 @@
+"""
+Tests del registro de clientes S3 y del firmador de presigned URLs (api/utils/s3_clients.py).
+"""
+
+import pytest
+
+from api.scripts import reportes_contratos_operations as reportes
+from api.utils import s3_clients
+from api.utils.s3_clients import PresignedUrlSigner
+
+CREDS = {
+    "aws_access_key_id": "AKIATEST",
+    "aws_secret_access_key": "secreto",
+    "aws_region": "us-east-1",
+    "bucket_name_emprestito": "contratos-emprestito",
+}
+
+
+class FakeS3:
+    def __init__(self, region):
+        self.region = region
+        self.location_calls = 0
+        self.signed = []
+
+    def get_bucket_location(self, Bucket):
+        self.location_calls += 1
+        if Bucket == "roto":
+            raise RuntimeError("AccessDenied")
+        return {"LocationConstraint": None if Bucket == "contratos-emprestito" else "us-east-2"}
+
+    def head_bucket(self, Bucket):
+        raise RuntimeError("AccessDenied")
+
+    def generate_presigned_url(self, op, Params, ExpiresIn):
+        self.signed.append(Params["Key"])
+        return f"https://{Params['Bucket']}.s3.{self.region}.amazonaws.com/{Params['Key']}?n={len(self.signed)}"
+
+
+@pytest.fixture
+def fake_boto(monkeypatch):
+    clients = []
+
+    def _client(service, region_name=None, **kwargs):
+        client = FakeS3(region_name)
+        clients.append(client)
+        return client
+
+    monkeypatch.setattr(s3_clients.boto3, "client", _client)
+    s3_clients.clear_s3_registry()
+    yield clients
+    s3_clients.clear_s3_registry()
+
+
+def test_clients_and_regions_are_shared(fake_boto):
+    assert s3_clients.bucket_region(CREDS, "contratos-emprestito") == "us-east-1"
+    assert s3_clients.bucket_region(dict(CREDS), "contratos-emprestito") == "us-east-1"
+    assert s3_clients.bucket_region(CREDS, "reportes") == "us-east-2"
+    # Un fallo de descubrimiento cae en la región configurada
+    assert s3_clients.bucket_region(CREDS, "roto") == "us-east-1"
+
+    a = s3_clients.get_bucket_client(CREDS, "reportes")
+    assert s3_clients.get_bucket_client(dict(CREDS), "reportes") is a
+    assert [c.region for c in fake_boto] == ["us-east-1", "us-east-2"]
+    assert fake_boto[0].location_calls == 3
+    # Otras credenciales → otro cliente
+    s3_clients.get_s3_client({**CREDS, "aws_secret_access_key": "otro"})
+    assert len(fake_boto) == 3
+
+
+def test_signer_batches_and_refreshes_before_expiry(fake_boto, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(s3_clients.time, "time", lambda: now[0])
+    signer = PresignedUrlSigner(CREDS, expires_in=600, refresh_margin=60)
+
+    urls = signer.sign_many([("reportes", "a.pdf"), ("reportes", "b.jpg"), ("reportes", "a.pdf"), ("", "x")])
+    assert urls[("", "x")] is None
+    assert urls[("reportes", "a.pdf")].startswith("https://reportes.s3.us-east-2.amazonaws.com/a.pdf")
+    assert fake_boto[-1].signed == ["a.pdf", "b.jpg"]
+
+    now[0] += 500
+    assert signer.sign("reportes", "a.pdf") == urls[("reportes", "a.pdf")]
+    now[0] += 50  # quedan 50 s < margen de 60 s → se refirma
+    assert signer.sign("reportes", "a.pdf") != urls[("reportes", "a.pdf")]
+    assert fake_boto[-1].signed == ["a.pdf", "b.jpg", "a.pdf"]
+
+
+def test_reportes_normalization_signs_in_one_batch(fake_boto, monkeypatch, tmp_path):
+    cred_file = tmp_path / "aws.json"
+    cred_file.write_text('{"aws_access_key_id": "AKIATEST", "aws_secret_access_key": "s", "aws_region": "us-east-2"}')
+    monkeypatch.setenv("AWS_CREDENTIALS_FILE_REPORTES_CONTRATOS", str(cred_file))
+    monkeypatch.setenv("S3_USE_PRESIGNED_URLS", "true")
+    doc = {
+        "archivos_evidencia": [
+            {"name": "foto.jpg", "bucket": "reportes", "s3_key": "r/foto.jpg"},
+            {"name": "acta.pdf", "url": "https://reportes.s3.us-east-2.amazonaws.com/r/acta.pdf"},
+            "basura",
+        ]
+    }
+
+    first = reportes._normalize_archivos_for_frontend(dict(doc))
+    second = reportes._normalize_archivos_for_frontend(dict(doc))
+
+    assert [a["url_presigned"] for a in first["archivos_evidencia"]] == [
+        a["url_presigned"] for a in second["archivos_evidencia"]
+    ]
+    assert all(a["url"] == a["url_presigned"] for a in first["archivos_evidencia"])
+    assert fake_boto[-1].signed == ["r/foto.jpg", "r/acta.pdf"]
@@ -0,0 +1,103 @@
+"""
+Tests del servicio de subidas S3 y la normalización de imágenes (api/utils/s3_uploads.py).
+"""
+
+import asyncio
+import io
+import threading
+
+from PIL import Image
+
+from api.utils import s3_uploads
+from api.utils.s3_document_manager import S3DocumentManager
+from api.utils.s3_uploads import S3UploadService, UploadRequest, normalize_images
+
+
+class FakeS3:
+    def __init__(self, existing=None):
+        self.objects = dict(existing or {})
+        self.puts = []
+        self.multipart = []
+        self.heads = 0
+        self._lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, **extra):
+        if Key.endswith("boom.pdf"):
+            raise RuntimeError("SlowDown")
+        with self._lock:
+            self.puts.append(Key)
+            self.objects[Key] = extra["Metadata"]
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        with self._lock:
+            self.multipart.append((key, len(fileobj.read()), Config.multipart_chunksize))
+            self.objects[key] = ExtraArgs["Metadata"]
+
+    def head_object(self, Bucket, Key):
+        self.heads += 1
+        if Key not in self.objects:
+            raise KeyError(Key)
+        return {"Metadata": self.objects[Key]}
+
+
+def _png(color, size=(2000, 1000)):
+    buf = io.BytesIO()
+    Image.new("RGBA", size, color).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_upload_many_parallel_multipart_and_dedupe():
+    s3 = FakeS3()
+    service = S3UploadService(s3, workers=4, multipart_threshold=1000, multipart_chunksize=600)
+    requests = [
+        UploadRequest("b", "a.jpg", b"x" * 10),
+        UploadRequest("b", "grande.bin", b"y" * 1500),
+        UploadRequest("b", "a-copia.jpg", b"x" * 10),
+        UploadRequest("b", "boom.pdf", b"z"),
+        UploadRequest("b", "a.jpg", b"x" * 10),
+    ]
+
+    results = service.upload_many(requests)
+
+    # Mismo cuerpo con otra key se sube a su key; la misma key solo una vez
+    assert sorted(s3.puts) == ["a-copia.jpg", "a.jpg"]
+    assert s3.multipart == [("grande.bin", 1500, 600)]
+    assert results[2]["key"] == "a-copia.jpg" and not results[2]["deduplicated"]
+    assert results[0]["key"] == "a.jpg" and results[0]["deduplicated"]
+    assert not results[4]["deduplicated"]
+    assert results[1]["multipart"] and isinstance(results[3], RuntimeError)
+    assert s3.objects["a.jpg"]["content-sha256"] == results[0]["sha256"]
+
+
+def test_document_manager_skips_unchanged_documents():
+    manager = S3DocumentManager.__new__(S3DocumentManager)
+    manager.bucket_name, manager.region = "contratos-emprestito", "us-east-1"
+    manager.s3_client = s3 = FakeS3()
+    files = [
+        {"content": b"%PDF-1", "filename": "rpc.pdf"},
+        {"content": b"%PDF-2", "filename": "anexo.pdf"},
+    ]
+
+    ok, failed = manager.upload_multiple_documents(files, "4151.010.26.1.001", "rpc")
+    assert len(ok) == 2 and not failed and len(s3.puts) == 2
+
+    files[1]["content"] = b"%PDF-2 corregido"
+    ok, failed = manager.upload_multiple_documents(files, "4151.010.26.1.001", "rpc")
+    assert [r["deduplicated"] for r in ok] == [True, False]
+    assert s3.puts[-1] == "contratos-rpc-docs/4151010261001/anexo.pdf"
+    assert ok[0]["s3_url"].startswith("https://contratos-emprestito.s3.us-east-1.amazonaws.com/")
+
+
+def test_normalize_images_on_process_pool(monkeypatch):
+    monkeypatch.setattr(s3_uploads, "IMAGE_PROCESS_WORKERS", 2)
+    red = _png((255, 0, 0, 128))
+    try:
+        results = asyncio.run(normalize_images([red, b"no-es-imagen", red, _png((0, 0, 255, 255), (300, 200))]))
+    finally:
+        s3_uploads.shutdown_image_pool()
+
+    assert isinstance(results[1], ValueError)
+    assert results[0] == results[2]
+    first = Image.open(io.BytesIO(results[0]))
+    assert first.format == "JPEG" and first.size == (1280, 640)
+    assert Image.open(io.BytesIO(results[3])).size == (300, 200)
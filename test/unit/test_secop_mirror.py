@@ -0,0 +1,157 @@
+"""
+Tests del mirror local de SECOP/TVEC (api/scripts/secop_mirror.py).
+"""
+
+import asyncio
+import re
+import threading
+import time
+
+import pytest
+
+from api.scripts import secop_mirror
+from api.scripts.secop_mirror import SECOP_CONTRATOS_DATASET, SecopMirror
+from api.scripts.secop_sync import SECOP_PROCESOS_DATASET
+
+
+class FakeSoda:
+    """Datasets en memoria que entienden ``:updated_at > 'ts'`` y el keyset ``(:updated_at, :id)``."""
+
+    def __init__(self, datasets, on_page=None):
+        self.datasets = datasets
+        self.calls = []
+        self.on_page = on_page
+
+    async def __call__(self, params, dataset, bucket=None):
+        where = params["$where"]
+        self.calls.append((dataset, where))
+        assert "$offset" not in params
+        rows = self.datasets.get(dataset, [])
+        since = re.match(r".* AND :updated_at > '([^']*)'", where.split(" AND (", 1)[0])
+        if since:
+            rows = [r for r in rows if r[":updated_at"] > since.group(1)]
+        after = re.search(r"\(:updated_at > '([^']*)' OR \(:updated_at = '[^']*' AND :id > '([^']*)'\)\)", where)
+        if after:
+            rows = [r for r in rows if (r[":updated_at"], r[":id"]) > (after.group(1), after.group(2))]
+        page = sorted(rows, key=lambda r: (r[":updated_at"], r[":id"]))[:params["$limit"]]
+        if self.on_page:
+            self.on_page(len(self.calls))
+        return page
+
+
+def _proceso(row_id, ref, updated, **extra):
+    return {":id": row_id, ":updated_at": updated, "referencia_del_proceso": ref, "nit_entidad": "890399011", **extra}
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    mirror = SecopMirror(str(tmp_path / "mirror.sqlite3"))
+    monkeypatch.setattr(secop_mirror, "SECOP_MIRROR_ENABLED", True)
+    monkeypatch.setattr(secop_mirror, "SECOP_MIRROR_LIVE_FALLBACK", True)
+    secop_mirror.set_secop_mirror(mirror)
+    yield mirror
+    secop_mirror.set_secop_mirror(None)
+
+
+def test_lookup_waits_for_first_sync_then_answers_locally(mirror, monkeypatch):
+    assert secop_mirror.lookup_secop_mirror(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "R-1") is None
+
+    soda = FakeSoda({
+        SECOP_PROCESOS_DATASET: [_proceso("a", "R-1", "2024-01-01T00:00:00", fase="Borrador")],
+        SECOP_CONTRATOS_DATASET: [
+            {":id": "c1", ":updated_at": "2024-01-01T00:00:00", "referencia_del_contrato": "C-1",
+             "proceso_de_compra": "CO1.BDOS.123_45", "nit_entidad": "890399011"},
+        ],
+    })
+    monkeypatch.setattr(secop_mirror, "soql_get", soda)
+    result = asyncio.run(secop_mirror.sincronizar_mirror_secop())
+    assert result["success"], result
+
+    rows = secop_mirror.lookup_secop_mirror(
+        SECOP_PROCESOS_DATASET, "referencia_del_proceso", "R-1", nit_entidad="890399011"
+    )
+    assert rows == [{"referencia_del_proceso": "R-1", "nit_entidad": "890399011", "fase": "Borrador"}]
+    # LIKE '%...%' sobre proceso_de_compra, con '_' literal
+    assert len(secop_mirror.lookup_secop_mirror(SECOP_CONTRATOS_DATASET, "proceso_de_compra", "123_4", contains=True)) == 1
+    assert secop_mirror.lookup_secop_mirror(SECOP_CONTRATOS_DATASET, "proceso_de_compra", "123%4", contains=True) is None
+
+    # Fila ausente: None con fallback en vivo, [] si el mirror es autoritativo
+    assert secop_mirror.lookup_secop_mirror(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "X") is None
+    monkeypatch.setattr(secop_mirror, "SECOP_MIRROR_LIVE_FALLBACK", False)
+    assert secop_mirror.lookup_secop_mirror(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "X") == []
+
+
+def test_delta_sync_and_full_reload_purge(mirror, monkeypatch):
+    procesos = [_proceso("a", "R-1", "2024-01-01T00:00:00"), _proceso("b", "R-2", "2024-01-02T00:00:00")]
+    soda = FakeSoda({SECOP_PROCESOS_DATASET: procesos})
+    monkeypatch.setattr(secop_mirror, "soql_get", soda)
+
+    asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+    assert mirror.get_state(SECOP_PROCESOS_DATASET)["last_updated_at"] == "2024-01-02T00:00:00"
+
+    procesos[0] = _proceso("a", "R-1", "2024-02-01T00:00:00", fase="Adjudicado")
+    result = asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+    assert "2024-01-02T00:00:00" in soda.calls[-1][1]
+    assert result["datasets"][0]["modo"] == "delta" and result["datasets"][0]["filas_escritas"] == 1
+    assert mirror.lookup(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "R-1")[0]["fase"] == "Adjudicado"
+
+    # La recarga completa elimina filas que ya no existen en la fuente
+    del procesos[1]
+    result = asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET], full=True))
+    assert result["datasets"][0]["filas_purgadas"] == 1
+    assert mirror.lookup(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "R-2") == []
+    assert mirror.get_state(SECOP_PROCESOS_DATASET)["rows"] == 1
+
+
+def test_keyset_paging_survives_rows_changing_mid_sync(mirror, monkeypatch):
+    procesos = [_proceso(f"r{i}", f"R-{i}", "2024-01-01T00:00:00") for i in range(5)]
+
+    def _modificar(llamada):
+        # Tras la primera página, r0 se actualiza y pasa al final del orden
+        if llamada == 1:
+            procesos[0] = _proceso("r0", "R-0", "2024-03-01T00:00:00")
+
+    soda = FakeSoda({SECOP_PROCESOS_DATASET: procesos}, on_page=_modificar)
+    monkeypatch.setattr(secop_mirror, "soql_get", soda)
+    monkeypatch.setattr(secop_mirror, "SECOP_PAGE_SIZE", 2)
+
+    asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+
+    # Con $offset la fila r2 se habría saltado
+    for i in range(5):
+        assert mirror.lookup(SECOP_PROCESOS_DATASET, "referencia_del_proceso", f"R-{i}")
+    assert mirror.get_state(SECOP_PROCESOS_DATASET)["last_updated_at"] == "2024-03-01T00:00:00"
+
+
+def test_periodic_refresh_schedules_full_reload(mirror, monkeypatch):
+    monkeypatch.setattr(secop_mirror, "SECOP_MIRROR_FULL_REFRESH_SECONDS", 3600)
+    soda = FakeSoda({SECOP_PROCESOS_DATASET: [_proceso("a", "R-1", "2024-01-01T00:00:00")]})
+    monkeypatch.setattr(secop_mirror, "soql_get", soda)
+
+    assert secop_mirror.datasets_pendientes_de_recarga() == list(secop_mirror.MIRROR_DATASETS)
+    asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+    # La primera carga (sin estado previo) cuenta como recarga completa
+    assert SECOP_PROCESOS_DATASET not in secop_mirror.datasets_pendientes_de_recarga()
+    assert SECOP_PROCESOS_DATASET in secop_mirror.datasets_pendientes_de_recarga(now=time.time() + 7200)
+
+    # Una delta no renueva la marca de recarga completa
+    full_synced_at = mirror.get_state(SECOP_PROCESOS_DATASET)["full_synced_at"]
+    asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+    assert mirror.get_state(SECOP_PROCESOS_DATASET)["full_synced_at"] == full_synced_at
+
+
+def test_async_lookup_runs_off_the_event_loop(mirror, monkeypatch):
+    soda = FakeSoda({SECOP_PROCESOS_DATASET: [_proceso("a", "R-1", "2024-01-01T00:00:00")]})
+    monkeypatch.setattr(secop_mirror, "soql_get", soda)
+    asyncio.run(secop_mirror.sincronizar_mirror_secop([SECOP_PROCESOS_DATASET]))
+    hilos = []
+    lookup = secop_mirror.lookup_secop_mirror
+
+    def _lookup(*args, **kwargs):
+        hilos.append(threading.get_ident())
+        return lookup(*args, **kwargs)
+
+    monkeypatch.setattr(secop_mirror, "lookup_secop_mirror", _lookup)
+    rows = asyncio.run(secop_mirror.alookup_secop_mirror(SECOP_PROCESOS_DATASET, "referencia_del_proceso", "R-1"))
+    assert rows[0]["referencia_del_proceso"] == "R-1"
+    assert hilos and hilos[0] != threading.get_ident()
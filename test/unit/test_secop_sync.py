@@ -0,0 +1,242 @@
+"""
+Tests del motor de sincronización SECOP (api/scripts/secop_sync.py).
+"""
+
+import asyncio
+import re
+import time
+
+import pytest
+
+from api.scripts import secop_mirror, secop_sync
+
+from .test_firestore_repository import FakeDB, FakeDoc
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None):
+        self.status_code = status_code
+        self._payload = payload or []
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(self.status_code)
+
+
+class FakeSession:
+    """Responde consultas ``IN (...)`` a partir de un dataset en memoria."""
+
+    def __init__(self, rows, failures=()):
+        self.rows = rows
+        self.failures = list(failures)
+        self.wheres = []
+
+    def get(self, url, params, timeout):
+        if self.failures:
+            return FakeResponse(self.failures.pop(0))
+        where = params["$where"]
+        self.wheres.append(where)
+        refs = set(re.findall(r"'((?:[^']|'')*)'", where.split("IN", 1)[1]))
+        refs = {r.replace("''", "'") for r in refs}
+        nit = re.match(r"nit_entidad='(\d+)'", where)
+        rows = [
+            r for r in self.rows
+            if r["referencia_del_proceso"] in refs and (not nit or r.get("nit_entidad") == nit.group(1))
+        ]
+        return FakeResponse(200, rows[params["$offset"]:params["$offset"] + params["$limit"]])
+
+
+class DocRef:
+    def __init__(self, db, name, doc_id):
+        self.db, self.name, self.doc_id = db, name, doc_id
+
+    def get(self):
+        return FakeDoc(self.doc_id, self.db.collections.setdefault(self.name, {}).get(self.doc_id))
+
+    def set(self, data, merge=False):
+        docs = self.db.collections.setdefault(self.name, {})
+        docs[self.doc_id] = {**(docs.get(self.doc_id) or {}), **data} if merge else dict(data)
+
+
+class SyncDB(FakeDB):
+    """FakeDB con referencias de documento para el checkpoint."""
+
+    def collection(self, name):
+        query = super().collection(name)
+        if name == secop_sync.CHECKPOINT_COLLECTION:
+            query.document = lambda doc_id: DocRef(self, name, doc_id)
+        return query
+
+
+@pytest.fixture(autouse=True)
+def _fast_sync(monkeypatch):
+    monkeypatch.setattr(secop_sync, "SECOP_BATCH_SIZE", 3)
+    monkeypatch.setattr(secop_sync, "SECOP_BACKOFF_SECONDS", 0.001)
+    monkeypatch.setattr(secop_sync, "SECOP_RATE_PER_SECOND", 1000)
+    monkeypatch.setattr(secop_sync, "_progress", {"status": "idle"})
+    monkeypatch.setattr(secop_mirror, "SECOP_MIRROR_ENABLED", False)
+    monkeypatch.setattr(secop_sync, "_lease_transaction", _fake_lease_transaction)
+
+
+def _fake_lease_transaction(db, decide):
+    """Misma lógica que la transacción de Firestore, sobre el dict en memoria."""
+    ref = db.collection(secop_sync.CHECKPOINT_COLLECTION).document(secop_sync.CHECKPOINT_DOC_ID)
+    snapshot = ref.get()
+    lease = decide(((snapshot.to_dict() or {}) if snapshot.exists else {}).get("lease") or {})
+    if lease is None:
+        return False
+    ref.set({"lease": lease}, merge=True)
+    return True
+
+
+def _use_session(monkeypatch, session):
+    monkeypatch.setattr(secop_sync, "_get_session", lambda: session)
+
+
+def _secop_row(ref, nit="890399011", **fields):
+    return {"referencia_del_proceso": ref, "nit_entidad": nit, "fase": "Presentación", "numero_de_lotes": "2", **fields}
+
+
+def test_batched_lookup_with_nit_fallback(monkeypatch):
+    rows = [_secop_row(f"R-{i}") for i in range(5)] + [_secop_row("O'Brien-1", nit="1")]
+    session = FakeSession(rows)
+    _use_session(monkeypatch, session)
+
+    found = asyncio.run(secop_sync.buscar_procesos_secop([f"R-{i}" for i in range(5)] + ["O'Brien-1", "X"]))
+
+    assert set(found) == {"R-0", "R-1", "R-2", "R-3", "R-4", "O'Brien-1"}
+    # 7 referencias en lotes de 3 con NIT, luego 2 faltantes sin NIT
+    assert len(session.wheres) == 4
+    assert "'O''Brien-1'" in session.wheres[-1] and "nit_entidad" not in session.wheres[-1]
+
+
+def test_retries_on_rate_limit(monkeypatch):
+    session = FakeSession([_secop_row("R-1")], failures=[429, 503])
+    _use_session(monkeypatch, session)
+    assert "R-1" in asyncio.run(secop_sync.buscar_procesos_secop(["R-1"]))
+
+
+def test_sync_updates_changed_docs_and_resumes(monkeypatch):
+    procesos = {f"d{i}": {"referencia_proceso": f"R-{i}"} for i in range(5)}
+    procesos["d0"].update(secop_sync.mapear_proceso_secop_completo(_secop_row("R-0")))
+    db = SyncDB({"procesos_emprestito": procesos})
+    session = FakeSession([_secop_row(f"R-{i}") for i in range(4)])
+    _use_session(monkeypatch, session)
+
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(db))
+
+    resumen = result["resumen_procesamiento"]
+    assert resumen["procesos_procesados"] == 5
+    assert resumen["procesos_actualizados"] == 3
+    assert resumen["procesos_sin_cambios"] == 1
+    assert resumen["procesos_con_errores"] == 1  # R-4 no existe en SECOP
+    assert {doc_id for op, doc_id, _ in db.writes if op == "update"} == {"d1", "d2", "d3"}
+    assert db.collections["sync_checkpoints"]["secop_procesos_emprestito"]["status"] == "completed"
+    assert secop_sync.get_secop_sync_progress()["status"] == "completed"
+
+    # Reanudar una corrida interrumpida omite los documentos ya escritos
+    db.collections["sync_checkpoints"]["secop_procesos_emprestito"] = {
+        "status": "running", "run_id": "abc", "completed_doc_ids": ["d0", "d1", "d2"],
+    }
+    session.wheres.clear()
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(db, resume=True))
+    assert result["run_id"] == "abc"
+    assert result["resumen_procesamiento"]["procesos_omitidos_por_checkpoint"] == 3
+    assert result["resumen_procesamiento"]["procesos_procesados"] == 2
+    assert all("'R-0'" not in where for where in session.wheres)
+
+
+def test_concurrent_run_is_rejected(monkeypatch):
+    monkeypatch.setattr(secop_sync, "_progress", {"status": "running"})
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(SyncDB({})))
+    assert result["success"] is False and "en curso" in result["error"]
+
+
+def test_simultaneous_starts_run_once(monkeypatch):
+    db = SyncDB({"procesos_emprestito": {"d0": {"referencia_proceso": "R-0"}}})
+    _use_session(monkeypatch, FakeSession([_secop_row("R-0")]))
+
+    async def _dos_corridas():
+        return await asyncio.gather(
+            secop_sync.sincronizar_procesos_emprestito(db),
+            secop_sync.sincronizar_procesos_emprestito(db),
+        )
+
+    primera, segunda = asyncio.run(_dos_corridas())
+    assert primera["success"] is True
+    assert segunda["success"] is False and "en curso" in segunda["error"]
+
+
+def test_failed_checkpoint_does_not_leave_status_running(monkeypatch):
+    db = SyncDB({"procesos_emprestito": {"d0": {"referencia_proceso": "R-0"}}})
+    _use_session(monkeypatch, FakeSession([_secop_row("R-0")]))
+
+    async def _falla(db, data):
+        raise TimeoutError("Firestore lento")
+
+    monkeypatch.setattr(secop_sync, "_save_checkpoint", _falla)
+    with pytest.raises(TimeoutError):
+        asyncio.run(secop_sync.sincronizar_procesos_emprestito(db))
+    assert secop_sync.get_secop_sync_progress()["status"] == "interrupted"
+
+
+def test_stop_leaves_checkpoint_open(monkeypatch):
+    db = SyncDB({"procesos_emprestito": {f"d{i}": {"referencia_proceso": f"R-{i}"} for i in range(9)}})
+    _use_session(monkeypatch, FakeSession([_secop_row(f"R-{i}") for i in range(9)]))
+    monkeypatch.setattr(secop_sync, "SECOP_SYNC_CONCURRENCY", 1)
+    reportes = []
+
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(
+        db, on_progress=reportes.append, should_stop=lambda: len(reportes) >= 1,
+    ))
+
+    assert result["resumen_procesamiento"]["procesos_procesados"] == 3
+    assert reportes[0]["procesados"] == 3
+    assert secop_sync.get_secop_sync_progress()["status"] == "interrupted"
+    assert db.collections["sync_checkpoints"]["secop_procesos_emprestito"]["status"] == "running"
+
+
+def _checkpoint(db):
+    return db.collections["sync_checkpoints"]["secop_procesos_emprestito"]
+
+
+def test_run_held_by_another_worker_is_rejected(monkeypatch):
+    db = SyncDB({
+        "procesos_emprestito": {"d0": {"referencia_proceso": "R-0"}},
+        "sync_checkpoints": {"secop_procesos_emprestito": {
+            "status": "running", "lease": {"token": "otro", "expires_at": time.time() + 60},
+        }},
+    })
+    _use_session(monkeypatch, FakeSession([_secop_row("R-0")]))
+
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(db))
+
+    assert result["success"] is False and "otro worker" in result["error"]
+    assert _checkpoint(db)["lease"]["token"] == "otro"
+    assert secop_sync.get_secop_sync_progress()["status"] == "idle"
+
+
+def test_expired_lease_is_taken_and_released(monkeypatch):
+    db = SyncDB({
+        "procesos_emprestito": {"d0": {"referencia_proceso": "R-0"}},
+        "sync_checkpoints": {"secop_procesos_emprestito": {
+            "status": "running", "lease": {"token": "caido", "expires_at": time.time() - 1},
+        }},
+    })
+    _use_session(monkeypatch, FakeSession([_secop_row("R-0")]))
+
+    result = asyncio.run(secop_sync.sincronizar_procesos_emprestito(db))
+
+    assert result["success"] is True
+    assert _checkpoint(db)["status"] == "completed"
+    assert _checkpoint(db)["lease"] == {"token": None}
+
+
+def test_renewal_fails_once_another_owner_holds_the_lease():
+    decide = secop_sync._decide_claim("mio", renew=True)
+    assert decide({"token": "mio", "expires_at": 0}) is not None
+    assert decide({"token": "otro", "expires_at": 0}) is None
+    assert secop_sync._decide_release("mio")({"token": "otro"}) is None
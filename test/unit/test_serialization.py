@@ -0,0 +1,83 @@
+"""
+Tests de la serialización de Firestore a JSON (api/core/serialization.py).
+"""
+
+import json
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from google.api_core.datetime_helpers import DatetimeWithNanoseconds
+from google.cloud.firestore_v1._helpers import GeoPoint
+from google.cloud.firestore_v1.document import DocumentReference
+
+from api.core import responses, serialization
+from api.core.serialization import dumps, iter_json_chunks, to_jsonable
+from api.scripts.ordenes_compra_operations import serialize_datetime_objects
+
+STAMP = DatetimeWithNanoseconds(2025, 7, 1, 8, 30, 5, nanosecond=123456789, tzinfo=timezone.utc)
+
+
+class _Client:
+    _database_string = "projects/p/databases/(default)"
+
+
+def _doc():
+    return {
+        "creado": STAMP,
+        "fecha": date(2025, 7, 1),
+        "ubicacion": GeoPoint(3.45, -76.53),
+        "contrato": DocumentReference("contratos_emprestito", "c1", client=_Client()),
+        "valor": Decimal("10.5"),
+        "tags": {"obra"},
+        "anidado": [{"en": datetime(2025, 1, 2, 3, 4, 5)}],
+    }
+
+
+EXPECTED = {
+    "creado": "2025-07-01T08:30:05.123456+00:00",
+    "fecha": "2025-07-01",
+    "ubicacion": {"latitude": 3.45, "longitude": -76.53},
+    "contrato": "contratos_emprestito/c1",
+    "valor": 10.5,
+    "tags": ["obra"],
+    "anidado": [{"en": "2025-01-02T03:04:05"}],
+}
+
+
+def test_dumps_encodes_firestore_types_with_and_without_orjson(monkeypatch):
+    assert json.loads(dumps(_doc())) == EXPECTED
+    assert to_jsonable(_doc()) == EXPECTED
+
+    monkeypatch.setattr(serialization, "ORJSON_AVAILABLE", False)
+    assert json.loads(dumps(_doc())) == EXPECTED
+    assert "ñ".encode() in dumps({"centro": "Secretaría de Educación, Niñez"})
+
+
+def test_legacy_serializers_keep_their_format():
+    doc = _doc()
+    assert serialize_datetime_objects(doc)["creado"] == "2025-07-01 08:30:05"
+    assert serialize_datetime_objects(doc)["anidado"][0]["en"] == "2025-01-02 03:04:05"
+    assert responses.clean_firebase_data(doc)["creado"] == EXPECTED["creado"]
+    assert doc["creado"] is STAMP  # no se modifica el original
+
+
+def test_create_utf8_response_streams_large_lists(monkeypatch):
+    monkeypatch.setattr(serialization, "JSON_STREAM_MIN_ITEMS", 5)
+    app = FastAPI()
+    rows = [{"id": i, "creado": STAMP} for i in range(12)]
+
+    @app.get("/lista")
+    def lista(n: int):
+        return responses.create_utf8_response({"success": True, "data": rows[:n], "count": n})
+
+    client = TestClient(app)
+    small = client.get("/lista", params={"n": 3})
+    large = client.get("/lista", params={"n": 12})
+
+    assert "content-length" in small.headers and "content-length" not in large.headers
+    assert large.headers["content-type"] == "application/json; charset=utf-8"
+    assert large.json() == {"success": True, "count": 12, "data": json.loads(dumps(rows))}
+    assert len(list(iter_json_chunks({"data": rows}, chunk_items=5))) == 5
+    assert json.loads(b"".join(iter_json_chunks({"data": []}))) == {"data": []}
@@ -0,0 +1,108 @@
+"""
+Tests del pipeline de importación masiva (api/scripts/unidades_proyecto_import.py
+y POST /unidades-proyecto/importar/ejecutar).
+"""
+
+import asyncio
+
+from api.routers import unidades_proyecto as router
+from api.scripts.unidades_proyecto_import import (
+    ImportBatchWriter,
+    ImportWrite,
+    prefetch_existing_upids,
+    prefetch_intervenciones,
+)
+
+from .test_firestore_repository import FakeBatch, FakeDB
+
+
+class FailingBatch(FakeBatch):
+    def commit(self):
+        if any(doc_id == "boom" for _, doc_id, _ in self.ops):
+            raise RuntimeError("deadline exceeded")
+        super().commit()
+
+
+class ImportDB(FakeDB):
+    def batch(self):
+        return FailingBatch(self)
+
+
+def _db():
+    return ImportDB({
+        "unidades_proyecto": {f"UNP-{i}": {"upid": f"UNP-{i}"} for i in range(1, 71)},
+        "intervenciones_unidades_proyecto": {
+            "UNP-1-INT-1": {"upid": "UNP-1", "intervencion_id": "UNP-1-INT-1",
+                            "tipo_intervencion": "Obra", "referencia_contrato": "C-1"},
+            "UNP-1-INT-4": {"upid": "UNP-1", "intervencion_id": "UNP-1-INT-4", "tipo_intervencion": "Obra"},
+        },
+        "unidades_proyecto_intervenciones": {
+            "x": {"upid": "UNP-2", "intervencion_id": "UNP-2-INT-7", "tipo_intervencion": "Dotación"},
+        },
+    })
+
+
+def test_prefetch_uses_chunked_in_queries():
+    db = _db()
+    upids = [f"UNP-{i}" for i in range(1, 81)]
+
+    existing = asyncio.run(prefetch_existing_upids(db, upids))
+    assert existing == {f"UNP-{i}" for i in range(1, 71)}
+    assert len(db.queries) == 3  # 80 upids en lotes de 30
+
+    state = asyncio.run(prefetch_intervenciones(db, ["UNP-1", "UNP-2", "UNP-3"]))
+    assert state["UNP-1"]["max"] == 4 and ("obra", "c-1") in state["UNP-1"]["keys"]
+    assert state["UNP-2"]["max"] == 7
+    assert state["UNP-3"] == {"keys": set(), "max": 0}
+
+
+def test_writer_keeps_groups_together_and_reports_failures():
+    db = _db()
+    events = []
+    groups = [
+        [ImportWrite("unidades_proyecto", f"UNP-{i}", {}, feature_index=i, created_id=f"UNP-{i}"),
+         ImportWrite("cambios", None, {})]
+        for i in range(5)
+    ]
+    groups[3][0].doc_id = "boom"
+
+    writer = ImportBatchWriter(db, chunk_size=5, on_commit=events.append)
+    asyncio.run(writer.write_groups(groups))
+
+    # Ningún grupo de 2 escrituras se parte entre batches de 5
+    assert db.commits == [4, 2]
+    assert [e["batch"] for e in events] == [1, 2, 3]
+    assert events[-1] == {"batch": 3, "written": 6, "failed": 4, "total": 10}
+    assert writer.created_ids() == ["UNP-0", "UNP-1", "UNP-4"]
+    assert [e["feature_index"] for e in writer.feature_errors()] == [2, 3]
+
+
+def test_ejecutar_combinado_batches_writes(monkeypatch):
+    db = _db()
+    monkeypatch.setattr(router, "enforce_unidades_access", lambda user, action, centro: None)
+    monkeypatch.setattr(router, "_invalidate_unidades_cache", lambda full_reload=False: None)
+    monkeypatch.setattr(router, "_enriquecer_geometrias", lambda geoms: [(None, None, []) for _ in geoms])
+
+    def feature(**props):
+        return {"properties": {"tipo_intervencion": "Obra", **props}}
+
+    body = router.ImportarGeoRequest(
+        entity_type="combinado",
+        column_mapping={f: f for f in ("upid", "nombre_up", "tipo_intervencion", "referencia_contrato")},
+        nombre_centro_gestor_global="DAGMA",
+        upid_start=100,
+        features=[
+            feature(upid="UNP-1", referencia_contrato="C-1"),  # duplicada
+            feature(upid="UNP-1", referencia_contrato="C-2"),
+            feature(upid="NUEVA", nombre_up="Parque", referencia_contrato="C-3"),
+        ],
+    )
+    events = []
+    result = asyncio.run(router._ejecutar_importacion(body, {"uid": "u1"}, db, progress=events.append))
+
+    assert result["created_ids"] == ["UNP-1-INT-5", "UNP-101", "UNP-101-INT-1"]
+    assert result["skipped_duplicate_count"] == 1 and result["next_upid_start"] == 101
+    assert result["error_count"] == 0
+    # 3 documentos + 3 auditorías en un único WriteBatch
+    assert db.commits == [6]
+    assert [e["stage"] for e in events] == ["validacion", "prefetch", "geometria", "escritura"]
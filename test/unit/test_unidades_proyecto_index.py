@@ -0,0 +1,85 @@
+"""
+Tests del índice columnar usado por apply_client_side_filters.
+"""
+
+import pytest
+
+from api.scripts.unidades_proyecto import apply_client_side_filters
+from api.scripts.unidades_proyecto_index import get_index
+
+RECORDS = [
+    {
+        "type": "Feature",
+        "properties": {
+            "upid": "UNP-1",
+            "clase_obra": "Obra vial",
+            "nombre_centro_gestor": "Secretaría de Infraestructura",
+            "comuna_corregimiento": "COMUNA 01",
+            "intervenciones": [
+                {"estado": "En ejecución", "tipo_intervencion": "Mejoramiento"},
+                {"estado": "Terminado", "tipo_intervencion": "Mantenimiento"},
+            ],
+        },
+    },
+    {
+        "upid": "UNP-2",
+        "clase_up": "Obras equipamientos",
+        "estado": "Terminado",
+        "presupuesto_base": "250000000",
+        "avance_obra": 100,
+        "lat": 3.45,
+        "lng": -76.53,
+        "fecha_creacion": "2025-06-01",
+        "nombre_up": "Parque",
+        "comuna_corregimiento": "COMUNA 02",
+    },
+    {
+        "upid": "UNP-3",
+        "properties": {"presupuesto_base": 50_000_000, "avance_obra": "40"},
+        "coordinates": [-76.6, 3.4],
+        "created_at": "2024-01-01",
+        "barrio_vereda": "San Antonio",
+    },
+]
+
+
+@pytest.mark.parametrize(
+    "filters, expected",
+    [
+        ({"upid": "UNP-2"}, [1]),
+        ({"upid": ["UNP-1", "UNP-3"]}, [0, 2]),
+        ({"estado": "En ejecución"}, [0]),
+        ({"estado": "Terminado"}, [0, 1]),
+        ({"tipo_intervencion": "Mantenimiento"}, [0]),
+        ({"clase_up": "Obra vial"}, [0]),
+        ({"comuna_corregimiento": "COMUNA 02"}, [1]),
+        ({"presupuesto_base": 100_000_000}, [1]),
+        ({"avance_obra": 30}, [1, 2]),
+        ({"search": "antonio"}, [2]),
+        ({"search": "unp"}, [0, 1, 2]),
+        ({"has_geometry": True}, [1, 2]),
+        ({"has_geometry": False}, [0]),
+        ({"bbox": [-76.55, 3.40, -76.50, 3.50]}, [1]),
+        ({"bbox": ["x", 3.40, -76.50, 3.50]}, [0, 1, 2]),
+        ({"fecha_desde": "2025-01-01"}, [0, 1]),
+        ({"fecha_hasta": "2024-12-31"}, [0, 2]),
+        ({"estado": "Terminado", "clase_up": "Obras equipamientos"}, [1]),
+        ({"estado": "Inexistente"}, []),
+    ],
+)
+def test_index_filters(filters, expected):
+    assert apply_client_side_filters(RECORDS, filters) == [RECORDS[i] for i in expected]
+
+
+def test_index_is_reused_for_the_same_base_list():
+    index = get_index(RECORDS)
+    apply_client_side_filters(RECORDS, {"estado": "Terminado"})
+    assert get_index(RECORDS) is index
+    # Un slice es otra lista: por eso el offset se aplica después de filtrar
+    assert get_index(RECORDS[1:]) is not index
+
+
+def test_index_preserves_order_and_identity():
+    result = apply_client_side_filters(RECORDS, {"upid": ["UNP-3", "UNP-1"]})
+    assert result[0] is RECORDS[0]
+    assert result[1] is RECORDS[2]
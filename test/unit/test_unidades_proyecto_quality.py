@@ -0,0 +1,177 @@
+"""
+Tests del motor incremental de calidad de unidades_proyecto
+(api/scripts/unidades_proyecto_quality_metrics.py).
+"""
+
+import asyncio
+
+import pytest
+
+from api.scripts import quality_snapshot_index
+from api.scripts import unidades_proyecto_quality_metrics as quality
+
+from .test_firestore_repository import FakeDoc
+
+
+class MemoryRef:
+    def __init__(self, store, path):
+        self.store, self.path, self.id = store, path, path[-1]
+
+    def collection(self, name):
+        return MemoryCollection(self.store, (*self.path, name))
+
+    def set(self, data):
+        self.store.writes += 1
+        self.store.docs[self.path] = dict(data)
+
+    def get(self):
+        return FakeDoc(self.id, self.store.docs.get(self.path))
+
+
+class MemoryCollection:
+    def __init__(self, store, path):
+        self.store, self.path = store, path
+
+    def document(self, doc_id):
+        return MemoryRef(self.store, (*self.path, doc_id))
+
+    def stream(self):
+        n = len(self.path)
+        return iter(
+            FakeDoc(path[-1], data)
+            for path, data in sorted(self.store.docs.items())
+            if len(path) == n + 1 and path[:n] == self.path
+        )
+
+
+class MemoryBatch:
+    def __init__(self):
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append((ref, data))
+
+    def commit(self):
+        for ref, data in self.ops:
+            ref.set(data)
+
+
+class MemoryFirestore:
+    def __init__(self):
+        self.docs = {}
+        self.writes = 0
+
+    def collection(self, name):
+        return MemoryCollection(self, (name,))
+
+    def batch(self):
+        return MemoryBatch()
+
+
+class FakeSnapshot:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def invalidate(self, full=False):
+        pass
+
+    async def aitems(self):
+        return sorted(self.docs.items())
+
+
+@pytest.fixture
+def env(monkeypatch, tmp_path):
+    db = MemoryFirestore()
+    monkeypatch.setattr(quality_snapshot_index, "QUALITY_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(quality_snapshot_index, "_indexes", quality.OrderedDict())
+    unidades = {
+        "u1": {"upid": "UNP-1", "nombre_up": "Parque", "nombre_centro_gestor": "Secretaria A",
+               "presupuesto_base": 10, "fecha_inicio": "2025-01-01", "fecha_fin": "2025-12-31",
+               "lat": 3.4, "lon": -76.5},
+        "u2": {"upid": "UNP-2", "nombre_up": "Vía", "nombre_centro_gestor": "Secretaria B"},
+    }
+    intervenciones = {
+        "i1": {"intervencion_id": "INT-1", "upid": "UNP-1", "estado": "En ejecución", "tipo_intervencion": "Obra"},
+        "i2": {"intervencion_id": "INT-2", "upid": "UNP-9", "estado": "Terminado", "tipo_intervencion": "Obra"},
+    }
+    monkeypatch.setattr(quality, "get_firestore_client", lambda: db)
+    monkeypatch.setattr(quality, "get_unidades_snapshot", lambda: FakeSnapshot(unidades))
+    monkeypatch.setattr(quality, "get_intervenciones_snapshot", lambda: FakeSnapshot(intervenciones))
+    monkeypatch.setattr(quality, "_materialized", quality.OrderedDict())
+    return db, unidades, intervenciones
+
+
+def test_rerun_reevaluates_and_stores_only_changes(env):
+    db, unidades, intervenciones = env
+
+    first = asyncio.run(quality.generate_unidades_proyecto_quality_report())
+    assert first["incremental"]["records_reevaluated"] == 4
+    assert first["incremental"]["storage"]["base_report_id"] is None
+    assert first["summary"]["intervenciones"]["orphan_upid"] == 1
+    assert first["summary"]["intervenciones"]["by_field"]["presupuesto_base"]["missing"] == 2
+
+    unidades["u2"] = {**unidades["u2"], "presupuesto_base": 5}
+    writes_before = db.writes
+    second = asyncio.run(quality.generate_unidades_proyecto_quality_report())
+
+    assert second["incremental"]["base_report_id"] == first["report_id"]
+    assert second["incremental"]["records_reevaluated"] == 1
+    assert second["incremental"]["storage"]["records_stored"] == 1
+    # blob + reporte + latest + estado por filtro
+    assert db.writes - writes_before == 4
+    assert second["summary"]["unidades"]["by_field"]["presupuesto_base"]["missing"] == 0
+
+    # Un cambio relacional (upid que aparece) se refleja sin reevaluar el documento
+    unidades["u9"] = {"upid": "UNP-9", "nombre_up": "Nueva", "nombre_centro_gestor": "Secretaria B"}
+    third = asyncio.run(quality.generate_unidades_proyecto_quality_report())
+    assert third["incremental"]["records_reevaluated"] == 1
+    assert third["summary"]["intervenciones"]["orphan_upid"] == 0
+
+
+def test_readers_materialize_delta_chain(env):
+    db, unidades, intervenciones = env
+    for i in range(3, 7):
+        unidades[f"u{i}"] = {"upid": f"UNP-{i}", "nombre_up": "Sede", "nombre_centro_gestor": "Secretaria C"}
+    asyncio.run(quality.generate_unidades_proyecto_quality_report())
+    del intervenciones["i2"]
+    unidades["u1"] = {**unidades["u1"], "nombre_centro_gestor": None}
+    report = asyncio.run(quality.generate_unidades_proyecto_quality_report())
+    assert report["incremental"]["storage"]["records_removed"] == 1
+
+    # Leer desde Firestore, sin la caché del proceso
+    quality._materialized.clear()
+    page = asyncio.run(quality.get_unidades_proyecto_quality_records_paginated(page_size=2, record_type="unidad"))
+    assert page["report_id"] == report["report_id"]
+    assert [r["record_uid"] for r in page["records"]] == ["unidad-u1", "unidad-u2"]
+    assert page["has_more"] and page["next_page_token"] == 1
+    assert page["total_records"] == 6
+    rest = asyncio.run(quality.get_unidades_proyecto_quality_records_paginated(page_token=4))
+    assert [r["record_uid"] for r in rest["records"]] == ["unidad-u6", "intervencion-i1"]
+    assert rest["records"][1]["record_index"] == 6 and not rest["has_more"]
+    assert rest["records"][1]["nombre_centro_gestor"] == "Sin centro gestor"
+
+    issues = asyncio.run(quality.get_unidades_proyecto_quality_issues_paginated(field="nombre_centro_gestor"))
+    assert [i["record_uid"] for i in issues["issues"]] == ["unidad-u1"]
+    centro_c = asyncio.run(quality.get_unidades_proyecto_quality_issues_paginated(
+        nombre_centro_gestor="secretaria c", page_size=3,
+    ))
+    assert centro_c["total_issues"] == 16 and centro_c["count"] == 3
+    following = asyncio.run(quality.get_unidades_proyecto_quality_issues_paginated(
+        nombre_centro_gestor="secretaria c", page_size=3, page_token=centro_c["next_page_token"],
+    ))
+    assert not {i["record_uid"] + i["field"] for i in following["issues"]} & {
+        i["record_uid"] + i["field"] for i in centro_c["issues"]
+    }
+
+    missing = asyncio.run(quality.get_unidades_proyecto_quality_missing_centros_paginated())
+    assert {c["record_uid"] for c in missing["candidates"]} == {"unidad-u1", "intervencion-i1"}
+
+
+def test_content_hash_is_stable_for_firestore_types():
+    from google.cloud.firestore_v1 import GeoPoint
+
+    first = {"upid": "UNP-1", "ubicacion": GeoPoint(3.45, -76.53)}
+    second = {"ubicacion": GeoPoint(3.45, -76.53), "upid": "UNP-1"}
+
+    assert quality._content_hash(first) == quality._content_hash(second)
+    assert quality._content_hash(first) != quality._content_hash({**first, "ubicacion": GeoPoint(3.4, -76.5)})
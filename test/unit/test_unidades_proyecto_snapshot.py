@@ -0,0 +1,107 @@
+"""
+Tests del snapshot en memoria de unidades_proyecto / intervenciones.
+"""
+
+from datetime import datetime, timezone
+from unittest.mock import MagicMock, patch
+
+from api.scripts.unidades_proyecto_snapshot import CollectionSnapshot
+
+
+def _doc(doc_id, data):
+    doc = MagicMock()
+    doc.id = doc_id
+    doc.to_dict.return_value = data
+    return doc
+
+
+def _db(full_docs, delta_docs=()):
+    db = MagicMock()
+    collection = db.collection.return_value
+    collection.stream.side_effect = lambda: iter(full_docs)
+    collection.where.return_value.stream.side_effect = lambda: iter(delta_docs)
+    return db
+
+
+class TestCollectionSnapshot:
+    def test_full_load_once_then_served_from_memory(self):
+        db = _db([_doc("b", {"upid": "UNP-2"}), _doc("a", {"upid": "UNP-1"})])
+        snap = CollectionSnapshot("unidades_proyecto", refresh_seconds=3600)
+        with patch(
+            "api.scripts.unidades_proyecto_snapshot.get_firestore_client",
+            return_value=db,
+        ):
+            first = snap.documents()
+            second = snap.documents()
+
+        assert [d["upid"] for d in first] == ["UNP-2", "UNP-1"]
+        assert first == second
+        assert db.collection.return_value.stream.call_count == 1
+
+    def test_incremental_refresh_merges_changed_docs(self):
+        full = [
+            _doc("a", {"upid": "UNP-1", "updated_at": "2026-01-01T00:00:00"}),
+        ]
+        delta = [
+            _doc("a", {"upid": "UNP-1", "avance_obra": 50, "updated_at": "2026-02-01T00:00:00"}),
+            _doc("0", {"upid": "UNP-0", "updated_at": "2026-02-02T00:00:00"}),
+        ]
+        db = _db(full, delta)
+        snap = CollectionSnapshot("unidades_proyecto", refresh_seconds=3600)
+        with patch(
+            "api.scripts.unidades_proyecto_snapshot.get_firestore_client",
+            return_value=db,
+        ):
+            snap.documents()
+            snap.invalidate()
+            items = snap.items()
+
+        db.collection.return_value.where.assert_called_with(
+            "updated_at", ">", datetime(2026, 1, 1, tzinfo=timezone.utc)
+        )
+        assert [doc_id for doc_id, _ in items] == ["0", "a"]
+        assert dict(items)["a"]["avance_obra"] == 50
+        assert snap.get_stats()["watermark"] == "2026-02-02T00:00:00+00:00"
+
+    def test_watermark_compares_mixed_offsets_as_instants(self):
+        # 10:30-05:00 es 15:30 UTC: posterior a 15:00 aunque ordene antes como texto
+        full = [
+            _doc("a", {"upid": "UNP-1", "updated_at": "2026-03-07T15:00:00"}),
+            _doc("b", {"upid": "UNP-2", "updated_at": "2026-03-07T10:30:00-05:00"}),
+            _doc("c", {"upid": "UNP-3", "updated_at": datetime(2026, 3, 7, 15, 10, tzinfo=timezone.utc)}),
+        ]
+        delta = [
+            _doc("c", {"upid": "UNP-3", "avance_obra": 80,
+                       "updated_at": datetime(2026, 3, 7, 15, 45, tzinfo=timezone.utc)}),
+        ]
+        db = _db(full, delta)
+        snap = CollectionSnapshot("unidades_proyecto", refresh_seconds=3600)
+        with patch(
+            "api.scripts.unidades_proyecto_snapshot.get_firestore_client",
+            return_value=db,
+        ):
+            snap.documents()
+            assert snap.get_stats()["watermark"] == "2026-03-07T15:30:00+00:00"
+            snap.invalidate()
+            items = dict(snap.items())
+
+        db.collection.return_value.where.assert_called_with(
+            "updated_at", ">", datetime(2026, 3, 7, 15, 30, tzinfo=timezone.utc)
+        )
+        assert items["c"]["avance_obra"] == 80
+        assert snap.get_stats()["watermark"] == "2026-03-07T15:45:00+00:00"
+        assert db.collection.return_value.stream.call_count == 1
+
+    def test_full_invalidation_reloads_and_drops_deleted_docs(self):
+        db = _db([_doc("a", {"upid": "UNP-1"}), _doc("b", {"upid": "UNP-2"})])
+        snap = CollectionSnapshot("unidades_proyecto", refresh_seconds=3600)
+        with patch(
+            "api.scripts.unidades_proyecto_snapshot.get_firestore_client",
+            return_value=db,
+        ):
+            assert len(snap.documents()) == 2
+            db.collection.return_value.stream.side_effect = lambda: iter(
+                [_doc("a", {"upid": "UNP-1"})]
+            )
+            snap.invalidate(full=True)
+            assert len(snap.documents()) == 1
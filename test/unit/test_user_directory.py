@@ -0,0 +1,87 @@
+"""
+Tests del directorio de usuarios en memoria (auth_system/user_directory.py).
+"""
+
+import pytest
+
+from api.services import comunicaciones_service
+from auth_system import user_directory
+from auth_system.permissions import get_user_role_level, has_role
+from auth_system.user_directory import UserDirectory
+
+from .test_firestore_repository import FakeDB
+
+DAGMA = "Departamento Administrativo de Gestión del Medio Ambiente - DAGMA"
+
+
+def _users():
+    return {
+        "u1": {"email": "Ana@cali.gov.co", "full_name": "Ana", "nombre_centro_gestor": DAGMA, "roles": ["editor"]},
+        "u2": {"email": "beto@cali.gov.co", "centro_gestor_assigned": "dagma", "role": "Viewer", "is_active": False},
+        "u3": {"correo": "caro@cali.gov.co", "nombre_centro_gestor": "Secretaría de Salud Pública",
+               "roles": ["super_admin", "editor"]},
+        "u4": {"email": "sin-arroba", "roles": "viewer"},
+    }
+
+
+@pytest.fixture
+def directory(monkeypatch):
+    now = [0.0]
+    db = FakeDB({"users": _users()})
+    directory = UserDirectory(db_getter=lambda: db, ttl_seconds=60, clock=lambda: now[0])
+    monkeypatch.setattr(user_directory, "_directory", directory)
+    return directory, db, now
+
+
+def test_find_uses_indexes(directory):
+    directory, db, _ = directory
+
+    assert [u["uid"] for u in directory.find(centros="DAGMA")] == ["u1", "u2"]
+    assert [u["uid"] for u in directory.find(centros=["dagma"], active=True)] == ["u1"]
+    assert [u["uid"] for u in directory.find(roles=["viewer", "SUPER_ADMIN"])] == ["u2", "u3", "u4"]
+    assert [u["uid"] for u in directory.find(centros="salud", roles="editor")] == ["u3"]
+    assert directory.get_by_email("ana@CALI.gov.co")["uid"] == "u1"
+
+    page, total = directory.page(1, 2)
+    assert total == 4 and [u["uid"] for u in page] == ["u2", "u3"]
+    assert len(db.queries) == 1  # una sola carga completa
+
+
+def test_ttl_invalidation_and_point_reads(directory):
+    directory, db, now = directory
+    directory.find()
+
+    db.collections["users"]["u1"]["nombre_centro_gestor"] = "Secretaría de Cultura"
+    db.collections["users"]["u9"] = {"email": "nuevo@cali.gov.co", "roles": ["editor"]}
+    del db.collections["users"]["u2"]
+
+    # Un uid desconocido se lee directamente; los invalidados, en la próxima consulta
+    assert directory.get("u9")["email"] == "nuevo@cali.gov.co"
+    user_directory.invalidate_user_directory("u1")
+    user_directory.invalidate_user_directory("u2")
+    assert [u["uid"] for u in directory.find(centros="cultura")] == ["u1"]
+    assert directory.find(centros="dagma") == []
+    assert directory.stats()["loads"] == 1
+
+    now[0] = 61
+    directory.find()
+    assert directory.stats()["loads"] == 2
+
+
+def test_audiences_and_rbac_read_the_directory(directory, monkeypatch):
+    directory, db, _ = directory
+    monkeypatch.setattr(comunicaciones_service, "_get_db", lambda: db)
+
+    assert comunicaciones_service.resolve_audience("centros_gestores:dagma") == [
+        ("Ana@cali.gov.co", "Ana"),
+        ("beto@cali.gov.co", ""),
+    ]
+    assert comunicaciones_service.resolve_audience("activos") == [
+        ("Ana@cali.gov.co", "Ana"),
+        ("caro@cali.gov.co", ""),
+    ]
+    assert [e for e, _ in comunicaciones_service.resolve_audience("uids:u3,zz")] == ["caro@cali.gov.co"]
+
+    assert has_role("u3", "super_admin") and not has_role("u1", "super_admin")
+    assert get_user_role_level("u3") == 0 and get_user_role_level("nadie") == 999
+    assert directory.stats()["loads"] == 1